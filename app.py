@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, Request, render_template, request, jsonify, redirect, url_for, flash, session, send_file, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_migrate import Migrate
 from flask_cors import CORS
@@ -8,6 +8,7 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 import os
+import io
 from datetime import datetime, timedelta
 from config import Config
 from models import (
@@ -17,7 +18,8 @@ from models import (
     Order, OrderItem, Invoice, InvoicePayment, InvoiceItem, ProofOfPayment, AuditLog,
     HomePageSettings
 )
-from email_service import EmailService
+from email_service import EmailService, SMTP_POOL_IDLE_TIMEOUT
+from email_outbox import queue_email
 import json
 import secrets
 from werkzeug.utils import secure_filename
@@ -26,18 +28,49 @@ from email_service import EmailService
 from geolocation import geolocation_service
 from pricing import pricing_service
 from ocr_service import OCRService
-from s3_storage import storage_service
+from ocr_jobs import submit_proof_of_payment, get_pop_status
+from s3_storage import storage_service, S3_DELETE_FLUSH_INTERVAL
+from object_cache import object_cache
+from static_files import StaticFastPath
+from static_manifest import static_manifest
+from content_versions import content_versions, viewer_key, currency_key, customer_scope
+import cloudflare_cache
+from page_cache import page_cache, is_warmup_request
+from prerender import prerenderer, is_prerender_request, PRERENDER_CHECK_INTERVAL
+from image_pipeline import queue_image_variants, delete_image_and_variants, picture, image_set
 import bleach
 from security_utils import (
     validate_password_strength, check_account_locked, record_failed_login,
     clear_failed_login_attempts, generate_2fa_secret, get_2fa_qr_code,
     verify_2fa_token, require_2fa, secure_file_upload, log_security_event,
-    get_client_ip, cleanup_old_data
+    get_client_ip, cleanup_old_data, read_upload,
+    DIRECT_UPLOAD_ORIGIN
 )
 from security_middleware import security_middleware
-from performance import optimize_db_connection, optimize_static_files, optimize_templates
+from performance import (
+    optimize_db_connection, optimize_static_files, optimize_templates,
+    enable_compression, precompress_static
+)
+
+POP_MAX_SIZE = 10 * 1024 * 1024  # proof of payment upload limit
+IN_MEMORY_UPLOAD_ENDPOINTS = {'customer_pay_invoice'}
+
+
+class InMemoryUploadRequest(Request):
+    """
+    Keep proof of payment uploads (up to POP_MAX_SIZE) in memory instead of
+    spooling them to temporary files, so a body can be read once and shared
+    by hashing, S3 and OCR. Every other upload spools as usual.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if (self.endpoint in IN_MEMORY_UPLOAD_ENDPOINTS and total_content_length is not None
+                and total_content_length <= POP_MAX_SIZE):
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 app.config.from_object(Config)
 
 # APPLY BANK-LEVEL SECURITY MIDDLEWARE
@@ -47,6 +80,20 @@ security_middleware(app)
 optimize_db_connection(app)
 optimize_static_files(app)
 optimize_templates(app)
+enable_compression(app)  # after_request hooks run in reverse: sees the final body
+precompress_static(app.static_folder)
+static_manifest.init_app(app)  # static_url(): content-hashed, immutable asset URLs
+
+# /static/... is answered in front of the Flask request pipeline; the index is
+# built once, so development keeps Flask's own static route for live edits
+if os.getenv('FLASK_ENV') != 'development':
+    app.wsgi_app = StaticFastPath(
+        app.wsgi_app, app.static_folder, max_age=app.config['SEND_FILE_MAX_AGE_DEFAULT'],
+        manifest=static_manifest, pages=prerenderer  # prerendered public pages (prerender.py)
+    )
+
+# Responsive <picture>/srcset and CSS image-set() for uploaded images
+app.jinja_env.globals.update(picture=picture, image_set=image_set)
 
 # Initialize logging FIRST for early error catching
 from logging_config import setup_logging, log_request
@@ -62,6 +109,9 @@ app.logger.info("⚡ Performance optimizations applied")
 db.init_app(app)
 migrate = Migrate(app, db)
 cache = Cache(app)
+content_versions.init_app(app, view_cache=cache)
+page_cache.init_app(app, cache, versions=content_versions)  # per-currency pages, jittered TTLs, warm-up
+cloudflare_cache.init_app(app)  # purge edge copies of pages when their content commits
 CORS(app)
 
 # CSRF Protection
@@ -74,6 +124,9 @@ limiter = Limiter(
     default_limits=["200 per day", "50 per hour"],
     storage_uri=app.config.get('RATELIMIT_STORAGE_URL', 'memory://')
 )
+# Page cache warm-up renders pages as 127.0.0.1 several times an hour
+limiter.request_filter(is_warmup_request)
+limiter.request_filter(is_prerender_request)
 
 # HTTPS and Security Headers
 csp = {
@@ -108,7 +161,7 @@ csp = {
     'style-src-attr': ["'unsafe-inline'"],
     'img-src': ["'self'", 'data:', 'https:'],
     'font-src': ["'self'", 'cdnjs.cloudflare.com'],
-    'connect-src': ["'self'", 'https://api.stripe.com']
+    'connect-src': ["'self'", 'https://api.stripe.com'] + ([DIRECT_UPLOAD_ORIGIN] if DIRECT_UPLOAD_ORIGIN else [])
 }
 
 # Only enable Talisman in production (Railway deployment)
@@ -163,7 +216,7 @@ else:
             "style-src-attr 'unsafe-inline'",
             "img-src 'self' data: https:",
             "font-src 'self' cdnjs.cloudflare.com",
-            "connect-src 'self' https://api.stripe.com cdn.jsdelivr.net"
+            "connect-src 'self' https://api.stripe.com cdn.jsdelivr.net " + DIRECT_UPLOAD_ORIGIN
         ])
         response.headers['Content-Security-Policy'] = csp_header
         return response
@@ -230,7 +283,7 @@ def set_security_headers(response):
             "style-src-attr 'unsafe-inline'",
             "img-src 'self' data: https:",
             "font-src 'self' cdnjs.cloudflare.com",
-            "connect-src 'self' https://api.stripe.com cdn.jsdelivr.net"
+            "connect-src 'self' https://api.stripe.com cdn.jsdelivr.net " + DIRECT_UPLOAD_ORIGIN
         ])
         response.headers['Content-Security-Policy'] = csp_header
     
@@ -262,47 +315,6 @@ def validate_password_strength(password):
     
     return True, "Password is strong"
 
-def secure_file_upload(file):
-    """Enhanced file upload security"""
-    if not file:
-        return None, "No file provided"
-    
-    # Check file size
-    file.seek(0, 2)  # Seek to end
-    size = file.tell()
-    file.seek(0)  # Reset
-    
-    if size > app.config['MAX_CONTENT_LENGTH']:
-        return None, "File too large (max 16MB)"
-    
-    if size == 0:
-        return None, "File is empty"
-    
-    # Sanitize filename
-    filename = secure_filename(file.filename)
-    if not filename:
-        return None, "Invalid filename"
-    
-    # Check extension
-    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-    if ext not in app.config['ALLOWED_EXTENSIONS']:
-        return None, f"File type .{ext} not allowed"
-    
-    # Generate unique filename to prevent overwrite attacks
-    unique_filename = f"{secrets.token_hex(16)}.{ext}"
-    
-    # Save file
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    file.save(filepath)
-    
-    # Set restrictive permissions
-    try:
-        os.chmod(filepath, 0o644)
-    except:
-        pass  # Windows doesn't support chmod
-    
-    return unique_filename, None
-
 def sanitize_input(text, max_length=1000):
     """Sanitize user input to prevent XSS"""
     if not text:
@@ -362,22 +374,29 @@ def save_upload_file(file):
     if not allowed_file(file.filename):
         return None
     
+    # Read once: the same bytes are uploaded and resized into variants
+    data = file.read()
+    
     # Upload to S3 cloud storage
     file_url, error = storage_service.upload_file(
         file,
         folder='uploads',
-        allowed_extensions=app.config['ALLOWED_EXTENSIONS']
+        allowed_extensions=app.config['ALLOWED_EXTENSIONS'],
+        data=data
     )
     
     if error:
         print(f"S3 Upload error: {error}")
         return None
     
+    # WebP/AVIF/JPEG derivatives for srcset, encoded after the response
+    queue_image_variants(file_url, data)
+    
     return file_url  # Returns full S3 URL (https://t3.storageapi.dev/bucket/uploads/filename)
 
 
 def send_payment_email(transaction):
-    """Send payment confirmation email to customer."""
+    """Queue payment confirmation email to customer."""
     if not app.config.get('SEND_EMAILS'):
         return False
 
@@ -385,8 +404,8 @@ def send_payment_email(transaction):
     if not company:
         return False
 
-    return email_service.send_payment_confirmation(
-        recipient_email=transaction.customer_email,
+    queue_email(
+        'send_payment_confirmation', transaction.customer_email,
         recipient_name=transaction.customer_name or 'Valued Customer',
         transaction_id=transaction.transaction_id,
         amount=transaction.amount,
@@ -397,10 +416,13 @@ def send_payment_email(transaction):
         company_email=company.email,
         company_phone=company.phone
     )
+    db.session.commit()
+    return True
 
 
 @app.route('/')
-@cache.cached(timeout=300)
+@content_versions.conditional('catalog', 'chrome', vary=(viewer_key,))
+@page_cache.cached()
 def index():
     hero_sections = HeroSection.query.filter_by(
         is_active=True
@@ -433,7 +455,8 @@ def index():
                          products=products)
 
 @app.route('/services')
-@cache.cached(timeout=300)
+@content_versions.conditional('catalog', 'chrome', vary=(viewer_key,))
+@page_cache.cached()
 def services():
     services = Service.query.filter_by(is_active=True).order_by(Service.order_position).all()
     company_info = CompanyInfo.query.first()
@@ -445,7 +468,8 @@ def services():
                          menu_items=menu_items)
 
 @app.route('/products')
-@cache.cached(timeout=300)
+@content_versions.conditional('catalog', 'chrome', vary=(viewer_key, currency_key))
+@page_cache.cached(vary_currency=True)
 def products():
     products = Product.query.filter_by(is_active=True).order_by(
         Product.order_position
@@ -474,7 +498,7 @@ def products():
                          menu_items=menu_items)
 
 @app.route('/payment')
-@cache.cached(timeout=300)
+@page_cache.cached()
 def payment():
     payment_methods = PaymentMethod.query.filter_by(is_active=True).order_by(PaymentMethod.order_position).all()
     payment_terms = PaymentTerm.query.filter_by(is_active=True).order_by(PaymentTerm.order_position).all()
@@ -498,6 +522,7 @@ def contact():
                          menu_items=menu_items)
 
 @app.route('/privacy')
+@content_versions.conditional('chrome', vary=(viewer_key,))
 def privacy():
     company_info = CompanyInfo.query.first()
     menu_items = MenuItem.query.filter_by(is_active=True, parent_id=None).order_by(MenuItem.order_position).all()
@@ -506,6 +531,7 @@ def privacy():
                          menu_items=menu_items)
 
 @app.route('/terms')
+@content_versions.conditional('chrome', vary=(viewer_key,))
 def terms():
     company_info = CompanyInfo.query.first()
     menu_items = MenuItem.query.filter_by(is_active=True, parent_id=None).order_by(MenuItem.order_position).all()
@@ -536,53 +562,38 @@ def submit_contact():
     )
 
     db.session.add(submission)
-    db.session.commit()
 
-    # Send emails asynchronously (non-blocking)
+    # Queued in the same transaction; sent by the outbox dispatcher
     if app.config.get('SEND_EMAILS'):
-        import threading
-        
-        def send_emails_async():
-            with app.app_context():  # Add Flask app context
-                try:
-                    company = CompanyInfo.query.first()
-
-                    # Send confirmation to user
-                    email_service.send_contact_confirmation(
-                        recipient_name=data.get('name'),
-                        recipient_email=data.get('email'),
-                        subject=data.get('subject'),
-                        message_content=data.get('message'),
-                        company_name=company.company_name if company else
-                            '360Degree Supply',
-                        company_phone=company.phone if company else
-                            '+27 64 902 4363',
-                        company_email=company.email if company else
-                            'info@360degreesupply.co.za'
-                    )
-
-                    # Send notification to admin (info@360degreesupply.co.za)
-                    admin_email = app.config.get(
-                        'ADMIN_EMAIL',
-                        'info@360degreesupply.co.za'
-                    )
-                    email_service.send_contact_notification(
-                        admin_email=admin_email,
-                        sender_name=data.get('name'),
-                        sender_email=data.get('email'),
-                        sender_phone=data.get('phone'),
-                        subject=data.get('subject'),
-                        message_content=data.get('message'),
-                        company_name=company.company_name if company else
-                            '360Degree Supply'
-                    )
-                except Exception as e:
-                    app.logger.error(f"Background email error: {str(e)}")
-        
-        # Start email sending in background thread
-        email_thread = threading.Thread(target=send_emails_async)
-        email_thread.daemon = True
-        email_thread.start()
+        company = CompanyInfo.query.first()
+        company_name = company.company_name if company else '360Degree Supply'
+
+        # Confirmation to the sender
+        queue_email(
+            'send_contact_confirmation', data.get('email'),
+            recipient_name=data.get('name'),
+            subject=data.get('subject'),
+            message_content=data.get('message'),
+            company_name=company_name,
+            company_phone=company.phone if company else
+                '+27 64 902 4363',
+            company_email=company.email if company else
+                'info@360degreesupply.co.za'
+        )
+
+        # Notification to admin (info@360degreesupply.co.za)
+        queue_email(
+            'send_contact_notification',
+            app.config.get('ADMIN_EMAIL', 'info@360degreesupply.co.za'),
+            sender_name=data.get('name'),
+            sender_email=data.get('email'),
+            sender_phone=data.get('phone'),
+            subject=data.get('subject'),
+            message_content=data.get('message'),
+            company_name=company_name
+        )
+
+    db.session.commit()
 
     return jsonify({
         'success': True,
@@ -833,7 +844,7 @@ def admin_company():
                 company_info.logo_url = logo_url
         
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('chrome')
         flash('Company information updated successfully', 'success')
         
         return redirect(url_for('admin_company'))
@@ -862,7 +873,7 @@ def admin_homepage():
             if hero_image_url:
                 settings.hero_image = hero_image_url
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('catalog')
         flash('Homepage settings updated successfully!', 'success')
         return redirect(url_for('admin_homepage'))
     return render_template('admin/homepage.html', settings=settings)
@@ -892,7 +903,7 @@ def admin_service_add():
         
         db.session.add(service)
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('catalog')
         flash('Service added successfully', 'success')
         
         return redirect(url_for('admin_services'))
@@ -917,7 +928,7 @@ def admin_service_edit(id):
                 service.image_url = image_url
         
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('catalog')
         flash('Service updated successfully', 'success')
         
         return redirect(url_for('admin_services'))
@@ -930,7 +941,7 @@ def admin_service_delete(id):
     service = Service.query.get_or_404(id)
     db.session.delete(service)
     db.session.commit()
-    cache.clear()
+    content_versions.invalidate('catalog')
     flash('Service deleted successfully', 'success')
     
     return redirect(url_for('admin_services'))
@@ -968,14 +979,17 @@ def admin_product_add():
             is_active=request.form.get('is_active') == 'on'
         )
         
-        if 'image' in request.files:
+        direct_url = direct_upload_url('products')
+        if direct_url:
+            product.image_url = direct_url
+        elif 'image' in request.files:
             image_url = save_upload_file(request.files['image'])
             if image_url:
                 product.image_url = image_url
         
         db.session.add(product)
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('catalog')
         flash('Product added successfully', 'success')
         
         return redirect(url_for('admin_products'))
@@ -1010,13 +1024,16 @@ def admin_product_edit(id):
         product.order_position = request.form.get('order_position', 0)
         product.is_active = request.form.get('is_active') == 'on'
         
-        if 'image' in request.files:
+        direct_url = direct_upload_url('products')
+        if direct_url:
+            product.image_url = direct_url
+        elif 'image' in request.files:
             image_url = save_upload_file(request.files['image'])
             if image_url:
                 product.image_url = image_url
         
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('catalog')
         flash('Product updated successfully', 'success')
         
         return redirect(url_for('admin_products'))
@@ -1027,9 +1044,13 @@ def admin_product_edit(id):
 @login_required
 def admin_product_delete(id):
     product = Product.query.get_or_404(id)
+    image_url = product.image_url
     db.session.delete(product)
     db.session.commit()
-    cache.clear()
+    # Queue the image and its variants unless another row still uses it
+    if image_url and not Product.query.filter_by(image_url=image_url).first():
+        delete_image_and_variants(image_url)
+    content_versions.invalidate('catalog')
     flash('Product deleted successfully', 'success')
     
     return redirect(url_for('admin_products'))
@@ -1061,10 +1082,11 @@ def admin_hero_section_add():
                 filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 file.save(filepath)
                 hero.background_image = f'/static/uploads/{filename}'
+                queue_image_variants(hero.background_image)
         
         db.session.add(hero)
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('catalog')
         flash('Hero section added successfully', 'success')
         
         return redirect(url_for('admin_hero_sections'))
@@ -1092,9 +1114,10 @@ def admin_hero_section_edit(id):
                 filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 file.save(filepath)
                 hero.background_image = f'/static/uploads/{filename}'
+                queue_image_variants(hero.background_image)
         
         db.session.commit()
-        cache.clear()
+        content_versions.invalidate('catalog')
         flash('Hero section updated successfully', 'success')
         
         return redirect(url_for('admin_hero_sections'))
@@ -1107,7 +1130,7 @@ def admin_hero_section_delete(id):
     hero = HeroSection.query.get_or_404(id)
     db.session.delete(hero)
     db.session.commit()
-    cache.clear()
+    content_versions.invalidate('catalog')
     flash('Hero section deleted successfully', 'success')
     
     return redirect(url_for('admin_hero_sections'))
@@ -1247,6 +1270,7 @@ def admin_testimonial_add():
 
         db.session.add(testimonial)
         db.session.commit()
+        content_versions.invalidate('catalog')
 
         return redirect(url_for('admin_testimonials'))
 
@@ -1281,6 +1305,7 @@ def admin_testimonial_edit(id):
         )
 
         db.session.commit()
+        content_versions.invalidate('catalog')
 
         return redirect(url_for('admin_testimonials'))
 
@@ -1294,6 +1319,7 @@ def admin_testimonial_delete(id):
     testimonial = Testimonial.query.get_or_404(id)
     db.session.delete(testimonial)
     db.session.commit()
+    content_versions.invalidate('catalog')
 
     return redirect(url_for('admin_testimonials'))
 
@@ -1768,6 +1794,7 @@ def clear_cart():
 
 @app.route('/api/cart/count', methods=['GET'])
 @customer_required
+@content_versions.conditional(customer_scope('cart'), shared_only=True)
 def get_cart_count():
     """Get number of items in cart (for navbar) - requires customer login"""
     cart_count = 0
@@ -1872,18 +1899,15 @@ def checkout():
             # Mark cart as inactive
             cart.is_active = False
             
-            db.session.commit()
-            
-            # Send order confirmation email
-            try:
-                email_service = EmailService()
-                email_service.send_order_confirmation(
-                    current_user.email,
-                    order_number,
-                    total
+            # Order confirmation email commits with the order
+            if app.config.get('SEND_EMAILS'):
+                queue_email(
+                    'send_order_confirmation', current_user.email,
+                    order_number=order_number,
+                    total_amount=total
                 )
-            except Exception as e:
-                print(f'Email error: {e}')
+            
+            db.session.commit()
             
             flash(f'Order {order_number} created! Invoice {invoice_number} generated.', 'success')
             # Redirect to invoice page to proceed with payment
@@ -2205,6 +2229,7 @@ def api_update_order_status(order_id):
 
 @app.route('/api/customers/<int:customer_id>/orders', methods=['GET'])
 @login_required
+@content_versions.conditional(lambda customer_id: f'orders:{customer_id}', shared_only=True)
 def api_get_customer_orders(customer_id):
     """API to get customer orders for invoice creation"""
     if not isinstance(current_user, User):
@@ -2289,55 +2314,30 @@ def payfast_payment():
 
 
 def send_payment_confirmation_email(transaction):
-    """Send payment confirmation emails to customer and admin."""
+    """Queue payment confirmation emails to customer and admin."""
     if not app.config.get('SEND_EMAILS') or not transaction:
         return
 
-    try:
-        company = CompanyInfo.query.first()
-        company_name = (
-            company.company_name if company
-            else '360Degree Supply'
-        )
-        company_email = (
-            company.email if company
-            else 'info@360degreesupply.co.za'
-        )
-        company_phone = (
-            company.phone if company
-            else '+27 64 902 4363'
-        )
-
-        # Send confirmation to customer
-        if transaction.customer_email:
-            email_service.send_payment_confirmation(
-                recipient_email=transaction.customer_email,
-                recipient_name=(
-                    transaction.customer_name or 'Valued Customer'
-                ),
-                transaction_id=transaction.transaction_id,
-                amount=str(transaction.amount),
-                currency=transaction.currency or 'ZAR',
-                payment_method=(
-                    transaction.payment_method or 'Unknown'
-                ),
-                company_name=company_name,
-                company_email=company_email,
-                company_phone=company_phone
-            )
+    company = CompanyInfo.query.first()
+    company_name = (
+        company.company_name if company
+        else '360Degree Supply'
+    )
+    company_email = (
+        company.email if company
+        else 'info@360degreesupply.co.za'
+    )
+    company_phone = (
+        company.phone if company
+        else '+27 64 902 4363'
+    )
 
-        # Send notification to admin
-        admin_email = app.config.get(
-            'ADMIN_EMAIL',
-            'admin@360degreesupply.co.za'
-        )
-        email_service.send_payment_notification(
-            admin_email=admin_email,
-            customer_name=(
-                transaction.customer_name or 'Unknown'
-            ),
-            customer_email=(
-                transaction.customer_email or 'N/A'
+    # Confirmation to customer
+    if transaction.customer_email:
+        queue_email(
+            'send_payment_confirmation', transaction.customer_email,
+            recipient_name=(
+                transaction.customer_name or 'Valued Customer'
             ),
             transaction_id=transaction.transaction_id,
             amount=str(transaction.amount),
@@ -2345,13 +2345,30 @@ def send_payment_confirmation_email(transaction):
             payment_method=(
                 transaction.payment_method or 'Unknown'
             ),
-            company_name=company_name
+            company_name=company_name,
+            company_email=company_email,
+            company_phone=company_phone
         )
 
-    except Exception as e:
-        app.logger.error(
-            f"Error sending payment confirmation email: {str(e)}"
-        )
+    # Notification to admin
+    queue_email(
+        'send_payment_notification',
+        app.config.get('ADMIN_EMAIL', 'admin@360degreesupply.co.za'),
+        customer_name=(
+            transaction.customer_name or 'Unknown'
+        ),
+        customer_email=(
+            transaction.customer_email or 'N/A'
+        ),
+        transaction_id=transaction.transaction_id,
+        amount=str(transaction.amount),
+        currency=transaction.currency or 'ZAR',
+        payment_method=(
+            transaction.payment_method or 'Unknown'
+        ),
+        company_name=company_name
+    )
+    db.session.commit()
 
 
 @app.route('/webhook/stripe', methods=['POST'])
@@ -2462,6 +2479,28 @@ def customer_invoice_detail(invoice_id):
         return redirect(url_for('customer_invoices'))
 
 
+@app.route('/customer/invoices/<int:invoice_id>/pop-status', methods=['GET'])
+@login_required
+def customer_invoice_pop_status(invoice_id):
+    """Poll OCR/verification status of uploaded proofs of payment"""
+    if not isinstance(current_user, Customer):
+        return jsonify({'error': 'Customers only'}), 403
+    
+    invoice = Invoice.query.filter_by(
+        id=invoice_id, customer_id=current_user.id
+    ).first()
+    if not invoice:
+        return jsonify({'error': 'Invoice not found'}), 404
+    
+    proofs = [get_pop_status(pop) for pop in invoice.proof_of_payments]
+    return jsonify({
+        'invoice_status': invoice.status,
+        'remaining_balance': invoice.remaining_balance(),
+        'pending': any(p['verification_status'] == 'queued' for p in proofs),
+        'proofs': proofs
+    })
+
+
 @app.route('/customer/invoices/<int:invoice_id>/pay', methods=['GET', 'POST'])
 @login_required
 def customer_pay_invoice(invoice_id):
@@ -2563,6 +2602,85 @@ def customer_pay_invoice(invoice_id):
         return redirect(url_for('customer_invoices'))
 
 
+def record_proof_of_payment(invoice, file_url, file_ext, file_size, content_hash=None):
+    """
+    Create the pending InvoicePayment and ProofOfPayment for an uploaded
+    document and route it for verification (not committed here).
+    
+    content_hash is None for direct-to-bucket uploads; the OCR worker
+    hashes those when it downloads them.
+    
+    Returns:
+        tuple: (pop, verification_status)
+    """
+    import uuid
+    filename = f"pop_{invoice.invoice_number}_{uuid.uuid4().hex[:8]}.{file_ext}"
+    
+    # Log security event
+    log_security_event(
+        event_type='proof_of_payment_uploaded',
+        user_id=None,
+        username=invoice.customer.email if invoice.customer else 'guest',
+        details=f'Invoice: {invoice.invoice_number}, File: {filename}, Size: {file_size} bytes',
+        ip_address=get_client_ip()
+    )
+    
+    # Create pending payment record
+    payment = InvoicePayment(
+        invoice_id=invoice.id,
+        amount=invoice.remaining_balance(),
+        payment_method='eft',
+        payment_date=datetime.utcnow(),
+        notes='Pending verification - Proof of Payment uploaded'
+    )
+    db.session.add(payment)
+    db.session.flush()  # Get payment ID
+    
+    # Create ProofOfPayment record with S3 URL
+    pop = ProofOfPayment(
+        invoice_payment_id=payment.id,
+        invoice_id=invoice.id,
+        customer_id=current_user.id,
+        file_path=file_url,  # Store S3 URL instead of local path
+        file_name=filename,
+        file_type=file_ext,
+        file_size=file_size,
+        content_hash=content_hash,
+        verification_status='queued'
+    )
+    db.session.add(pop)
+    db.session.flush()  # Get POP ID
+    
+    # Reuse a cached extraction for identical documents, otherwise queue OCR
+    invoice.status = 'pending_verification'
+    return pop, submit_proof_of_payment(pop)
+
+
+def proof_of_payment_message(pop, status):
+    """Customer-facing (message, category) for a submitted proof of payment"""
+    if pop.duplicate_of is not None:
+        return 'This document has already been submitted. It has been sent for manual review.', 'warning'
+    if status == 'queued':
+        return 'Proof of payment uploaded. We are verifying it now - this page will update automatically.', 'info'
+    if status == 'verified':
+        return f'Payment verified! Amount: R{pop.extracted_amount:.2f}', 'success'
+    return 'Proof of payment uploaded. Manual verification required.', 'warning'
+
+
+def log_duplicate_proof_of_payment(invoice, pop):
+    """Security event for a re-submitted document (after commit)"""
+    if pop.duplicate_of is None:
+        return
+    log_security_event(
+        event_type='proof_of_payment_duplicate',
+        user_id=None,
+        username=invoice.customer.email if invoice.customer else 'guest',
+        details=(f'Invoice: {invoice.invoice_number}, POP #{pop.id} duplicates '
+                 f'POP #{pop.duplicate_of_id} (invoice #{pop.duplicate_of.invoice_id})'),
+        ip_address=get_client_ip()
+    )
+
+
 def handle_eft_payment(invoice, request):
     """Handle EFT/Bank Transfer payment with Proof of Payment upload"""
     try:
@@ -2579,143 +2697,42 @@ def handle_eft_payment(invoice, request):
         
         # Validate file with secure_file_upload
         allowed_extensions = {'pdf', 'jpg', 'jpeg', 'png'}
-        max_size_mb = 10  # 10MB limit
+        max_size = POP_MAX_SIZE
         
         is_valid, error_msg, secure_filename = secure_file_upload(
             file, 
             allowed_extensions=allowed_extensions,
-            max_size_mb=max_size_mb
+            max_size=max_size
         )
         
         if not is_valid:
             flash(f'Upload validation failed: {error_msg}', 'danger')
             return redirect(url_for('customer_pay_invoice', invoice_id=invoice.id))
         
-        # Reset file pointer after validation
-        file.seek(0)
+        # Read the body once; hashing, S3 and OCR all share this buffer
+        document, error_msg = read_upload(file, max_size=max_size)
+        if document is None:
+            flash(f'Upload validation failed: {error_msg}', 'danger')
+            return redirect(url_for('customer_pay_invoice', invoice_id=invoice.id))
         
-        # Upload to S3 cloud storage using the helper function
+        # Upload to S3 cloud storage using the helper function; the SHA-256
+        # hashed while streaming lets identical re-uploads reuse earlier OCR results
         from s3_storage import upload_proof_of_payment
-        file_url, error = upload_proof_of_payment(file)
+        checksums = {}
+        file_url, error = upload_proof_of_payment(file, data=document, checksums=checksums)
         
         if error:
             flash(f'Upload failed: {error}', 'danger')
             return redirect(url_for('customer_pay_invoice', invoice_id=invoice.id))
+        content_hash = checksums['sha256']
         
-        # Extract filename from S3 URL for storage
-        import uuid
         file_ext = secure_filename.rsplit('.', 1)[1].lower()
-        filename = f"pop_{invoice.invoice_number}_{uuid.uuid4().hex[:8]}.{file_ext}"
-        
-        # Get file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        # Log security event
-        log_security_event(
-            event_type='proof_of_payment_uploaded',
-            user_id=None,
-            username=invoice.customer.email if invoice.customer else 'guest',
-            details=f'Invoice: {invoice.invoice_number}, File: {filename}, Size: {file_size} bytes',
-            ip_address=get_client_ip()
-        )
-        
-        # Create pending payment record
-        payment = InvoicePayment(
-            invoice_id=invoice.id,
-            amount=invoice.remaining_balance(),
-            payment_method='eft',
-            payment_date=datetime.utcnow(),
-            notes='Pending verification - Proof of Payment uploaded'
+        pop, status = record_proof_of_payment(
+            invoice, file_url, file_ext, len(document), content_hash=content_hash
         )
-        db.session.add(payment)
-        db.session.flush()  # Get payment ID
-        
-        # Create ProofOfPayment record with S3 URL
-        pop = ProofOfPayment(
-            invoice_payment_id=payment.id,
-            invoice_id=invoice.id,
-            customer_id=current_user.id,
-            file_path=file_url,  # Store S3 URL instead of local path
-            file_name=filename,
-            file_type=file_ext,
-            file_size=file_size,
-            verification_status='pending'
-        )
-        db.session.add(pop)
-        db.session.flush()  # Get POP ID
-        
-        # Process document with OCR
-        try:
-            ocr_service = OCRService()
-            result = ocr_service.process_document(file_path, file_ext)
-            
-            if result.get('success'):
-                # Store extracted data
-                pop.extracted_amount = result.get('amount')
-                pop.extracted_reference = result.get('reference')
-                pop.extracted_date = result.get('date')
-                pop.extracted_payer_name = result.get('payer_name')
-                pop.extracted_payer_account = result.get('payer_account')
-                pop.extracted_bank_name = result.get('bank_name')
-                pop.ocr_confidence = result.get('confidence', 0.0)
-                pop.ocr_raw_text = result.get('raw_text', '')
-                pop.processed_at = datetime.utcnow()
-                
-                # Validate amount
-                if pop.extracted_amount:
-                    validation = ocr_service.validate_payment(
-                        pop.extracted_amount,
-                        float(invoice.total_amount)
-                    )
-                    
-                    pop.amount_matched = validation['matched']
-                    pop.verification_status = validation['status']
-                    pop.verification_notes = validation['reason']
-                    
-                    # Auto-verify if amount matches and confidence is high
-                    if validation['matched'] and pop.ocr_confidence >= 0.75:
-                        pop.verification_status = 'verified'
-                        pop.verified_at = datetime.utcnow()
-                        
-                        # Update invoice
-                        invoice.paid_amount = float(invoice.paid_amount or 0) + float(payment.amount)
-                        if invoice.paid_amount >= float(invoice.total_amount):
-                            invoice.status = 'paid'
-                        else:
-                            invoice.status = 'partial'
-                        
-                        # Update order if linked
-                        if invoice.order_id:
-                            order = Order.query.get(invoice.order_id)
-                            if order:
-                                order.payment_status = 'paid' if invoice.status == 'paid' else 'partial'
-                        
-                        flash(f'Payment verified! Amount: R{pop.extracted_amount:.2f}', 'success')
-                    else:
-                        pop.verification_status = 'manual_review'
-                        invoice.status = 'pending_verification'
-                        flash('Proof of payment uploaded successfully. Payment is pending verification.', 'info')
-                else:
-                    pop.verification_status = 'manual_review'
-                    pop.verification_notes = 'Could not extract payment amount'
-                    invoice.status = 'pending_verification'
-                    flash('Proof of payment uploaded. Manual verification required.', 'warning')
-            else:
-                pop.verification_status = 'manual_review'
-                pop.verification_notes = f'OCR Error: {result.get("error", "Unknown error")}'
-                invoice.status = 'pending_verification'
-                flash('Proof of payment uploaded. Manual verification required.', 'warning')
-        
-        except Exception as ocr_error:
-            app.logger.error(f"OCR processing error: {str(ocr_error)}")
-            pop.verification_status = 'manual_review'
-            pop.verification_notes = f'OCR processing failed: {str(ocr_error)}'
-            invoice.status = 'pending_verification'
-            flash('Proof of payment uploaded. Manual verification required.', 'warning')
-        
+        flash(*proof_of_payment_message(pop, status))
         db.session.commit()
+        log_duplicate_proof_of_payment(invoice, pop)
         
         return redirect(url_for('customer_invoice_detail', invoice_id=invoice.id))
         
@@ -2726,6 +2743,147 @@ def handle_eft_payment(invoice, request):
         return redirect(url_for('customer_pay_invoice', invoice_id=invoice.id))
 
 
+# =====================================================
+# DIRECT-TO-BUCKET UPLOADS
+# =====================================================
+# The browser POSTs the file straight to S3 with a presigned policy, then
+# calls finalize; upload bytes never pass through a web worker.
+
+MAX_PENDING_UPLOADS = 10
+
+
+def _direct_upload_target(kind, data):
+    """
+    Check the current user may upload `kind` and resolve its target.
+    
+    Returns:
+        tuple: (target_id, error_message)
+    """
+    if kind == 'proof_of_payment':
+        if not isinstance(current_user, Customer):
+            return None, 'Customers only'
+        invoice = Invoice.query.filter_by(
+            id=data.get('invoice_id'), customer_id=current_user.id
+        ).first()
+        if not invoice:
+            return None, 'Invoice not found'
+        if invoice.remaining_balance() <= 0:
+            return None, 'This invoice has already been paid'
+        return invoice.id, None
+    
+    if kind in ('product_image', 'invoice_file'):
+        if not isinstance(current_user, User):
+            return None, 'Admin only'
+        if kind == 'invoice_file':
+            invoice = db.session.get(Invoice, data.get('invoice_id') or 0)
+            return (invoice.id, None) if invoice else (None, 'Invoice not found')
+        product_id = data.get('product_id')
+        if product_id and not db.session.get(Product, product_id):
+            return None, 'Product not found'
+        return product_id or None, None
+    
+    return None, 'Unknown upload type'
+
+
+@app.route('/api/uploads/presign', methods=['POST'])
+@limiter.limit("20 per minute")
+@login_required
+def presign_upload():
+    """Issue a presigned POST policy for a direct browser upload"""
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    
+    target_id, error = _direct_upload_target(kind, data)
+    if error:
+        return jsonify({'success': False, 'message': error}), 403
+    
+    upload, error = storage_service.create_presigned_upload(kind, data.get('filename'))
+    if error:
+        # 503 tells the page to fall back to a regular form upload
+        status = 503 if not storage_service.enabled else 400
+        return jsonify({'success': False, 'message': error}), status
+    
+    # Only keys issued to this session can be finalized
+    pending = session.get('pending_uploads', {})
+    pending[upload['key']] = {'kind': kind, 'target_id': target_id}
+    session['pending_uploads'] = dict(list(pending.items())[-MAX_PENDING_UPLOADS:])
+    
+    return jsonify({'success': True, **upload})
+
+
+@app.route('/api/uploads/finalize', methods=['POST'])
+@limiter.limit("20 per minute")
+@login_required
+def finalize_upload():
+    """Verify a direct upload and attach it to its record"""
+    data = request.get_json(silent=True) or {}
+    key = data.get('key')
+    
+    pending = session.get('pending_uploads', {})
+    ticket = pending.pop(key, None) if key else None
+    session['pending_uploads'] = pending
+    if not ticket:
+        return jsonify({'success': False, 'message': 'Unknown or expired upload'}), 404
+    
+    info, error = storage_service.verify_uploaded_object(ticket['kind'], key)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    kind, target_id = ticket['kind'], ticket['target_id']
+    try:
+        if kind == 'proof_of_payment':
+            invoice = Invoice.query.filter_by(id=target_id, customer_id=current_user.id).first_or_404()
+            pop, status = record_proof_of_payment(
+                invoice, info['url'], key.rsplit('.', 1)[1], info['size']
+            )
+            message, category = proof_of_payment_message(pop, status)
+            flash(message, category)
+            db.session.commit()
+            log_duplicate_proof_of_payment(invoice, pop)
+            return jsonify({
+                'success': True,
+                'message': message,
+                'proof': get_pop_status(pop),
+                'redirect': url_for('customer_invoice_detail', invoice_id=invoice.id)
+            })
+        
+        if kind == 'invoice_file':
+            invoice = db.session.get(Invoice, target_id)
+            invoice.pdf_path = info['url']
+            db.session.commit()
+        else:
+            # Product image: srcset variants are encoded after the response
+            queue_image_variants(info['url'])
+            # The product form may now submit this key as its image_url
+            finalized = session.get('finalized_uploads', [])
+            session['finalized_uploads'] = (finalized + [key])[-MAX_PENDING_UPLOADS:]
+            if target_id:
+                product = db.session.get(Product, target_id)
+                product.image_url = info['url']
+                db.session.commit()
+                content_versions.invalidate('catalog')
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error finalizing upload {key}: {str(e)}")
+        return jsonify({'success': False, 'message': 'Could not save upload'}), 500
+    
+    return jsonify({'success': True, 'url': info['url'], 'size': info['size']})
+
+
+def direct_upload_url(folder):
+    """
+    Submitted image_url if it points at a direct upload in folder that this
+    session finalized; each finalized upload can be used once.
+    """
+    url = request.form.get('image_url')
+    key = storage_service.key_from_url(url) if url else None
+    finalized = session.get('finalized_uploads', [])
+    if not key or not key.startswith(f'{folder}/') or key not in finalized:
+        return None
+    session['finalized_uploads'] = [other for other in finalized if other != key]
+    return url
+
+
 # Admin Invoice Routes
 @app.route('/admin/invoices/create', methods=['GET', 'POST'])
 @login_required
@@ -2885,6 +3043,48 @@ def admin_invoice_detail(invoice_id):
         return redirect(url_for('admin_invoices'))
 
 
+def serve_stored_file(file_url, download_name=None):
+    """
+    Serve a bucket object through the local read-through cache, with
+    ETag / If-None-Match and Range support.
+    """
+    s3_key = storage_service.key_from_url(file_url)
+    for attempt in range(2):
+        entry = object_cache.get(s3_key) if s3_key else None
+        if entry is None:
+            abort(404)
+        try:
+            # send_file opens the file here; once open, eviction cannot pull it away
+            response = send_file(
+                entry.path or io.BytesIO(entry.data),
+                mimetype=entry.content_type,
+                download_name=download_name,
+                conditional=True,
+                etag=entry.etag or True,
+                max_age=300
+            )
+            break
+        except FileNotFoundError:
+            # Evicted by another thread or worker after the lookup: fetch it again
+            if attempt:
+                raise
+    response.cache_control.private = True
+    return response
+
+
+@app.route('/admin/proofs/<int:pop_id>/document', methods=['GET'])
+@login_required
+def admin_pop_document(pop_id):
+    """View an uploaded proof of payment document (admin)"""
+    if not isinstance(current_user, User):
+        abort(403)
+    
+    pop = db.session.get(ProofOfPayment, pop_id)
+    if not pop:
+        abort(404)
+    return serve_stored_file(pop.file_path, download_name=pop.file_name)
+
+
 @app.route('/admin/invoices/<int:invoice_id>/edit', methods=['GET', 'POST'])
 @login_required
 def admin_invoice_edit(invoice_id):
@@ -3041,14 +3241,31 @@ def run_migration():
             'message': str(e)
         }), 500
 
+# Public pages as static HTML, re-rendered when their content changes
+prerenderer.init_app(app, versions=content_versions)
+
 # Periodic cleanup of security data
 import atexit
 from apscheduler.schedulers.background import BackgroundScheduler
 
 scheduler = BackgroundScheduler()
 scheduler.add_job(func=cleanup_old_data, trigger="interval", hours=1)
+# Batched object storage deletes (see S3StorageService.delete_file)
+scheduler.add_job(func=storage_service.flush_deletes, trigger="interval", seconds=S3_DELETE_FLUSH_INTERVAL)
+# Close pooled SMTP sessions before the server drops them for idling
+scheduler.add_job(func=email_service.pool.prune, trigger="interval", seconds=SMTP_POOL_IDLE_TIMEOUT)
 scheduler.start()
 atexit.register(lambda: scheduler.shutdown())
+atexit.register(storage_service.flush_deletes)
+# Render storefront pages into the cache now and before their TTLs run out
+if page_cache.enabled:
+    scheduler.add_job(func=page_cache.warm, kwargs={'reason': 'startup'})
+    scheduler.add_job(func=page_cache.warm, trigger="interval", seconds=page_cache.refresh_interval,
+                      kwargs={'reason': 'refresh'})
+# Write prerendered pages now, then compare them with live output for drift
+if prerenderer.enabled:
+    scheduler.add_job(func=prerenderer.prerender, kwargs={'reason': 'startup'})
+    scheduler.add_job(func=prerenderer.check, trigger="interval", seconds=PRERENDER_CHECK_INTERVAL)
 
 app.logger.info("✅ Security cleanup scheduler started")
 
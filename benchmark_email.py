@@ -0,0 +1,92 @@
+"""
+Email Render Benchmark
+
+Per-message build time for a bulk send, comparing:
+- per-message: every message compiles its template from source and inlines
+  the CSS again (what render_template_string on a string did, plus inlining)
+- compiled: email_templates.render_email, where the inlined template is
+  compiled once and only rendered per message
+
+Both produce the HTML and plain-text parts. No SMTP traffic is involved.
+
+Usage:
+    python benchmark_email.py
+    python benchmark_email.py --messages 2000 --template refund.html
+"""
+import time
+import argparse
+from datetime import datetime
+
+from jinja2 import Environment, select_autoescape
+
+from email_templates import (
+    EMAIL_TEMPLATE_DIR, InliningLoader, email_env, html_to_text, render_email
+)
+
+SAMPLE_CONTEXT = {
+    'recipient_name': 'Thandi Mokoena',
+    'recipient_email': 'thandi@example.com',
+    'order_number': 'ORD-20261019-0042',
+    'transaction_id': 'pi_3Nf8x2LkdIwHu7ix0',
+    'refund_amount': '1499.00',
+    'amount': '1499.00',
+    'total_amount': '1499.00',
+    'currency': 'ZAR',
+    'refund_reason': 'Damaged in transit',
+    'payment_method': 'Stripe',
+    'error_message': 'Card declined',
+    'retry_url': 'https://360degreesupply.co.za/payment/select?order=42',
+    'company_name': '360Degree Supply',
+    'company_email': 'info@360degreesupply.co.za',
+    'company_phone': '+27 64 902 4363',
+    'processed_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
+    'payment_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
+    'order_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
+}
+
+
+def per_message(template_name, **context):
+    """Uncached build: fresh environment, inlining and compile for each message"""
+    env = Environment(
+        loader=InliningLoader(EMAIL_TEMPLATE_DIR), autoescape=select_autoescape(['html']),
+        trim_blocks=True, lstrip_blocks=True, cache_size=0
+    )
+    html = env.get_template(template_name).render(**context)
+    return html, html_to_text(html)
+
+
+def run(build, template_name, messages):
+    """Build `messages` emails; returns (ms per message, messages/s)"""
+    start = time.perf_counter()
+    for index in range(messages):
+        build(template_name, **dict(SAMPLE_CONTEXT, order_number=f'ORD-{index:06d}'))
+    elapsed = time.perf_counter() - start
+    return elapsed / messages * 1000, messages / elapsed
+
+
+def benchmark(template_name, messages):
+    assert per_message(template_name, **SAMPLE_CONTEXT) == render_email(template_name, **SAMPLE_CONTEXT)
+
+    print(f"Template: {template_name}, {messages} messages")
+    email_env.cache.clear()
+    before = email_env.loader.inlined
+    cold = time.perf_counter()
+    render_email(template_name, **SAMPLE_CONTEXT)
+    print(f"First render (load, inline, compile): {(time.perf_counter() - cold) * 1000:.2f} ms")
+
+    slow_ms, slow_rate = run(per_message, template_name, messages)
+    fast_ms, fast_rate = run(render_email, template_name, messages)
+
+    print(f"\n{'':>14}{'ms/message':>12}{'messages/s':>12}")
+    print(f"{'per-message':>14}{slow_ms:>12.3f}{slow_rate:>12.0f}")
+    print(f"{'compiled':>14}{fast_ms:>12.3f}{fast_rate:>12.0f}")
+    print(f"\nSpeed-up: {slow_ms / fast_ms:.1f}x; stylesheet inlined "
+          f"{email_env.loader.inlined - before} time(s) for {messages} compiled renders")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Email build time: per-message compile vs compiled templates')
+    parser.add_argument('--messages', type=int, default=500, help='Messages per run')
+    parser.add_argument('--template', default='payment_confirmation.html', help='Template under templates/emails')
+    args = parser.parse_args()
+    benchmark(args.template, args.messages)
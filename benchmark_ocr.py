@@ -0,0 +1,423 @@
+"""
+OCR Benchmark - synthetic proof-of-payment documents
+
+Usage:
+    python benchmark_ocr.py pdf [--docs 20] [--pages 4]
+    python benchmark_ocr.py images [--docs 10]
+    python benchmark_ocr.py parse [--docs 2000]
+
+pdf   Multi-page PDFs mixing text-layer and scanned pages; reports pages/second
+      for the page-parallel, text-layer-first extractor against the legacy
+      "rasterise every page" path (legacy needs Tesseract + poppler installed).
+images  12 MP phone-photo style receipts (skewed, off-centre, EXIF-rotated);
+      reports OCR time and field accuracy with and without preprocessing.
+parse   Receipt texts in each bank's layout (plus an unknown bank); reports
+      documents/second and per-bank field accuracy for the template engine
+      against the legacy per-field regex parser.
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from collections import Counter, defaultdict
+
+from ocr_service import OCRService, TESSERACT_AVAILABLE
+
+BANKS = ['FNB', 'ABSA', 'Standard Bank', 'Nedbank', 'Capitec']
+
+
+def synthetic_receipt_lines(rng, index):
+    """Fields of one fake EFT confirmation"""
+    amount = rng.randint(100, 250000) + rng.choice([0, 0.5, 0.99])
+    return [
+        f"{rng.choice(BANKS)} Payment Confirmation",
+        f"Date: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2026",
+        f"Reference: INV-{1000 + index}",
+        f"Amount: R{amount:,.2f}",
+        "From: Thabo Mokoena",
+        f"Account: 62{rng.randint(10000000, 99999999)}",
+    ]
+
+
+def filler_lines(rng):
+    """Terms-and-conditions style text with no payment fields"""
+    words = ['transfer', 'terms', 'bank', 'branch', 'client', 'service',
+             'notice', 'processing', 'beneficiary', 'subject', 'conditions']
+    return [" ".join(rng.choice(words) for _ in range(10)) for _ in range(12)]
+
+
+def _text_page_pdf(lines):
+    """Minimal single-page PDF with a real text layer"""
+    stream = ["BT", "/F1 11 Tf", "14 TL", "72 760 Td"]
+    for line in lines:
+        escaped = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream.append(f"({escaped}) Tj T*")
+    stream.append("ET")
+    content = "\n".join(stream).encode('latin-1')
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+              f"startxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def _scanned_page_pdf(lines):
+    """Single-page image-only PDF (no text layer), like a scanned receipt"""
+    from PIL import Image, ImageDraw
+    image = Image.new('L', (1240, 1754), 255)  # A4 at 150 DPI
+    draw = ImageDraw.Draw(image)
+    for row, line in enumerate(lines):
+        draw.text((100, 120 + row * 40), line, fill=0)
+    out = io.BytesIO()
+    image.save(out, format='PDF', resolution=150)
+    return out.getvalue()
+
+
+def build_pdf(rng, index, pages, scanned_ratio=0.5):
+    """
+    Multi-page receipt PDF. Page 1 holds the payment fields, later pages are
+    filler; each page is text-layer or scanned at random.
+    """
+    import PyPDF2
+    writer = PyPDF2.PdfWriter()
+    for page_number in range(pages):
+        lines = synthetic_receipt_lines(rng, index) if page_number == 0 else filler_lines(rng)
+        page_pdf = _scanned_page_pdf(lines) if rng.random() < scanned_ratio else _text_page_pdf(lines)
+        writer.add_page(PyPDF2.PdfReader(io.BytesIO(page_pdf)).pages[0])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def build_receipt_photo(rng, index):
+    """
+    12 MP JPEG of a receipt lying on a desk: off-centre, rotated a few
+    degrees, sometimes stored sideways with an EXIF orientation tag.
+
+    Returns:
+        tuple: (jpeg_bytes, expected_fields)
+    """
+    from PIL import Image, ImageDraw, ImageFont, ImageFilter
+    lines = synthetic_receipt_lines(rng, index)
+    expected = {
+        'reference': lines[2].split(': ')[1],
+        'amount': float(lines[3].split('R')[1].replace(',', '')),
+        'date': lines[1].split(': ')[1],
+    }
+
+    paper = Image.new('L', (1600, 2200), 238)
+    draw = ImageDraw.Draw(paper)
+    try:
+        font = ImageFont.load_default(size=44)
+    except TypeError:
+        font = ImageFont.load_default()
+    for row, line in enumerate(lines + filler_lines(rng)[:6]):
+        draw.text((90, 140 + row * 95), line, fill=25, font=font)
+    paper = paper.rotate(rng.uniform(-4, 4), expand=True, fillcolor=70)
+
+    photo = Image.new('L', (4032, 3024), 70)
+    photo.paste(paper, (rng.randint(200, 2000), rng.randint(0, 400)))
+    photo = photo.filter(ImageFilter.GaussianBlur(1.2))
+
+    out = io.BytesIO()
+    if index % 3 == 0:
+        # Sideways sensor data with EXIF Orientation=6 (rotate 90 CW to view)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        photo.rotate(90, expand=True).save(out, format='JPEG', quality=85, exif=exif)
+    else:
+        photo.save(out, format='JPEG', quality=85)
+    return out.getvalue(), expected
+
+
+PAYERS = ['Thabo Mokoena', 'Lerato Dlamini', 'Pieter van Wyk', 'Ayesha Patel', 'Sipho Nkosi']
+
+
+def _rand_amount(rng):
+    return Decimal(rng.randint(100, 250000)) + rng.choice([Decimal('0'), Decimal('0.50'), Decimal('0.99')])
+
+
+def bank_receipt_text(rng, index, bank):
+    """
+    Text of one EFT confirmation in the given bank's layout, as it comes out
+    of a PDF text layer or OCR: own-reference lines next to the recipient
+    reference, space or comma thousands separators, irregular spacing.
+
+    Returns:
+        tuple: (text, expected_fields)
+    """
+    amount = _rand_amount(rng)
+    day = datetime(2026, rng.randint(1, 12), rng.randint(1, 28))
+    reference = f"INV-{1000 + index}"
+    own_reference = rng.choice(['Rent', 'Supplies', 'Order 77', 'Stock'])
+    payer = rng.choice(PAYERS)
+    account = f"62{rng.randint(10000000, 99999999)}"
+    spaced = f"{amount:,.2f}".replace(',', ' ')
+    commas = f"{amount:,.2f}"
+    gap = lambda: ' ' * rng.randint(0, 2)
+
+    if bank == 'FNB':
+        lines = ["FNB", "First National Bank", "Payment Notification",
+                 f"Date Actioned{gap()}: {day:%Y/%m/%d}", f"Time : {rng.randint(8, 17)}:15:02",
+                 f"Amount{gap()}: R{commas}", f"Own Reference : {own_reference}",
+                 f"Recipient Reference{gap()}: {reference}",
+                 f"From Account : {account}", f"Account Holder : {payer}"]
+    elif bank == 'ABSA':
+        lines = ["ABSA", "Payment Confirmation", f"Payment Date: {day:%d %B %Y}",
+                 f"Your Reference: {own_reference}", f"Payment Amount:{gap()}R {spaced}",
+                 f"Beneficiary Reference: {reference}", f"Account Holder: {payer}"]
+    elif bank == 'Standard Bank':
+        lines = ["Standard Bank", "Proof of payment", f"Date: {day:%d %b %Y}",
+                 f"Payer reference: {own_reference}", f"Amount: {commas} ZAR",
+                 f"Beneficiary reference: {reference}", f"From: {payer}",
+                 f"From account: {account[:2]} {account[2:6]} {account[6:]}"]
+    elif bank == 'Nedbank':
+        lines = ["Nedbank", "Notification of payment", f"Payment date: {day:%Y-%m-%d}",
+                 f"Your reference: {own_reference}", f"Amount paid: R{spaced}",
+                 f"Recipient reference: {reference}", f"Paid by: {payer}",
+                 f"Paid from: {account}"]
+    elif bank == 'Capitec':
+        lines = ["Capitec", "Payment Confirmation", f"Payment Date: {day:%d/%m/%Y}",
+                 f"My Reference: {own_reference}", f"Their Reference: {reference}",
+                 f"Amount: R{spaced}", f"From Account: {account}"]
+    else:
+        lines = ["Payment Confirmation", f"Date: {day:%d/%m/%Y}", f"Reference: {reference}",
+                 f"Amount: R{commas}", f"From: {payer}", f"Account: {account}"]
+
+    if rng.random() < 0.3:
+        lines = [line.lower() if ':' in line else line for line in lines]
+    lines += filler_lines(rng)[:rng.randint(0, 4)]
+    return "\n".join(lines), {
+        'amount': float(amount), 'reference': reference,
+        'date': day.strftime('%d/%m/%Y'), 'bank_name': bank if bank in BANKS else None,
+    }
+
+
+def _legacy_parse(text):
+    """Pre-template parser: each field re-scans the whole text with inline patterns"""
+    import re
+    amounts = []
+    for pattern in [r'(?:amount|total|paid|deposited?)[:\s]*R?\s*([0-9,]+\.?\d{0,2})',
+                    r'R\s*([0-9,]+\.?\d{2})', r'ZAR\s*([0-9,]+\.?\d{2})',
+                    r'([0-9,]+\.\d{2})\s*(?:ZAR|R)']:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            try:
+                amount = Decimal(match.group(1).replace(',', '').replace(' ', ''))
+                if 0 < amount < 1000000:
+                    amounts.append(amount)
+            except Exception:
+                continue
+    data = {'amount': float(Counter(amounts).most_common(1)[0][0]) if amounts else None,
+            'reference': None, 'date': None, 'bank_name': None}
+    for pattern in [r'(?:reference|ref|ref\s*no|ref\s*number)[:\s]*([A-Z0-9\-]+)',
+                    r'(?:transaction|trans|txn)[:\s]*(?:id|number|no)[:\s]*([A-Z0-9\-]+)',
+                    r'INV[-\s]*([A-Z0-9]+)', r'ORD[-\s]*([A-Z0-9]+)']:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            data['reference'] = match.group(1).strip()
+            break
+    for pattern in [r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
+                    r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})']:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y', '%Y/%m/%d',
+                        '%Y-%m-%d', '%d %B %Y', '%d %b %Y']:
+                try:
+                    data['date'] = datetime.strptime(match.group(1), fmt)
+                    break
+                except ValueError:
+                    continue
+            if data['date']:
+                break
+    for bank in ['ABSA', 'Standard Bank', 'FNB', 'Nedbank', 'Capitec']:
+        if bank.upper() in text.upper():
+            data['bank_name'] = bank
+            break
+    return data
+
+
+def field_hits(data, expected):
+    """Per-field correctness of one parse"""
+    return {
+        'amount': data['amount'] is not None and abs(data['amount'] - expected['amount']) < 0.01,
+        'reference': (data['reference'] or '').upper() == expected['reference'],
+        'date': bool(data['date']) and data['date'].strftime('%d/%m/%Y') == expected['date'],
+        'bank': data['bank_name'] == expected['bank_name'],
+    }
+
+
+def parse_corpus(docs, seed=11):
+    """docs receipts spread over every bank layout plus an unknown bank"""
+    rng = random.Random(seed)
+    layouts = BANKS + ['Other']
+    return [(layouts[index % len(layouts)],) + bank_receipt_text(rng, index, layouts[index % len(layouts)])
+            for index in range(docs)]
+
+
+def benchmark_parse(docs):
+    corpus = parse_corpus(docs)
+    service = OCRService()
+    print(f"Synthetic corpus: {docs} receipt texts across {len(BANKS)} bank layouts + unknown")
+
+    for label, parse in (('legacy regexes', _legacy_parse), ('template engine', service._parse_payment_info)):
+        start = time.perf_counter()
+        parsed = [parse(text) for _, text, _ in corpus]
+        elapsed = time.perf_counter() - start
+
+        accuracy = defaultdict(Counter)
+        for (bank, _, expected), data in zip(corpus, parsed):
+            for field, hit in field_hits(data, expected).items():
+                accuracy[bank][field] += hit
+            accuracy[bank]['docs'] += 1
+
+        print(f"\n{label}: {docs / elapsed:,.0f} docs/s ({elapsed * 1000 / docs:.3f} ms/doc)")
+        print(f"  {'layout':<14}{'amount':>8}{'ref':>8}{'date':>8}{'bank':>8}")
+        for bank, counts in accuracy.items():
+            n = counts['docs']
+            print(f"  {bank:<14}" + "".join(f"{counts[f] / n:>8.0%}" for f in ('amount', 'reference', 'date', 'bank')))
+
+
+def score_fields(service, text, expected):
+    """Count how many of amount/reference/date were extracted correctly"""
+    data = service._parse_payment_info(text)
+    hits = 0
+    hits += 1 if data['amount'] is not None and abs(data['amount'] - expected['amount']) < 0.01 else 0
+    hits += 1 if data['reference'] == expected['reference'] else 0
+    hits += 1 if data['date'] and data['date'].strftime('%d/%m/%Y') == expected['date'] else 0
+    return hits
+
+
+def benchmark_images(docs, seed=7):
+    from PIL import Image
+    rng = random.Random(seed)
+    corpus = [build_receipt_photo(rng, index) for index in range(docs)]
+    print(f"Synthetic corpus: {docs} receipt photos (4032x3024)")
+
+    service = OCRService()
+    start = time.perf_counter()
+    prepared = [service._preprocess_image(Image.open(io.BytesIO(data))) for data, _ in corpus]
+    prep = time.perf_counter() - start
+    print(f"\nPreprocessing: {prep / docs * 1000:.0f} ms/image, "
+          f"{4032 * 3024 / 1e6:.1f} MP -> {sum(i.width * i.height for i in prepared) / docs / 1e6:.1f} MP avg")
+
+    if not (TESSERACT_AVAILABLE and shutil.which('tesseract')):
+        print("Tesseract not installed - skipping OCR time/accuracy comparison")
+        return
+
+    import pytesseract
+    from ocr_service import TESSERACT_CONFIG
+    results = {}
+    for label, run in (
+        ('raw upload', lambda data: pytesseract.image_to_string(Image.open(io.BytesIO(data)))),
+        ('preprocessed', lambda data: pytesseract.image_to_string(
+            service._preprocess_image(Image.open(io.BytesIO(data))), config=TESSERACT_CONFIG)),
+    ):
+        hits = 0
+        start = time.perf_counter()
+        for data, expected in corpus:
+            hits += score_fields(service, run(data), expected)
+        results[label] = (time.perf_counter() - start, hits)
+
+    print()
+    for label, (elapsed, hits) in results.items():
+        print(f"{label:>13}: {elapsed / docs:.2f} s/image, "
+              f"fields correct {hits}/{docs * 3} ({hits / (docs * 3):.0%})")
+
+
+def _legacy_pdf_ocr(path):
+    """Pre-optimisation path: rasterise every page at default DPI, OCR sequentially"""
+    import pytesseract
+    from pdf2image import convert_from_path
+    return "".join(pytesseract.image_to_string(image) for image in convert_from_path(path))
+
+
+def benchmark_pdf(docs, pages, seed=42):
+    rng = random.Random(seed)
+    ocr_tools = TESSERACT_AVAILABLE and shutil.which('tesseract') and shutil.which('pdftoppm')
+    corpus = [build_pdf(rng, index, pages, scanned_ratio=0.5 if ocr_tools else 0.0)
+              for index in range(docs)]
+
+    print(f"Synthetic corpus: {docs} PDFs x {pages} pages ({docs * pages} pages)")
+    if not ocr_tools:
+        print("Tesseract/poppler not installed - corpus uses text-layer pages only")
+
+    service = OCRService()
+    totals = {'text_pages': 0, 'ocr_pages': 0, 'early_stops': 0, 'found': 0}
+    start = time.perf_counter()
+    for document in corpus:
+        text = service._extract_from_pdf(document)
+        stats = service.last_pdf_stats or {}
+        totals['text_pages'] += stats.get('text_pages', 0)
+        totals['ocr_pages'] += stats.get('ocr_pages', 0)
+        totals['early_stops'] += 1 if stats.get('early_stop') else 0
+        totals['found'] += 1 if service._has_key_fields(text) else 0
+    elapsed = time.perf_counter() - start
+
+    print(f"\nText-layer-first extractor:")
+    print(f"  {docs * pages / elapsed:,.1f} pages/s ({elapsed:.2f}s total)")
+    print(f"  text-layer pages: {totals['text_pages']}, OCR'd pages: {totals['ocr_pages']}, "
+          f"early stops: {totals['early_stops']}/{docs}, key fields found: {totals['found']}/{docs}")
+
+    if ocr_tools:
+        # The legacy path needs files on disk; writing them is not timed
+        workdir = tempfile.mkdtemp(prefix='ocr_bench_')
+        paths = []
+        for index, document in enumerate(corpus):
+            path = os.path.join(workdir, f'receipt_{index}.pdf')
+            with open(path, 'wb') as f:
+                f.write(document)
+            paths.append(path)
+        start = time.perf_counter()
+        for path in paths:
+            _legacy_pdf_ocr(path)
+        legacy = time.perf_counter() - start
+        print(f"\nLegacy rasterise-everything path:")
+        print(f"  {docs * pages / legacy:,.1f} pages/s ({legacy:.2f}s total)")
+        print(f"\nSpeed-up: {legacy / elapsed:.1f}x")
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OCR benchmarks on synthetic receipts')
+    sub = parser.add_subparsers(dest='command')
+    pdf = sub.add_parser('pdf', help='Multi-page PDF throughput')
+    pdf.add_argument('--docs', type=int, default=20)
+    pdf.add_argument('--pages', type=int, default=4)
+    images = sub.add_parser('images', help='Phone-photo preprocessing time and accuracy')
+    images.add_argument('--docs', type=int, default=10)
+    parse = sub.add_parser('parse', help='Field extraction speed and accuracy per bank layout')
+    parse.add_argument('--docs', type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == 'pdf':
+        benchmark_pdf(args.docs, args.pages)
+    elif args.command == 'images':
+        benchmark_images(args.docs)
+    elif args.command == 'parse':
+        benchmark_parse(args.docs)
+    else:
+        parser.print_help()
+        sys.exit(1)
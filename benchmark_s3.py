@@ -0,0 +1,123 @@
+"""
+S3 Upload Throughput Benchmark
+
+Compares boto3's default transfer settings against the tuned
+TransferConfig / connection pool in s3_storage, for a range of file sizes
+and concurrent uploaders.
+
+Usage:
+    python benchmark_s3.py                       # local moto server
+    python benchmark_s3.py --sizes 1 16 64 --threads 4
+    S3_ENDPOINT_URL=http://localhost:9000 S3_BUCKET_NAME=bench \\
+        S3_ACCESS_KEY_ID=minioadmin S3_SECRET_ACCESS_KEY=minioadmin \\
+        python benchmark_s3.py --external         # MinIO or any S3 endpoint
+"""
+import io
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+MB = 1024 * 1024
+
+
+def start_moto_server(port=5055):
+    """In-process moto S3 server; returns (server, endpoint URL)"""
+    from moto.server import ThreadedMotoServer
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    return server, f'http://127.0.0.1:{port}'
+
+
+def make_client(pool_connections, path_style):
+    """Client for the benchmark endpoint with the given HTTP pool size"""
+    import boto3
+    from botocore.client import Config
+    return boto3.client(
+        's3', endpoint_url=os.environ['S3_ENDPOINT_URL'],
+        aws_access_key_id=os.environ.get('S3_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.environ.get('S3_SECRET_ACCESS_KEY'),
+        region_name=os.environ.get('S3_REGION', 'auto'),
+        config=Config(
+            signature_version='s3v4', max_pool_connections=pool_connections,
+            s3={'addressing_style': 'path' if path_style else 'virtual'}
+        )
+    )
+
+
+def run(client, bucket, transfer_config, sizes, threads, rounds):
+    """Upload `rounds` files of each size from `threads` threads; returns MB/s per size"""
+    results = {}
+    for size_mb in sizes:
+        payload = os.urandom(size_mb * MB)
+
+        def upload(index):
+            client.upload_fileobj(
+                io.BytesIO(payload), bucket, f'bench/{size_mb}mb-{index}.bin',
+                Config=transfer_config
+            )
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(upload, range(rounds)))
+        results[size_mb] = size_mb * rounds / (time.perf_counter() - start)
+    return results
+
+
+def benchmark(sizes, threads, rounds, external=False):
+    server = None
+    if not external:
+        server, endpoint = start_moto_server()
+        os.environ.update({
+            'S3_ENDPOINT_URL': endpoint, 'S3_BUCKET_NAME': 'bench',
+            'S3_ACCESS_KEY_ID': 'testing', 'S3_SECRET_ACCESS_KEY': 'testing',
+            'S3_REGION': 'us-east-1',
+        })
+
+    from boto3.s3.transfer import TransferConfig
+    import s3_storage
+
+    service = s3_storage.S3StorageService()
+    if not service.enabled:
+        print("S3 not configured")
+        sys.exit(1)
+    # Local stand-ins only serve path-style URLs
+    service.s3_client = make_client(s3_storage.S3_MAX_POOL_CONNECTIONS, path_style=not external)
+    if not external:
+        service.s3_client.create_bucket(Bucket=service.bucket_name)
+    default_client = make_client(10, path_style=not external)  # botocore's default pool
+
+    print(f"Endpoint: {service.endpoint_url} ({'external' if external else 'moto'})")
+    print(f"{rounds} uploads per size from {threads} thread(s)")
+    print(f"Tuned: threshold {s3_storage.S3_MULTIPART_THRESHOLD // MB}MB, "
+          f"chunks {s3_storage.S3_MULTIPART_CHUNKSIZE // MB}MB, "
+          f"concurrency {s3_storage.S3_MAX_CONCURRENCY}, pool {s3_storage.S3_MAX_POOL_CONNECTIONS}")
+
+    default = run(default_client, service.bucket_name, TransferConfig(), sizes, threads, rounds)
+    tuned = run(service.s3_client, service.bucket_name, service.transfer_config, sizes, threads, rounds)
+
+    print(f"\n{'size':>8}{'default MB/s':>15}{'tuned MB/s':>13}{'speed-up':>10}")
+    for size_mb in sizes:
+        print(f"{size_mb:>6}MB{default[size_mb]:>15.1f}{tuned[size_mb]:>13.1f}"
+              f"{tuned[size_mb] / default[size_mb]:>9.2f}x")
+
+    # Streaming checksums and per-folder latency, as reported on /metrics
+    for size_mb in sizes:
+        service.upload_stream(io.BytesIO(os.urandom(size_mb * MB)), f'bench/checksummed-{size_mb}.bin')
+    print("\nupload_stats():")
+    for folder, stats in service.upload_stats().items():
+        print(f"  {folder}: {stats}")
+
+    if server:
+        server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='S3 upload throughput: default vs tuned transfer settings')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 8, 32], help='File sizes in MB')
+    parser.add_argument('--threads', type=int, default=2, help='Concurrent uploaders (request threads)')
+    parser.add_argument('--rounds', type=int, default=4, help='Uploads per size')
+    parser.add_argument('--external', action='store_true', help='Use S3_* env settings instead of moto')
+    args = parser.parse_args()
+    benchmark(args.sizes, args.threads, args.rounds, args.external)
@@ -1,152 +1,183 @@
 """
 Cloudflare Cache Management Utility
-Allows programmatic cache clearing after deployments
+Purges the edge cache when content changes, and from the CLI after deployments
+
+Content edits purge automatically: committing a Product, Service, HeroSection,
+Testimonial (see CONTENT_PURGE_PATHS) enqueues the public pages that show it.
+Purges are coalesced for PURGE_WINDOW seconds, then sent as chunks of 30 URLs
+(the API limit) in parallel over one pooled session, with retries on 429 /
+5xx / connection errors.
+
+Environment:
+- CLOUDFLARE_ZONE_ID, CLOUDFLARE_API_TOKEN: purging is off without both
+- CLOUDFLARE_PURGE_ORIGINS: comma-separated origins pages are purged for
+- CLOUDFLARE_API_BASE: API root (a local stub in tests)
 """
 
 import os
+import time
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Iterable
+
 import requests
-from typing import Optional, Dict, List
+from requests.adapters import HTTPAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_DOMAIN = "https://www.360degreesupply.co.za"
+CLOUDFLARE_API_BASE = os.getenv('CLOUDFLARE_API_BASE', 'https://api.cloudflare.com/client/v4')
+PURGE_BATCH_SIZE = 30  # URLs per purge_cache call (API limit)
+PURGE_CONCURRENCY = int(os.getenv('CLOUDFLARE_PURGE_CONCURRENCY', 4))
+PURGE_RETRIES = 3
+PURGE_BACKOFF = 0.5  # seconds, doubled per retry unless Retry-After says otherwise
+PURGE_WINDOW = float(os.getenv('CLOUDFLARE_PURGE_WINDOW', 2.0))  # seconds to coalesce edits
+PURGE_TIMEOUT = (3, 10)
+
+PUBLIC_PAGES = ('/', '/products', '/services', '/payment', '/contact', '/privacy', '/terms')
+
+# Model class name -> public pages that render it
+CONTENT_PURGE_PATHS = {
+    'Product': ('/', '/products'),
+    'Service': ('/', '/services'),
+    'HeroSection': ('/',),
+    'Testimonial': ('/',),
+    'ContentSection': ('/',),
+    'HomePageSettings': ('/',),
+    'PaymentMethod': ('/payment',),
+    'PaymentTerm': ('/payment',),
+    'CompanyInfo': PUBLIC_PAGES,  # header / footer on every page
+    'MenuItem': PUBLIC_PAGES,
+}
+
 
 class CloudflareCache:
     """Manage Cloudflare cache purging"""
-    
-    def __init__(self):
-        self.zone_id = os.getenv('CLOUDFLARE_ZONE_ID')
-        self.api_token = os.getenv('CLOUDFLARE_API_TOKEN')
-        self.base_url = f"https://api.cloudflare.com/client/v4/zones/{self.zone_id}"
-        
-        if not self.zone_id:
-            print("Warning: CLOUDFLARE_ZONE_ID not set. Cache purging disabled.")
-        if not self.api_token:
-            print("Warning: CLOUDFLARE_API_TOKEN not set. Cache purging disabled.")
-    
+
+    def __init__(self, zone_id: Optional[str] = None, api_token: Optional[str] = None,
+                 api_base: str = CLOUDFLARE_API_BASE, concurrency: int = PURGE_CONCURRENCY,
+                 retries: int = PURGE_RETRIES, backoff: float = PURGE_BACKOFF, quiet: bool = False):
+        self.zone_id = zone_id or os.getenv('CLOUDFLARE_ZONE_ID')
+        self.api_token = api_token or os.getenv('CLOUDFLARE_API_TOKEN')
+        self.base_url = f"{api_base.rstrip('/')}/zones/{self.zone_id}"
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+
+        # One pooled session shared by every purge (and every thread)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(concurrency, 1))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self._get_headers())
+
+        if not quiet:
+            if not self.zone_id:
+                print("Warning: CLOUDFLARE_ZONE_ID not set. Cache purging disabled.")
+            if not self.api_token:
+                print("Warning: CLOUDFLARE_API_TOKEN not set. Cache purging disabled.")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.zone_id and self.api_token)
+
     def _get_headers(self) -> Dict[str, str]:
         """Get API request headers"""
         return {
             'Authorization': f'Bearer {self.api_token}',
             'Content-Type': 'application/json'
         }
-    
+
+    def _purge(self, data: Dict, description: str) -> bool:
+        """POST purge_cache, retrying 429 / 5xx / connection errors with backoff"""
+        if not self.configured:
+            print("❌ Cloudflare credentials not configured")
+            return False
+
+        url = f"{self.base_url}/purge_cache"
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * (2 ** attempt)
+            try:
+                response = self.session.post(url, json=data, timeout=PURGE_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                error = f"Error purging {description}: {str(e)}"
+            else:
+                if response.status_code == 200:
+                    result = response.json()
+                    if result.get('success'):
+                        print(f"✅ Successfully purged {description}")
+                        return True
+                    print(f"❌ Cache purge failed: {result.get('errors', [])}")
+                    return False
+                if response.status_code != 429 and response.status_code < 500:
+                    print(f"❌ API request failed: {response.status_code}")
+                    return False
+                error = f"API request failed: {response.status_code}"
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = int(retry_after)
+
+            if attempt < self.retries:
+                print(f"⚠️  {error}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+        print(f"❌ {error} (gave up after {self.retries + 1} attempts)")
+        return False
+
     def purge_all(self) -> bool:
         """Purge all cached content
-        
+
         Returns:
             bool: True if successful, False otherwise
         """
-        if not self.zone_id or not self.api_token:
-            print("❌ Cloudflare credentials not configured")
-            return False
-        
-        try:
-            url = f"{self.base_url}/purge_cache"
-            data = {"purge_everything": True}
-            
-            response = requests.post(url, json=data, headers=self._get_headers())
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    print("✅ Successfully purged all Cloudflare cache")
-                    return True
-                else:
-                    errors = result.get('errors', [])
-                    print(f"❌ Cache purge failed: {errors}")
-                    return False
-            else:
-                print(f"❌ API request failed: {response.status_code}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error purging cache: {str(e)}")
-            return False
-    
+        return self._purge({"purge_everything": True}, "all Cloudflare cache")
+
     def purge_urls(self, urls: List[str]) -> bool:
         """Purge specific URLs from cache
-        
+
+        Duplicates are dropped; more than PURGE_BATCH_SIZE URLs are split
+        into chunks sent concurrently.
+
         Args:
-            urls: List of full URLs to purge (max 30 per request)
-            
+            urls: List of full URLs to purge
+
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if every chunk succeeded, False otherwise
         """
-        if not self.zone_id or not self.api_token:
-            print("❌ Cloudflare credentials not configured")
-            return False
-        
-        if len(urls) > 30:
-            print("⚠️  Warning: Can only purge 30 URLs at a time. Splitting requests...")
-            # Split into chunks of 30
-            for i in range(0, len(urls), 30):
-                chunk = urls[i:i+30]
-                if not self.purge_urls(chunk):
-                    return False
+        urls = list(dict.fromkeys(urls))
+        chunks = [urls[i:i + PURGE_BATCH_SIZE] for i in range(0, len(urls), PURGE_BATCH_SIZE)]
+        if not chunks:
             return True
-        
-        try:
-            url = f"{self.base_url}/purge_cache"
-            data = {"files": urls}
-            
-            response = requests.post(url, json=data, headers=self._get_headers())
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    print(f"✅ Successfully purged {len(urls)} URLs from cache")
-                    return True
-                else:
-                    errors = result.get('errors', [])
-                    print(f"❌ Cache purge failed: {errors}")
-                    return False
-            else:
-                print(f"❌ API request failed: {response.status_code}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error purging URLs: {str(e)}")
-            return False
-    
+
+        def purge_chunk(chunk):
+            return self._purge({"files": chunk}, f"{len(chunk)} URLs from cache")
+
+        if len(chunks) == 1:
+            return purge_chunk(chunks[0])
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as pool:
+            return all(list(pool.map(purge_chunk, chunks)))
+
     def purge_tags(self, tags: List[str]) -> bool:
         """Purge cache by tags (Enterprise only)
-        
+
         Args:
             tags: List of cache tags to purge
-            
+
         Returns:
             bool: True if successful, False otherwise
         """
-        if not self.zone_id or not self.api_token:
-            print("❌ Cloudflare credentials not configured")
-            return False
-        
-        try:
-            url = f"{self.base_url}/purge_cache"
-            data = {"tags": tags}
-            
-            response = requests.post(url, json=data, headers=self._get_headers())
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    print(f"✅ Successfully purged cache for tags: {', '.join(tags)}")
-                    return True
-                else:
-                    errors = result.get('errors', [])
-                    print(f"❌ Cache purge failed: {errors}")
-                    return False
-            else:
-                print(f"❌ API request failed: {response.status_code}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error purging tags: {str(e)}")
-            return False
-    
-    def purge_static_assets(self, domain: str = "https://www.360degreesupply.co.za") -> bool:
+        return self._purge({"tags": tags}, f"cache for tags: {', '.join(tags)}")
+
+    def purge_static_assets(self, domain: str = DEFAULT_DOMAIN) -> bool:
         """Purge common static assets after deployment
-        
+
+        CSS/JS linked through static_url() is content-hashed (see
+        static_manifest.py) and needs no purge; this only matters for
+        assets still linked by their plain name.
+
         Args:
             domain: Base domain URL
-            
+
         Returns:
             bool: True if successful, False otherwise
         """
@@ -155,26 +186,132 @@ class CloudflareCache:
             f"{domain}/static/js/table-functions.js",
             f"{domain}/",  # Homepage
         ]
-        
+
         print(f"🔄 Purging static assets...")
         return self.purge_urls(static_urls)
 
 
+class PurgeQueue:
+    """Coalesce page purges for `window` seconds, then send them as one purge_urls()"""
+
+    def __init__(self, cloudflare: CloudflareCache, origins: Iterable[str] = (DEFAULT_DOMAIN,),
+                 window: float = PURGE_WINDOW):
+        self.cloudflare = cloudflare
+        self.origins = [origin.rstrip('/') for origin in origins]
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+        self._stats = {'enqueued': 0, 'coalesced': 0, 'batches': 0, 'urls_purged': 0, 'failures': 0}
+
+    def enqueue(self, paths: Iterable[str]):
+        """Queue page paths ('/products') for every origin; the first one starts the window"""
+        urls = [f"{origin}{path}" for path in paths for origin in self.origins]
+        with self._lock:
+            for url in urls:
+                self._stats['enqueued'] += 1
+                if url in self._pending:
+                    self._stats['coalesced'] += 1
+                self._pending.add(url)
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> bool:
+        """Send everything pending now"""
+        with self._lock:
+            urls, self._pending = sorted(self._pending), set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not urls:
+            return True
+        ok = self.cloudflare.purge_urls(urls)
+        with self._lock:
+            self._stats['batches'] += 1
+            if ok:
+                self._stats['urls_purged'] += len(urls)
+            else:
+                self._stats['failures'] += 1
+        return ok
+
+    def stats(self) -> Dict:
+        """
+        Returns:
+            dict: enqueued, coalesced, batches, urls_purged, failures, pending
+        """
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+
+def content_purge_paths(objects) -> set:
+    """Public pages affected by a set of changed model instances"""
+    paths = set()
+    for obj in objects:
+        paths.update(CONTENT_PURGE_PATHS.get(type(obj).__name__, ()))
+    return paths
+
+
+def watch_content(queue: PurgeQueue):
+    """Enqueue affected pages once the transaction that changed them commits; returns an unwatch()"""
+    pending = ('cloudflare_purge', id(queue))  # session.info key
+
+    def after_flush(session_, flush_context):
+        paths = content_purge_paths(list(session_.new) + list(session_.dirty) + list(session_.deleted))
+        if paths:
+            session_.info.setdefault(pending, set()).update(paths)
+
+    def after_commit(session_):
+        paths = session_.info.pop(pending, None)
+        if paths:
+            queue.enqueue(sorted(paths))
+
+    def after_rollback(session_):
+        session_.info.pop(pending, None)
+
+    listeners = (('after_flush', after_flush), ('after_commit', after_commit), ('after_rollback', after_rollback))
+    for name, listener in listeners:
+        event.listen(Session, name, listener)
+
+    def unwatch():
+        for name, listener in listeners:
+            event.remove(Session, name, listener)
+    return unwatch
+
+
+purge_queue = None
+
+
+def init_app(app) -> Optional[PurgeQueue]:
+    """Start automatic purging when Cloudflare credentials are configured"""
+    global purge_queue
+    cloudflare = CloudflareCache(quiet=True)
+    if not cloudflare.configured or purge_queue is not None:
+        return purge_queue
+    origins = os.getenv('CLOUDFLARE_PURGE_ORIGINS', DEFAULT_DOMAIN).split(',')
+    purge_queue = PurgeQueue(cloudflare, [origin.strip() for origin in origins if origin.strip()])
+    watch_content(purge_queue)
+    atexit.register(purge_queue.flush)
+    app.logger.info(f"☁️  Cloudflare purge on content changes enabled for {', '.join(purge_queue.origins)}")
+    return purge_queue
+
+
 # CLI usage
 if __name__ == "__main__":
     import sys
-    
+
     cache = CloudflareCache()
-    
+
     if len(sys.argv) < 2:
         print("Usage:")
         print("  python cloudflare_cache.py all              # Purge all cache")
         print("  python cloudflare_cache.py static           # Purge static assets")
         print("  python cloudflare_cache.py urls <url1> <url2> ...  # Purge specific URLs")
         sys.exit(1)
-    
+
     command = sys.argv[1]
-    
+
     if command == "all":
         print("🔄 Purging all Cloudflare cache...")
         cache.purge_all()
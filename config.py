@@ -36,6 +36,15 @@ class Config:
     else:
         CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_TTL_JITTER = float(os.getenv('CACHE_TTL_JITTER', 0.1))  # +/- fraction, so pages expire apart
+    CACHE_STALE_GRACE = int(os.getenv('CACHE_STALE_GRACE', 300))  # serve stale while one request re-renders
+    CACHE_STALE_IF_ERROR = int(os.getenv('CACHE_STALE_IF_ERROR', 3600))  # serve stale if the re-render fails
+    # Pre-render storefront pages on startup, after invalidation and before expiry
+    CACHE_WARMUP = os.getenv('CACHE_WARMUP', str(os.getenv('FLASK_ENV') == 'production')) == 'True'
+    # Serve homepage, services, contact, privacy and terms from prerendered HTML (prerender.py)
+    PRERENDER_ENABLED = os.getenv('PRERENDER_ENABLED', str(os.getenv('FLASK_ENV') == 'production')) == 'True'
+    # Plain-HTTP requests fall through to Flask's force_https redirect (same condition as app.py)
+    PRERENDER_REQUIRE_HTTPS = os.getenv('FLASK_ENV') == 'production' or os.getenv('RAILWAY_ENVIRONMENT') is not None
     
     STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY')
     STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
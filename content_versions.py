@@ -0,0 +1,345 @@
+"""
+Content Version Stamps - ETag / Last-Modified for pages and JSON APIs
+
+A stamp is a short token that changes whenever the content behind it does:
+- catalog: products, services, homepage sections and testimonials
+- chrome: company info and menus shown on every page
+- cart:<customer_id>, orders:<customer_id>: one customer's cart and orders
+
+Views declare the stamps they depend on with @content_versions.conditional().
+Validators are derived from the stamps, not from the rendered body, so
+If-None-Match / If-Modified-Since are answered with 304 before the view
+renders a template or queries the database.
+
+Stamps live in Redis when REDIS_URL is set, so every worker agrees. Without
+it each process keeps its own and they expire after CACHE_DEFAULT_TIMEOUT,
+the staleness bound the per-process view cache already has. Per-customer
+endpoints had no view cache and are changed from other processes (another
+gunicorn worker, the OCR worker), so they are declared shared_only and are
+only revalidated with the Redis backend.
+
+catalog / chrome are bumped by the admin routes through invalidate(), which
+clears the view cache first so a new stamp never labels an old page. Cart
+and order rows change in many places (routes, payment webhooks, the OCR
+worker), so their stamps are bumped from SQLAlchemy commit events.
+"""
+import time
+import hashlib
+import secrets
+import logging
+import threading
+from functools import wraps
+
+from flask import request, session, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.http import http_date
+
+from geolocation import geolocation_service
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = 'content_version:'
+VERSION_REDIS_TTL = 30 * 86400  # stamps of idle customers age out
+CSRF_TIME_LIMIT = 3600  # pages embed a CSRF token valid this long (WTF_CSRF_TIME_LIMIT)
+
+
+def new_stamp(previous=None):
+    """
+    '<unix time>-<random>': unique, and carries its own Last-Modified.
+    A replacement is at least a whole second later than `previous`, so
+    Last-Modified (second resolution) changes on every bump.
+    """
+    now = time.time()
+    if previous:
+        now = max(now, int(stamp_time(previous)) + 1)
+    return f"{now:.3f}-{secrets.token_hex(3)}"
+
+
+def stamp_time(stamp):
+    return float(stamp.split('-', 1)[0])
+
+
+class LocalStamps:
+    """Per-process stamps that expire after `ttl` seconds"""
+
+    shared = False  # other processes never see these bumps
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stamps = {}  # scope -> (stamp, expires_at)
+
+    def get_many(self, scopes):
+        now = time.monotonic()
+        with self._lock:
+            result = []
+            for scope in scopes:
+                entry = self._stamps.get(scope)
+                if not entry or entry[1] <= now:
+                    entry = self._stamps[scope] = (new_stamp(), now + self.ttl)
+                result.append(entry[0])
+            return result
+
+    def bump(self, scopes):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for scope in scopes:
+                previous = self._stamps.get(scope)
+                self._stamps[scope] = (new_stamp(previous and previous[0]), expires_at)
+
+
+class RedisStamps:
+    """Stamps shared by every worker through Redis"""
+
+    shared = True
+
+    def __init__(self, client, ttl=VERSION_REDIS_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    def get_many(self, scopes):
+        keys = [VERSION_KEY_PREFIX + scope for scope in scopes]
+        stamps = self.client.mget(keys)
+        for index, stamp in enumerate(stamps):
+            if stamp is None:
+                # SET NX: concurrent first readers settle on one stamp
+                self.client.set(keys[index], new_stamp(), nx=True, ex=self.ttl)
+                stamp = self.client.get(keys[index])
+            stamps[index] = stamp.decode() if isinstance(stamp, bytes) else stamp
+        return stamps
+
+    def bump(self, scopes):
+        keys = [VERSION_KEY_PREFIX + scope for scope in scopes]
+        pipe = self.client.pipeline()
+        for key, previous in zip(keys, self.client.mget(keys)):
+            previous = previous.decode() if isinstance(previous, bytes) else previous
+            pipe.set(key, new_stamp(previous), ex=self.ttl)
+        pipe.execute()
+
+
+# =====================================================
+# REQUEST KEYS
+# =====================================================
+
+def session_user_id():
+    """Logged-in user id from the signed session cookie (no user lookup)"""
+    return session.get('_user_id')
+
+
+def viewer_key():
+    """
+    What a page varies by besides its content: who is logged in (navbar)
+    and the session's CSRF token, which expires after CSRF_TIME_LIMIT.
+    """
+    return f"{session_user_id()}:{session.get('csrf_token')}:{int(time.time() // CSRF_TIME_LIMIT)}"
+
+
+def currency_key():
+    """Prices are ZAR for South Africa, USD elsewhere; keyed without a GeoIP lookup"""
+    country = request.headers.get('CF-IPCountry')
+    if country:
+        return 'ZAR' if country.upper() == 'ZA' else 'USD'
+    return geolocation_service.get_client_ip()
+
+
+def customer_scope(name):
+    """Scope callable for the session customer's own data, e.g. customer_scope('cart')"""
+    def scope(**view_kwargs):
+        user_id = session_user_id()
+        return f"{name}:{user_id}" if user_id else None
+    return scope
+
+
+# =====================================================
+# VERSIONS
+# =====================================================
+
+class ContentVersions:
+    """Version stamps plus the conditional-GET decorator built on them"""
+
+    def __init__(self):
+        self.store = None
+        self.view_cache = None
+        self.invalidation_hooks = []
+        self._stats = {'not_modified': 0, 'tagged': 0, 'errors': 0}
+
+    def init_app(self, app, view_cache=None):
+        """
+        Args:
+            app: Flask app (REDIS_URL, CACHE_DEFAULT_TIMEOUT)
+            view_cache: flask_caching.Cache cleared by invalidate()
+        """
+        redis_url = app.config.get('REDIS_URL')
+        if redis_url:
+            import redis
+            self.store = RedisStamps(redis.from_url(redis_url))
+        else:
+            self.store = LocalStamps(ttl=app.config.get('CACHE_DEFAULT_TIMEOUT', 300))
+        self.view_cache = view_cache
+        watch_commits(self)
+
+    def stamps(self, *scopes):
+        return self.store.get_many(scopes)
+
+    def bump(self, *scopes):
+        """New stamps for `scopes`; clients holding the old ETag get a 200 next time"""
+        try:
+            self.store.bump(scopes)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"Could not bump content versions {scopes}: {e}")
+
+    def invalidate(self, *scopes):
+        """Clear the view cache, then bump: a new stamp never labels a cached old page"""
+        if self.view_cache is not None:
+            self.view_cache.clear()
+        self.bump(*scopes)
+        for hook in self.invalidation_hooks:
+            try:
+                hook(scopes)
+            except Exception as e:
+                logger.error(f"Invalidation hook {hook!r} failed: {e}")
+
+    def on_invalidate(self, hook):
+        """Call hook(scopes) after every invalidate(), e.g. to re-warm the view cache"""
+        self.invalidation_hooks.append(hook)
+        return hook
+
+    def validators(self, scopes, vary=(), view_kwargs=None):
+        """
+        Returns:
+            tuple: (etag, last_modified) or None if a scope does not apply
+        """
+        names = []
+        for scope in scopes:
+            name = scope(**(view_kwargs or {})) if callable(scope) else scope
+            if name is None:
+                return None
+            names.append(name)
+        stamps = self.stamps(*names)
+        parts = names + stamps + [key() for key in vary]
+        etag = hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()[:20]
+        return etag, int(max(stamp_time(stamp) for stamp in stamps))
+
+    def conditional(self, *scopes, vary=(), shared_only=False):
+        """
+        Decorator: ETag / Last-Modified from the stamps of `scopes` (names, or
+        callables taking the view kwargs and returning a name or None), and
+        304 Not Modified without calling the view when the client is current.
+
+        Tags are weak: pages embed per-render values (CSRF token), so bodies
+        are equivalent rather than byte-identical. `vary` adds request keys
+        (viewer_key, currency_key) for pages that differ per visitor; those
+        are only revalidated by ETag, since a date cannot say who asked.
+        `shared_only` views run unconditionally unless stamps are shared by
+        every process (Redis): their data changes outside this process.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+                if shared_only and not self.store.shared:
+                    return view(*args, **kwargs)
+                try:
+                    validators = self.validators(scopes, vary, kwargs)
+                except Exception as e:
+                    self._stats['errors'] += 1
+                    logger.warning(f"Content versions unavailable, serving {request.path} without validators: {e}")
+                    validators = None
+                if validators is None:
+                    return view(*args, **kwargs)
+
+                etag, last_modified = validators
+                if self._is_current(etag, None if vary else last_modified):
+                    self._stats['not_modified'] += 1
+                    response = make_response('', 304)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    self._stats['tagged'] += 1
+                response.set_etag(etag, weak=True)
+                response.headers['Last-Modified'] = http_date(last_modified)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Cookie')
+                return response
+            return wrapped
+        return decorator
+
+    @staticmethod
+    def _is_current(etag, last_modified):
+        # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(etag)
+        if request.if_modified_since and last_modified is not None:
+            return last_modified <= request.if_modified_since.timestamp()
+        return False
+
+    def stats(self):
+        """
+        Returns:
+            dict: not_modified, tagged, errors, hit_rate, backend
+        """
+        stats = dict(self._stats)
+        answered = stats['not_modified'] + stats['tagged']
+        stats['hit_rate'] = round(stats['not_modified'] / answered, 3) if answered else None
+        stats['backend'] = 'redis' if isinstance(self.store, RedisStamps) else 'local'
+        return stats
+
+
+content_versions = ContentVersions()
+
+
+# =====================================================
+# COMMIT EVENTS (cart / orders)
+# =====================================================
+
+def _customer_scopes(session_, objects):
+    """cart:<id> / orders:<id> scopes touched by flushed objects"""
+    from models import Cart, CartItem, Customer, Order, OrderItem, Invoice
+
+    scopes = set()
+    for obj in objects:
+        if isinstance(obj, Cart):
+            scopes.add(f"cart:{obj.customer_id}")
+        elif isinstance(obj, CartItem):
+            cart = session_.get(Cart, obj.cart_id)
+            if cart:
+                scopes.add(f"cart:{cart.customer_id}")
+        elif isinstance(obj, (Order, Invoice)):
+            scopes.add(f"orders:{obj.customer_id}")
+        elif isinstance(obj, Customer):
+            scopes.add(f"orders:{obj.id}")  # name, email and company are in the order list
+        elif isinstance(obj, OrderItem):
+            order = session_.get(Order, obj.order_id)
+            if order:
+                scopes.add(f"orders:{order.customer_id}")
+    return scopes
+
+
+def watch_commits(versions):
+    """Bump cart / order stamps once the transaction that changed them commits"""
+    if getattr(versions, '_watching', False):
+        return
+    versions._watching = True
+    pending = ('content_versions', id(versions))  # session.info key
+
+    def after_flush(session_, flush_context):
+        changed = list(session_.new) + list(session_.dirty) + list(session_.deleted)
+        scopes = _customer_scopes(session_, changed)
+        if scopes:
+            session_.info.setdefault(pending, set()).update(scopes)
+
+    def after_commit(session_):
+        scopes = session_.info.pop(pending, None)
+        if scopes:
+            versions.bump(*scopes)
+
+    def after_rollback(session_):
+        session_.info.pop(pending, None)
+
+    event.listen(Session, 'after_flush', after_flush)
+    event.listen(Session, 'after_commit', after_commit)
+    event.listen(Session, 'after_rollback', after_rollback)
@@ -0,0 +1,297 @@
+"""
+Transactional Email Outbox
+DB-backed outbox drained by a dedicated dispatcher process
+
+Request handlers only add an EmailOutbox row to the session, so the email
+commits (or rolls back) together with the order, payment or contact
+submission that caused it. The dispatcher sends pending rows over the
+pooled SMTP sessions, retries failures with exponential backoff, spreads
+mail to any one recipient under a rate limit and dead-letters messages
+that keep failing.
+
+Usage:
+    python email_outbox.py               # Run the dispatcher until interrupted
+    python email_outbox.py --once        # Drain the outbox and exit
+    python email_outbox.py --retry-dead  # Requeue dead-lettered messages
+"""
+import os
+import sys
+import json
+import time
+import random
+import inspect
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+from flask import current_app
+from jinja2 import TemplateError
+from sqlalchemy import func
+
+from models import db, EmailOutbox
+from email_service import EmailService, smtp_breaker
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 20))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', 30))  # seconds
+OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', 3600))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 2))
+OUTBOX_STALE_AFTER = int(os.getenv('OUTBOX_STALE_AFTER', 300))  # seconds
+# At most this many messages per recipient per window; ADMIN_EMAIL is exempt
+OUTBOX_RECIPIENT_LIMIT = int(os.getenv('OUTBOX_RECIPIENT_LIMIT', 10))
+OUTBOX_RECIPIENT_WINDOW = int(os.getenv('OUTBOX_RECIPIENT_WINDOW', 3600))  # seconds
+
+# Name of the address argument across EmailService.send_* methods
+RECIPIENT_PARAMS = ('recipient_email', 'admin_email')
+
+
+# =====================================================
+# ENQUEUE (web side)
+# =====================================================
+
+def queue_email(template, recipient_email, **kwargs):
+    """
+    Queue an EmailService call, e.g.
+    queue_email('send_refund_email', customer.email, order_number=...).
+    Added to the caller's session so it commits with the business change.
+
+    Args:
+        template: EmailService method name
+        recipient_email: Address; passed as the method's recipient_email
+            or admin_email argument
+        **kwargs: Remaining keyword arguments (JSON-serialisable; Decimal
+            and datetime values are stored as strings)
+    """
+    method = getattr(EmailService, template, None)
+    if not template.startswith('send_') or not callable(method):
+        raise ValueError(f'Unknown email template: {template}')
+    params = inspect.signature(method).parameters
+    field = next((name for name in RECIPIENT_PARAMS if name in params), None)
+    if field is None:
+        raise ValueError(f'{template} takes no recipient address')
+    kwargs[field] = recipient_email
+
+    message = EmailOutbox(
+        template=template,
+        recipient=recipient_email,
+        payload=json.dumps(kwargs, default=str),
+        status='pending'
+    )
+    db.session.add(message)
+    return message
+
+
+def backoff(attempts):
+    """Delay before attempt `attempts + 1`: doubling from the base, capped, +-10% jitter"""
+    delay = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+
+# =====================================================
+# DISPATCHER
+# =====================================================
+
+def claim_messages(limit):
+    """
+    Atomically claim up to `limit` due messages.
+    Uses SKIP LOCKED so several dispatchers can share the table.
+    """
+    now = datetime.utcnow()
+    messages = EmailOutbox.query.filter(
+        EmailOutbox.status == 'pending',
+        EmailOutbox.run_after <= now
+    ).order_by(EmailOutbox.id).limit(limit).with_for_update(skip_locked=True).all()
+
+    for message in messages:
+        message.status = 'sending'
+        message.started_at = now
+        message.attempts += 1
+    db.session.commit()
+    return messages
+
+
+def requeue_stale_messages():
+    """Return messages orphaned by a crashed dispatcher to the outbox"""
+    cutoff = datetime.utcnow() - timedelta(seconds=OUTBOX_STALE_AFTER)
+    count = EmailOutbox.query.filter(
+        EmailOutbox.status == 'sending',
+        EmailOutbox.started_at < cutoff
+    ).update({'status': 'pending'}, synchronize_session=False)
+    if count:
+        db.session.commit()
+        logger.warning(f"Requeued {count} stale outbox message(s)")
+    return count
+
+
+def rate_limited_until(recipient):
+    """
+    When `recipient` may receive mail again, or None if under the limit.
+    Counts messages sent within the rolling window.
+    """
+    if recipient == current_app.config.get('ADMIN_EMAIL'):
+        return None
+    window_start = datetime.utcnow() - timedelta(seconds=OUTBOX_RECIPIENT_WINDOW)
+    sent = db.session.query(EmailOutbox.sent_at).filter(
+        EmailOutbox.recipient == recipient,
+        EmailOutbox.status == 'sent',
+        EmailOutbox.sent_at >= window_start
+    ).order_by(EmailOutbox.sent_at.desc()).limit(OUTBOX_RECIPIENT_LIMIT).all()
+    if len(sent) < OUTBOX_RECIPIENT_LIMIT:
+        return None
+    # Free again once the oldest of the last LIMIT sends leaves the window
+    return sent[-1][0] + timedelta(seconds=OUTBOX_RECIPIENT_WINDOW)
+
+
+def _defer(message, until):
+    """Put a claimed message back without spending an attempt"""
+    message.status = 'pending'
+    message.attempts -= 1
+    message.run_after = until
+
+
+def _fail_message(message, error, retry=True):
+    """Retry with backoff, or dead-letter after the last attempt"""
+    message.last_error = str(error)
+    if retry and message.attempts < OUTBOX_MAX_ATTEMPTS:
+        message.status = 'pending'
+        message.run_after = datetime.utcnow() + backoff(message.attempts)
+        logger.warning(f"Outbox message {message.id} failed (attempt {message.attempts}), retrying: {error}")
+    else:
+        message.status = 'dead'
+        logger.error(f"Outbox message {message.id} ({message.template} -> {message.recipient}) dead-lettered: {error}")
+
+
+def send_message(service, message):
+    """Render and send one claimed message; commits its outcome"""
+    try:
+        until = rate_limited_until(message.recipient)
+        if until:
+            _defer(message, until)
+            logger.info(f"Outbox message {message.id} to {message.recipient} deferred until {until:%H:%M:%S} (rate limit)")
+            db.session.commit()
+            return False
+
+        kwargs = json.loads(message.payload)
+        sent = getattr(service, message.template)(**kwargs)
+    except (TypeError, ValueError, AttributeError, KeyError, TemplateError) as e:
+        # Payload does not fit the template: retrying cannot help
+        db.session.rollback()
+        _fail_message(message, e, retry=False)
+        sent = False
+    except Exception as e:
+        # Database or filesystem trouble may pass: back off, keep the batch going
+        db.session.rollback()
+        _fail_message(message, e)
+        sent = False
+    else:
+        if sent:
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+        else:
+            _fail_message(message, 'SMTP send failed')
+    db.session.commit()
+    return bool(sent)
+
+
+def dispatch(service, limit=OUTBOX_BATCH_SIZE):
+    """
+    Send one batch of due messages. Consecutive sends reuse the same
+    pooled SMTP session; while the SMTP breaker is open the rest of the
+    batch is put back without spending attempts.
+
+    Returns:
+        int: Number of messages sent
+    """
+    requeue_stale_messages()
+    messages = claim_messages(limit)
+    sent = 0
+    for index, message in enumerate(messages):
+        if smtp_breaker.state == smtp_breaker.OPEN:
+            retry_at = datetime.utcnow() + timedelta(seconds=smtp_breaker.recovery_timeout)
+            for waiting in messages[index:]:
+                _defer(waiting, retry_at)
+            db.session.commit()
+            logger.warning(f"SMTP unavailable; {len(messages) - index} outbox message(s) held back")
+            break
+        sent += send_message(service, message)
+    return sent
+
+
+def run_dispatcher(service, once=False):
+    """
+    Drain the outbox, polling every OUTBOX_POLL_INTERVAL seconds.
+
+    Args:
+        service: EmailService used for delivery
+        once: Exit when nothing is due instead of polling forever
+    """
+    logger.info("Email outbox dispatcher started")
+    while True:
+        due = EmailOutbox.query.filter(
+            EmailOutbox.status == 'pending', EmailOutbox.run_after <= datetime.utcnow()
+        ).count()
+        # Nothing sent (rows locked by another dispatcher, deferred or failing): wait
+        if due and dispatch(service):
+            continue
+        if once and not due:
+            break
+        time.sleep(OUTBOX_POLL_INTERVAL)
+    logger.info("Email outbox dispatcher stopped")
+
+
+def retry_dead():
+    """Requeue every dead-lettered message with a fresh attempt budget"""
+    count = EmailOutbox.query.filter_by(status='dead').update({
+        'status': 'pending', 'attempts': 0, 'run_after': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def outbox_stats():
+    """
+    Returns:
+        dict: count per status, due/oldest pending age (s), sent in the last hour
+    """
+    now = datetime.utcnow()
+    counts = dict(db.session.query(EmailOutbox.status, func.count(EmailOutbox.id))
+                  .group_by(EmailOutbox.status).all())
+    oldest = db.session.query(func.min(EmailOutbox.created_at)).filter(
+        EmailOutbox.status.in_(('pending', 'sending'))
+    ).scalar()
+    due = EmailOutbox.query.filter(
+        EmailOutbox.status == 'pending', EmailOutbox.run_after <= now
+    ).count()
+    sent_last_hour = EmailOutbox.query.filter(
+        EmailOutbox.status == 'sent', EmailOutbox.sent_at >= now - timedelta(hours=1)
+    ).count()
+    return {
+        'pending': counts.get('pending', 0),
+        'due': due,
+        'sending': counts.get('sending', 0),
+        'dead': counts.get('dead', 0),
+        'sent_last_hour': sent_last_hour,
+        'oldest_pending_age_s': round((now - oldest).total_seconds(), 1) if oldest else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transactional email outbox dispatcher')
+    parser.add_argument('--once', action='store_true', help='Drain the outbox and exit')
+    parser.add_argument('--retry-dead', action='store_true', help='Requeue dead-lettered messages and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app import app, email_service
+
+    with app.app_context():
+        if args.retry_dead:
+            print(f"Requeued {retry_dead()} dead-lettered message(s)")
+            sys.exit(0)
+        try:
+            run_dispatcher(email_service, once=args.once)
+        except KeyboardInterrupt:
+            sys.exit(0)
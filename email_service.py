@@ -3,12 +3,210 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from flask import render_template_string
+from email_templates import render_email
+import os
+import time
+import atexit
 import logging
+import socket
+import threading
+from collections import deque
 from datetime import datetime
+from resilience import get_breaker, DependencyUnavailableError
 
 logger = logging.getLogger(__name__)
 
+# Connection-level SMTP failures trip the breaker; per-message errors such as
+# refused recipients do not. At most 4 threads may be talking SMTP at once;
+# a fifth waits up to SMTP_BULKHEAD_WAIT seconds for a slot before giving up.
+SMTP_BULKHEAD_WAIT = float(os.getenv('SMTP_BULKHEAD_WAIT', 5))
+
+smtp_breaker = get_breaker(
+    'smtp', failure_threshold=3, recovery_timeout=60,
+    failure_exceptions=(
+        smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected,
+        smtplib.SMTPHeloError, socket.timeout, socket.gaierror,
+        ConnectionError, TimeoutError
+    ),
+    max_concurrent=4,
+    acquire_timeout=SMTP_BULKHEAD_WAIT
+)
+
+
+# Authenticated SMTP sessions are kept and reused. A session idle longer
+# than SMTP_POOL_NOOP_AFTER is checked with NOOP before reuse; sessions
+# older than SMTP_POOL_MAX_AGE or idle past SMTP_POOL_IDLE_TIMEOUT are closed
+# (most servers drop idle clients after 1-5 minutes).
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 4))
+SMTP_POOL_MAX_AGE = float(os.getenv('SMTP_POOL_MAX_AGE', 300))
+SMTP_POOL_IDLE_TIMEOUT = float(os.getenv('SMTP_POOL_IDLE_TIMEOUT', 60))
+SMTP_POOL_NOOP_AFTER = float(os.getenv('SMTP_POOL_NOOP_AFTER', 5))
+SMTP_LATENCY_WINDOW = 200
+
+
+class SMTPMetrics:
+    """Send latency and connection churn, shared by every pool in the process"""
+
+    def __init__(self, window=SMTP_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self._stats = dict.fromkeys((
+            'sent', 'failed', 'recipients', 'refused', 'connections_opened',
+            'connections_reused', 'connections_closed', 'noop_failures', 'retries',
+            'rejected'
+        ), 0)
+
+    def incr(self, name, count=1):
+        with self._lock:
+            self._stats[name] += count
+
+    def record_send(self, seconds, recipients, refused=0, success=True):
+        with self._lock:
+            if not success:
+                self._stats['failed'] += 1
+                return
+            self._stats['sent'] += 1
+            self._stats['recipients'] += recipients
+            self._stats['refused'] += refused
+            self._recent.append(seconds)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: counters plus avg/p50/p95/max send latency (ms) and reuse rate
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            recent = sorted(self._recent)
+        percentile = lambda p: round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 1) if recent else None
+        stats['avg_ms'] = round(sum(recent) / len(recent) * 1000, 1) if recent else None
+        stats['p50_ms'] = percentile(0.5)
+        stats['p95_ms'] = percentile(0.95)
+        stats['max_ms'] = round(recent[-1] * 1000, 1) if recent else None
+        checkouts = stats['connections_opened'] + stats['connections_reused']
+        stats['reuse_rate'] = round(stats['connections_reused'] / checkouts, 3) if checkouts else None
+        return stats
+
+
+smtp_metrics = SMTPMetrics()
+
+
+class PooledConnection:
+    """An authenticated SMTP session with its age and last use"""
+
+    def __init__(self, server):
+        self.server = server
+        self.created = self.last_used = time.monotonic()
+
+    def expired(self, now, max_age, idle_timeout):
+        return now - self.created > max_age or now - self.last_used > idle_timeout
+
+    def healthy(self):
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close(self):
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                self.server.close()
+            except OSError:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Thread-safe pool of authenticated SMTP sessions.
+
+    Args:
+        connect: Callable returning a logged-in smtplib.SMTP instance
+        size: Idle sessions kept (the breaker already caps concurrent use)
+        max_age: Seconds after which a session is retired
+        idle_timeout: Seconds of inactivity after which a session is closed
+        noop_after: Idle seconds after which a session is NOOP-checked before reuse
+    """
+
+    def __init__(self, connect, size=SMTP_POOL_SIZE, max_age=SMTP_POOL_MAX_AGE,
+                 idle_timeout=SMTP_POOL_IDLE_TIMEOUT, noop_after=SMTP_POOL_NOOP_AFTER,
+                 metrics=smtp_metrics):
+        self._connect = connect
+        self.size = size
+        self.max_age = max_age
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._idle = []  # most recently used last
+
+    def acquire(self):
+        """
+        Reuse a healthy idle session or open a new one.
+
+        Returns:
+            tuple: (PooledConnection, reused)
+        """
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                break
+            now = time.monotonic()
+            if conn.expired(now, self.max_age, self.idle_timeout):
+                self._discard(conn)
+                continue
+            if now - conn.last_used > self.noop_after and not conn.healthy():
+                self.metrics.incr('noop_failures')
+                self._discard(conn)
+                continue
+            self.metrics.incr('connections_reused')
+            return conn, True
+
+        conn = PooledConnection(self._connect())
+        self.metrics.incr('connections_opened')
+        return conn, False
+
+    def release(self, conn, healthy=True):
+        """Return a session after use; broken, aged or surplus sessions are closed"""
+        conn.last_used = now = time.monotonic()
+        if healthy and not conn.expired(now, self.max_age, self.idle_timeout):
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(conn)
+                    return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        conn.close()
+        self.metrics.incr('connections_closed')
+
+    def prune(self):
+        """Close idle sessions past their age or idle limit"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [conn for conn in self._idle if conn.expired(now, self.max_age, self.idle_timeout)]
+            self._idle = [conn for conn in self._idle if conn not in stale]
+        for conn in stale:
+            self._discard(conn)
+        return len(stale)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._idle)
+
+
+def smtp_stats():
+    """Send latency, failures and connection reuse for /metrics"""
+    return smtp_metrics.snapshot()
+
 
 class EmailService:
     """Handle email notifications for the website."""
@@ -32,6 +230,32 @@ class EmailService:
         self.sender_password = sender_password
         self.use_tls = use_tls
         self.reply_to = reply_to
+        self.pool = SMTPConnectionPool(self._login)
+        atexit.register(self.pool.close_all)
+
+    def _build_message(self, recipient_email, subject, html_content,
+                       plain_text=None):
+        """Assemble the multipart/alternative message"""
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = self.sender_email
+        message["To"] = (recipient_email if isinstance(
+            recipient_email, str
+        ) else ", ".join(recipient_email))
+
+        # Add Reply-To header if configured
+        if self.reply_to:
+            message["Reply-To"] = self.reply_to
+
+        # Attach plain text version
+        if plain_text:
+            part1 = MIMEText(plain_text, "plain")
+            message.attach(part1)
+
+        # Attach HTML version (preferred)
+        part2 = MIMEText(html_content, "html")
+        message.attach(part2)
+        return message
 
     def send_email(self, recipient_email, subject, html_content,
                    plain_text=None):
@@ -39,7 +263,8 @@ class EmailService:
         Send an email message.
 
         Args:
-            recipient_email: Recipient email address(es)
+            recipient_email: Recipient email address(es); a list is
+                delivered in one SMTP transaction
             subject: Email subject
             html_content: HTML email body
             plain_text: Plain text fallback
@@ -53,60 +278,26 @@ class EmailService:
                 logger.warning("Email not sent: SMTP credentials not configured")
                 return False
             
-            # Create message
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = self.sender_email
-            message["To"] = (recipient_email if isinstance(
-                recipient_email, str
-            ) else ", ".join(recipient_email))
-            
-            # Add Reply-To header if configured
-            if self.reply_to:
-                message["Reply-To"] = self.reply_to
-
-            # Attach plain text version
-            if plain_text:
-                part1 = MIMEText(plain_text, "plain")
-                message.attach(part1)
-
-            # Attach HTML version (preferred)
-            part2 = MIMEText(html_content, "html")
-            message.attach(part2)
+            message = self._build_message(
+                recipient_email, subject, html_content, plain_text
+            )
 
-            # Send email with timeout - try both TLS and SSL
             logger.info(f"Attempting to send email to {recipient_email} via {self.smtp_server}:{self.smtp_port}")
-            
+
             try:
-                if self.use_tls:
-                    # Try STARTTLS on port 587
-                    server = smtplib.SMTP(
-                        self.smtp_server, self.smtp_port, timeout=10
-                    )
-                    server.starttls()
-                else:
-                    # Try SSL on port 465
-                    server = smtplib.SMTP_SSL(
-                        self.smtp_server, self.smtp_port, timeout=10
-                    )
-            except Exception as conn_error:
-                # If TLS fails, try SSL on port 465
-                logger.warning(f"TLS connection failed, trying SSL: {str(conn_error)}")
-                try:
-                    server = smtplib.SMTP_SSL(
-                        self.smtp_server, 465, timeout=10
-                    )
-                except Exception as ssl_error:
-                    logger.error(f"Both TLS and SSL failed: {str(ssl_error)}")
-                    return False
+                result = smtp_breaker.call(
+                    self._deliver, recipient_email, message.as_string()
+                )
+            except DependencyUnavailableError as e:
+                # Fast-fail: SMTP is known to be down or saturated
+                smtp_metrics.incr('rejected')
+                logger.error(f"Email to {recipient_email} dropped: {e}")
+                return False
 
-            server.login(self.sender_email, self.sender_password)
-            server.sendmail(
-                self.sender_email,
-                recipient_email,
-                message.as_string()
-            )
-            server.quit()
+            if isinstance(result, Exception):
+                raise result
+            if result:
+                logger.warning(f"Recipients refused: {', '.join(result)}")
 
             logger.info(
                 f"Email sent successfully to {recipient_email}"
@@ -123,6 +314,134 @@ class EmailService:
             logger.error(f"Error sending email: {str(e)}")
             return False
 
+    def send_bulk(self, messages):
+        """
+        Send several messages over one pooled SMTP session.
+
+        Args:
+            messages: Iterable of dicts with send_email's arguments
+                (recipient_email, subject, html_content, plain_text)
+
+        Returns:
+            list: bool per message, in order
+        """
+        messages = list(messages)
+        if not self.sender_email or not self.sender_password:
+            logger.warning("Email not sent: SMTP credentials not configured")
+            return [False] * len(messages)
+
+        prepared = [
+            (m['recipient_email'], self._build_message(**m).as_string())
+            for m in messages
+        ]
+        try:
+            results = smtp_breaker.call(self._deliver_batch, prepared)
+        except DependencyUnavailableError as e:
+            smtp_metrics.incr('rejected', len(messages))
+            logger.error(f"{len(messages)} email(s) dropped: {e}")
+            return [False] * len(messages)
+        except Exception as e:
+            logger.error(f"Error sending emails: {str(e)}")
+            return [False] * len(messages)
+
+        sent = []
+        for (recipients, _), result in zip(prepared, results):
+            if isinstance(result, Exception):
+                logger.error(f"Email to {recipients} rejected: {str(result)}")
+            elif result:
+                logger.warning(f"Recipients refused: {', '.join(result)}")
+            sent.append(not isinstance(result, Exception))
+        logger.info(f"Sent {sum(sent)} of {len(sent)} email(s)")
+        return sent
+
+    def _open_connection(self):
+        """Open an SMTP connection, falling back from STARTTLS to SSL"""
+        try:
+            if self.use_tls:
+                # Try STARTTLS on port 587
+                server = smtplib.SMTP(
+                    self.smtp_server, self.smtp_port, timeout=10
+                )
+                server.starttls()
+            else:
+                # Try SSL on port 465
+                server = smtplib.SMTP_SSL(
+                    self.smtp_server, self.smtp_port, timeout=10
+                )
+        except Exception as conn_error:
+            # If TLS fails, try SSL on port 465
+            logger.warning(f"TLS connection failed, trying SSL: {str(conn_error)}")
+            server = smtplib.SMTP_SSL(
+                self.smtp_server, 465, timeout=10
+            )
+        return server
+
+    def _login(self):
+        """New authenticated session for the pool"""
+        server = self._open_connection()
+        try:
+            server.login(self.sender_email, self.sender_password)
+        except Exception:
+            PooledConnection(server).close()
+            raise
+        return server
+
+    def _deliver(self, recipient_email, message_text):
+        """Hand one message to the SMTP server over a pooled session"""
+        return self._deliver_batch([(recipient_email, message_text)])[0]
+
+    def _deliver_batch(self, messages):
+        """
+        Send (recipients, message_text) pairs over one pooled session.
+
+        A reused session the server has already dropped is replaced once;
+        connection errors propagate to the breaker. Messages the server
+        rejects do not end the session (smtplib resets it).
+
+        Returns:
+            list: per message, the dict of refused recipients or the
+                  SMTP exception that rejected it
+        """
+        results = []
+        retried = False
+        while len(results) < len(messages):
+            conn, reused = self.pool.acquire()
+            healthy = True
+            try:
+                for recipients, message_text in messages[len(results):]:
+                    started = time.perf_counter()
+                    try:
+                        refused = conn.server.sendmail(
+                            self.sender_email, recipients, message_text
+                        )
+                    except (smtplib.SMTPRecipientsRefused,
+                            smtplib.SMTPSenderRefused,
+                            smtplib.SMTPDataError) as e:
+                        smtp_metrics.record_send(0, 0, success=False)
+                        results.append(e)
+                        continue
+                    smtp_metrics.record_send(
+                        time.perf_counter() - started,
+                        1 if isinstance(recipients, str) else len(recipients),
+                        len(refused)
+                    )
+                    results.append(refused)
+            except smtplib.SMTPServerDisconnected:
+                healthy = False
+                if reused and not retried:
+                    retried = True
+                    smtp_metrics.incr('retries')
+                    continue
+                smtp_metrics.incr('failed', len(messages) - len(results))
+                raise
+            except BaseException:
+                healthy = False
+                smtp_metrics.incr('failed', len(messages) - len(results))
+                raise
+            finally:
+                self.pool.release(conn, healthy)
+        return results
+
     def send_contact_confirmation(self, recipient_name,
                                   recipient_email, subject,
                                   message_content, company_name,
@@ -142,95 +461,8 @@ class EmailService:
         Returns:
             bool: True if successful
         """
-        html_template = """
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto;">
-                    <!-- Header -->
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 20px; text-align: center;">
-                        <h2>Thank You for Contacting Us!</h2>
-                    </div>
-
-                    <!-- Content -->
-                    <div style="padding: 20px; background-color: #f9f9f9;">
-                        <p>Dear {{ recipient_name }},</p>
-
-                        <p>Thank you for reaching out to us. We have received
-                        your message and appreciate you taking the time to
-                        contact {{ company_name }}.</p>
-
-                        <div style="background-color: white; padding: 15px;
-                                    border-left: 4px solid #f39c12;
-                                    margin: 20px 0;">
-                            <h4 style="color: #1a472a; margin-top: 0;">
-                                Your Message Summary:
-                            </h4>
-                            <p><strong>Subject:</strong> {{ subject }}</p>
-                            <p><strong>Submitted:</strong>
-                            {{ submission_date }}</p>
-                        </div>
-
-                        <p>We will review your inquiry and get back to you
-                        within 24-48 business hours.</p>
-
-                        <h4 style="color: #1a472a;">Contact Information:</h4>
-                        <p>
-                            <strong>{{ company_name }}</strong><br>
-                            📞 {{ company_phone }}<br>
-                            📧 {{ company_email }}
-                        </p>
-
-                        <p style="color: #7f8c8d; font-size: 12px;
-                                  margin-top: 30px;">
-                            <em>This is an automated response. Please do not
-                            reply to this email.</em>
-                        </p>
-                    </div>
-
-                    <!-- Footer -->
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 15px; text-align: center;
-                                font-size: 12px;">
-                        <p>© 2026 {{ company_name }}. All rights reserved.
-                        </p>
-                        <p>Transforming Industries with Quality &
-                        Reliability</p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-
-        plain_text = f"""
-Thank you for contacting us!
-
-Dear {recipient_name},
-
-Thank you for reaching out to us. We have received your message and
-appreciate you taking the time to contact {company_name}.
-
-Your Message Summary:
-Subject: {subject}
-Submitted: {datetime.now().strftime('%Y-%m-%d %H:%M')}
-
-We will review your inquiry and get back to you within 24-48 business
-hours.
-
-Contact Information:
-{company_name}
-📞 {company_phone}
-📧 {company_email}
-
-This is an automated response. Please do not reply to this email.
-
-© 2026 {company_name}. All rights reserved.
-        """
-
-        from flask import render_template_string
-
-        html_content = render_template_string(
-            html_template,
+        html_content, plain_text = render_email(
+            'contact_confirmation.html',
             recipient_name=recipient_name,
             subject=subject,
             company_name=company_name,
@@ -265,91 +497,8 @@ This is an automated response. Please do not reply to this email.
         Returns:
             bool: True if successful
         """
-        html_template = """
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto;">
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 20px;">
-                        <h2>New Contact Form Submission</h2>
-                    </div>
-
-                    <div style="padding: 20px; background-color: #f9f9f9;">
-                        <h4 style="color: #1a472a;">
-                            Contact Details:
-                        </h4>
-
-                        <table style="width: 100%; border-collapse: collapse;">
-                            <tr>
-                                <td style="padding: 8px; font-weight: bold;
-                                          width: 30%;">Name:</td>
-                                <td style="padding: 8px;">
-                                {{ sender_name }}
-                                </td>
-                            </tr>
-                            <tr style="background-color: white;">
-                                <td style="padding: 8px; font-weight: bold;">
-                                Email:</td>
-                                <td style="padding: 8px;">
-                                <a href="mailto:{{ sender_email }}">
-                                {{ sender_email }}</a>
-                                </td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 8px; font-weight: bold;">
-                                Phone:</td>
-                                <td style="padding: 8px;">
-                                <a href="tel:{{ sender_phone }}">
-                                {{ sender_phone }}</a>
-                                </td>
-                            </tr>
-                            <tr style="background-color: white;">
-                                <td style="padding: 8px; font-weight: bold;">
-                                Subject:</td>
-                                <td style="padding: 8px;">
-                                {{ subject }}
-                                </td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 8px; font-weight: bold;
-                                          vertical-align: top;">Message:</td>
-                                <td style="padding: 8px;">
-                                {{ message_content }}
-                                </td>
-                            </tr>
-                            <tr style="background-color: white;">
-                                <td style="padding: 8px; font-weight: bold;">
-                                Submitted:</td>
-                                <td style="padding: 8px;">
-                                {{ submission_date }}
-                                </td>
-                            </tr>
-                        </table>
-
-                        <p style="margin-top: 20px;">
-                            <a href="{{ admin_link }}"
-                               style="background-color: #1a472a;
-                                      color: white; padding: 10px 20px;
-                                      text-decoration: none;
-                                      border-radius: 4px;">
-                                View in Admin Panel
-                            </a>
-                        </p>
-                    </div>
-
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 15px; text-align: center;
-                                font-size: 12px;">
-                        <p>© 2026 {{ company_name }}. All rights
-                        reserved.</p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-
-        html_content = render_template_string(
-            html_template,
+        html_content, plain_text = render_email(
+            'contact_notification.html',
             sender_name=sender_name,
             sender_email=sender_email,
             sender_phone=sender_phone,
@@ -365,7 +514,8 @@ This is an automated response. Please do not reply to this email.
         return self.send_email(
             admin_email,
             f"New Contact Form: {subject}",
-            html_content
+            html_content,
+            plain_text
         )
 
     def send_payment_confirmation(self, recipient_email, recipient_name,
@@ -389,101 +539,8 @@ This is an automated response. Please do not reply to this email.
         Returns:
             bool: True if successful
         """
-        html_template = """
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto;">
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 20px; text-align: center;">
-                        <h2>✓ Payment Received</h2>
-                    </div>
-
-                    <div style="padding: 20px; background-color: #f9f9f9;">
-                        <p>Dear {{ recipient_name }},</p>
-
-                        <p>We have successfully received your payment.
-                        Thank you for your business!</p>
-
-                        <div style="background-color: #e8f5e9;
-                                    padding: 20px; border-radius: 4px;
-                                    margin: 20px 0; border-left: 4px
-                                    solid #4caf50;">
-                            <h4 style="color: #1a472a; margin-top: 0;">
-                                Payment Summary
-                            </h4>
-
-                            <table style="width: 100%;
-                                        border-collapse: collapse;">
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Transaction ID:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ transaction_id }}
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Amount:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ currency }} {{ amount }}
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Payment Method:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ payment_method }}
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Date:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ payment_date }}
-                                    </td>
-                                </tr>
-                            </table>
-                        </div>
-
-                        <p>If you have any questions about this payment,
-                        please contact us:</p>
-
-                        <p>
-                            {{ company_name }}<br>
-                            📧 {{ company_email }}<br>
-                            📞 {{ company_phone }}
-                        </p>
-
-                        <p style="color: #7f8c8d; font-size: 12px;
-                                  margin-top: 30px;">
-                            <em>This is an automated receipt. Please keep
-                            this email for your records.</em>
-                        </p>
-                    </div>
-
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 15px; text-align: center;
-                                font-size: 12px;">
-                        <p>© 2026 {{ company_name }}. All rights
-                        reserved.</p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-
-
-
-        html_content = render_template_string(
-            html_template,
+        html_content, plain_text = render_email(
+            'payment_confirmation.html',
             recipient_name=recipient_name,
             transaction_id=transaction_id,
             amount=f"{float(amount):.2f}",
@@ -498,7 +555,45 @@ This is an automated response. Please do not reply to this email.
         return self.send_email(
             recipient_email,
             f"Payment Confirmation - {transaction_id}",
-            html_content
+            html_content,
+            plain_text
+        )
+
+    def send_payment_notification(self, admin_email, customer_name,
+                                  customer_email, transaction_id, amount,
+                                  currency, payment_method, company_name):
+        """
+        Send payment received notification to admin.
+
+        Args:
+            admin_email: Admin email to notify
+            customer_name: Customer name
+            customer_email: Customer email address
+            transaction_id: Transaction ID
+            amount: Payment amount
+            currency: Currency code
+            payment_method: Payment method used
+            company_name: Company name
+
+        Returns:
+            bool: True if successful
+        """
+        html_content, plain_text = render_email(
+            'payment_notification.html',
+            customer_name=customer_name,
+            customer_email=customer_email,
+            transaction_id=transaction_id,
+            amount=f"{float(amount):.2f}",
+            currency=currency,
+            payment_method=payment_method,
+            company_name=company_name
+        )
+
+        return self.send_email(
+            admin_email,
+            f"Payment Received - {currency} {float(amount):.2f}",
+            html_content,
+            plain_text
         )
 
     def send_order_confirmation(self, recipient_email, order_number,
@@ -519,83 +614,8 @@ This is an automated response. Please do not reply to this email.
         Returns:
             bool: True if successful, False otherwise
         """
-        html_template = '''
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6;
-                         color: #333;">
-                <div style="background-color: #1a472a; color: white; padding:
-                            20px; text-align: center;">
-                    <h1>Order Confirmation</h1>
-                </div>
-                
-                <div style="padding: 20px; max-width: 600px; margin: 0 auto;">
-                    <p>Thank you for your order!</p>
-                    
-                    <h3>Order Details:</h3>
-                    <table style="width: 100%; border-collapse: collapse;">
-                        <tr style="background-color: #f5f5f5;">
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                <strong>Order Number:</strong>
-                            </td>
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                {{ order_number }}
-                            </td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                <strong>Order Date:</strong>
-                            </td>
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                {{ order_date }}
-                            </td>
-                        </tr>
-                        <tr style="background-color: #f5f5f5;">
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                <strong>Total Amount:</strong>
-                            </td>
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                R{{ total_amount }}
-                            </td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                <strong>Status:</strong>
-                            </td>
-                            <td style="padding: 10px; border: 1px solid #ddd;">
-                                Pending Processing
-                            </td>
-                        </tr>
-                    </table>
-                    
-                    <h3>Next Steps:</h3>
-                    <ul>
-                        <li>Your order is being processed</li>
-                        <li>You will receive tracking info soon</li>
-                        <li>Questions? Contact us at {{ company_email }}
-                        </li>
-                    </ul>
-                    
-                    <hr style="margin: 20px 0;">
-                    
-                    <div style="background-color: #f5f5f5; padding: 15px;
-                                border-left: 4px solid #f39c12;">
-                        <p><strong>{{ company_name }}</strong></p>
-                        <p>
-                            Email: <a href="mailto:{{ company_email }}">
-                            {{ company_email }}</a><br>
-                            Phone: {{ company_phone }}<br>
-                            Website: 
-                            <a href="http://360degreesupply.co.za">
-                            360degreesupply.co.za</a>
-                        </p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        '''
-
-        html_content = render_template_string(
-            html_template,
+        html_content, plain_text = render_email(
+            'order_confirmation.html',
             order_number=order_number,
             total_amount=f"{float(total_amount):.2f}",
             order_date=datetime.now().strftime('%Y-%m-%d %H:%M'),
@@ -607,7 +627,8 @@ This is an automated response. Please do not reply to this email.
         return self.send_email(
             recipient_email,
             f"Order Confirmation - {order_number}",
-            html_content
+            html_content,
+            plain_text
         )
 
     def send_payment_failed_email(self, recipient_email, recipient_name,
@@ -630,89 +651,8 @@ This is an automated response. Please do not reply to this email.
         Returns:
             bool: True if successful
         """
-        html_template = """
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto;">
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 20px; text-align: center;">
-                        <h2>⚠ Payment Failed</h2>
-                    </div>
-
-                    <div style="padding: 20px; background-color: #f9f9f9;">
-                        <p>Dear {{ recipient_name }},</p>
-
-                        <p>Unfortunately, we were unable to process your
-                        payment for order
-                        <strong>{{ order_number }}</strong>.</p>
-
-                        <div style="background-color: #ffebee;
-                                    padding: 20px; border-radius: 4px;
-                                    margin: 20px 0; border-left: 4px
-                                    solid #f44336;">
-                            <h4 style="color: #c62828; margin-top: 0;">
-                                Error Details
-                            </h4>
-                            <p style="margin: 0;">
-                                <strong>Reason:</strong>
-                                {{ error_message }}
-                            </p>
-                        </div>
-
-                        <h4 style="color: #1a472a;">What Happens Next?</h4>
-                        <ul>
-                            <li>Your order has been saved and is ready for
-                            payment</li>
-                            <li>Please verify your card/payment details and
-                            try again</li>
-                            <li>If the problem persists, please contact us
-                            for assistance</li>
-                        </ul>
-
-                        {% if retry_url %}
-                        <div style="text-align: center; margin: 30px 0;">
-                            <a href="{{ retry_url }}"
-                               style="background-color: #1a472a;
-                                      color: white; padding: 12px 30px;
-                                      text-decoration: none;
-                                      border-radius: 4px;
-                                      display: inline-block;
-                                      font-weight: bold;">
-                                Retry Payment
-                            </a>
-                        </div>
-                        {% endif %}
-
-                        <h4 style="color: #1a472a;">Need Help?</h4>
-                        <p>
-                            Please don't hesitate to contact us:
-                        </p>
-                        <p>
-                            {{ company_name }}<br>
-                            📧 {{ company_email }}<br>
-                            📞 {{ company_phone }}
-                        </p>
-
-                        <p style="color: #7f8c8d; font-size: 12px;
-                                  margin-top: 30px;">
-                            <em>This is an automated notification. Please do
-                            not reply to this email.</em>
-                        </p>
-                    </div>
-
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 15px; text-align: center;
-                                font-size: 12px;">
-                        <p>© 2026 {{ company_name }}. All rights
-                        reserved.</p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-
-        html_content = render_template_string(
-            html_template,
+        html_content, plain_text = render_email(
+            'payment_failed.html',
             recipient_name=recipient_name,
             order_number=order_number,
             error_message=error_message,
@@ -725,7 +665,8 @@ This is an automated response. Please do not reply to this email.
         return self.send_email(
             recipient_email,
             f"Payment Failed - Order {order_number}",
-            html_content
+            html_content,
+            plain_text
         )
 
     def send_refund_email(self, recipient_email, recipient_name,
@@ -750,120 +691,8 @@ This is an automated response. Please do not reply to this email.
         Returns:
             bool: True if successful
         """
-        html_template = """
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto;">
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 20px; text-align: center;">
-                        <h2>💰 Refund Processed</h2>
-                    </div>
-
-                    <div style="padding: 20px; background-color: #f9f9f9;">
-                        <p>Dear {{ recipient_name }},</p>
-
-                        <p>We have successfully processed a refund for your
-                        order. Please see the details below.</p>
-
-                        <div style="background-color: #e8f5e9;
-                                    padding: 20px; border-radius: 4px;
-                                    margin: 20px 0; border-left: 4px
-                                    solid #4caf50;">
-                            <h4 style="color: #2e7d32; margin-top: 0;">
-                                Refund Summary
-                            </h4>
-
-                            <table style="width: 100%;
-                                        border-collapse: collapse;">
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Order Number:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ order_number }}
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Original Transaction:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ transaction_id }}
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Refund Amount:
-                                    </td>
-                                    <td style="padding: 8px;
-                                              color: #2e7d32;
-                                              font-weight: bold;">
-                                    {{ currency }}
-                                    {{ refund_amount }}
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Reason:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ refund_reason }}
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px;
-                                              font-weight: bold;">
-                                    Processed Date:
-                                    </td>
-                                    <td style="padding: 8px;">
-                                    {{ processed_date }}
-                                    </td>
-                                </tr>
-                            </table>
-                        </div>
-
-                        <h4 style="color: #1a472a;">Refund Timeline</h4>
-                        <p>
-                            The refund has been initiated. Please allow
-                            <strong>3-5 business days</strong> for the funds
-                            to appear back in your original payment method.
-                        </p>
-
-                        <h4 style="color: #1a472a;">Questions?</h4>
-                        <p>
-                            If you don't see the refund within 5 business
-                            days or have any questions, please contact us:
-                        </p>
-                        <p>
-                            {{ company_name }}<br>
-                            📧 {{ company_email }}<br>
-                            📞 {{ company_phone }}
-                        </p>
-
-                        <p style="color: #7f8c8d; font-size: 12px;
-                                  margin-top: 30px;">
-                            <em>This is an automated notification. Please
-                            keep this email for your records.</em>
-                        </p>
-                    </div>
-
-                    <div style="background-color: #1a472a; color: white;
-                                padding: 15px; text-align: center;
-                                font-size: 12px;">
-                        <p>© 2026 {{ company_name }}. All rights
-                        reserved.</p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-
-        html_content = render_template_string(
-            html_template,
+        html_content, plain_text = render_email(
+            'refund.html',
             recipient_name=recipient_name,
             order_number=order_number,
             transaction_id=transaction_id,
@@ -879,5 +708,6 @@ This is an automated response. Please do not reply to this email.
         return self.send_email(
             recipient_email,
             f"Refund Processed - Order {order_number}",
-            html_content
+            html_content,
+            plain_text
         )
@@ -0,0 +1,202 @@
+"""
+Email Template Rendering
+Jinja templates under templates/emails/ sharing one layout and stylesheet
+
+CSS is inlined into each template's *source* when Jinja first loads it, so
+the compiled template already carries style="" attributes and a send only
+pays for rendering. The plain-text part is derived from the rendered HTML.
+
+- templates/emails/email.css: simple `tag`, `.class` and `tag.class` rules
+- templates/emails/layout.html: header, content and footer blocks
+- render_email(name, **context) -> (html, text)
+"""
+import os
+import re
+import logging
+from html.parser import HTMLParser
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'emails')
+EMAIL_STYLESHEET = 'email.css'
+
+_SELECTOR = re.compile(r'^([a-z][a-z0-9]*)?(?:\.([\w-]+))?$')
+_START_TAG = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>')
+_ATTR = re.compile(r'\s(class|style)="([^"]*)"')
+
+
+# =====================================================
+# CSS INLINING
+# =====================================================
+
+def parse_stylesheet(css):
+    """
+    Parse simple rules into {selector: declarations}.
+    Anything other than `tag`, `.class` or `tag.class` is skipped with a warning.
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    rules = {}
+    for selectors, body in re.findall(r'([^{}]+)\{([^{}]*)\}', css):
+        declarations = '; '.join(
+            ' '.join(part.split()) for part in body.split(';') if part.strip()
+        )
+        for selector in selectors.split(','):
+            selector = selector.strip()
+            match = _SELECTOR.match(selector)
+            if not match or not any(match.groups()):
+                logger.warning(f"Email CSS selector not inlinable, skipped: {selector}")
+                continue
+            rules[selector] = f"{rules[selector]}; {declarations}" if selector in rules else declarations
+    return rules
+
+
+def inline_css(source, rules):
+    """
+    Copy matching rules into each start tag's style attribute.
+    Order: tag rules, then class rules, then the tag's own style="".
+    Tags with a templated class attribute are left alone.
+    """
+    def inline(match):
+        tag, attrs, closing = match.group(1).lower(), match.group(2) or '', match.group(3)
+        found = dict(_ATTR.findall(attrs))
+        classes = found.get('class', '')
+        if '{' in classes:
+            return match.group(0)
+
+        styles = [rules[tag]] if tag in rules else []
+        for name in classes.split():
+            for selector in (f'.{name}', f'{tag}.{name}'):
+                if selector in rules:
+                    styles.append(rules[selector])
+        if not styles:
+            return match.group(0)
+        if found.get('style'):
+            styles.append(found['style'])
+
+        # Later declarations replace earlier ones for the same property
+        merged = {}
+        for declaration in '; '.join(styles).split(';'):
+            prop, _, value = declaration.partition(':')
+            if value.strip():
+                merged.pop(prop.strip(), None)
+                merged[prop.strip()] = value.strip()
+        style = '; '.join(f'{prop}: {value}' for prop, value in merged.items())
+
+        attrs = _ATTR.sub(lambda a: '' if a.group(1) == 'style' else a.group(0), attrs)
+        return f'<{match.group(1)}{attrs} style="{style}"{closing}>'
+
+    return _START_TAG.sub(inline, source)
+
+
+class InliningLoader(FileSystemLoader):
+    """FileSystemLoader that inlines the shared stylesheet into .html sources"""
+
+    def __init__(self, searchpath, stylesheet=EMAIL_STYLESHEET):
+        super().__init__(searchpath)
+        self.stylesheet = stylesheet
+        self.inlined = 0
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        if not template.endswith('.html'):
+            return source, filename, uptodate
+
+        css, css_path, css_uptodate = super().get_source(environment, self.stylesheet)
+        self.inlined += 1
+        return (
+            inline_css(source, parse_stylesheet(css)), filename,
+            lambda: uptodate() and css_uptodate()
+        )
+
+
+# =====================================================
+# PLAIN TEXT
+# =====================================================
+
+class _TextExtractor(HTMLParser):
+    """Readable plain text from email HTML: blocks become lines, links keep their URL"""
+
+    BLOCKS = {'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'tr', 'ul', 'ol', 'hr'}
+    SKIP = {'head', 'style', 'script', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+        self._href = None
+        self._link_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag in self.BLOCKS:
+            self.parts.append('\n\n' if tag in ('p', 'h1', 'h2', 'h3', 'h4', 'table', 'ul', 'ol') else '\n')
+            if tag == 'hr':
+                self.parts.append('-' * 40 + '\n')
+        elif tag == 'br':
+            self.parts.append('\n')
+        elif tag == 'li':
+            self.parts.append('\n- ')
+        elif tag == 'td':
+            self.parts.append(' ')
+        elif tag == 'a':
+            self._href = dict(attrs).get('href')
+            self._link_text = []
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip -= 1
+        elif tag in self.BLOCKS and tag not in ('div', 'tr'):
+            self.parts.append('\n')
+        elif tag == 'a' and self._href:
+            text = ' '.join(''.join(self._link_text).split())
+            if not self._href.startswith(('mailto:', 'tel:')) and self._href != text:
+                self.parts.append(f' ({self._href})')
+            self._href = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        data = re.sub(r'\s+', ' ', data)  # source line breaks are not text breaks
+        self.parts.append(data)
+        if self._href:
+            self._link_text.append(data)
+
+    def text(self):
+        lines = (' '.join(line.split()) for line in ''.join(self.parts).split('\n'))
+        return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip() + '\n'
+
+
+def html_to_text(html):
+    """Plain-text alternative for a rendered email"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+# =====================================================
+# RENDERING
+# =====================================================
+
+email_env = Environment(
+    loader=InliningLoader(EMAIL_TEMPLATE_DIR),
+    autoescape=select_autoescape(['html']),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    # Templates are compiled once per process; reload only while developing
+    auto_reload=os.getenv('FLASK_ENV') == 'development',
+)
+
+
+def render_email(template_name, **context):
+    """
+    Render an email template.
+
+    Returns:
+        tuple: (html, plain_text)
+    """
+    html = email_env.get_template(template_name).render(**context)
+    return html, html_to_text(html)
@@ -1,10 +1,21 @@
 """
 Real Email Validation - DNS MX Record Verification
 Ensures only real, existing email addresses are accepted
+
+MX results are cached per domain (not per address) for the record's DNS
+TTL, NXDOMAIN / no-MX answers are cached negatively, and the large mail
+providers are accepted without a lookup. Each lookup has a hard time
+budget; verify_email_exists_async() does the same check on asyncio.
 """
+import os
 import re
+import time
+import threading
+from collections import OrderedDict
+
+import dns.exception
 import dns.resolver
-from functools import lru_cache
+import dns.asyncresolver
 
 # Pre-compiled regex for email format
 EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
@@ -15,48 +26,215 @@ DISPOSABLE_DOMAINS = frozenset([
     'throwaway.email', 'temp-mail.org', 'fakeinbox.com', 'trashmail.com'
 ])
 
-@lru_cache(maxsize=1000)
-def verify_email_exists(email):
+# Providers known to accept mail: no lookup needed
+KNOWN_MAIL_PROVIDERS = frozenset([
+    'gmail.com', 'googlemail.com', 'outlook.com', 'hotmail.com', 'live.com',
+    'msn.com', 'yahoo.com', 'ymail.com', 'icloud.com', 'me.com', 'mac.com',
+    'aol.com', 'proton.me', 'protonmail.com', 'gmx.com', 'gmx.net', 'zoho.com',
+    'yandex.com', 'mail.com',
+    # South African ISPs
+    'webmail.co.za', 'vodamail.co.za', 'telkomsa.net', 'mweb.co.za',
+    'absamail.co.za', 'iafrica.com', 'afrihost.co.za',
+])
+
+MX_LOOKUP_TIMEOUT = float(os.getenv('MX_LOOKUP_TIMEOUT', 2.0))  # total seconds per lookup
+MX_CACHE_SIZE = int(os.getenv('MX_CACHE_SIZE', 5000))
+MX_CACHE_MIN_TTL = 60
+MX_CACHE_MAX_TTL = 86400
+MX_NEGATIVE_TTL = int(os.getenv('MX_NEGATIVE_TTL', 900))
+
+
+class DomainCache:
+    """Thread-safe LRU of per-domain results, each with its own expiry"""
+
+    def __init__(self, max_entries=MX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # domain -> (result, expires_at)
+        self._stats = {'hits': 0, 'misses': 0, 'negative': 0, 'allowlisted': 0,
+                       'timeouts': 0, 'errors': 0}
+
+    def get(self, domain):
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(domain)
+                self._stats['hits'] += 1
+                return entry[0]
+            if entry:
+                del self._entries[domain]
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, domain, result, ttl):
+        with self._lock:
+            self._entries[domain] = (result, time.monotonic() + ttl)
+            self._entries.move_to_end(domain)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if not result[0]:
+                self._stats['negative'] += 1
+
+    def count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, hit_rate, negative, allowlisted, timeouts, errors, entries
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+mx_cache = DomainCache()
+
+
+def make_resolver(nameservers=None, port=53, timeout=MX_LOOKUP_TIMEOUT, resolver_class=dns.resolver.Resolver):
     """
-    Verify email address exists by checking DNS MX records
-    Returns: (is_valid, error_message)
+    Resolver with a hard budget: `timeout` covers all retries and servers.
+
+    Args:
+        nameservers: Override /etc/resolv.conf (e.g. a local stub in tests)
+        port: Nameserver port
+        timeout: Total seconds a lookup may take
+        resolver_class: dns.resolver.Resolver or dns.asyncresolver.Resolver
+    """
+    try:
+        resolver = resolver_class(configure=nameservers is None)
+    except dns.resolver.NoResolverConfiguration:
+        # No /etc/resolv.conf: lookups fail open (see _error_result)
+        resolver = resolver_class(configure=False)
+    if nameservers is not None:
+        resolver.nameservers = list(nameservers)
+        resolver.port = port
+    resolver.lifetime = timeout
+    resolver.timeout = timeout / 2  # per server attempt, leaves room for one retry
+    return resolver
+
+
+mx_resolver = make_resolver()
+mx_async_resolver = make_resolver(resolver_class=dns.asyncresolver.Resolver)
+
+
+def _parse_address(email):
+    """
+    Returns:
+        tuple: (domain, None) or (None, error_message)
     """
-    # Basic format validation
     if not email or not isinstance(email, str):
-        return False, "Email is required"
-    
+        return None, "Email is required"
+
     email = email.strip().lower()
-    
+
     # Check format
     if not EMAIL_REGEX.match(email):
-        return False, "Invalid email format"
-    
+        return None, "Invalid email format"
+
     # Extract domain
-    try:
-        domain = email.split('@')[1]
-    except IndexError:
-        return False, "Invalid email format"
-    
+    domain = email.rsplit('@', 1)[1]
+
     # Block disposable email domains
     if domain in DISPOSABLE_DOMAINS:
-        return False, "Disposable email addresses are not allowed"
-    
-    # Check DNS MX records (verify domain can receive emails)
+        return None, "Disposable email addresses are not allowed"
+    return domain, None
+
+
+def _answer_result(domain, answer):
+    """(result, ttl) for a successful MX answer"""
+    if not answer.rrset:
+        return (False, f"Email domain '{domain}' cannot receive emails"), MX_NEGATIVE_TTL
+    ttl = min(max(answer.rrset.ttl, MX_CACHE_MIN_TTL), MX_CACHE_MAX_TTL)
+    return (True, None), ttl
+
+
+def _error_result(domain, error):
+    """
+    (result, ttl) for a failed lookup; ttl None means do not cache.
+    Timeouts and resolver trouble are never cached.
+    """
+    if isinstance(error, dns.resolver.NXDOMAIN):
+        return (False, f"Email domain '{domain}' does not exist"), MX_NEGATIVE_TTL
+    if isinstance(error, dns.resolver.NoAnswer):
+        return (False, f"Email domain '{domain}' has no mail server"), MX_NEGATIVE_TTL
+    if isinstance(error, (dns.resolver.LifetimeTimeout, dns.exception.Timeout)):
+        mx_cache.count('timeouts')
+        return (False, "Email verification timeout - please try again"), None
+    # In production, log this error but allow the email
+    # (don't block users due to DNS issues)
+    mx_cache.count('errors')
+    return (True, None), None
+
+
+def _cached(domain):
+    """Allowlisted or cached result, or None if a lookup is needed"""
+    if domain in KNOWN_MAIL_PROVIDERS:
+        mx_cache.count('allowlisted')
+        return (True, None)
+    return mx_cache.get(domain)
+
+
+def _store(domain, result, ttl):
+    if ttl is not None:
+        mx_cache.set(domain, result, ttl)
+    return result
+
+
+def check_domain(domain, resolver=None):
+    """
+    Verify a domain can receive mail (DNS MX), using the cache.
+
+    Returns:
+        tuple: (is_valid, error_message)
+    """
+    result = _cached(domain)
+    if result is not None:
+        return result
+    try:
+        answer = (resolver or mx_resolver).resolve(domain, 'MX')
+    except Exception as e:
+        return _store(domain, *_error_result(domain, e))
+    return _store(domain, *_answer_result(domain, answer))
+
+
+async def check_domain_async(domain, resolver=None):
+    """check_domain() on asyncio (dns.asyncresolver); shares the same cache"""
+    result = _cached(domain)
+    if result is not None:
+        return result
     try:
-        mx_records = dns.resolver.resolve(domain, 'MX')
-        if not mx_records:
-            return False, f"Email domain '{domain}' cannot receive emails"
-        return True, None
-    except dns.resolver.NXDOMAIN:
-        return False, f"Email domain '{domain}' does not exist"
-    except dns.resolver.NoAnswer:
-        return False, f"Email domain '{domain}' has no mail server"
-    except dns.resolver.Timeout:
-        return False, "Email verification timeout - please try again"
+        answer = await (resolver or mx_async_resolver).resolve(domain, 'MX')
     except Exception as e:
-        # In production, log this error but allow the email
-        # (don't block users due to DNS issues)
-        return True, None
+        return _store(domain, *_error_result(domain, e))
+    return _store(domain, *_answer_result(domain, answer))
+
+
+def verify_email_exists(email):
+    """
+    Verify email address exists by checking DNS MX records
+    Returns: (is_valid, error_message)
+    """
+    domain, error = _parse_address(email)
+    if error:
+        return False, error
+    return check_domain(domain)
+
+
+async def verify_email_exists_async(email):
+    """verify_email_exists() without blocking the event loop"""
+    domain, error = _parse_address(email)
+    if error:
+        return False, error
+    return await check_domain_async(domain)
+
 
 def validate_email_for_registration(email):
     """
@@ -64,10 +242,10 @@ def validate_email_for_registration(email):
     Stricter validation - must be real, existing email
     """
     is_valid, error = verify_email_exists(email)
-    
+
     if not is_valid:
         return False, error
-    
+
     return True, None
 
 def validate_email_for_login(email):
@@ -76,10 +254,10 @@ def validate_email_for_login(email):
     """
     if not email or not isinstance(email, str):
         return False, "Email is required"
-    
+
     email = email.strip().lower()
-    
+
     if not EMAIL_REGEX.match(email):
         return False, "Invalid email format"
-    
+
     return True, None
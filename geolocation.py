@@ -6,9 +6,32 @@ Supports both GeoIP2 and fallback methods.
 import requests
 from flask import request
 import logging
+from resilience import get_breaker, DependencyUnavailableError
 
 logger = logging.getLogger(__name__)
 
+# Lookup failures (timeouts, refused connections, 5xx) trip the breaker;
+# while open, lookups fall through to the next provider immediately.
+_LOOKUP_FAILURES = (requests.exceptions.RequestException,)
+primary_breaker = get_breaker(
+    'geoip_primary', failure_threshold=3, recovery_timeout=60,
+    failure_exceptions=_LOOKUP_FAILURES, max_concurrent=8
+)
+fallback_breaker = get_breaker(
+    'geoip_fallback', failure_threshold=3, recovery_timeout=60,
+    failure_exceptions=_LOOKUP_FAILURES, max_concurrent=8
+)
+
+
+def _fetch_json(url):
+    """GET a GeoIP endpoint; raises on transport errors and 5xx responses"""
+    response = requests.get(url, timeout=(2, 3))
+    if response.status_code >= 500:
+        response.raise_for_status()
+    if response.status_code != 200:
+        return None
+    return response.json()
+
 # List of South African country codes and identifiers
 SOUTH_AFRICA_CODES = ['ZA', 'South Africa', 'za']
 
@@ -56,8 +79,12 @@ class GeolocationService:
             dict: Contains 'country_code', 'country_name', 'success' keys
         """
         if not ip_address:
+            # Cloudflare already geolocated the visitor: no lookup needed
+            country = request.environ.get('HTTP_CF_IPCOUNTRY', '').upper()
+            if country:
+                return self._from_cloudflare(country)
             ip_address = self.get_client_ip()
-        
+
         # Skip lookup for localhost/development
         if ip_address in ['127.0.0.1', 'localhost', '::1']:
             return {
@@ -70,12 +97,10 @@ class GeolocationService:
         
         # Try primary API: ip-api.com
         try:
-            response = requests.get(
-                f'http://ip-api.com/json/{ip_address}',
-                timeout=5
+            data = primary_breaker.call(
+                _fetch_json, f'http://ip-api.com/json/{ip_address}'
             )
-            if response.status_code == 200:
-                data = response.json()
+            if data:
                 if data.get('status') == 'success':
                     return {
                         'country_code': data.get('countryCode', '').upper(),
@@ -85,18 +110,18 @@ class GeolocationService:
                         'success': True,
                         'is_local': data.get('countryCode', '').upper() == 'ZA'
                     }
+        except DependencyUnavailableError as e:
+            logger.debug(f"Primary GeoIP skipped: {e}")
         except Exception as e:
             msg = f"Primary GeoIP lookup failed for {ip_address}: {e}"
             logger.warning(msg)
         
         # Fallback API: ipapi.co
         try:
-            response = requests.get(
-                f'https://ipapi.co/{ip_address}/json/',
-                timeout=5
+            data = fallback_breaker.call(
+                _fetch_json, f'https://ipapi.co/{ip_address}/json/'
             )
-            if response.status_code == 200:
-                data = response.json()
+            if data:
                 country_code = data.get('country_code', '').upper()
                 if country_code:
                     return {
@@ -107,6 +132,8 @@ class GeolocationService:
                         'success': True,
                         'is_local': country_code == 'ZA'
                     }
+        except DependencyUnavailableError as e:
+            logger.debug(f"Fallback GeoIP skipped: {e}")
         except Exception as e:
             msg = f"Fallback GeoIP lookup failed for {ip_address}: {e}"
             logger.warning(msg)
@@ -121,6 +148,24 @@ class GeolocationService:
             'error': 'Could not determine location'
         }
     
+    @staticmethod
+    def _from_cloudflare(country):
+        """Result for a CF-IPCountry header (XX: unknown, T1: Tor)"""
+        if country in ('XX', 'T1'):
+            return {
+                'country_code': 'UNKNOWN',
+                'country_name': 'Unknown',
+                'success': False,
+                'is_local': False,
+                'error': 'Could not determine location'
+            }
+        return {
+            'country_code': country,
+            'country_name': 'South Africa' if country == 'ZA' else country,
+            'success': True,
+            'is_local': country == 'ZA'
+        }
+
     def is_local_customer(self, ip_address=None):
         """
         Determine if customer is from South Africa.
@@ -15,7 +15,7 @@ worker_class = 'sync'
 worker_connections = 1000
 max_requests = 1000  # Restart workers after this many requests (prevents memory leaks)
 max_requests_jitter = 50
-timeout = 120  # Increased for long-running requests (OCR processing)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))  # OCR runs in the ocr_worker process, not here
 keepalive = 5
 
 # Threading
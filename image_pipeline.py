@@ -0,0 +1,461 @@
+"""
+Responsive Image Derivatives
+Resized WebP / AVIF / JPEG variants for uploaded and static images
+
+Uploads (save_upload_file, hero images, direct-to-bucket product images) queue
+their variants with queue_image_variants(): a background thread per process
+encodes them after the response, so no request waits on 3 formats x 4 widths.
+Existing images are backfilled on a process pool.
+Variants are stripped of EXIF/XMP metadata (the ICC profile is kept) and
+never upscaled. Their URLs are recorded in image_variant_sets so templates
+can emit srcset through the picture() and image_set() helpers.
+
+Usage:
+    python image_pipeline.py                  # Backfill DB-referenced and static images
+    python image_pipeline.py --static-only --workers 4
+    python image_pipeline.py --force          # Regenerate existing variant sets
+"""
+import os
+import io
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+
+from flask import current_app
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps, features
+
+from models import db, ImageVariantSet
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANT_WIDTHS = tuple(
+    int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,1024,1600').split(',')
+)
+AVIF_AVAILABLE = features.check('avif') and os.getenv('IMAGE_VARIANT_AVIF', 'True') == 'True'
+
+# (mime type, extension, Pillow format, save options), most efficient first
+IMAGE_VARIANT_FORMATS = (
+    [('image/avif', 'avif', 'AVIF', {'quality': 55, 'speed': 8})] if AVIF_AVAILABLE else []
+) + [
+    ('image/webp', 'webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('image/jpeg', 'jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+]
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_IMAGE_DIRS = ('uploads', 'images', 'hero')
+STATIC_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+VARIANT_DIR = 'variants'
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', os.cpu_count() or 2))
+# Background encoders per web process for new uploads
+IMAGE_VARIANT_QUEUE_WORKERS = int(os.getenv('IMAGE_VARIANT_QUEUE_WORKERS', 1))
+
+# source_url -> (variants or None, recheck_after); misses are rechecked
+# because another worker may have generated the set since
+VARIANT_LOOKUP_MISS_TTL = 60
+VARIANT_LOOKUP_CACHE_SIZE = 4096
+_variant_lookup = {}
+
+
+# =====================================================
+# RENDERING (pure, runs in the process pool)
+# =====================================================
+
+def render_variants(data, widths=IMAGE_VARIANT_WIDTHS, formats=None):
+    """
+    Decode an image and encode every width x format derivative.
+
+    Returns:
+        tuple: (width, height, [(mime, ext, variant_width, bytes), ...])
+    """
+    formats = IMAGE_VARIANT_FORMATS if formats is None else formats
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        icc_profile = source.info.get('icc_profile')
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Never upscale: widths above the original collapse to the original
+    targets = sorted({width for width in widths if width < image.width} | {min(image.width, max(widths))})
+    rendered = []
+    for width in targets:
+        if width == image.width:
+            resized = image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        flat = None
+        for mime, ext, pillow_format, options in formats:
+            frame = resized
+            if pillow_format == 'JPEG' and has_alpha:
+                if flat is None:
+                    flat = Image.new('RGB', resized.size, (255, 255, 255))
+                    flat.paste(resized, mask=resized.getchannel('A'))
+                frame = flat
+            frame.info = {}  # drop EXIF / XMP / comments
+            out = io.BytesIO()
+            save_options = dict(options, icc_profile=icc_profile) if icc_profile else options
+            frame.save(out, format=pillow_format, **save_options)
+            rendered.append((mime, ext, width, out.getvalue()))
+    return image.width, image.height, rendered
+
+
+def _render_static_file(path):
+    """Process-pool entry point for a file on local disk"""
+    with open(path, 'rb') as f:
+        return render_variants(f.read())
+
+
+# =====================================================
+# STORAGE
+# =====================================================
+
+def _static_relpath(source_url):
+    """Path under static/ for a local image URL, or None for bucket URLs"""
+    if not source_url or '://' in source_url:
+        return None
+    path = source_url.lstrip('/')
+    if path.startswith('static/'):
+        path = path[len('static/'):]
+    return path
+
+
+def _variant_name(path, width, ext):
+    """uploads/x.jpg -> uploads/variants/x-640w.webp"""
+    directory, filename = os.path.split(path)
+    stem = filename.rsplit('.', 1)[0]
+    return '/'.join(part for part in (directory, VARIANT_DIR, f'{stem}-{width}w.{ext}') if part)
+
+
+def store_variants(source_url, rendered):
+    """
+    Write rendered variants next to their source: into the bucket for
+    uploaded images, under static/<dir>/variants/ for local files.
+
+    Returns:
+        dict: {mime: {width: url}}
+    """
+    relpath = _static_relpath(source_url)
+    if relpath is None:
+        from s3_storage import storage_service
+        source_key = storage_service.key_from_url(source_url)
+        if not source_key:
+            raise ValueError(f'Not a stored image: {source_url}')
+
+    variants = {}
+    for mime, ext, width, data in rendered:
+        if relpath is None:
+            key = _variant_name(source_key, width, ext)
+            storage_service.upload_stream(io.BytesIO(data), key, content_type=mime)
+            url = storage_service.get_file_url(key)
+        else:
+            name = _variant_name(relpath, width, ext)
+            path = os.path.join(STATIC_ROOT, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            url = f'/static/{name}'
+        variants.setdefault(mime, {})[str(width)] = url
+    return variants
+
+
+def record_variants(source_url, width, height, variants):
+    """Upsert the variant set (added to the caller's session)"""
+    row = ImageVariantSet.query.filter_by(source_url=source_url).first()
+    if row is None:
+        row = ImageVariantSet(source_url=source_url)
+        db.session.add(row)
+    row.width = width
+    row.height = height
+    row.variants = json.dumps(variants)
+    _variant_lookup[source_url] = (variants, 0)
+    return row
+
+
+def create_image_variants(source_url, data):
+    """
+    Generate, store and record derivatives for a freshly uploaded image.
+    Failures are logged and never fail the upload itself.
+
+    Returns:
+        dict: {mime: {width: url}} or None
+    """
+    try:
+        width, height, rendered = render_variants(data)
+        variants = store_variants(source_url, rendered)
+        record_variants(source_url, width, height, variants)
+        logger.info(f"Image variants created for {source_url}: {len(rendered)} file(s)")
+        return variants
+    except Exception as e:
+        logger.warning(f"Image variants skipped for {source_url}: {e}")
+        return None
+
+
+def _read_source(source_url):
+    """Bytes of a stored image: from static/ for local URLs, else from the bucket"""
+    relpath = _static_relpath(source_url)
+    if relpath is not None:
+        with open(os.path.join(STATIC_ROOT, *relpath.split('/')), 'rb') as f:
+            return f.read()
+    from s3_storage import storage_service
+    data = storage_service.get_file_bytes(source_url)
+    if data is None:
+        raise IOError(f'Could not download {source_url}')
+    return data
+
+
+# =====================================================
+# UPLOAD QUEUE
+# =====================================================
+
+_variant_queue = None
+_variant_queue_lock = threading.Lock()
+_pending_variants = set()
+
+
+def _variants_job(app, source_url, data):
+    with app.app_context():
+        try:
+            if data is None:
+                data = _read_source(source_url)
+            if create_image_variants(source_url, data) is not None:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Image variants skipped for {source_url}: {e}")
+
+
+def queue_image_variants(source_url, data=None):
+    """
+    Generate variants for a freshly stored image after the request.
+    Pages render the plain image until the variant set is recorded.
+
+    Args:
+        source_url: Stored image URL (bucket or /static/...)
+        data: Uploaded bytes, or None to read the stored image
+
+    Returns:
+        Future
+    """
+    global _variant_queue
+    app = current_app._get_current_object()
+    with _variant_queue_lock:
+        if _variant_queue is None:
+            _variant_queue = ThreadPoolExecutor(max_workers=IMAGE_VARIANT_QUEUE_WORKERS,
+                                                thread_name_prefix='image-variants')
+        future = _variant_queue.submit(_variants_job, app, source_url, data)
+        _pending_variants.add(future)
+    future.add_done_callback(_pending_variants.discard)
+    return future
+
+
+def wait_for_queued_variants(timeout=None):
+    """Block until queued variants are written; True if none are left"""
+    with _variant_queue_lock:
+        pending = set(_pending_variants)
+    return not wait(pending, timeout=timeout).not_done
+
+
+def delete_image_and_variants(source_url):
+    """
+    Queue a bucket image and its stored variants for deletion and drop the
+    variant set (committed here). Local static files are left alone.
+    """
+    from s3_storage import storage_service
+    if _static_relpath(source_url) is not None:
+        return
+    row = ImageVariantSet.query.filter_by(source_url=source_url).first()
+    if row:
+        for urls in json.loads(row.variants).values():
+            for url in urls.values():
+                storage_service.delete_file(url)
+        db.session.delete(row)
+        db.session.commit()
+    _variant_lookup.pop(source_url, None)
+    storage_service.delete_file(source_url)
+
+
+# =====================================================
+# TEMPLATE HELPERS
+# =====================================================
+
+def get_variants(source_url):
+    """Variant URLs for an image, from the per-process lookup cache"""
+    if not source_url:
+        return None
+    now = time.monotonic()
+    cached = _variant_lookup.get(source_url)
+    if cached and (cached[0] is not None or cached[1] > now):
+        return cached[0]
+
+    row = ImageVariantSet.query.filter_by(source_url=source_url).first()
+    variants = json.loads(row.variants) if row else None
+    if len(_variant_lookup) >= VARIANT_LOOKUP_CACHE_SIZE:
+        _variant_lookup.clear()
+    _variant_lookup[source_url] = (variants, now + VARIANT_LOOKUP_MISS_TTL)
+    return variants
+
+
+def srcset(urls):
+    """'url 320w, url 640w' from {width: url}"""
+    return ', '.join(f'{url} {width}w' for width, url in sorted(urls.items(), key=lambda item: int(item[0])))
+
+
+def picture(src, alt='', sizes='100vw', **attrs):
+    """
+    <picture> with AVIF/WebP sources and a JPEG srcset on the <img>; falls
+    back to a plain <img> until variants exist. Keyword arguments become
+    <img> attributes (class_ -> class, data_x -> data-x).
+    """
+    img_attrs = ''.join(
+        f' {escape(name.rstrip("_").replace("_", "-"))}="{escape(value)}"' for name, value in attrs.items()
+    )
+    variants = get_variants(src)
+    if not variants:
+        return Markup(f'<img src="{escape(src)}" alt="{escape(alt)}"{img_attrs}>')
+
+    sources = ''.join(
+        f'<source type="{mime}" srcset="{escape(srcset(variants[mime]))}" sizes="{escape(sizes)}">'
+        for mime in ('image/avif', 'image/webp') if mime in variants
+    )
+    fallback = variants.get('image/jpeg')
+    img_srcset = f' srcset="{escape(srcset(fallback))}" sizes="{escape(sizes)}"' if fallback else ''
+    return Markup(
+        f'<picture style="display: contents">{sources}'
+        f'<img src="{escape(src)}"{img_srcset} alt="{escape(alt)}"{img_attrs}></picture>'
+    )
+
+
+def image_set(src, max_width=1600):
+    """
+    CSS image-set() of the largest variant per format up to max_width, for
+    background images (single-quoted, safe inside a style attribute). Use
+    after a plain url() declaration as the fallback.
+    """
+    variants = get_variants(src)
+    if not variants:
+        return Markup(f"url('{escape(src)}')")
+
+    candidates = []
+    for mime in ('image/avif', 'image/webp', 'image/jpeg'):
+        widths = sorted((int(width) for width in variants.get(mime, {})), reverse=True)
+        fitting = [width for width in widths if width <= max_width] or widths[-1:]
+        if fitting:
+            candidates.append(f"url('{escape(variants[mime][str(fitting[0])])}') type('{mime}')")
+    return Markup(f'image-set({", ".join(candidates)})')
+
+
+# =====================================================
+# BACKFILL
+# =====================================================
+
+def referenced_image_urls():
+    """Every image URL stored on a model that templates render"""
+    from models import (
+        Product, Service, HeroSection, ContentSection, Testimonial, CompanyInfo, HomePageSettings
+    )
+    columns = (
+        Product.image_url, Service.image_url, HeroSection.background_image, ContentSection.image_url,
+        Testimonial.avatar_url, CompanyInfo.logo_url, HomePageSettings.hero_image,
+    )
+    urls = set()
+    for column in columns:
+        urls.update(value for (value,) in db.session.query(column).filter(column.isnot(None)).distinct())
+    return {url for url in urls if url.lower().endswith(STATIC_IMAGE_EXTENSIONS)}
+
+
+def static_image_urls():
+    """Images shipped under static/uploads, static/images and static/hero"""
+    urls = set()
+    for directory in STATIC_IMAGE_DIRS:
+        root = os.path.join(STATIC_ROOT, directory)
+        if not os.path.isdir(root):
+            continue
+        for name in sorted(os.listdir(root)):
+            if name.lower().endswith(STATIC_IMAGE_EXTENSIONS):
+                urls.add(f'/static/{directory}/{name}')
+    return urls
+
+
+def _submit_render(pool, source_url):
+    """Local files are read by the worker; bucket objects are downloaded here"""
+    relpath = _static_relpath(source_url)
+    if relpath is not None:
+        return pool.submit(_render_static_file, os.path.join(STATIC_ROOT, *relpath.split('/')))
+    return pool.submit(render_variants, _read_source(source_url))
+
+
+def backfill(workers=IMAGE_PIPELINE_WORKERS, include_db=True, include_static=True, force=False):
+    """
+    Generate variants for existing images on a process pool.
+
+    Returns:
+        dict: created, skipped, failed counts
+    """
+    urls = set()
+    if include_db:
+        urls |= referenced_image_urls()
+    if include_static:
+        urls |= static_image_urls()
+    if not force:
+        done = {url for (url,) in db.session.query(ImageVariantSet.source_url)}
+        skipped = len(urls & done)
+        urls -= done
+    else:
+        skipped = 0
+
+    print(f"{len(urls)} image(s) to process ({skipped} already have variants)")
+    report = {'created': 0, 'skipped': skipped, 'failed': 0}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for url in sorted(urls):
+            try:
+                futures[_submit_render(pool, url)] = url
+            except Exception as e:
+                print(f"  FAILED {url}: {e}")
+                report['failed'] += 1
+
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                width, height, rendered = future.result()
+                variants = store_variants(url, rendered)
+                record_variants(url, width, height, variants)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"  FAILED {url}: {e}")
+                report['failed'] += 1
+                continue
+            report['created'] += 1
+            size = sum(len(data) for _, _, _, data in rendered)
+            print(f"  {url}: {len(rendered)} variant(s), {size / 1024:.0f} KB")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s: " +
+          ', '.join(f'{key}={value}' for key, value in report.items()))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill responsive image variants')
+    parser.add_argument('--workers', type=int, default=IMAGE_PIPELINE_WORKERS, help='Encoding processes')
+    parser.add_argument('--static-only', action='store_true', help='Only images under static/')
+    parser.add_argument('--db-only', action='store_true', help='Only images referenced in the database')
+    parser.add_argument('--force', action='store_true', help='Regenerate images that already have variants')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    from app import app
+
+    with app.app_context():
+        try:
+            backfill(workers=args.workers, include_db=not args.static_only,
+                     include_static=not args.db_only, force=args.force)
+        except KeyboardInterrupt:
+            sys.exit(1)
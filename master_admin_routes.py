@@ -7,6 +7,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'models'))
 from master_admin import SecurityEvent, UserActivity, SystemLog
 from security_models import BlockedIP, SystemControl, UserPermission, DetailedLog
 from models import db, User, Product, Order, AuditLog, Customer, Invoice, Transaction, Service, Testimonial
+from content_versions import content_versions
 from sqlalchemy import inspect, text, func, desc
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
@@ -241,6 +242,7 @@ def delete_product(product_id):
     name = product.name
     db.session.delete(product)
     db.session.commit()
+    content_versions.invalidate('catalog')
     log_audit(current_user.id, 'deleted_product', 'products', product_id, severity='warning')
     flash(f'Product {name} deleted successfully', 'success')
     return redirect(url_for('master_admin.products'))
@@ -341,6 +343,7 @@ def delete_service(service_id):
     title = service.title
     db.session.delete(service)
     db.session.commit()
+    content_versions.invalidate('catalog')
     log_audit(current_user.id, 'deleted_service', 'services', service_id)
     flash(f'Service {title} deleted successfully', 'success')
     return redirect(url_for('master_admin.manage_services'))
@@ -360,6 +363,7 @@ def delete_testimonial(testimonial_id):
     name = testimonial.client_name
     db.session.delete(testimonial)
     db.session.commit()
+    content_versions.invalidate('catalog')
     log_audit(current_user.id, 'deleted_testimonial', 'testimonials', testimonial_id)
     flash(f'Testimonial from {name} deleted successfully', 'success')
     return redirect(url_for('master_admin.manage_testimonials'))
@@ -0,0 +1,42 @@
+"""Add email_outbox table for transactional email delivery
+
+Revision ID: email_outbox
+Revises: image_variants
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'email_outbox'
+down_revision = 'image_variants'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('template', sa.String(64), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('recipient', sa.String(255), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.create_index('ix_email_outbox_recipient', ['recipient'], unique=False)
+        batch_op.create_index('ix_email_outbox_status', ['status'], unique=False)
+        batch_op.create_index('ix_email_outbox_sent_at', ['sent_at'], unique=False)
+
+
+def downgrade():
+    op.drop_table('email_outbox')
@@ -0,0 +1,35 @@
+"""Add image_variant_sets table for responsive image derivatives
+
+Revision ID: image_variants
+Revises: pop_content_hash
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'image_variants'
+down_revision = 'pop_content_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_variant_sets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_url', sa.String(500), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('variants', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    with op.batch_alter_table('image_variant_sets', schema=None) as batch_op:
+        batch_op.create_index('ix_image_variant_sets_source_url', ['source_url'], unique=True)
+
+
+def downgrade():
+    op.drop_table('image_variant_sets')
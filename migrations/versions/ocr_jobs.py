@@ -0,0 +1,40 @@
+"""Add ocr_jobs table for asynchronous proof-of-payment OCR
+
+Revision ID: ocr_jobs
+Revises: phase2_security
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ocr_jobs'
+down_revision = 'phase2_security'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ocr_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('proof_of_payment_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['proof_of_payment_id'], ['proof_of_payments.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    with op.batch_alter_table('ocr_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_ocr_jobs_proof_of_payment_id', ['proof_of_payment_id'], unique=False)
+        batch_op.create_index('ix_ocr_jobs_status', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_table('ocr_jobs')
@@ -0,0 +1,35 @@
+"""Add content hash and duplicate link to proof_of_payments
+
+Revision ID: pop_content_hash
+Revises: ocr_jobs
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'pop_content_hash'
+down_revision = 'ocr_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('proof_of_payments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(64), nullable=True))
+        batch_op.add_column(sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_proof_of_payments_content_hash', ['content_hash'], unique=False)
+        batch_op.create_foreign_key(
+            'fk_proof_of_payments_duplicate_of', 'proof_of_payments',
+            ['duplicate_of_id'], ['id']
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('proof_of_payments', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_proof_of_payments_duplicate_of', type_='foreignkey')
+        batch_op.drop_index('ix_proof_of_payments_content_hash')
+        batch_op.drop_column('duplicate_of_id')
+        batch_op.drop_column('content_hash')
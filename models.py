@@ -759,6 +759,7 @@ class ProofOfPayment(db.Model):
     file_name = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)  # pdf, jpg, png
     file_size = db.Column(db.Integer)  # in bytes
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the document
     
     # OCR extracted data
     extracted_amount = db.Column(db.Numeric(10, 2))
@@ -776,12 +777,15 @@ class ProofOfPayment(db.Model):
     verification_notes = db.Column(db.Text)
     verified_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     verified_at = db.Column(db.DateTime)
+    # Byte-identical document submitted earlier (re-upload or reuse across invoices)
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('proof_of_payments.id'), nullable=True)
     
     # Timestamps
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     processed_at = db.Column(db.DateTime)  # When OCR processing completed
     
     # Relationships
+    duplicate_of = db.relationship('ProofOfPayment', remote_side=[id])
     invoice = db.relationship('Invoice', backref='proof_of_payments')
     customer = db.relationship('Customer', backref='proof_of_payments')
     invoice_payment = db.relationship('InvoicePayment', backref='proof_of_payment', uselist=False)
@@ -790,6 +794,76 @@ class ProofOfPayment(db.Model):
         return f'<ProofOfPayment {self.id} - Invoice {self.invoice_id}>'
 
 
+class OCRJob(db.Model):
+    """Queued OCR processing for a Proof of Payment (see ocr_jobs.py)"""
+    __tablename__ = 'ocr_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    proof_of_payment_id = db.Column(
+        db.Integer, db.ForeignKey('proof_of_payments.id'), nullable=False, index=True
+    )
+
+    # Job status: queued, processing, done, failed
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    # Relationships
+    proof_of_payment = db.relationship(
+        'ProofOfPayment', backref=db.backref('ocr_jobs', lazy='dynamic')
+    )
+
+    def __repr__(self):
+        return f'<OCRJob {self.id} - POP {self.proof_of_payment_id} ({self.status})>'
+
+
+class ImageVariantSet(db.Model):
+    """Resized WebP/AVIF/JPEG derivatives of an uploaded image (see image_pipeline.py)"""
+    __tablename__ = 'image_variant_sets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_url = db.Column(db.String(500), unique=True, nullable=False, index=True)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    # JSON: {"image/webp": {"640": "https://.../x-640w.webp", ...}, ...}
+    variants = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ImageVariantSet {self.source_url}>'
+
+
+class EmailOutbox(db.Model):
+    """Outgoing email written with the business change, sent by email_outbox.py"""
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # EmailService method and its keyword arguments (JSON)
+    template = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    recipient = db.Column(db.String(255), nullable=False, index=True)
+
+    # Status: pending, sending, sent, dead
+    status = db.Column(db.String(20), default='pending', nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.template} -> {self.recipient} ({self.status})>'
+
+
 class AuditLog(db.Model):
     """Enhanced audit logging for security events"""
     __tablename__ = 'audit_logs'
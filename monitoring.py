@@ -110,6 +110,28 @@ def detailed_health_check():
             'message': f'S3 check error: {str(e)}'
         }
     
+    # Circuit breakers for outbound dependencies (open breakers degrade, not fail)
+    try:
+        from resilience import circuit_status
+        breakers = circuit_status()
+        open_breakers = [
+            name for name, stats in breakers.items()
+            if stats['state'] != 'closed'
+        ]
+        health_data['checks']['circuit_breakers'] = {
+            'status': 'degraded' if open_breakers else 'healthy',
+            'message': (
+                f"Failing fast: {', '.join(open_breakers)}"
+                if open_breakers else 'All dependencies closed'
+            ),
+            'breakers': breakers
+        }
+    except Exception as e:
+        health_data['checks']['circuit_breakers'] = {
+            'status': 'degraded',
+            'message': f'Circuit breaker check error: {str(e)}'
+        }
+
     health_data['status'] = 'healthy' if overall_healthy else 'unhealthy'
     status_code = 200 if overall_healthy else 503
     
@@ -165,6 +187,68 @@ def metrics():
             }
         }
         
+        # Object storage upload latency per folder and read cache hit rates
+        try:
+            from s3_storage import storage_service
+            from object_cache import object_cache
+            metrics_data['storage'] = {
+                'uploads': storage_service.upload_stats(),
+                'presigned_urls': storage_service.presigned_url_stats(),
+                'deletes': storage_service.delete_stats(),
+                'object_cache': object_cache.stats()
+            }
+        except Exception as e:
+            current_app.logger.debug(f"Could not get storage stats: {e}")
+        
+        # Outgoing email: send latency, SMTP session reuse, outbox depth and age
+        try:
+            from email_service import smtp_stats
+            from email_outbox import outbox_stats
+            metrics_data['email'] = smtp_stats()
+            metrics_data['email']['outbox'] = outbox_stats()
+            from email_validator import mx_cache
+            metrics_data['email']['mx_cache'] = mx_cache.stats()
+        except Exception as e:
+            current_app.logger.debug(f"Could not get email stats: {e}")
+
+        # Response compression (bytes saved, CPU spent)
+        try:
+            from performance import compression_metrics
+            metrics_data['compression'] = compression_metrics.snapshot()
+        except Exception as e:
+            current_app.logger.debug(f"Could not get compression stats: {e}")
+
+        # Static fast path (WSGI wrapper in front of Flask)
+        static_stats = getattr(current_app.wsgi_app, 'stats', None)
+        if static_stats:
+            metrics_data['static'] = static_stats()
+
+        # Conditional GET (304s answered from content version stamps)
+        try:
+            from content_versions import content_versions
+            metrics_data['conditional_get'] = content_versions.stats()
+        except Exception as e:
+            current_app.logger.debug(f"Could not get conditional GET stats: {e}")
+
+        # Page cache warm-up (duration and coverage of the last run)
+        try:
+            from page_cache import page_cache
+            metrics_data['page_cache'] = page_cache.stats()
+        except Exception as e:
+            current_app.logger.debug(f"Could not get page cache stats: {e}")
+
+        # Prerendered public pages (served statically, drift checks)
+        try:
+            from prerender import prerenderer
+            metrics_data['prerender'] = prerenderer.stats()
+        except Exception as e:
+            current_app.logger.debug(f"Could not get prerender stats: {e}")
+
+        # Cloudflare purges queued by content changes
+        from cloudflare_cache import purge_queue
+        if purge_queue is not None:
+            metrics_data['cloudflare_purge'] = purge_queue.stats()
+        
         # Database connection pool stats (if available)
         try:
             engine = db.engine
@@ -0,0 +1,228 @@
+"""
+Local Read-Through Cache for Stored Objects
+Bounded on-disk LRU in front of the bucket for frequently viewed files
+(proof of payment documents in the admin invoice view)
+
+Stored objects are written once under unique keys and never modified, so
+a cached copy stays valid until it is evicted. Each gunicorn worker keeps
+its own LRU index over the shared directory; a file evicted by another
+worker is simply treated as a miss.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+OBJECT_CACHE_DIR = os.getenv(
+    'OBJECT_CACHE_DIR', os.path.join(tempfile.gettempdir(), '360degree-object-cache')
+)
+OBJECT_CACHE_MAX_BYTES = int(os.getenv('OBJECT_CACHE_MAX_MB', 256)) * MB
+OBJECT_CACHE_MAX_OBJECT_BYTES = int(os.getenv('OBJECT_CACHE_MAX_OBJECT_MB', 16)) * MB
+OBJECT_CACHE_CHUNK = MB
+
+# path is None for objects too large to cache; their body is in data
+CachedObject = namedtuple('CachedObject', 'key path size etag content_type data')
+
+
+def fetch_from_bucket(s3_key):
+    """get_object through the S3 breaker; None if storage is not configured"""
+    from s3_storage import storage_service, s3_breaker
+    if not storage_service.enabled:
+        return None
+    return s3_breaker.call(
+        storage_service.s3_client.get_object,
+        Bucket=storage_service.bucket_name,
+        Key=s3_key
+    )
+
+
+class ObjectCache:
+    """
+    Size-bounded LRU of object bodies on local disk.
+
+    Args:
+        directory: Cache directory (created on demand)
+        max_bytes: Total size limit; least recently used files are evicted
+        max_object_bytes: Larger objects are served without being cached
+        fetch: Callable(s3_key) -> get_object-style response dict
+    """
+
+    def __init__(self, directory=OBJECT_CACHE_DIR, max_bytes=OBJECT_CACHE_MAX_BYTES,
+                 max_object_bytes=OBJECT_CACHE_MAX_OBJECT_BYTES, fetch=fetch_from_bucket):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bypassed': 0, 'errors': 0}
+
+    def _path(self, s3_key):
+        return os.path.join(self.directory, hashlib.sha256(s3_key.encode()).hexdigest())
+
+    def _load_index(self):
+        """Adopt files left by earlier processes, oldest write first (caller holds the lock)"""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or '.part' in name:
+                continue
+            path = os.path.join(self.directory, name[:-5])
+            try:
+                with open(f'{path}.json') as f:
+                    meta = json.load(f)
+                stat = os.stat(path)
+            except (OSError, ValueError):
+                continue
+            if stat.st_size == meta.get('size'):
+                found.append((stat.st_mtime, CachedObject(
+                    meta['key'], path, meta['size'], meta.get('etag'), meta.get('content_type'), None
+                )))
+        for _, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[entry.key] = entry
+            self._bytes += entry.size
+        self._evict(0)
+        self._loaded = True
+
+    def _evict(self, incoming):
+        """Drop least recently used entries until `incoming` more bytes fit"""
+        while self._entries and self._bytes + incoming > self.max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._stats['evictions'] += 1
+            for path in (entry.path, f'{entry.path}.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _lookup(self, s3_key):
+        """Cached entry, moved to most-recent; drops entries whose file vanished"""
+        with self._lock:
+            if not self._loaded:
+                self._load_index()
+            entry = self._entries.get(s3_key)
+            if entry is None:
+                return None
+            if not os.path.exists(entry.path):
+                del self._entries[s3_key]
+                self._bytes -= entry.size
+                return None
+            self._entries.move_to_end(s3_key)
+            self._stats['hits'] += 1
+        return entry
+
+    def get(self, s3_key):
+        """
+        Return the object, fetching it into the cache on a miss.
+        Concurrent misses for the same key share one download.
+
+        Returns:
+            CachedObject or None if the object could not be fetched
+        """
+        entry = self._lookup(s3_key)
+        if entry:
+            return entry
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(s3_key, threading.Lock())
+        try:
+            with key_lock:
+                entry = self._lookup(s3_key)
+                if entry:
+                    return entry
+                with self._lock:
+                    self._stats['misses'] += 1
+                return self._fill(s3_key)
+        finally:
+            with self._lock:
+                self._key_locks.pop(s3_key, None)
+
+    def _fill(self, s3_key):
+        try:
+            response = self._fetch(s3_key)
+        except Exception as e:
+            logger.warning(f"Object cache fetch failed for {s3_key}: {e}")
+            response = None
+        if response is None:
+            with self._lock:
+                self._stats['errors'] += 1
+            return None
+
+        etag = (response.get('ETag') or '').strip('"') or None
+        content_type = response.get('ContentType') or 'application/octet-stream'
+        size = response.get('ContentLength')
+
+        if size is None or size > self.max_object_bytes:
+            data = response['Body'].read()
+            with self._lock:
+                self._stats['bypassed'] += 1
+            return CachedObject(s3_key, None, len(data), etag, content_type, data)
+
+        path = self._path(s3_key)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            written = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: response['Body'].read(OBJECT_CACHE_CHUNK), b''):
+                    f.write(chunk)
+                    written += len(chunk)
+            with open(f'{tmp_path}.json', 'w') as f:
+                json.dump({'key': s3_key, 'size': written, 'etag': etag, 'content_type': content_type}, f)
+            os.replace(tmp_path, path)
+            os.replace(f'{tmp_path}.json', f'{path}.json')
+        except OSError as e:
+            logger.warning(f"Object cache write failed for {s3_key}: {e}")
+            for leftover in (tmp_path, f'{tmp_path}.json'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            with self._lock:
+                self._stats['errors'] += 1
+            return None
+
+        entry = CachedObject(s3_key, path, written, etag, content_type, None)
+        with self._lock:
+            self._evict(written)
+            self._entries[s3_key] = entry
+            self._bytes += written
+        return entry
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, hit_rate, evictions, bypassed, errors, entries, size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['mb'] = round(self._bytes / MB, 2)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        stats['max_mb'] = round(self.max_bytes / MB, 2)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            for entry in list(self._entries.values()):
+                for path in (entry.path, f'{entry.path}.json'):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            self._entries.clear()
+            self._bytes = 0
+
+
+# Global instance
+object_cache = ObjectCache()
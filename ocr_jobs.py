@@ -0,0 +1,432 @@
+"""
+Asynchronous OCR Job Queue for Proof of Payment Processing
+DB-backed jobs table drained by a dedicated worker process pool
+
+Web requests only enqueue a job; the worker downloads the document,
+runs OCR in a separate process and applies the verification logic.
+Byte-identical re-uploads reuse the earlier extraction without OCR; for
+direct-to-bucket uploads the worker hashes the document it downloads.
+
+Usage:
+    python ocr_jobs.py            # Run the worker until interrupted
+    python ocr_jobs.py --once     # Drain the queue and exit
+"""
+import os
+import sys
+import time
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+from models import db, OCRJob, ProofOfPayment, Order
+from ocr_service import OCRService
+
+logger = logging.getLogger(__name__)
+
+# Job concurrency is capped independently of gunicorn workers/threads
+OCR_WORKER_CONCURRENCY = int(os.getenv('OCR_WORKER_CONCURRENCY', 2))
+OCR_JOB_MAX_ATTEMPTS = int(os.getenv('OCR_JOB_MAX_ATTEMPTS', 3))
+OCR_JOB_POLL_INTERVAL = float(os.getenv('OCR_JOB_POLL_INTERVAL', 2))
+OCR_JOB_STALE_AFTER = int(os.getenv('OCR_JOB_STALE_AFTER', 600))  # seconds
+
+
+# =====================================================
+# ENQUEUE (web side)
+# =====================================================
+
+def enqueue_ocr_job(pop):
+    """
+    Queue OCR for a Proof of Payment.
+    Added to the caller's session so it commits with the upload.
+    """
+    pop.verification_status = 'queued'
+    job = OCRJob(proof_of_payment=pop, status='queued')
+    db.session.add(job)
+    return job
+
+
+def find_previous_submission(pop):
+    """Most recent earlier POP with the same content hash, if any"""
+    if not pop.content_hash:
+        return None
+    return ProofOfPayment.query.filter(
+        ProofOfPayment.content_hash == pop.content_hash,
+        ProofOfPayment.id != pop.id
+    ).order_by(
+        # Prefer a submission on the same invoice, then one with OCR results
+        (ProofOfPayment.invoice_id == pop.invoice_id).desc(),
+        ProofOfPayment.processed_at.is_(None),
+        ProofOfPayment.id.desc()
+    ).first()
+
+
+def cached_ocr_result(previous):
+    """Rebuild a process_document() result from an already-processed POP"""
+    if not previous or not previous.processed_at:
+        return None
+    return {
+        'success': True,
+        'amount': float(previous.extracted_amount) if previous.extracted_amount is not None else None,
+        'reference': previous.extracted_reference,
+        'date': previous.extracted_date,
+        'payer_name': previous.extracted_payer_name,
+        'payer_account': previous.extracted_payer_account,
+        'bank_name': previous.extracted_bank_name,
+        'confidence': previous.ocr_confidence or 0.0,
+        'raw_text': previous.ocr_raw_text or ''
+    }
+
+
+def submit_proof_of_payment(pop):
+    """
+    Route a freshly uploaded POP: reuse a cached extraction for a
+    byte-identical document, otherwise queue OCR.
+
+    Duplicates are linked via duplicate_of_id and always go to manual
+    review so the same transfer cannot settle an invoice twice.
+
+    Returns:
+        str: verification_status after submission ('queued' if OCR pending)
+    """
+    cached = cached_ocr_result(_link_duplicate(pop))
+    if cached is None:
+        enqueue_ocr_job(pop)
+        return pop.verification_status
+
+    return apply_ocr_result(pop, cached)
+
+
+def _link_duplicate(pop):
+    """Point pop.duplicate_of at an earlier identical submission, if any"""
+    previous = find_previous_submission(pop)
+    if previous:
+        pop.duplicate_of = previous
+        logger.warning(
+            f"POP {pop.id} duplicates POP {previous.id} "
+            f"(invoice {previous.invoice_id}, status {previous.verification_status})"
+        )
+    return previous
+
+
+def hash_direct_upload(pop, document):
+    """
+    Direct-to-bucket uploads reach the worker unhashed: hash the downloaded
+    document and run the duplicate check submit_proof_of_payment() would
+    have run at upload time.
+
+    Returns:
+        dict: Cached OCR result to reuse instead of running OCR, or None
+    """
+    pop.content_hash = hashlib.sha256(document).hexdigest()
+    cached = cached_ocr_result(_link_duplicate(pop))
+    db.session.commit()
+    return cached
+
+
+def duplicate_note(pop):
+    """Reviewer-facing explanation for a duplicate submission"""
+    previous = pop.duplicate_of
+    if previous.invoice_id == pop.invoice_id:
+        return (f'Duplicate submission: identical to proof #{previous.id} '
+                f'uploaded {previous.uploaded_at:%d %b %Y %H:%M} for this invoice '
+                f'({previous.verification_status}).')
+    return (f'Document reuse: identical to proof #{previous.id} '
+            f'submitted for invoice #{previous.invoice_id}.')
+
+
+def get_pop_status(pop):
+    """Status summary for the invoice page poller"""
+    job = pop.ocr_jobs.order_by(OCRJob.id.desc()).first()
+    return {
+        'id': pop.id,
+        'file_name': pop.file_name,
+        'verification_status': pop.verification_status,
+        'job_status': job.status if job else None,
+        'extracted_amount': float(pop.extracted_amount) if pop.extracted_amount is not None else None,
+        'verification_notes': pop.verification_notes,
+        'processed_at': pop.processed_at.isoformat() if pop.processed_at else None
+    }
+
+
+# =====================================================
+# RESULT HANDLING
+# =====================================================
+
+def apply_ocr_result(pop, result, ocr_service=None):
+    """
+    Store OCR output on the POP and run amount validation / auto-verification.
+
+    Args:
+        pop: ProofOfPayment row
+        result: dict from OCRService.process_document
+        ocr_service: OCRService used for validation (optional)
+
+    Returns:
+        str: Final verification status
+    """
+    ocr_service = ocr_service or OCRService()
+    invoice = pop.invoice
+    payment = pop.invoice_payment
+    threshold = current_app.config.get('OCR_CONFIDENCE_THRESHOLD', 0.75)
+
+    if not result.get('success'):
+        pop.verification_status = 'manual_review'
+        pop.verification_notes = f'OCR Error: {result.get("error", "Unknown error")}'
+        invoice.status = 'pending_verification'
+        return pop.verification_status
+
+    # Store extracted data
+    pop.extracted_amount = result.get('amount')
+    pop.extracted_reference = result.get('reference')
+    pop.extracted_date = result.get('date')
+    pop.extracted_payer_name = result.get('payer_name')
+    pop.extracted_payer_account = result.get('payer_account')
+    pop.extracted_bank_name = result.get('bank_name')
+    pop.ocr_confidence = result.get('confidence', 0.0)
+    pop.ocr_raw_text = result.get('raw_text', '')
+    pop.processed_at = datetime.utcnow()
+
+    if not pop.extracted_amount:
+        pop.verification_status = 'manual_review'
+        pop.verification_notes = 'Could not extract payment amount'
+        if pop.duplicate_of is not None:
+            pop.verification_notes = f'{duplicate_note(pop)} {pop.verification_notes}'
+        invoice.status = 'pending_verification'
+        return pop.verification_status
+
+    # Validate amount
+    validation = ocr_service.validate_payment(
+        pop.extracted_amount,
+        float(invoice.total_amount),
+        tolerance=current_app.config.get('PAYMENT_VALIDATION_TOLERANCE', 0.01)
+    )
+    pop.amount_matched = validation['matched']
+    pop.verification_status = validation['status']
+    pop.verification_notes = validation['reason']
+
+    if pop.duplicate_of is not None:
+        # Never auto-settle a document that has been submitted before
+        pop.verification_status = 'manual_review'
+        pop.verification_notes = f"{duplicate_note(pop)} {validation['reason']}"
+        invoice.status = 'pending_verification'
+        return pop.verification_status
+
+    # Auto-verify if amount matches and confidence is high
+    if validation['matched'] and pop.ocr_confidence >= threshold:
+        pop.verification_status = 'verified'
+        pop.verified_at = datetime.utcnow()
+
+        invoice.paid_amount = float(invoice.paid_amount or 0) + float(payment.amount)
+        if invoice.paid_amount >= float(invoice.total_amount):
+            invoice.status = 'paid'
+        else:
+            invoice.status = 'partial'
+
+        # Update order if linked
+        if invoice.order_id:
+            order = db.session.get(Order, invoice.order_id)
+            if order:
+                order.payment_status = 'paid' if invoice.status == 'paid' else 'partial'
+    else:
+        pop.verification_status = 'manual_review'
+        invoice.status = 'pending_verification'
+
+    return pop.verification_status
+
+
+def _run_ocr(document, file_type):
+    """Process-pool entry point: OCR one document held in memory"""
+    return OCRService().process_document(document, file_type)
+
+
+# =====================================================
+# WORKER
+# =====================================================
+
+def claim_jobs(limit):
+    """
+    Atomically claim up to `limit` runnable jobs.
+    Uses SKIP LOCKED so several worker processes can share the table.
+    """
+    if limit <= 0:
+        return []
+
+    now = datetime.utcnow()
+    jobs = OCRJob.query.filter(
+        OCRJob.status == 'queued',
+        OCRJob.run_after <= now
+    ).order_by(OCRJob.id).limit(limit).with_for_update(skip_locked=True).all()
+
+    for job in jobs:
+        job.status = 'processing'
+        job.started_at = now
+        job.attempts += 1
+    db.session.commit()
+    return jobs
+
+
+def requeue_stale_jobs():
+    """
+    Return jobs orphaned by a crashed or hung worker to the queue. The claim
+    already spent an attempt, so a document that keeps killing the worker
+    goes to manual review after OCR_JOB_MAX_ATTEMPTS.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=OCR_JOB_STALE_AFTER)
+    jobs = OCRJob.query.filter(
+        OCRJob.status == 'processing',
+        OCRJob.started_at < cutoff
+    ).with_for_update(skip_locked=True).all()
+    for job in jobs:
+        _fail_job(job, f'OCR worker stopped responding (stale after {OCR_JOB_STALE_AFTER}s)')
+    if jobs:
+        db.session.commit()
+        logger.warning(f"Recovered {len(jobs)} stale OCR job(s)")
+    return len(jobs)
+
+
+def _fail_job(job, error):
+    """Retry with backoff or give up and send the POP to manual review"""
+    job.last_error = str(error)
+    if job.attempts < OCR_JOB_MAX_ATTEMPTS:
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + timedelta(seconds=30 * 2 ** job.attempts)
+        logger.warning(f"OCR job {job.id} failed (attempt {job.attempts}), retrying: {error}")
+    else:
+        job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+        pop = job.proof_of_payment
+        pop.verification_status = 'manual_review'
+        pop.verification_notes = f'OCR processing failed: {error}'
+        pop.invoice.status = 'pending_verification'
+        logger.error(f"OCR job {job.id} failed permanently: {error}")
+
+
+def _finish_job(job_id, result):
+    job = db.session.get(OCRJob, job_id)
+    try:
+        status = apply_ocr_result(job.proof_of_payment, result)
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+        logger.info(f"OCR job {job.id} done: POP {job.proof_of_payment_id} -> {status}")
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(OCRJob, job_id)
+        _fail_job(job, e)
+    db.session.commit()
+
+
+def _requeue_after_crash(job_ids, crashes):
+    """
+    Jobs in flight when an OCR process died go back to the queue without
+    spending an attempt. A job caught in OCR_JOB_MAX_ATTEMPTS crashes is
+    probably the cause and is failed instead.
+    """
+    for job_id in job_ids:
+        job = db.session.get(OCRJob, job_id)
+        crashes[job_id] = crashes.get(job_id, 0) + 1
+        if crashes[job_id] >= OCR_JOB_MAX_ATTEMPTS:
+            _fail_job(job, 'OCR process crashed')
+        else:
+            job.status = 'queued'
+            job.attempts -= 1
+    db.session.commit()
+
+
+def _submit(pool, job):
+    """Fetch the document and hand it to the process pool"""
+    from s3_storage import storage_service
+
+    pop = job.proof_of_payment
+    document = storage_service.get_file_bytes(pop.file_path)
+    if document is None:
+        raise IOError(f'Could not download {pop.file_path}')
+
+    if pop.content_hash is None:
+        cached = hash_direct_upload(pop, document)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+    return pool.submit(_run_ocr, document, pop.file_type)
+
+
+def run_worker(concurrency=OCR_WORKER_CONCURRENCY, once=False):
+    """
+    Drain the OCR queue with at most `concurrency` documents in flight.
+
+    Args:
+        concurrency: Size of the OCR process pool
+        once: Exit when the queue is empty instead of polling forever
+    """
+    logger.info(f"OCR worker started (concurrency={concurrency})")
+    in_flight = {}
+    crashes = {}  # job id -> pool crashes it was in flight for
+    pool = ProcessPoolExecutor(max_workers=concurrency)
+
+    try:
+        while True:
+            requeue_stale_jobs()
+            broken = []
+
+            for job in claim_jobs(concurrency - len(in_flight)):
+                try:
+                    in_flight[_submit(pool, job)] = job.id
+                except BrokenProcessPool:
+                    broken.append(job.id)
+                except Exception as e:
+                    _fail_job(job, e)
+                    db.session.commit()
+
+            if not in_flight and not broken:
+                if once:
+                    break
+                time.sleep(OCR_JOB_POLL_INTERVAL)
+                continue
+
+            done, _ = wait(list(in_flight), timeout=OCR_JOB_POLL_INTERVAL,
+                           return_when=FIRST_COMPLETED) if in_flight else (set(), set())
+            for future in done:
+                job_id = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken.append(job_id)
+                    continue
+                except Exception as e:
+                    result = {'success': False, 'error': str(e), 'raw_text': ''}
+                _finish_job(job_id, result)
+
+            if broken:
+                # A child died (OOM, tesseract segfault): every future of this pool fails
+                broken.extend(in_flight.values())
+                in_flight.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                _requeue_after_crash(broken, crashes)
+                logger.error(f"OCR process pool crashed; restarted it and requeued {len(broken)} job(s)")
+                pool = ProcessPoolExecutor(max_workers=concurrency)
+    finally:
+        pool.shutdown()
+
+    logger.info("OCR worker stopped")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Proof of payment OCR worker')
+    parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+    parser.add_argument('--concurrency', type=int, default=OCR_WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app import app
+
+    with app.app_context():
+        try:
+            run_worker(concurrency=args.concurrency, once=args.once)
+        except KeyboardInterrupt:
+            sys.exit(0)
@@ -2,12 +2,17 @@
 OCR Service for Proof of Payment Processing
 Extracts payment information from bank receipts and EFT confirmations
 """
+import os
 import re
-from datetime import datetime
+import subprocess
+import multiprocessing
 from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
 import io
+
+from ocr_templates import extraction_engine
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps, ImageFilter, ImageChops
     import pytesseract
     TESSERACT_AVAILABLE = True
 except ImportError:
@@ -20,6 +25,127 @@ except ImportError:
     PDF_AVAILABLE = False
 
 
+# PDF handling: pages with a usable text layer skip OCR entirely; the rest are
+# rasterised one at a time at a DPI tuned for receipt-sized text.
+PDF_OCR_DPI = int(os.getenv('OCR_PDF_DPI', 250))
+PDF_OCR_WORKERS = int(os.getenv('OCR_PDF_WORKERS', 2))
+PDF_RENDER_TIMEOUT = int(os.getenv('OCR_PDF_RENDER_TIMEOUT', 60))  # seconds per page
+MIN_TEXT_LAYER_CHARS = 25
+
+# Image preprocessing: phone photos are downscaled to this effective DPI,
+# assuming the document spans the long edge of the frame (A4 = 11.69in).
+IMAGE_TARGET_DPI = int(os.getenv('OCR_IMAGE_DPI', 250))
+DOCUMENT_LONG_EDGE_INCHES = 11.69
+ADAPTIVE_THRESHOLD_RADIUS = 15
+ADAPTIVE_THRESHOLD_OFFSET = 12
+DESKEW_MAX_ANGLE = 5.0
+
+# LSTM engine, single column of variable-size text (receipt layout).
+# The whitelist keeps letters, digits and the punctuation used in amounts,
+# dates and references so stray glyphs are not emitted.
+TESSERACT_WHITELIST = (
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    ".,:;/-()#&@"
+)
+TESSERACT_CONFIG = (
+    f"--oem 1 --psm 4 -c preserve_interword_spaces=1 "
+    f"-c tessedit_char_whitelist={TESSERACT_WHITELIST}"
+)
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only stream over a bytes-like object, without copying it"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        chunk = self._view[self._pos:self._pos + len(target)]
+        target[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def _open_buffer(document):
+    """
+    File-like view of an in-memory document.
+    bytes are shared by BytesIO; other buffers (memoryview, bytearray) are
+    wrapped so the upload is never copied.
+    """
+    if isinstance(document, bytes):
+        return io.BytesIO(document)
+    return io.BufferedReader(_BufferReader(document))
+
+
+def _poppler(command, pdf_bytes, timeout=PDF_RENDER_TIMEOUT):
+    """Run a poppler utility reading the PDF from stdin ('-')"""
+    try:
+        completed = subprocess.run(
+            command, input=pdf_bytes, capture_output=True, timeout=timeout, check=True
+        )
+    except FileNotFoundError:
+        raise ImportError("poppler-utils not installed (pdftoppm/pdfinfo required for scanned PDFs)")
+    return completed.stdout
+
+
+def _pdf_page_count(pdf_bytes):
+    """Page count via pdfinfo, for PDFs PyPDF2 cannot parse"""
+    info = _poppler(['pdfinfo', '-'], pdf_bytes).decode('utf-8', 'replace')
+    match = re.search(r'^Pages:\s+(\d+)', info, re.MULTILINE)
+    return int(match.group(1)) if match else 1
+
+
+def _ocr_pdf_page(pdf_bytes, page_number, dpi=PDF_OCR_DPI):
+    """Rasterise and OCR a single PDF page, piping the PDF through pdftoppm"""
+    png = _poppler([
+        'pdftoppm', '-f', str(page_number), '-l', str(page_number),
+        '-r', str(dpi), '-gray', '-png', '-', '-'
+    ], pdf_bytes)
+    if not png:
+        return ''
+    # Same pipeline as photos; the rendered page is already the whole document
+    image = OCRService()._preprocess_image(Image.open(io.BytesIO(png)), crop_document=False)
+    return pytesseract.image_to_string(image, config=TESSERACT_CONFIG)
+
+
+def _in_worker_process():
+    """
+    True inside a multiprocessing worker, e.g. an ocr_jobs job. Its pool
+    already caps concurrent OCR, so pages are not fanned out again.
+    """
+    return multiprocessing.parent_process() is not None
+
+
+# Process-pool workers receive the document once, via the initializer,
+# rather than once per page task.
+_worker_document = None
+
+
+def _init_pdf_worker(pdf_bytes):
+    global _worker_document
+    _worker_document = pdf_bytes
+
+
+def _ocr_worker_page(page_number, dpi=PDF_OCR_DPI):
+    """Process-pool entry point"""
+    return _ocr_pdf_page(_worker_document, page_number, dpi)
+
+
 class OCRService:
     """
     Intelligent OCR service for extracting payment data from proof of payment documents
@@ -27,21 +153,27 @@ class OCRService:
     
     def __init__(self):
         self.confidence_threshold = 0.7
+        self.engine = extraction_engine
+        self.last_pdf_stats = None  # Page handling summary of the last PDF
         
-    def process_document(self, file_path, file_type):
+    def process_document(self, document, file_type):
         """
         Main entry point for processing a proof of payment document
         
         Args:
-            file_path: Path to the uploaded file
+            document: Uploaded file contents (bytes or memoryview), or a path
             file_type: File extension (pdf, jpg, png, etc.)
             
         Returns:
             dict: Extracted payment information
         """
         try:
+            if isinstance(document, (str, os.PathLike)):
+                with open(document, 'rb') as f:
+                    document = f.read()
+            
             # Extract text from document
-            text = self._extract_text(file_path, file_type)
+            text = self._extract_text(document, file_type)
             
             if not text:
                 return {
@@ -64,251 +196,245 @@ class OCRService:
                 'raw_text': ''
             }
     
-    def _extract_text(self, file_path, file_type):
-        """Extract text from image or PDF"""
+    def _extract_text(self, document, file_type):
+        """Extract text from image or PDF held in memory"""
         file_type = file_type.lower()
         
         if file_type == 'pdf':
-            return self._extract_from_pdf(file_path)
+            return self._extract_from_pdf(document)
         elif file_type in ['jpg', 'jpeg', 'png', 'bmp', 'tiff']:
-            return self._extract_from_image(file_path)
+            return self._extract_from_image(document)
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
     
-    def _extract_from_pdf(self, file_path):
-        """Extract text from PDF file"""
+    def _extract_from_pdf(self, document):
+        """
+        Extract text from an in-memory PDF page by page.
+        Text-layer pages are read directly; only pages without text are OCR'd.
+        Stops as soon as amount, reference and date have been found.
+        """
         if not PDF_AVAILABLE:
             raise ImportError("PyPDF2 not installed. Install with: pip install PyPDF2")
         
-        text = ""
+        self.last_pdf_stats = None
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
+            pdf_reader = PyPDF2.PdfReader(_open_buffer(document))
+            pages = list(pdf_reader.pages)
         except Exception as e:
-            # If PDF text extraction fails, try OCR on PDF images
+            # If PDF cannot be parsed at all, OCR every page
             if TESSERACT_AVAILABLE:
-                text = self._extract_from_pdf_with_ocr(file_path)
+                return self._extract_from_pdf_with_ocr(document)
+            raise e
+        
+        self.last_pdf_stats = {
+            'pages': len(pages), 'text_pages': 0, 'ocr_pages': 0, 'early_stop': False
+        }
+        page_texts = {}
+        ocr_pages = []
+        for page_number, page in enumerate(pages, start=1):
+            try:
+                text = page.extract_text() or ''
+            except Exception:
+                text = ''
+            
+            if self._has_text_layer(text):
+                page_texts[page_number] = text
+                self.last_pdf_stats['text_pages'] += 1
+                if self._has_key_fields(self._join_pages(page_texts)):
+                    self.last_pdf_stats['early_stop'] = True
+                    return self._join_pages(page_texts)
             else:
-                raise e
+                ocr_pages.append(page_number)
         
-        return text
-    
-    def _extract_from_pdf_with_ocr(self, file_path):
-        """Extract text from PDF using OCR (for scanned PDFs)"""
-        try:
-            from pdf2image import convert_from_path
-            images = convert_from_path(file_path)
-            text = ""
-            for image in images:
-                text += pytesseract.image_to_string(image)
-            return text
-        except ImportError:
-            raise ImportError("pdf2image not installed. Install with: pip install pdf2image")
-    
-    def _extract_from_image(self, file_path):
-        """Extract text from image file using OCR"""
-        if not TESSERACT_AVAILABLE:
-            raise ImportError("Tesseract OCR not installed. Install with: pip install pytesseract pillow")
+        if ocr_pages and TESSERACT_AVAILABLE:
+            return self._extract_from_pdf_with_ocr(document, ocr_pages, page_texts)
         
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image)
-        return text
+        return self._join_pages(page_texts)
     
-    def _parse_payment_info(self, text):
-        """
-        Parse extracted text to find payment information
-        Uses regex patterns to extract amount, reference, date, and payer details
+    def _extract_from_pdf_with_ocr(self, document, page_numbers=None, page_texts=None):
         """
-        data = {
-            'amount': None,
-            'reference': None,
-            'date': None,
-            'payer_name': None,
-            'payer_account': None,
-            'bank_name': None,
-            'confidence': 0.0
-        }
-        
-        confidence_scores = []
-        
-        # Extract amount
-        amount_result = self._extract_amount(text)
-        if amount_result:
-            data['amount'] = amount_result['value']
-            confidence_scores.append(amount_result['confidence'])
-        
-        # Extract reference number
-        reference_result = self._extract_reference(text)
-        if reference_result:
-            data['reference'] = reference_result['value']
-            confidence_scores.append(reference_result['confidence'])
+        Extract text from PDF using OCR (for scanned PDFs)
         
-        # Extract date
-        date_result = self._extract_date(text)
-        if date_result:
-            data['date'] = date_result['value']
-            confidence_scores.append(date_result['confidence'])
+        Pages are rendered by pdftoppm reading the PDF from stdin, so no
+        temporary files are written.
         
-        # Extract payer details
-        payer_result = self._extract_payer_info(text)
-        if payer_result:
-            data.update(payer_result['values'])
-            confidence_scores.append(payer_result['confidence'])
-        
-        # Extract bank name
-        bank_result = self._extract_bank_name(text)
-        if bank_result:
-            data['bank_name'] = bank_result['value']
-            confidence_scores.append(bank_result['confidence'])
-        
-        # Calculate overall confidence
-        data['confidence'] = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.0
+        Args:
+            document: PDF contents (bytes or memoryview)
+            page_numbers: 1-based pages to OCR (default: all pages)
+            page_texts: Text already read from other pages, keyed by page number
+        """
+        page_texts = dict(page_texts or {})
+        if page_numbers is None:
+            page_count = _pdf_page_count(document)
+            page_numbers = list(range(1, page_count + 1))
         
-        return data
+        stats = self.last_pdf_stats or {
+            'pages': len(page_numbers), 'text_pages': 0, 'ocr_pages': 0, 'early_stop': False
+        }
+        self.last_pdf_stats = stats
+        
+        # Single page, or already in a pool worker: OCR pages in turn
+        if len(page_numbers) == 1 or PDF_OCR_WORKERS <= 1 or _in_worker_process():
+            for page_number in page_numbers:
+                page_texts[page_number] = _ocr_pdf_page(document, page_number)
+                stats['ocr_pages'] += 1
+                if self._has_key_fields(self._join_pages(page_texts)):
+                    stats['early_stop'] = page_number != page_numbers[-1]
+                    break
+            return self._join_pages(page_texts)
+        
+        workers = min(PDF_OCR_WORKERS, len(page_numbers))
+        # memoryviews cannot be pickled; bytes are sent to each worker once
+        pdf_bytes = document if isinstance(document, bytes) else bytes(document)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_worker,
+                                 initargs=(pdf_bytes,)) as pool:
+            futures = [
+                (page_number, pool.submit(_ocr_worker_page, page_number))
+                for page_number in page_numbers
+            ]
+            # Consume in page order so early termination keeps the first pages
+            for index, (page_number, future) in enumerate(futures):
+                page_texts[page_number] = future.result()
+                stats['ocr_pages'] += 1
+                if self._has_key_fields(self._join_pages(page_texts)):
+                    remaining = futures[index + 1:]
+                    stats['early_stop'] = bool(remaining)
+                    for _, pending in remaining:
+                        pending.cancel()
+                    break
+        
+        return self._join_pages(page_texts)
     
-    def _extract_amount(self, text):
-        """Extract payment amount from text"""
-        # Common patterns for South African Rand amounts
-        patterns = [
-            r'(?:amount|total|paid|deposited?)[:\s]*R?\s*([0-9,]+\.?\d{0,2})',
-            r'R\s*([0-9,]+\.?\d{2})',
-            r'ZAR\s*([0-9,]+\.?\d{2})',
-            r'([0-9,]+\.\d{2})\s*(?:ZAR|R)',
-        ]
-        
-        amounts = []
-        for pattern in patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                amount_str = match.group(1).replace(',', '').replace(' ', '')
-                try:
-                    amount = Decimal(amount_str)
-                    if 0 < amount < 1000000:  # Reasonable range
-                        amounts.append(amount)
-                except:
-                    continue
-        
-        if amounts:
-            # Return the most common amount or the largest if all different
-            from collections import Counter
-            amount_counts = Counter(amounts)
-            most_common = amount_counts.most_common(1)[0][0]
-            return {
-                'value': float(most_common),
-                'confidence': 0.9 if len(amounts) > 1 else 0.7
-            }
-        
-        return None
+    @staticmethod
+    def _has_text_layer(text):
+        """True if a PDF page carries enough embedded text to skip OCR"""
+        return sum(1 for ch in text if ch.isalnum()) >= MIN_TEXT_LAYER_CHARS
     
-    def _extract_reference(self, text):
-        """Extract payment reference number"""
-        patterns = [
-            r'(?:reference|ref|ref\s*no|ref\s*number)[:\s]*([A-Z0-9\-]+)',
-            r'(?:transaction|trans|txn)[:\s]*(?:id|number|no)[:\s]*([A-Z0-9\-]+)',
-            r'INV[-\s]*([A-Z0-9]+)',
-            r'ORD[-\s]*([A-Z0-9]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return {
-                    'value': match.group(1).strip(),
-                    'confidence': 0.8
-                }
-        
-        return None
+    @staticmethod
+    def _join_pages(page_texts):
+        """Join per-page text in page order"""
+        return "\n".join(page_texts[number] for number in sorted(page_texts))
     
-    def _extract_date(self, text):
-        """Extract payment date"""
-        # South African date formats
-        patterns = [
-            r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',  # DD/MM/YYYY or DD-MM-YYYY
-            r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',  # YYYY/MM/DD or YYYY-MM-DD
-            r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})',  # DD Month YYYY
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                date_str = match.group(1)
-                parsed_date = self._parse_date_string(date_str)
-                if parsed_date:
-                    return {
-                        'value': parsed_date,
-                        'confidence': 0.8
-                    }
-        
-        return None
+    def _has_key_fields(self, text):
+        """True once amount, reference and date are all extracted with confidence"""
+        field_confidence = self.engine.extract(text)['field_confidence']
+        return all(
+            field_confidence.get(field, 0.0) >= self.confidence_threshold
+            for field in ('amount', 'reference', 'date')
+        )
     
-    def _parse_date_string(self, date_str):
-        """Parse various date formats"""
-        formats = [
-            '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y',
-            '%Y/%m/%d', '%Y-%m-%d',
-            '%d %B %Y', '%d %b %Y'
-        ]
-        
-        for fmt in formats:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
-                continue
+    def _extract_from_image(self, document):
+        """Extract text from an in-memory image using OCR"""
+        if not TESSERACT_AVAILABLE:
+            raise ImportError("Tesseract OCR not installed. Install with: pip install pytesseract pillow")
         
-        return None
+        image = Image.open(_open_buffer(document))
+        image = self._preprocess_image(image)
+        text = pytesseract.image_to_string(image, config=TESSERACT_CONFIG)
+        return text
     
-    def _extract_payer_info(self, text):
-        """Extract payer name and account information"""
-        data = {
-            'payer_name': None,
-            'payer_account': None
-        }
-        
-        # Extract account number
-        account_pattern = r'(?:account|acc)[:\s]*(?:no|number)?[:\s]*([0-9\s\-]{8,20})'
-        account_match = re.search(account_pattern, text, re.IGNORECASE)
-        if account_match:
-            data['payer_account'] = account_match.group(1).replace(' ', '').replace('-', '')
+    def _preprocess_image(self, image, crop_document=True):
+        """
+        Prepare a photographed receipt for Tesseract
         
-        # Extract payer name (look for "from" or "payer" keywords)
-        name_patterns = [
-            r'(?:from|payer|sender)[:\s]*([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})',
-            r'(?:name)[:\s]*([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})',
-        ]
+        EXIF orientation -> grayscale -> downscale to target DPI ->
+        crop to document -> adaptive threshold -> deskew
         
-        for pattern in name_patterns:
-            name_match = re.search(pattern, text, re.IGNORECASE)
-            if name_match:
-                data['payer_name'] = name_match.group(1).strip()
+        Args:
+            image: PIL Image as uploaded
+            crop_document: Crop to the detected document region
+            
+        Returns:
+            PIL Image: 1-bit-looking grayscale image ready for OCR
+        """
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('L')
+        image = self._downscale_to_dpi(image)
+        if crop_document:
+            image = self._crop_to_document(image)
+        image = self._adaptive_threshold(image)
+        return self._deskew(image)
+    
+    @staticmethod
+    def _downscale_to_dpi(image, target_dpi=IMAGE_TARGET_DPI):
+        """Shrink oversized photos; small scans are left alone"""
+        max_long_edge = int(target_dpi * DOCUMENT_LONG_EDGE_INCHES)
+        long_edge = max(image.size)
+        if long_edge <= max_long_edge:
+            return image
+        scale = max_long_edge / long_edge
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        return image.resize(size, Image.LANCZOS)
+    
+    @staticmethod
+    def _crop_to_document(image, margin=10):
+        """Crop to the bright paper region when it is clearly smaller than the frame"""
+        small = image.reduce(4) if min(image.size) > 400 else image
+        factor = image.width / small.width
+        # Paper is the brightest large area: keep pixels near the top of the histogram
+        histogram = small.histogram()
+        total = sum(histogram)
+        cumulative, paper_level = 0, 255
+        for level in range(255, -1, -1):
+            cumulative += histogram[level]
+            if cumulative >= total * 0.25:
+                paper_level = level
                 break
-        
-        if data['payer_name'] or data['payer_account']:
-            return {
-                'values': data,
-                'confidence': 0.7
-            }
-        
-        return None
+        mask = small.point(lambda v: 255 if v >= paper_level - 40 else 0)
+        mask = mask.filter(ImageFilter.MinFilter(5)).filter(ImageFilter.MaxFilter(5))
+        bbox = mask.getbbox()
+        if not bbox:
+            return image
+        left, top, right, bottom = (int(v * factor) for v in bbox)
+        area = (right - left) * (bottom - top)
+        if area >= 0.9 * image.width * image.height or area < 0.1 * image.width * image.height:
+            return image
+        return image.crop((
+            max(0, left - margin), max(0, top - margin),
+            min(image.width, right + margin), min(image.height, bottom + margin)
+        ))
     
-    def _extract_bank_name(self, text):
-        """Extract bank name from text"""
-        south_african_banks = [
-            'ABSA', 'Standard Bank', 'FNB', 'Nedbank', 'Capitec',
-            'Investec', 'African Bank', 'Bidvest Bank', 'Discovery Bank',
-            'TymeBank', 'Bank Zero'
-        ]
-        
-        text_upper = text.upper()
-        for bank in south_african_banks:
-            if bank.upper() in text_upper:
-                return {
-                    'value': bank,
-                    'confidence': 0.9
-                }
-        
-        return None
+    @staticmethod
+    def _projection_score(image, angle):
+        """Variance of row darkness after rotating; peaks when text lines are level"""
+        rotated = image.rotate(angle, resample=Image.BILINEAR, expand=False, fillcolor=255)
+        rows = rotated.resize((1, rotated.height), Image.BOX).tobytes()
+        mean = sum(rows) / len(rows)
+        return sum((v - mean) ** 2 for v in rows)
+    
+    def _deskew(self, image, max_angle=DESKEW_MAX_ANGLE):
+        """Straighten slightly rotated photos using a horizontal projection profile"""
+        probe = image
+        if max(probe.size) > 800:
+            scale = 800 / max(probe.size)
+            probe = probe.resize((int(probe.width * scale), int(probe.height * scale)), Image.BOX)
+        
+        # Coarse search in 1 degree steps, then refine around the best
+        best = max(
+            (a for a in range(-int(max_angle), int(max_angle) + 1)),
+            key=lambda a: self._projection_score(probe, a)
+        )
+        fine = [best + step / 4 for step in range(-3, 4)]
+        best = max(fine, key=lambda a: self._projection_score(probe, a))
+        if abs(best) < 0.25:
+            return image
+        # Nearest-neighbour keeps the thresholded image strictly black/white
+        return image.rotate(best, resample=Image.NEAREST, expand=True, fillcolor=255)
+    
+    @staticmethod
+    def _adaptive_threshold(image, radius=ADAPTIVE_THRESHOLD_RADIUS, offset=ADAPTIVE_THRESHOLD_OFFSET):
+        """Local-mean threshold: ink is anything notably darker than its neighbourhood"""
+        local_mean = image.filter(ImageFilter.BoxBlur(radius))
+        darker_by = ImageChops.subtract(local_mean, image)
+        return darker_by.point(lambda v: 0 if v > offset else 255)
+    
+    def _parse_payment_info(self, text):
+        """
+        Parse extracted text to find payment information
+        Detects the bank and applies its field template (see ocr_templates),
+        returning per-field confidence alongside the values
+        """
+        return self.engine.extract(text)
     
     def validate_payment(self, extracted_amount, expected_amount, tolerance=0.01):
         """
@@ -0,0 +1,302 @@
+"""
+Bank-Template Extraction Engine for Proof of Payment Text
+
+All patterns are compiled once at import. Parsing a document is two scans:
+one combined regex detects the issuing bank, then that bank's field
+template (a single alternation over every labelled field) runs over the
+text. Fields the template misses fall back to a generic template.
+
+Each field carries its own confidence: a value found under a bank's own
+label (e.g. FNB "Recipient Reference") scores higher than one picked up
+by a generic pattern.
+"""
+import re
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Value patterns shared by every template (no capturing groups inside)
+AMOUNT = r'(?:R|ZAR)?[ \t]?(?:\d{1,3}(?:[ ,]\d{3})+|\d+)(?:\.\d{2})?(?:[ \t]?ZAR)?'
+REFERENCE = r'[A-Z0-9][A-Z0-9\-/]*'
+MONTHS = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*'
+DATE = (
+    r'(?:\d{4}[-/]\d{1,2}[-/]\d{1,2}'           # YYYY/MM/DD, YYYY-MM-DD
+    r'|\d{1,2}[-/]\d{1,2}[-/]\d{2,4}'           # DD/MM/YYYY, DD-MM-YY
+    rf'|\d{{1,2}}[ \t]+{MONTHS}[ \t]+\d{{2,4}})'  # 14 March 2026
+)
+NAME = r"[A-Z][A-Z'\-]+(?:[ \t]+[A-Z][A-Z'\-]+){1,3}"
+ACCOUNT = r'[0-9][0-9 \-]{6,18}[0-9]'
+SEPARATOR = r'[ \t]*[:\-]?[ \t]*'
+
+DATE_FORMATS = [
+    '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y',
+    '%Y/%m/%d', '%Y-%m-%d',
+    '%d %B %Y', '%d %b %Y'
+]
+
+# Confidence for a value found under a bank-specific label
+TEMPLATE_CONFIDENCE = 0.95
+BANK_CONFIDENCE = 0.9
+
+SOUTH_AFRICAN_BANKS = [
+    # (template key, display name, aliases)
+    ('absa', 'ABSA', ['ABSA']),
+    ('standard_bank', 'Standard Bank', ['Standard Bank']),
+    ('fnb', 'FNB', ['FNB', 'First National Bank']),
+    ('nedbank', 'Nedbank', ['Nedbank']),
+    ('capitec', 'Capitec', ['Capitec']),
+    ('investec', 'Investec', ['Investec']),
+    ('african_bank', 'African Bank', ['African Bank']),
+    ('bidvest_bank', 'Bidvest Bank', ['Bidvest Bank']),
+    ('discovery_bank', 'Discovery Bank', ['Discovery Bank']),
+    ('tymebank', 'TymeBank', ['TymeBank', 'Tyme Bank']),
+    ('bank_zero', 'Bank Zero', ['Bank Zero']),
+]
+
+BANK_NAMES = {key: name for key, name, _ in SOUTH_AFRICAN_BANKS}
+
+
+def _labels(*labels):
+    """Alternation of labels, longest first so 'Amount Paid' beats 'Amount'"""
+    ordered = sorted(labels, key=len, reverse=True)
+    return '(?:' + '|'.join(re.escape(label).replace(r'\ ', r'[ \t]+') for label in ordered) + ')'
+
+
+# One pass: the earliest bank mention (normally the letterhead) wins
+BANK_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(
+        f'(?P<{key}>{_labels(*aliases)})' for key, _, aliases in SOUTH_AFRICAN_BANKS
+    ) + r')\b',
+    re.IGNORECASE
+)
+
+
+def parse_amount(value):
+    """'R1 500.00', 'R 1,500.00', '1500.00 ZAR' -> Decimal (None if implausible)"""
+    digits = re.sub(r'[^0-9.]', '', value)
+    try:
+        amount = Decimal(digits)
+    except InvalidOperation:
+        return None
+    return amount if 0 < amount < 1000000 else None
+
+
+def parse_date(value, formats=DATE_FORMATS):
+    """Parse a date string with the first matching format"""
+    value = re.sub(r'\s+', ' ', value.strip())
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class FieldTemplate:
+    """
+    A set of field patterns compiled into one alternation.
+
+    Each pattern is (field, regex, confidence); the regex must contain
+    exactly one named group, written (?P<{group}>...) and renamed here to
+    <field>_<rank>. When a field matches several times, the lowest rank
+    (earliest pattern) wins, then the earliest position.
+    """
+
+    def __init__(self, key, patterns, date_formats=DATE_FORMATS):
+        self.key = key
+        self.date_formats = date_formats
+        self.confidence = {}
+        alternatives = []
+        for rank, (field, regex, confidence) in enumerate(patterns):
+            group = f'{field}_{rank}'
+            self.confidence[group] = confidence
+            alternatives.append(regex.replace('{group}', group))
+        self.pattern = re.compile('|'.join(alternatives), FLAGS)
+
+    def scan(self, text):
+        """
+        Single pass over text.
+
+        Returns:
+            dict: field -> list of (rank, value, confidence), in text order
+        """
+        found = {}
+        for match in self.pattern.finditer(text):
+            group = match.lastgroup
+            field, rank = group.rsplit('_', 1)
+            found.setdefault(field, []).append(
+                (int(rank), match.group(group).strip(), self.confidence[group])
+            )
+        return found
+
+
+def bank_template(key, amount, reference, date, payer=(), account=(),
+                  date_formats=DATE_FORMATS):
+    """
+    Template for one bank's layout. Labels are matched at the start of a
+    line, so e.g. "Own Reference" never satisfies a "Reference" label.
+    """
+    line = r'^[ \t]*'
+    patterns = [
+        ('amount', line + _labels(*amount) + SEPARATOR + rf'(?P<{{group}}>{AMOUNT})', TEMPLATE_CONFIDENCE),
+        ('reference', line + _labels(*reference) + SEPARATOR + rf'(?P<{{group}}>{REFERENCE})', TEMPLATE_CONFIDENCE),
+        ('date', line + _labels(*date) + SEPARATOR + rf'(?P<{{group}}>{DATE})', TEMPLATE_CONFIDENCE),
+    ]
+    if payer:
+        patterns.append(('payer_name', line + _labels(*payer) + SEPARATOR + rf'(?P<{{group}}>{NAME})[ \t]*$', 0.9))
+    if account:
+        patterns.append(('payer_account', line + _labels(*account) + SEPARATOR + rf'(?P<{{group}}>{ACCOUNT})', 0.9))
+    return FieldTemplate(key, patterns, date_formats)
+
+
+BANK_TEMPLATES = {
+    'fnb': bank_template(
+        'fnb',
+        amount=['Amount'],
+        reference=['Recipient Reference', 'Beneficiary Reference'],
+        date=['Date Actioned', 'Payment Date', 'Date'],
+        payer=['Account Holder', 'Payer'],
+        account=['From Account', 'Account Number'],
+        date_formats=['%Y/%m/%d', '%d/%m/%Y', '%d %B %Y', '%d %b %Y'],
+    ),
+    'absa': bank_template(
+        'absa',
+        amount=['Payment Amount', 'Amount'],
+        reference=['Beneficiary Reference', 'Recipient Reference'],
+        date=['Payment Date', 'Date'],
+        payer=['Account Holder', 'Paid By'],
+        account=['From Account', 'Account Number'],
+        date_formats=['%d %B %Y', '%d %b %Y', '%Y-%m-%d', '%d/%m/%Y'],
+    ),
+    'standard_bank': bank_template(
+        'standard_bank',
+        amount=['Amount'],
+        reference=['Beneficiary Reference', 'Recipient Reference'],
+        date=['Date', 'Payment Date'],
+        payer=['From', 'Payer Name'],
+        account=['From Account', 'Account Number'],
+        date_formats=['%d %b %Y', '%d %B %Y', '%Y-%m-%d', '%d/%m/%Y'],
+    ),
+    'nedbank': bank_template(
+        'nedbank',
+        amount=['Amount Paid', 'Amount'],
+        reference=['Recipient Reference', 'Beneficiary Reference'],
+        date=['Payment Date', 'Date'],
+        payer=['Paid By', 'Payer Name'],
+        account=['Paid From', 'From Account'],
+        date_formats=['%Y-%m-%d', '%d/%m/%Y', '%d %B %Y', '%d %b %Y'],
+    ),
+    'capitec': bank_template(
+        'capitec',
+        amount=['Amount'],
+        reference=['Their Reference', 'Beneficiary Reference', 'Recipient Reference'],
+        date=['Payment Date', 'Date'],
+        payer=['Account Holder', 'From'],
+        account=['From Account', 'Account Number'],
+        date_formats=['%d/%m/%Y', '%Y-%m-%d', '%d %B %Y', '%d %b %Y'],
+    ),
+}
+
+# Fallback for unknown layouts and for fields a bank template missed
+GENERIC_TEMPLATE = FieldTemplate('generic', [
+    ('amount', r'\b' + _labels('amount', 'total', 'paid', 'deposit', 'deposited') + SEPARATOR + rf'(?P<{{group}}>{AMOUNT})', 0.8),
+    ('amount', rf'(?P<{{group}}>(?:R|ZAR)[ \t]?(?:\d{{1,3}}(?:[ ,]\d{{3}})+|\d+)\.\d{{2}})', 0.6),
+    ('amount', r'(?P<{group}>(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2}[ \t]?(?:ZAR|R))\b', 0.6),
+    ('reference', r'\b' + _labels('beneficiary reference', 'recipient reference', 'their reference') + SEPARATOR + rf'(?P<{{group}}>{REFERENCE})', 0.85),
+    ('reference', r'\b' + _labels('reference', 'ref no', 'ref number', 'ref') + r'\b' + r'[ \t]*[:\-#]?[ \t]*' + rf'(?P<{{group}}>{REFERENCE})', 0.8),
+    ('reference', r'\b' + _labels('transaction', 'trans', 'txn') + r'[ \t:]*' + _labels('id', 'number', 'no') + SEPARATOR + rf'(?P<{{group}}>{REFERENCE})', 0.8),
+    ('reference', r'\b(?P<{group}>(?:INV|ORD)[-\s]*[A-Z0-9]+)', 0.7),
+    ('date', r'\bdate\b' + SEPARATOR + rf'(?P<{{group}}>{DATE})', 0.85),
+    ('date', rf'(?<![0-9])(?P<{{group}}>{DATE})', 0.8),
+    ('payer_name', r'\b' + _labels('from', 'payer', 'sender', 'name') + SEPARATOR + rf'(?P<{{group}}>{NAME})', 0.7),
+    ('payer_account', r'\b' + _labels('account', 'acc') + r'[ \t:]*' + r'(?:no|number)?' + SEPARATOR + rf'(?P<{{group}}>{ACCOUNT})', 0.7),
+])
+
+FIELDS = ('amount', 'reference', 'date', 'payer_name', 'payer_account')
+
+
+class ExtractionEngine:
+    """Detect the bank, apply its template, fall back to generic patterns"""
+
+    def __init__(self, templates=None, generic=GENERIC_TEMPLATE):
+        self.templates = BANK_TEMPLATES if templates is None else templates
+        self.generic = generic
+
+    def detect_bank(self, text):
+        """Template key of the first bank mentioned, or None"""
+        match = BANK_PATTERN.search(text)
+        return match.lastgroup if match else None
+
+    def extract(self, text):
+        """
+        Parse payment fields from OCR/PDF text.
+
+        Returns:
+            dict: amount, reference, date, payer_name, payer_account,
+                  bank_name, confidence (mean of found fields),
+                  field_confidence (per field) and template (key used)
+        """
+        bank = self.detect_bank(text)
+        template = self.templates.get(bank)
+
+        data = {field: None for field in FIELDS}
+        data['bank_name'] = BANK_NAMES.get(bank)
+        field_confidence = {}
+        if bank:
+            field_confidence['bank_name'] = BANK_CONFIDENCE
+
+        if template:
+            self._resolve(template.scan(text), template.date_formats, data, field_confidence)
+
+        missing = [field for field in FIELDS if data[field] is None]
+        if missing:
+            candidates = self.generic.scan(text)
+            candidates = {field: candidates[field] for field in missing if field in candidates}
+            self._resolve(candidates, self.generic.date_formats, data, field_confidence)
+
+        data['field_confidence'] = field_confidence
+        data['confidence'] = (
+            sum(field_confidence.values()) / len(field_confidence) if field_confidence else 0.0
+        )
+        data['template'] = template.key if template else self.generic.key
+        return data
+
+    def _resolve(self, candidates, date_formats, data, field_confidence):
+        """Pick one value per field from scan() candidates"""
+        for field, matches in candidates.items():
+            if field == 'amount':
+                result = self._resolve_amount(matches)
+            else:
+                result = None
+                for rank, value, confidence in sorted(matches, key=lambda m: m[0]):
+                    parsed = self._convert(field, value, date_formats)
+                    if parsed is not None:
+                        result = (parsed, confidence)
+                        break
+            if result:
+                data[field], field_confidence[field] = result
+
+    @staticmethod
+    def _resolve_amount(matches):
+        """Best-ranked amount; repeated elsewhere in the document adds confidence"""
+        parsed = [(rank, parse_amount(value), confidence) for rank, value, confidence in matches]
+        parsed = [match for match in parsed if match[1] is not None]
+        if not parsed:
+            return None
+        rank, amount, confidence = min(parsed, key=lambda m: m[0])
+        if Counter(value for _, value, _ in parsed)[amount] > 1:
+            confidence = min(confidence + 0.1, TEMPLATE_CONFIDENCE)
+        return float(amount), confidence
+
+    @staticmethod
+    def _convert(field, value, date_formats):
+        if field == 'date':
+            return parse_date(value, date_formats) or parse_date(value)
+        if field == 'payer_account':
+            return re.sub(r'[ \-]', '', value)
+        return value
+
+
+extraction_engine = ExtractionEngine()
@@ -0,0 +1,400 @@
+"""
+Page Cache - per-currency view cache with stale-while-revalidate and warm-up
+
+Storefront pages are cached one entry per variant:
+
+    view//products|ZAR    view//products|USD    view//services
+
+Pages declared with vary_currency=True are keyed on the visitor's currency
+(ZAR in South Africa, USD elsewhere: CF-IPCountry, else a GeoIP lookup that is
+remembered per client IP for CURRENCY_CACHE_TTL, so cache hits do not wait on
+it); the rest have a single entry.
+
+Every entry is fresh for CACHE_DEFAULT_TIMEOUT +/- CACHE_TTL_JITTER, so pages
+rendered together do not all expire together. After that:
+- for CACHE_STALE_GRACE seconds the stale copy is served while one
+  background request re-renders it (stale-while-revalidate)
+- past the grace window the page is re-rendered in the request; concurrent
+  requests for it wait for that render instead of running their own
+  (single flight: a Redis lock when REDIS_URL is set, else per process)
+- if that render fails (database unavailable) a copy up to
+  CACHE_STALE_IF_ERROR seconds stale is served instead of an error
+content_versions.invalidate() clears the cache: edits never serve stale.
+
+Warm-up renders every variant through the full WSGI stack and overwrites
+its entry, so visitors do not pay for cold queries and templates:
+- on startup
+- WARMUP_DELAY seconds after content_versions.invalidate()
+- every refresh_interval seconds, ahead of the earliest jittered expiry
+With Redis one worker warms per round (WARMUP_LOCK_KEY); with the simple
+cache each process warms its own.
+"""
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import request, make_response, url_for
+
+from geolocation import geolocation_service
+from pricing import pricing_service
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_JITTER = 0.1  # +/- fraction of the timeout
+CACHE_STALE_GRACE = 300  # seconds a stale page is served while it revalidates
+CACHE_STALE_IF_ERROR = 3600  # seconds a stale page may stand in for a failed render
+REGEN_LOCK_KEY_PREFIX = 'page_cache:lock:'
+REGEN_LOCK_TIMEOUT = 30  # seconds: a crashed renderer cannot hold a page forever
+REGEN_WAIT = 5.0  # seconds a request waits for another's render before rendering itself
+REGEN_POLL = 0.05
+WARMUP_LEAD = 30  # seconds: refresh this long before the earliest expiry
+WARMUP_DELAY = 1.0  # seconds: coalesce invalidations before re-warming
+WARMUP_LOCK_KEY = 'page_cache:warmup'
+WARMUP_ENVIRON_KEY = 'page_cache.warmup'  # not settable from HTTP headers
+BYPASS_ENVIRON_KEY = 'page_cache.bypass'  # render without reading or writing the cache (prerender.py)
+# CF-IPCountry sent to render each variant (XX: unknown, so USD pages name no country)
+CURRENCY_COUNTRIES = {'ZAR': 'ZA', 'USD': 'XX'}
+CURRENCY_CACHE_SIZE = 10000
+CURRENCY_CACHE_TTL = 3600  # seconds a client IP keeps its GeoIP currency
+CURRENCY_CACHE_FAILED_TTL = 300  # ... when the lookup failed (USD fallback)
+
+_currency_by_ip = OrderedDict()  # client IP -> (currency, expires_at)
+_currency_lock = threading.Lock()
+
+
+def jittered(timeout, jitter=CACHE_TTL_JITTER):
+    """timeout +/- jitter (fraction), in whole seconds"""
+    return max(1, int(random.uniform(timeout * (1 - jitter), timeout * (1 + jitter))))
+
+
+def request_currency():
+    country = request.headers.get('CF-IPCountry')
+    if country:
+        return 'ZAR' if country.upper() == 'ZA' else 'USD'
+
+    ip_address = geolocation_service.get_client_ip()
+    with _currency_lock:
+        entry = _currency_by_ip.get(ip_address)
+        if entry and entry[1] > time.monotonic():
+            _currency_by_ip.move_to_end(ip_address)
+            return entry[0]
+
+    context = pricing_service.get_customer_pricing_context(ip_address)
+    ttl = CURRENCY_CACHE_TTL if context.get('location_detected') else CURRENCY_CACHE_FAILED_TTL
+    with _currency_lock:
+        _currency_by_ip[ip_address] = (context['currency_code'], time.monotonic() + ttl)
+        _currency_by_ip.move_to_end(ip_address)
+        while len(_currency_by_ip) > CURRENCY_CACHE_SIZE:
+            _currency_by_ip.popitem(last=False)
+    return context['currency_code']
+
+
+def is_warmup_request():
+    return bool(request.environ.get(WARMUP_ENVIRON_KEY))
+
+
+# =====================================================
+# SINGLE-FLIGHT LOCKS
+# =====================================================
+
+class LocalLocks:
+    """One render per page per process"""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._held = set()
+
+    def acquire(self, key):
+        """Token to pass to release(), or None if the page is already being rendered"""
+        with self._guard:
+            if key in self._held:
+                return None
+            self._held.add(key)
+            return key
+
+    def release(self, token):
+        with self._guard:
+            self._held.discard(token)
+
+
+class RedisLocks:
+    """One render per page across workers; falls back to per-process locks if Redis fails"""
+
+    def __init__(self, client, timeout=REGEN_LOCK_TIMEOUT):
+        self.client = client
+        self.timeout = timeout
+        self.local = LocalLocks()
+
+    def acquire(self, key):
+        # thread_local=False: a background revalidation releases the request's lock
+        lock = self.client.lock(f"{REGEN_LOCK_KEY_PREFIX}{key}", timeout=self.timeout, thread_local=False)
+        try:
+            return lock if lock.acquire(blocking=False) else None
+        except Exception as e:
+            logger.warning(f"Page cache lock unavailable, locking per process: {e}")
+            return self.local.acquire(key)
+
+    def release(self, token):
+        if isinstance(token, str):
+            return self.local.release(token)
+        try:
+            token.release()
+        except Exception as e:
+            # expired (LockError) or Redis gone: the lock frees itself after `timeout`
+            logger.debug(f"Page cache lock release failed: {e}")
+
+
+# =====================================================
+# PAGE CACHE
+# =====================================================
+
+class PageCache:
+    """View cache decorator plus the warm-up job that keeps it filled"""
+
+    def __init__(self):
+        self.app = None
+        self.cache = None
+        self.locks = LocalLocks()
+        self.timeout = 300
+        self.jitter = CACHE_TTL_JITTER
+        self.grace = CACHE_STALE_GRACE
+        self.stale_if_error = CACHE_STALE_IF_ERROR
+        self.enabled = False
+        self.pages = {}  # endpoint -> vary_currency
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stats = {'runs': 0, 'skipped': 0, 'pages_warmed': 0, 'failures': 0, 'last_run': None}
+        self._served = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0,
+                        'revalidations': 0, 'stale_if_error': 0, 'errors': 0}
+
+    def init_app(self, app, cache, versions=None):
+        """
+        Args:
+            app: Flask app (REDIS_URL, CACHE_DEFAULT_TIMEOUT, CACHE_TTL_JITTER,
+                 CACHE_STALE_GRACE, CACHE_STALE_IF_ERROR, CACHE_WARMUP)
+            cache: flask_caching.Cache holding the pages
+            versions: ContentVersions whose invalidate() triggers a re-warm
+        """
+        self.app = app
+        self.cache = cache
+        redis_url = app.config.get('REDIS_URL')
+        if redis_url:
+            import redis
+            self.locks = RedisLocks(redis.from_url(redis_url))
+        self.timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        self.jitter = app.config.get('CACHE_TTL_JITTER', CACHE_TTL_JITTER)
+        self.grace = app.config.get('CACHE_STALE_GRACE', CACHE_STALE_GRACE)
+        self.stale_if_error = max(self.grace, app.config.get('CACHE_STALE_IF_ERROR', CACHE_STALE_IF_ERROR))
+        self.enabled = app.config.get('CACHE_WARMUP', False)
+        if versions is not None:
+            versions.on_invalidate(lambda scopes: self.schedule('invalidation'))
+
+    @property
+    def refresh_interval(self):
+        """Seconds between refreshes: before any entry can expire"""
+        return max(WARMUP_LEAD, int(self.timeout * (1 - self.jitter)) - WARMUP_LEAD)
+
+    # =====================================================
+    # VIEW CACHE
+    # =====================================================
+
+    def cached(self, vary_currency=False):
+        """
+        Decorator: serve the page from the cache (stale-while-revalidate,
+        single-flight renders, stale-if-error); warm-up requests always
+        re-render and overwrite it.
+        """
+        def decorator(view):
+            self.pages[view.__name__] = vary_currency
+
+            @wraps(view)
+            def cached_view(*args, **kwargs):
+                if request.environ.get(BYPASS_ENVIRON_KEY):
+                    return view(*args, **kwargs)
+                currency = request_currency() if vary_currency else None
+                key = f"view/{request.path}|{currency}" if currency else f"view/{request.path}"
+                if is_warmup_request():
+                    return self._render(key, view, args, kwargs)
+
+                entry = self._get(key)
+                if entry is not None:
+                    fresh_until, response = entry
+                    if time.time() < fresh_until:
+                        self._count('hits')
+                        return response
+                    if time.time() < fresh_until + self.grace:
+                        self._count('stale_hits')
+                        self._revalidate(key, request.path, currency)
+                        return response
+                self._count('misses')
+                return self._regenerate(key, entry, view, args, kwargs)
+            return cached_view
+        return decorator
+
+    def _get(self, key):
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.error(f"Page cache read failed for {key}: {e}")
+            return None
+
+    def _render(self, key, view, args, kwargs):
+        """Run the view and store a 200 response"""
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            fresh = jittered(self.timeout, self.jitter)
+            try:
+                self.cache.set(key, (time.time() + fresh, response), timeout=fresh + self.stale_if_error)
+            except Exception as e:
+                logger.error(f"Page cache write failed for {key}: {e}")
+        return response
+
+    def _regenerate(self, key, entry, view, args, kwargs):
+        """Render in this request, unless another request already is: then wait for its result"""
+        lock = self.locks.acquire(key)
+        if lock is None:
+            known = entry[0] if entry else 0
+            deadline = time.monotonic() + REGEN_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(REGEN_POLL)
+                rendered = self._get(key)
+                if rendered is not None and rendered[0] > known:
+                    self._count('coalesced')
+                    return rendered[1]
+        try:
+            return self._render(key, view, args, kwargs)
+        except Exception as e:
+            if entry is None or time.time() > entry[0] + self.stale_if_error:
+                self._count('errors')
+                raise
+            self._count('stale_if_error')
+            logger.warning(f"Serving stale {key}: render failed: {e}")
+            return entry[1]
+        finally:
+            if lock is not None:
+                self.locks.release(lock)
+
+    def _revalidate(self, key, path, currency):
+        """Re-render a stale page in the background, once across requests"""
+        lock = self.locks.acquire(key)
+        if lock is None:
+            return
+        thread = threading.Thread(target=self._revalidate_in_background, args=(lock, path, currency), daemon=True)
+        thread.start()
+
+    def _revalidate_in_background(self, lock, path, currency):
+        try:
+            status = self._fetch(self.app.test_client(), path, currency)
+            self._count('revalidations' if status == 200 else 'errors')
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Revalidation of {path} ({currency or 'any currency'}) failed: {e}")
+        finally:
+            self.locks.release(lock)
+
+    def _count(self, name):
+        with self._lock:
+            self._served[name] += 1
+
+    # =====================================================
+    # WARM-UP
+    # =====================================================
+
+    def targets(self):
+        """(path, currency) for every cached page variant; currency is None for unvaried pages"""
+        with self.app.test_request_context():
+            paths = {endpoint: url_for(endpoint) for endpoint in self.pages}
+        return [(paths[endpoint], currency)
+                for endpoint, vary_currency in self.pages.items()
+                for currency in (CURRENCY_COUNTRIES if vary_currency else (None,))]
+
+    @staticmethod
+    def _fetch(client, path, currency):
+        """Render one page variant into the cache through the full app; returns the status code"""
+        headers = {'CF-IPCountry': CURRENCY_COUNTRIES[currency]} if currency else {}
+        return client.get(path, headers=headers, base_url='https://localhost',
+                          environ_overrides={WARMUP_ENVIRON_KEY: True, 'REMOTE_ADDR': '127.0.0.1'}).status_code
+
+    def warm(self, reason='manual'):
+        """
+        Render every page variant into the cache.
+
+        Returns:
+            dict: report (reason, duration_ms, warmed, total, coverage, pages)
+            or None if another worker is already warming this round
+        """
+        if not self.cache.add(WARMUP_LOCK_KEY, reason, timeout=max(1, self.refresh_interval // 2)):
+            with self._lock:
+                self._stats['skipped'] += 1
+            return None
+
+        started = time.monotonic()
+        client = self.app.test_client()
+        pages = []
+        for path, currency in self.targets():
+            page_started = time.monotonic()
+            try:
+                status = self._fetch(client, path, currency)
+            except Exception as e:
+                logger.error(f"Warm-up of {path} ({currency or 'any currency'}) failed: {e}")
+                status = None
+            pages.append({'path': path, 'currency': currency, 'status': status,
+                          'ms': round((time.monotonic() - page_started) * 1000, 1)})
+
+        warmed = sum(1 for page in pages if page['status'] == 200)
+        report = {
+            'reason': reason,
+            'finished_at': datetime.utcnow().isoformat(),
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
+            'warmed': warmed,
+            'total': len(pages),
+            'coverage': round(warmed / len(pages), 3) if pages else 1.0,
+            'pages': pages,
+        }
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['pages_warmed'] += warmed
+            self._stats['failures'] += len(pages) - warmed
+            self._stats['last_run'] = report
+
+        log = logger.info if warmed == len(pages) else logger.warning
+        log(f"🔥 Page cache warm-up ({reason}): {warmed}/{len(pages)} variants in {report['duration_ms']:.0f} ms")
+        return report
+
+    def schedule(self, reason, delay=WARMUP_DELAY):
+        """Warm in the background after `delay` seconds; calls within the delay coalesce"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(delay, self._scheduled, args=(reason,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _scheduled(self, reason):
+        with self._lock:
+            self._timer = None
+        try:
+            self.warm(reason)
+        except Exception as e:
+            logger.error(f"Page cache warm-up ({reason}) failed: {e}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: runs, skipped, pages_warmed, failures, last_run (report),
+                  served (hits, stale_hits, misses, coalesced, revalidations,
+                  stale_if_error, errors), pages, refresh_interval, enabled
+        """
+        with self._lock:
+            stats = dict(self._stats, served=dict(self._served))
+        stats.update(pages=sorted(self.pages), refresh_interval=self.refresh_interval, enabled=self.enabled)
+        return stats
+
+
+page_cache = PageCache()
@@ -195,12 +195,15 @@ class PayFastPayment:
             logger.error(error_msg)
             raise PayFastPaymentError(error_msg)
 
-    def handle_callback(self, post_data):
+    def handle_callback(self, post_data, before_commit=None):
         """
         Handle PayFast payment callback/notification
         
         Args:
             post_data (dict): POST data from PayFast
+            before_commit (callable): Called with the result dict before the
+                payment update commits, e.g. to queue emails in the same
+                transaction; if it raises, the update is rolled back
             
         Returns:
             dict: Callback processing result {
@@ -270,6 +273,15 @@ class PayFastPayment:
                 else:
                     order.payment_status = 'pending' if transaction_status == 'pending' else 'failed'
             
+            db.session.flush()
+            result = {
+                'success': True,
+                'order_id': order_id,
+                'transaction_id': transaction.id,
+                'status': transaction_status
+            }
+            if before_commit:
+                before_commit(result)
             db.session.commit()
             
             logger.info(
@@ -277,12 +289,7 @@ class PayFastPayment:
                 f"Status: {transaction_status}, Transaction: {transaction.id}"
             )
             
-            return {
-                'success': True,
-                'order_id': order_id,
-                'transaction_id': transaction.id,
-                'status': transaction_status
-            }
+            return result
             
         except PayFastPaymentError:
             db.session.rollback()
@@ -28,17 +28,13 @@ from flask_wtf.csrf import CSRFProtect
 from models import Order, Transaction, db
 from stripe_service import StripePayment, StripePaymentError
 from payfast_service import PayFastPayment, PayFastPaymentError
-from email_service import EmailService
+from email_outbox import queue_email
 from config import Config
 
 # Get CSRF instance
 csrf = CSRFProtect()
 
 # Get config values
-SMTP_SERVER = Config.MAIL_SERVER
-SMTP_PORT = Config.MAIL_PORT
-SENDER_EMAIL = Config.MAIL_USERNAME
-SENDER_PASSWORD = Config.MAIL_PASSWORD
 COMPANY_NAME = Config.MAIL_FROM_NAME
 COMPANY_EMAIL = Config.CONTACT_EMAIL
 COMPANY_PHONE = '+27 64 902 4363'
@@ -56,18 +52,6 @@ logger = logging.getLogger(__name__)
 # Rate limiting storage (in production, use Redis)
 rate_limit_store = {}
 
-# Initialize email service
-try:
-    email_service = EmailService(
-        smtp_server=SMTP_SERVER,
-        smtp_port=SMTP_PORT,
-        sender_email=SENDER_EMAIL,
-        sender_password=SENDER_PASSWORD
-    )
-except Exception as e:
-    logger.warning(f"Email service initialization failed: {str(e)}")
-    email_service = None
-
 
 def rate_limit(max_calls=10, time_window=60):
     """
@@ -384,6 +368,153 @@ def payment_status():
 # Webhook Routes
 # ============================================================================
 
+def queue_stripe_emails(result):
+    """Queue the customer emails for a Stripe webhook result (before it commits)"""
+    event_type = result.get('event_type')
+    order_id = result.get('order_id')
+
+    if order_id:
+        order = db.session.get(Order, order_id)
+        if order:
+            # Get customer email
+            if hasattr(order, 'customer') and order.customer:
+                customer_email = order.customer.email
+                customer_name = order.customer.name
+            else:
+                customer_email = order.customer_email if \
+                    hasattr(order, 'customer_email') else None
+                customer_name = order.customer_name if \
+                    hasattr(order, 'customer_name') else "Customer"
+
+            if customer_email:
+                # Handle payment success
+                if event_type == 'payment_intent.succeeded':
+                    transaction = db.session.get(
+                        Transaction,
+                        result.get('transaction_id')
+                    )
+                    if transaction:
+                        queue_email(
+                            'send_payment_confirmation', customer_email,
+                            recipient_name=customer_name,
+                            transaction_id=transaction.id,
+                            amount=transaction.amount,
+                            currency='ZAR',
+                            payment_method='Stripe',
+                            company_name=COMPANY_NAME,
+                            company_email=COMPANY_EMAIL,
+                            company_phone=COMPANY_PHONE
+                        )
+
+                # Handle payment failure
+                elif event_type == 'payment_intent.payment_failed':
+                    error_msg = result.get(
+                        'error_message',
+                        'Payment processing failed'
+                    )
+                    retry_url = (
+                        f"{request.host_url.rstrip('/')}"
+                        f"/payment/select?order={order_id}"
+                    )
+                    queue_email(
+                        'send_payment_failed_email', customer_email,
+                        recipient_name=customer_name,
+                        order_number=order.order_number,
+                        error_message=error_msg,
+                        company_name=COMPANY_NAME,
+                        company_email=COMPANY_EMAIL,
+                        company_phone=COMPANY_PHONE,
+                        retry_url=retry_url
+                    )
+
+                # Handle refund
+                elif event_type == 'charge.refunded':
+                    transaction = db.session.get(
+                        Transaction,
+                        result.get('transaction_id')
+                    )
+                    if transaction:
+                        refund_amount = (
+                            transaction.refund_amount
+                        )
+                        refund_reason = (
+                            transaction.refund_reason or
+                            'Refund processed'
+                        )
+                        queue_email(
+                            'send_refund_email', customer_email,
+                            recipient_name=customer_name,
+                            order_number=order.order_number,
+                            transaction_id=transaction.id,
+                            refund_amount=refund_amount,
+                            currency='ZAR',
+                            refund_reason=refund_reason,
+                            company_name=COMPANY_NAME,
+                            company_email=COMPANY_EMAIL,
+                            company_phone=COMPANY_PHONE
+                        )
+
+
+def queue_payfast_emails(result):
+    """Queue the customer emails for a PayFast callback result (before it commits)"""
+    status = result.get('status')
+    order_id = result.get('order_id')
+
+    if order_id:
+        order = db.session.get(Order, order_id)
+        if order:
+            # Get customer email
+            if hasattr(order, 'customer') and order.customer:
+                customer_email = order.customer.email
+                customer_name = order.customer.name
+            else:
+                customer_email = order.customer_email if \
+                    hasattr(order, 'customer_email') else None
+                customer_name = order.customer_name if \
+                    hasattr(order, 'customer_name') else "Customer"
+
+            if customer_email:
+                # Handle payment success
+                if status == 'completed':
+                    transaction = db.session.get(
+                        Transaction,
+                        result.get('transaction_id')
+                    )
+                    if transaction:
+                        queue_email(
+                            'send_payment_confirmation', customer_email,
+                            recipient_name=customer_name,
+                            transaction_id=transaction.id,
+                            amount=transaction.amount,
+                            currency='ZAR',
+                            payment_method='PayFast',
+                            company_name=COMPANY_NAME,
+                            company_email=COMPANY_EMAIL,
+                            company_phone=COMPANY_PHONE
+                        )
+
+                # Handle payment failure
+                elif status in ['failed', 'cancelled']:
+                    error_msg = 'Payment was not completed'
+                    if status == 'cancelled':
+                        error_msg = 'Payment was cancelled'
+
+                    retry_url = (
+                        f"{request.host_url.rstrip('/')}"
+                        f"/payment/select?order={order_id}"
+                    )
+                    queue_email(
+                        'send_payment_failed_email', customer_email,
+                        recipient_name=customer_name,
+                        order_number=order.order_number,
+                        error_message=error_msg,
+                        company_name=COMPANY_NAME,
+                        company_email=COMPANY_EMAIL,
+                        company_phone=COMPANY_PHONE,
+                        retry_url=retry_url
+                    )
+
+
 @payment_bp.route('/webhooks/stripe', methods=['POST'])
 @csrf.exempt
 @rate_limit(max_calls=100)
@@ -406,100 +537,15 @@ def stripe_webhook():
         
         try:
             stripe = StripePayment()
-            result = stripe.handle_webhook(payload, sig_header)
+            result = stripe.handle_webhook(
+                payload, sig_header, before_commit=queue_stripe_emails
+            )
             
             logger.info(
                 f"Stripe webhook processed: {result['event_type']} "
                 f"for order {result.get('order_id')}"
             )
             
-            # Send notification emails based on event type
-            event_type = result.get('event_type')
-            order_id = result.get('order_id')
-            
-            if order_id and email_service:
-                order = db.session.get(Order, order_id)
-                if order:
-                    # Get customer email
-                    if hasattr(order, 'customer') and order.customer:
-                        customer_email = order.customer.email
-                        customer_name = order.customer.name
-                    else:
-                        customer_email = order.customer_email if \
-                            hasattr(order, 'customer_email') else None
-                        customer_name = order.customer_name if \
-                            hasattr(order, 'customer_name') else "Customer"
-                    
-                    if customer_email:
-                        # Handle payment success
-                        if event_type == 'payment_intent.succeeded':
-                            transaction = db.session.get(
-                                Transaction,
-                                result.get('transaction_id')
-                            )
-                            if transaction:
-                                email_service.\
-                                    send_payment_confirmation(
-                                        recipient_email=customer_email,
-                                        recipient_name=customer_name,
-                                        transaction_id=transaction.id,
-                                        amount=transaction.amount,
-                                        currency='ZAR',
-                                        payment_method='Stripe',
-                                        company_name=COMPANY_NAME,
-                                        company_email=COMPANY_EMAIL,
-                                        company_phone=COMPANY_PHONE
-                                    )
-                        
-                        # Handle payment failure
-                        elif event_type == 'payment_intent.payment_failed':
-                            error_msg = result.get(
-                                'error_message',
-                                'Payment processing failed'
-                            )
-                            retry_url = (
-                                f"{request.host_url.rstrip('/')}"
-                                f"/payment/select?order={order_id}"
-                            )
-                            email_service.\
-                                send_payment_failed_email(
-                                    recipient_email=customer_email,
-                                    recipient_name=customer_name,
-                                    order_number=order.order_number,
-                                    error_message=error_msg,
-                                    company_name=COMPANY_NAME,
-                                    company_email=COMPANY_EMAIL,
-                                    company_phone=COMPANY_PHONE,
-                                    retry_url=retry_url
-                                )
-                        
-                        # Handle refund
-                        elif event_type == 'charge.refunded':
-                            transaction = db.session.get(
-                                Transaction,
-                                result.get('transaction_id')
-                            )
-                            if transaction:
-                                refund_amount = (
-                                    transaction.refund_amount
-                                )
-                                refund_reason = (
-                                    transaction.refund_reason or
-                                    'Refund processed'
-                                )
-                                email_service.send_refund_email(
-                                    recipient_email=customer_email,
-                                    recipient_name=customer_name,
-                                    order_number=order.order_number,
-                                    transaction_id=transaction.id,
-                                    refund_amount=refund_amount,
-                                    currency='ZAR',
-                                    refund_reason=refund_reason,
-                                    company_name=COMPANY_NAME,
-                                    company_email=COMPANY_EMAIL,
-                                    company_phone=COMPANY_PHONE
-                                )
-            
             return jsonify({
                 'success': True,
                 'event_id': result['event_id'],
@@ -527,73 +573,15 @@ def payfast_webhook():
     try:
         try:
             payfast = PayFastPayment()
-            result = payfast.handle_callback(request.form)
+            result = payfast.handle_callback(
+                request.form, before_commit=queue_payfast_emails
+            )
             
             logger.info(
                 f"PayFast callback processed: {result['status']} "
                 f"for order {result['order_id']}"
             )
             
-            # Send notification emails based on payment status
-            status = result.get('status')
-            order_id = result.get('order_id')
-            
-            if order_id and email_service:
-                order = db.session.get(Order, order_id)
-                if order:
-                    # Get customer email
-                    if hasattr(order, 'customer') and order.customer:
-                        customer_email = order.customer.email
-                        customer_name = order.customer.name
-                    else:
-                        customer_email = order.customer_email if \
-                            hasattr(order, 'customer_email') else None
-                        customer_name = order.customer_name if \
-                            hasattr(order, 'customer_name') else "Customer"
-                    
-                    if customer_email:
-                        # Handle payment success
-                        if status == 'completed':
-                            transaction = db.session.get(
-                                Transaction,
-                                result.get('transaction_id')
-                            )
-                            if transaction:
-                                email_service.\
-                                    send_payment_confirmation(
-                                        recipient_email=customer_email,
-                                        recipient_name=customer_name,
-                                        transaction_id=transaction.id,
-                                        amount=transaction.amount,
-                                        currency='ZAR',
-                                        payment_method='PayFast',
-                                        company_name=COMPANY_NAME,
-                                        company_email=COMPANY_EMAIL,
-                                        company_phone=COMPANY_PHONE
-                                    )
-                        
-                        # Handle payment failure
-                        elif status in ['failed', 'cancelled']:
-                            error_msg = 'Payment was not completed'
-                            if status == 'cancelled':
-                                error_msg = 'Payment was cancelled'
-                            
-                            retry_url = (
-                                f"{request.host_url.rstrip('/')}"
-                                f"/payment/select?order={order_id}"
-                            )
-                            email_service.\
-                                send_payment_failed_email(
-                                    recipient_email=customer_email,
-                                    recipient_name=customer_name,
-                                    order_number=order.order_number,
-                                    error_message=error_msg,
-                                    company_name=COMPANY_NAME,
-                                    company_email=COMPANY_EMAIL,
-                                    company_phone=COMPANY_PHONE,
-                                    retry_url=retry_url
-                                )
-            
             # PayFast expects 'success' in response
             return 'success', 200
         
@@ -811,12 +799,43 @@ def admin_refund_transaction(tx_id):
         )
         
         try:
+            def queue_refund_email(result):
+                """Refund email, queued in the same transaction as the refund"""
+                refund_amount = result.get('amount', amount)
+                order = db.session.get(Order, transaction.order_id)
+
+                if order:
+                    # Get customer email
+                    if hasattr(order, 'customer') and order.customer:
+                        customer_email = order.customer.email
+                        customer_name = order.customer.name
+                    else:
+                        customer_email = order.customer_email if \
+                            hasattr(order, 'customer_email') else None
+                        customer_name = order.customer_name if \
+                            hasattr(order, 'customer_name') else "Customer"
+
+                    if customer_email:
+                        queue_email(
+                            'send_refund_email', customer_email,
+                            recipient_name=customer_name,
+                            order_number=order.order_number,
+                            transaction_id=transaction.id,
+                            refund_amount=refund_amount,
+                            currency='ZAR',
+                            refund_reason=reason,
+                            company_name=COMPANY_NAME,
+                            company_email=COMPANY_EMAIL,
+                            company_phone=COMPANY_PHONE
+                        )
+            
             if transaction.payment_method == 'stripe':
                 stripe = StripePayment()
                 result = stripe.refund_payment(
                     transaction.payment_reference,
                     amount=int(amount * 100) if amount else None,
-                    reason=reason
+                    reason=reason,
+                    before_commit=queue_refund_email
                 )
             else:  # payfast
                 # PayFast doesn't support direct refunds through API
@@ -835,35 +854,6 @@ def admin_refund_transaction(tx_id):
                 f"{result.get('amount', amount)}"
             )
             
-            # Send refund notification email
-            refund_amount = result.get('amount', amount)
-            order = db.session.get(Order, transaction.order_id)
-            
-            if order and email_service:
-                # Get customer email
-                if hasattr(order, 'customer') and order.customer:
-                    customer_email = order.customer.email
-                    customer_name = order.customer.name
-                else:
-                    customer_email = order.customer_email if \
-                        hasattr(order, 'customer_email') else None
-                    customer_name = order.customer_name if \
-                        hasattr(order, 'customer_name') else "Customer"
-                
-                if customer_email:
-                    email_service.send_refund_email(
-                        recipient_email=customer_email,
-                        recipient_name=customer_name,
-                        order_number=order.order_number,
-                        transaction_id=transaction.id,
-                        refund_amount=refund_amount,
-                        currency='ZAR',
-                        refund_reason=reason,
-                        company_name=COMPANY_NAME,
-                        company_email=COMPANY_EMAIL,
-                        company_phone=COMPANY_PHONE
-                    )
-            
             return jsonify({
                 'success': True,
                 'refund_id': result.get('refund_id'),
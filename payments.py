@@ -5,6 +5,7 @@ from flask import current_app, url_for
 from models import Transaction, Order, db
 from datetime import datetime, timezone
 import uuid
+from stripe_service import stripe_breaker
 
 class StripePayment:
     def __init__(self):
@@ -13,7 +14,8 @@ class StripePayment:
     def create_payment_intent(self, order_id, amount, currency='usd', description=''):
         """Create a Stripe payment intent for an order"""
         try:
-            intent = stripe.PaymentIntent.create(
+            intent = stripe_breaker.call(
+                stripe.PaymentIntent.create,
                 amount=int(amount * 100),  # Stripe uses cents
                 currency=currency,
                 metadata={'order_id': order_id},
@@ -39,7 +41,7 @@ class StripePayment:
     def confirm_payment(self, payment_intent_id):
         """Confirm a Stripe payment"""
         try:
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = stripe_breaker.call(stripe.PaymentIntent.retrieve, payment_intent_id)
             
             transaction = Transaction.query.filter_by(payment_reference=payment_intent_id).first()
             if transaction:
@@ -97,7 +99,8 @@ class StripePayment:
             
             refund_amount = amount or transaction.amount
             
-            refund = stripe.Refund.create(
+            refund = stripe_breaker.call(
+                stripe.Refund.create,
                 payment_intent=payment_intent_id,
                 amount=int(refund_amount * 100) if amount else None,
             )
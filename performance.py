@@ -3,9 +3,13 @@ PERFORMANCE OPTIMIZATION MODULE
 Ultra-fast database queries and caching
 """
 from functools import wraps, lru_cache
-from flask import g
+from flask import g, request
+import os
+import glob
+import gzip
 import time
 import hashlib
+import threading
 
 # QUERY CACHE (IN-MEMORY)
 _query_cache = {}
@@ -80,10 +84,226 @@ def index_hint(model, index_name):
 
 
 # RESPONSE COMPRESSION
-def compress_response(data):
-    """Compress response data"""
-    import gzip
-    return gzip.compress(data.encode() if isinstance(data, str) else data)
+# Negotiated per request (brotli preferred, then gzip) for text responses
+# above COMPRESS_MIN_SIZE. Static CSS/JS is compressed once at startup at the
+# highest level and served from memory, never compressed per request.
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 4  # per request: fast, still smaller than gzip -6
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+PRECOMPRESS_PATTERNS = ('style.css', 'mobile-*.css', 'js/*.js')
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick a content coding from an Accept-Encoding header.
+
+    Returns:
+        str: 'br', 'gzip' or None (identity)
+    """
+    offered = {}
+    for item in (accept_encoding or '').lower().split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            offered[coding] = q
+    for coding in (('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)):
+        if offered.get(coding, offered.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def compress_response(data, encoding='gzip', level=None):
+    """Compress response data with 'gzip' or 'br'"""
+    data = data.encode() if isinstance(data, str) else data
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL if level is None else level)
+
+
+class CompressionMetrics:
+    """Bytes saved and CPU spent on per-request compression"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._counters = {'compressed': 0, 'skipped': 0, 'precompressed_served': 0,
+                          'bytes_in': 0, 'bytes_out': 0, 'precompressed_bytes_saved': 0,
+                          'cpu_ms': 0.0}
+        self._by_encoding = {}
+
+    def record(self, encoding, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            self._counters['compressed'] += 1
+            self._counters['bytes_in'] += bytes_in
+            self._counters['bytes_out'] += bytes_out
+            self._counters['cpu_ms'] += cpu_seconds * 1000
+            self._by_encoding[encoding] = self._by_encoding.get(encoding, 0) + 1
+
+    def record_static(self, bytes_saved):
+        with self._lock:
+            self._counters['precompressed_served'] += 1
+            self._counters['precompressed_bytes_saved'] += bytes_saved
+
+    def skip(self):
+        with self._lock:
+            self._counters['skipped'] += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: counters, bytes_saved, ratio, cpu_ms_per_response, by_encoding
+        """
+        with self._lock:
+            stats = dict(self._counters, by_encoding=dict(self._by_encoding))
+        stats['cpu_ms'] = round(stats['cpu_ms'], 2)
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out'] + stats['precompressed_bytes_saved']
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+        stats['cpu_ms_per_response'] = (
+            round(stats['cpu_ms'] / stats['compressed'], 3) if stats['compressed'] else None
+        )
+        stats['brotli_available'] = BROTLI_AVAILABLE
+        return stats
+
+
+compression_metrics = CompressionMetrics()
+
+# static filename -> {'gzip': bytes, 'br': bytes, 'size': int}
+_precompressed = {}
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def precompress_static(static_folder, patterns=PRECOMPRESS_PATTERNS):
+    """
+    Build .gz / .br siblings for static assets (highest levels) and keep them
+    in memory. Siblings newer than their source are reused, so a build step
+    or the first worker to start pays the cost once.
+
+    Returns:
+        dict: filename -> {encoding: bytes, 'size': original size}
+    """
+    _precompressed.clear()
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(static_folder, pattern))):
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                source = f.read()
+            mtime = os.path.getmtime(path)
+            variants = {'size': len(source)}
+            for encoding, suffix, level in (('gzip', '.gz', 9), ('br', '.br', 11)):
+                if encoding == 'br' and not BROTLI_AVAILABLE:
+                    continue
+                sibling = path + suffix
+                if os.path.exists(sibling) and os.path.getmtime(sibling) >= mtime:
+                    with open(sibling, 'rb') as f:
+                        variants[encoding] = f.read()
+                    continue
+                variants[encoding] = compress_response(source, encoding, level)
+                try:
+                    _write_atomic(sibling, variants[encoding])
+                except OSError as e:  # read-only deploy: keep it in memory only
+                    print(f"Could not write {sibling}: {e}")
+            _precompressed[filename] = variants
+    return _precompressed
+
+
+def precompressed_variant(filename, encoding):
+    """Precompressed bytes for a static file, or None"""
+    return _precompressed.get(filename, {}).get(encoding)
+
+
+def _serve_precompressed(response, encoding):
+    """Swap a full static file response for its precompressed variant"""
+    filename = request.view_args.get('filename') if request.view_args else None
+    if filename not in _precompressed:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = precompressed_variant(filename, encoding) if encoding else None
+    if body is None or request.range:
+        return response
+
+    tag, weak = response.get_etag()
+    if hasattr(response.response, 'close'):
+        response.response.close()  # the open file from send_file
+    response.direct_passthrough = False
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if tag:
+        # Each coding is its own representation
+        response.set_etag(f"{tag}-{encoding}", weak)
+        if request.if_none_match.contains_raw(response.headers['ETag']):
+            response.status_code = 304
+            response.set_data(b'')
+            del response.headers['Content-Encoding']
+            return response
+    compression_metrics.record_static(_precompressed[filename]['size'] - len(body))
+    return response
+
+
+def enable_compression(app, min_size=COMPRESS_MIN_SIZE):
+    """
+    Compress responses on the way out. after_request hooks run in reverse
+    registration order, so register this before hooks that change the body.
+    """
+    @app.after_request
+    def compress(response):
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if request.endpoint == 'static':
+            if response.status_code == 200:
+                return _serve_precompressed(response, encoding)
+            return response
+
+        if (encoding is None or request.method == 'HEAD'
+                or response.status_code != 200
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or 'no-transform' in (response.headers.get('Cache-Control') or '')):
+            if response.mimetype in COMPRESSIBLE_TYPES:
+                response.vary.add('Accept-Encoding')
+            return response
+
+        data = response.get_data()
+        response.vary.add('Accept-Encoding')
+        if len(data) < min_size:
+            compression_metrics.skip()
+            return response
+
+        started = time.process_time()
+        compressed = compress_response(data, encoding)
+        compression_metrics.record(encoding, len(data), len(compressed), time.process_time() - started)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        tag, weak = response.get_etag()
+        if tag and not weak:
+            response.set_etag(tag, weak=True)  # bytes differ per coding
+        return response
+
+    return compress
 
 
 # PAGINATION OPTIMIZATION
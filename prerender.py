@@ -0,0 +1,376 @@
+"""
+Prerendered Pages - public pages written to static HTML and served without Flask
+
+The homepage, services, contact, privacy and terms pages change only when an
+admin edits content, yet every request queried the database and rendered
+Jinja. They are rendered through the full app as an anonymous visitor (once
+per currency for pages that vary on it) and written to
+
+    <PRERENDER_FOLDER>/<endpoint>[.<currency>].html    the page
+    <PRERENDER_FOLDER>/<endpoint>[.<currency>].json    its headers (CSP, ...)
+
+on startup, PRERENDER_DELAY seconds after content_versions.invalidate(), and
+from `python prerender.py`. Files are rewritten only when the output changed;
+workers share the folder and reload a page when its file changes.
+
+Pages embed a per-session CSRF token, which a static file cannot carry, so
+the files hold CSRF_PLACEHOLDER instead and are served:
+- by the static fast path (static_files.py) to visitors without a session or
+  remember cookie, when no form on the page posts the token
+- by Flask, with the visitor's own token filled in, to other anonymous
+  visitors: no database query or template render
+Signed-in visitors and visitors with flashed messages get the live page, and
+so do page cache warm-ups (page_cache.py), which must render to fill the cache.
+With PRERENDER_REQUIRE_HTTPS the fast path only answers requests that arrived
+over HTTPS; plain HTTP goes on to Flask's force_https redirect.
+
+check() renders every page live and compares it with its file. Drift (an
+edit that skipped invalidate(), a deploy that changed a template) is logged
+and healed; it runs every PRERENDER_CHECK_INTERVAL seconds and from
+`python prerender.py --check`.
+
+Usage:
+    python prerender.py            # render and write every page
+    python prerender.py --check    # report drift, exit 1 if any
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from flask import request, session, make_response, url_for, has_request_context
+from flask_wtf.csrf import generate_csrf
+from werkzeug.http import parse_cookie
+
+from page_cache import BYPASS_ENVIRON_KEY, WARMUP_ENVIRON_KEY, CURRENCY_COUNTRIES
+from performance import BROTLI_AVAILABLE, compress_response
+from static_files import StaticEntry
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> varies by currency (none of these show prices)
+PRERENDER_PAGES = {'index': False, 'services': False, 'contact': False, 'privacy': False, 'terms': False}
+PRERENDER_DELAY = 1.0  # seconds: coalesce invalidations before re-rendering
+PRERENDER_CHECK_INTERVAL = int(os.getenv('PRERENDER_CHECK_INTERVAL', 3600))  # seconds between drift checks
+PRERENDER_ENVIRON_KEY = 'prerender.render'  # not settable from HTTP headers
+PRERENDER_CACHE_CONTROL = 'private, no-cache'  # browsers revalidate; shared caches must not mix visitors
+CSRF_PLACEHOLDER = '__prerender_csrf_token__'
+# Headers that belong to one response, not to the page
+SKIP_HEADERS = {'content-length', 'content-type', 'content-encoding', 'cache-control', 'etag',
+                'last-modified', 'vary', 'set-cookie', 'date', 'expires', 'x-response-time'}
+
+PrerenderedPage = namedtuple('PrerenderedPage', 'entry html headers needs_token mtime_ns cache_control')
+
+
+def is_prerender_request():
+    return bool(request.environ.get(PRERENDER_ENVIRON_KEY))
+
+
+def is_https(environ):
+    """Whether the visitor connected over HTTPS, directly or via Railway/Cloudflare (as force_https)"""
+    return (environ.get('wsgi.url_scheme') == 'https'
+            or environ.get('HTTP_X_FORWARDED_PROTO') == 'https'
+            or '"scheme":"https"' in environ.get('HTTP_CF_VISITOR', ''))
+
+
+class Prerenderer:
+    """Writes prerendered pages and serves them to the visitors they apply to"""
+
+    def __init__(self, pages=None):
+        self.pages = dict(PRERENDER_PAGES if pages is None else pages)
+        self.app = None
+        self.folder = None
+        self.enabled = False
+        self.require_https = False
+        self.routes = {}  # url path -> (endpoint, vary_currency)
+        self.session_cookies = ('session', 'remember_token')
+        self._loaded = {}  # file name -> PrerenderedPage
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stats = {'runs': 0, 'written': 0, 'drift': 0, 'errors': 0, 'served_static': 0,
+                       'served_flask': 0, 'last_run': None, 'last_check': None}
+
+    def init_app(self, app, versions=None):
+        """
+        Call once the pages' routes are registered.
+
+        Args:
+            app: Flask app (PRERENDER_ENABLED, PRERENDER_FOLDER, PRERENDER_REQUIRE_HTTPS,
+                 SESSION_COOKIE_NAME, REMEMBER_COOKIE_NAME)
+            versions: ContentVersions whose invalidate() triggers a re-render
+        """
+        self.app = app
+        self.folder = app.config.get('PRERENDER_FOLDER') or os.path.join(app.instance_path, 'prerendered')
+        self.enabled = app.config.get('PRERENDER_ENABLED', False)
+        self.require_https = app.config.get('PRERENDER_REQUIRE_HTTPS', False)
+        self.session_cookies = (app.config.get('SESSION_COOKIE_NAME', 'session'),
+                                app.config.get('REMEMBER_COOKIE_NAME', 'remember_token'))
+        with app.test_request_context():
+            self.routes = {url_for(endpoint): (endpoint, vary_currency)
+                           for endpoint, vary_currency in self.pages.items() if endpoint in app.view_functions}
+        app.context_processor(self._template_context)
+        app.before_request(self._serve_from_flask)
+        if versions is not None:
+            versions.on_invalidate(lambda scopes: self.schedule('invalidation'))
+
+    def variants(self):
+        """(path, file name, currency) for every page file"""
+        return [(path, f"{endpoint}.{currency}" if currency else endpoint, currency)
+                for path, (endpoint, vary_currency) in self.routes.items()
+                for currency in (CURRENCY_COUNTRIES if vary_currency else (None,))]
+
+    # =====================================================
+    # RENDERING
+    # =====================================================
+
+    @staticmethod
+    def _template_context():
+        if has_request_context() and is_prerender_request():
+            return {'csrf_token': lambda: CSRF_PLACEHOLDER}
+        return {}
+
+    @staticmethod
+    def _render(client, path, currency):
+        """Live anonymous render, bypassing the page cache: (status, html, headers)"""
+        response = client.get(
+            path, headers={'CF-IPCountry': CURRENCY_COUNTRIES[currency]} if currency else {},
+            base_url='https://localhost',
+            environ_overrides={PRERENDER_ENVIRON_KEY: True, BYPASS_ENVIRON_KEY: True, 'REMOTE_ADDR': '127.0.0.1'}
+        )
+        headers = [[name, value] for name, value in response.headers if name.lower() not in SKIP_HEADERS]
+        return response.status_code, response.get_data(), headers
+
+    def _stored(self, name):
+        """(html, headers) of a page file, or (None, None)"""
+        try:
+            with open(os.path.join(self.folder, f"{name}.html"), 'rb') as f:
+                html = f.read()
+            with open(os.path.join(self.folder, f"{name}.json")) as f:
+                headers = json.load(f)['headers']
+        except (OSError, ValueError, KeyError):
+            return None, None
+        return html, headers
+
+    def _write(self, name, path, currency, html, headers):
+        os.makedirs(self.folder, exist_ok=True)
+        meta = {'path': path, 'currency': currency, 'headers': headers,
+                'rendered_at': datetime.utcnow().isoformat()}
+        # headers first: a reader that sees the new page also sees its headers
+        for filename, data in ((f"{name}.json", json.dumps(meta, indent=2).encode()), (f"{name}.html", html)):
+            target = os.path.join(self.folder, filename)
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, target)
+
+    def prerender(self, reason='manual', write=True):
+        """
+        Render every page and compare it with its file.
+
+        Args:
+            reason: Logged with the report
+            write: Rewrite files that are missing or differ
+
+        Returns:
+            dict: reason, duration_ms, total, unchanged, changed, missing,
+                  errors, written, pages [{path, currency, state, status}]
+        """
+        started = time.monotonic()
+        client = self.app.test_client(use_cookies=False)
+        pages = []
+        for path, name, currency in self.variants():
+            page = {'path': path, 'currency': currency, 'status': None}
+            try:
+                page['status'], html, headers = self._render(client, path, currency)
+            except Exception as e:
+                logger.error(f"Prerender of {path} ({currency or 'any currency'}) failed: {e}")
+            if page['status'] != 200:
+                page['state'] = 'error'
+            else:
+                stored = self._stored(name)
+                if stored[0] is None:
+                    page['state'] = 'missing'
+                elif stored != (html, headers):
+                    page['state'] = 'changed'
+                    page['first_difference'] = next(
+                        (i for i, (a, b) in enumerate(zip(stored[0], html)) if a != b), min(len(stored[0]), len(html))
+                    )
+                else:
+                    page['state'] = 'unchanged'
+                if write and page['state'] != 'unchanged':
+                    self._write(name, path, currency, html, headers)
+            pages.append(page)
+
+        report = {'reason': reason, 'finished_at': datetime.utcnow().isoformat(),
+                  'duration_ms': round((time.monotonic() - started) * 1000, 1), 'total': len(pages)}
+        counts = {state: sum(1 for page in pages if page['state'] == state)
+                  for state in ('unchanged', 'changed', 'missing', 'error')}
+        report.update(unchanged=counts['unchanged'], changed=counts['changed'], missing=counts['missing'],
+                      errors=counts['error'])
+        report['written'] = report['changed'] + report['missing'] if write else 0
+        report['pages'] = pages
+
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['written'] += report['written']
+            self._stats['errors'] += report['errors']
+            self._stats['last_run'] = report
+        log = logger.info if not report['errors'] else logger.warning
+        log(f"📄 Prerender ({reason}): {report['written']} written, {report['unchanged']} unchanged, "
+            f"{report['errors']} failed of {len(pages)} in {report['duration_ms']:.0f} ms")
+        return report
+
+    def check(self, heal=True):
+        """Drift between the files and live output; heal=True rewrites what drifted"""
+        report = self.prerender('check', write=heal)
+        drift = report['changed'] + report['missing']
+        with self._lock:
+            self._stats['drift'] += drift
+            self._stats['last_check'] = {k: v for k, v in report.items() if k != 'pages'}
+        if drift:
+            drifted = ', '.join(f"{page['path']} ({page['state']})" for page in report['pages']
+                                if page['state'] in ('changed', 'missing'))
+            logger.warning(f"📄 Prerendered pages drifted from live output: {drifted}"
+                           f"{' - rewritten' if heal else ''}")
+        return report
+
+    def schedule(self, reason, delay=PRERENDER_DELAY):
+        """Prerender in the background after `delay` seconds; calls within the delay coalesce"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(delay, self._scheduled, args=(reason,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _scheduled(self, reason):
+        with self._lock:
+            self._timer = None
+        try:
+            self.prerender(reason)
+        except Exception as e:
+            logger.error(f"Prerender ({reason}) failed: {e}")
+
+    # =====================================================
+    # SERVING
+    # =====================================================
+
+    def _page(self, name):
+        """Loaded page, reloaded when its file changed; None if there is no file"""
+        html_path = os.path.join(self.folder, f"{name}.html")
+        try:
+            mtime_ns = os.stat(html_path).st_mtime_ns
+        except OSError:
+            return None
+        page = self._loaded.get(name)
+        if page is not None and page.mtime_ns == mtime_ns:
+            return page
+
+        html, headers = self._stored(name)
+        if html is None:
+            return None
+        body = html.replace(CSRF_PLACEHOLDER.encode(), b'')
+        etag = hashlib.sha1(html).hexdigest()[:16]
+        variants = {'gzip': (compress_response(body, 'gzip'), f"{etag}-gzip")}
+        if BROTLI_AVAILABLE:
+            variants['br'] = (compress_response(body, 'br'), f"{etag}-br")
+        entry = StaticEntry(html_path, len(body), mtime_ns // 10 ** 9, etag,
+                            'text/html; charset=utf-8', body, variants)
+        page = PrerenderedPage(
+            entry, html, [tuple(header) for header in headers] + [('Vary', 'Cookie')],
+            needs_token=f'value="{CSRF_PLACEHOLDER}"'.encode() in html,
+            mtime_ns=mtime_ns, cache_control=PRERENDER_CACHE_CONTROL
+        )
+        self._loaded[name] = page
+        return page
+
+    def lookup(self, path, environ):
+        """Prerendered page for a request path, or None"""
+        route = self.routes.get(path)
+        if not self.enabled or route is None:
+            return None
+        if environ.get(PRERENDER_ENVIRON_KEY) or environ.get(WARMUP_ENVIRON_KEY):
+            return None  # renders for prerender.py / page_cache.py must reach the view
+        endpoint, vary_currency = route
+        if not vary_currency:
+            return self._page(endpoint)
+        country = environ.get('HTTP_CF_IPCOUNTRY')
+        if not country:
+            return None  # currency unknown without a GeoIP lookup: render live
+        return self._page(f"{endpoint}.{'ZAR' if country.upper() == 'ZA' else 'USD'}")
+
+    def static_page(self, path, environ):
+        """Page the static fast path may send as is, or None to pass the request on to Flask"""
+        if path not in self.routes:
+            return None
+        if self.require_https and not is_https(environ):
+            return None  # Flask redirects it
+        cookies = parse_cookie(environ)
+        if any(name in cookies for name in self.session_cookies):
+            return None
+        page = self.lookup(path, environ)
+        if page is None or page.needs_token:
+            return None
+        self._count('served_static')
+        return page
+
+    def _serve_from_flask(self):
+        """before_request: anonymous visitors get the prerendered page with their CSRF token"""
+        if request.path not in self.routes or request.method not in ('GET', 'HEAD'):
+            return None
+        if self.session_cookies[1] in request.cookies or '_user_id' in session or '_flashes' in session:
+            return None
+        page = self.lookup(request.path, request.environ)
+        if page is None:
+            return None
+        response = make_response(page.html.replace(CSRF_PLACEHOLDER.encode(), generate_csrf().encode()))
+        for name, value in page.headers:
+            response.headers[name] = value
+        response.headers['Cache-Control'] = page.cache_control
+        self._count('served_flask')
+        return response
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: runs, written, drift, errors, served_static, served_flask,
+                  last_run (report), last_check, pages, enabled
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(pages=len(self.variants()), enabled=self.enabled)
+        return stats
+
+
+prerenderer = Prerenderer()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prerender public pages to static HTML')
+    parser.add_argument('--check', action='store_true',
+                        help='Report drift between the files and live output without rewriting them')
+    args = parser.parse_args()
+
+    from app import app
+    from prerender import prerenderer  # the instance app.py initialised, not this __main__ copy
+
+    with app.app_context():
+        report = prerenderer.check(heal=False) if args.check else prerenderer.prerender('cli')
+    for page in report['pages']:
+        print(f"  {page['state']:<9} {page['path']} {page['currency'] or ''}")
+    print(f"{len(report['pages'])} page(s) in {report['duration_ms']:.0f} ms: {report['unchanged']} unchanged, "
+          f"{report['changed']} changed, {report['missing']} missing, {report['errors']} failed")
+    drifted = args.check and (report['changed'] or report['missing'])
+    sys.exit(1 if report['errors'] or drifted else 0)
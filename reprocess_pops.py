@@ -0,0 +1,229 @@
+"""
+Batch Re-OCR for the Proof of Payment Manual Review Backlog
+
+Re-runs extraction for POPs that landed in manual_review because OCR
+failed or found no amount, e.g. after extractor improvements. Runs outside
+the web and ocr_worker processes:
+
+- rows are read in primary-key order, one chunk at a time (yield_per)
+- documents are downloaded on a thread pool and OCR'd on a process pool
+- each chunk's updates are committed together, then the checkpoint is saved,
+  so an interrupted run resumes after the last committed row
+- --dry-run reports what would change and writes nothing
+
+Usage:
+    python reprocess_pops.py                     # Resume from the checkpoint
+    python reprocess_pops.py --dry-run --limit 200
+    python reprocess_pops.py --restart --workers 4 --chunk-size 100
+    python reprocess_pops.py --all-manual-review  # Not only OCR failures
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from sqlalchemy import or_
+
+from models import db, ProofOfPayment, Invoice
+from ocr_jobs import apply_ocr_result, _run_ocr
+
+logger = logging.getLogger(__name__)
+
+REPROCESS_CHUNK_SIZE = int(os.getenv('REPROCESS_CHUNK_SIZE', 50))
+REPROCESS_WORKERS = int(os.getenv('REPROCESS_WORKERS', os.cpu_count() or 2))
+REPROCESS_FETCH_THREADS = int(os.getenv('REPROCESS_FETCH_THREADS', 8))
+DEFAULT_CHECKPOINT = os.getenv('REPROCESS_CHECKPOINT', 'reprocess_pops.checkpoint.json')
+
+
+def backlog_query(all_manual_review=False):
+    """
+    POPs eligible for re-OCR: manual_review, not yet handled by an admin,
+    not a duplicate submission, on an invoice that is still open.
+    """
+    query = ProofOfPayment.query.join(Invoice, ProofOfPayment.invoice_id == Invoice.id).filter(
+        ProofOfPayment.verification_status == 'manual_review',
+        ProofOfPayment.verified_by.is_(None),
+        ProofOfPayment.duplicate_of_id.is_(None),
+        Invoice.status.notin_(['paid', 'cancelled'])
+    )
+    if not all_manual_review:
+        query = query.filter(or_(
+            ProofOfPayment.verification_notes.like('OCR Error%'),
+            ProofOfPayment.extracted_amount.is_(None)
+        ))
+    return query
+
+
+def iter_chunks(query, after_id, chunk_size, limit=None):
+    """
+    Yield lists of POPs in id order, chunk_size at a time.
+
+    Each chunk is its own keyset query streamed with yield_per: a single
+    server-side cursor would not survive the per-chunk commits.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        chunk = list(
+            query.filter(ProofOfPayment.id > after_id)
+            .order_by(ProofOfPayment.id)
+            .limit(size)
+            .yield_per(size)
+        )
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1].id
+        if remaining is not None:
+            remaining -= len(chunk)
+
+
+def load_checkpoint(path):
+    """Last committed POP id and running totals, or a fresh start"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'last_id': 0, 'processed': 0, 'statuses': {}}
+
+
+def save_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file"""
+    checkpoint['updated_at'] = datetime.utcnow().isoformat()
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def fetch_document(file_path):
+    """Download one POP from storage (thread-pool entry point)"""
+    from s3_storage import storage_service
+    document = storage_service.get_file_bytes(file_path)
+    if document is None:
+        raise IOError(f'Could not download {file_path}')
+    return document
+
+
+def process_chunk(chunk, ocr_pool, fetch_pool):
+    """
+    Fetch and OCR every POP in the chunk, then apply the results in the
+    current session (not committed here).
+
+    Returns:
+        Counter: resulting verification_status per POP, plus 'errors'
+    """
+    pops = {pop.id: pop for pop in chunk}
+    downloads = {fetch_pool.submit(fetch_document, pop.file_path): pop.id for pop in chunk}
+    ocr_futures = {}
+    outcome = Counter()
+
+    for future in as_completed(downloads):
+        pop = pops[downloads[future]]
+        try:
+            document = future.result()
+        except Exception as e:
+            logger.warning(f"POP {pop.id}: {e}")
+            outcome['errors'] += 1
+            continue
+        ocr_futures[ocr_pool.submit(_run_ocr, document, pop.file_type)] = pop.id
+
+    for future in as_completed(ocr_futures):
+        pop = pops[ocr_futures[future]]
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'success': False, 'error': str(e), 'raw_text': ''}
+        outcome[apply_ocr_result(pop, result)] += 1
+
+    return outcome
+
+
+def reprocess(chunk_size=REPROCESS_CHUNK_SIZE, workers=REPROCESS_WORKERS,
+              fetch_threads=REPROCESS_FETCH_THREADS, checkpoint_path=DEFAULT_CHECKPOINT,
+              dry_run=False, restart=False, limit=None, all_manual_review=False):
+    """
+    Re-OCR the manual_review backlog in committed chunks.
+
+    Returns:
+        dict: Final checkpoint (last_id, processed, statuses)
+    """
+    checkpoint = {'last_id': 0, 'processed': 0, 'statuses': {}} if restart \
+        else load_checkpoint(checkpoint_path)
+    query = backlog_query(all_manual_review)
+    total = query.filter(ProofOfPayment.id > checkpoint['last_id']).count()
+    if limit is not None:
+        total = min(total, limit)
+
+    mode = 'DRY RUN - ' if dry_run else ''
+    print(f"{mode}{total} POP(s) to reprocess"
+          + (f" (resuming after id {checkpoint['last_id']})" if checkpoint['last_id'] else ''))
+    if not total:
+        return checkpoint
+
+    statuses = Counter(checkpoint.get('statuses', {}))
+    done = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as ocr_pool, \
+            ThreadPoolExecutor(max_workers=fetch_threads) as fetch_pool:
+        for chunk in iter_chunks(query, checkpoint['last_id'], chunk_size, limit):
+            outcome = process_chunk(chunk, ocr_pool, fetch_pool)
+            last_id = chunk[-1].id
+            statuses.update(outcome)
+
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+                checkpoint.update(
+                    last_id=last_id,
+                    processed=checkpoint['processed'] + len(chunk),
+                    statuses=dict(statuses)
+                )
+                save_checkpoint(checkpoint_path, checkpoint)
+
+            done += len(chunk)
+            elapsed = time.perf_counter() - started
+            rate = done / elapsed if elapsed else 0
+            eta = (total - done) / rate if rate else 0
+            summary = ', '.join(f'{status}={count}' for status, count in sorted(outcome.items()))
+            print(f"[{done}/{total}] ids ..{last_id}: {summary} "
+                  f"({rate:.1f} docs/s, ETA {eta:.0f}s)")
+
+    print(f"{mode}Done: " + ', '.join(f'{status}={count}' for status, count in sorted(statuses.items())))
+    return dict(checkpoint, statuses=dict(statuses))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-run OCR for POPs awaiting manual review')
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without saving them')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first row')
+    parser.add_argument('--limit', type=int, default=None, help='Process at most this many POPs')
+    parser.add_argument('--chunk-size', type=int, default=REPROCESS_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=REPROCESS_WORKERS, help='OCR processes')
+    parser.add_argument('--fetch-threads', type=int, default=REPROCESS_FETCH_THREADS)
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--all-manual-review', action='store_true',
+                        help='Include low-confidence and mismatched POPs, not only OCR failures')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    from app import app
+
+    with app.app_context():
+        try:
+            reprocess(
+                chunk_size=args.chunk_size, workers=args.workers,
+                fetch_threads=args.fetch_threads, checkpoint_path=args.checkpoint,
+                dry_run=args.dry_run, restart=args.restart, limit=args.limit,
+                all_manual_review=args.all_manual_review
+            )
+        except KeyboardInterrupt:
+            print("\nInterrupted - rerun to resume from the last committed chunk")
+            sys.exit(1)
@@ -0,0 +1,281 @@
+"""
+Resilience primitives for outbound dependencies
+Circuit breakers and bulkheads around geolocation, SMTP, Stripe and S3 calls
+"""
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyUnavailableError(Exception):
+    """Raised when a call is rejected without reaching the dependency"""
+
+    def __init__(self, name, message):
+        super().__init__(message)
+        self.name = name
+
+
+class CircuitOpenError(DependencyUnavailableError):
+    """Raised when the breaker for a dependency is open"""
+    pass
+
+
+class BulkheadFullError(DependencyUnavailableError):
+    """Raised when all concurrency slots for a dependency are taken"""
+    pass
+
+
+class Bulkhead:
+    """
+    Concurrency limit for a single dependency.
+    Stops one slow dependency from consuming every worker thread.
+    """
+
+    def __init__(self, name, max_concurrent=4, acquire_timeout=0.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.acquire_timeout = acquire_timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Take a slot or raise BulkheadFullError"""
+        if self.acquire_timeout:
+            acquired = self._semaphore.acquire(timeout=self.acquire_timeout)
+        else:
+            acquired = self._semaphore.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise BulkheadFullError(
+                self.name,
+                f"{self.name}: all {self.max_concurrent} slots busy"
+            )
+        with self._lock:
+            self.active += 1
+
+    def release(self):
+        """Return a slot"""
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        """Current bulkhead usage"""
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'active': self.active,
+                'rejected': self.rejected
+            }
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker (closed / open / half-open).
+
+    Only exceptions listed in ``failure_exceptions`` count as dependency
+    failures; business errors (bad card, unknown key) pass straight through.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30,
+                 half_open_max_calls=1, failure_exceptions=(Exception,),
+                 max_concurrent=None, acquire_timeout=0.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_exceptions = failure_exceptions
+        self.bulkhead = (
+            Bulkhead(name, max_concurrent, acquire_timeout)
+            if max_concurrent else None
+        )
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._half_open_calls = 0
+
+        # Counters for /health/detailed
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.last_failure = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        """Resolve OPEN -> HALF_OPEN once the recovery timeout passed (lock held)"""
+        if self._state == self.OPEN and \
+                time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"Circuit '{self.name}' half-open, probing dependency")
+        return self._state
+
+    def _before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                self.total_rejected += 1
+                raise CircuitOpenError(
+                    self.name, f"{self.name}: circuit open, failing fast"
+                )
+            if state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.total_rejected += 1
+                    raise CircuitOpenError(
+                        self.name, f"{self.name}: circuit half-open, probe in flight"
+                    )
+                self._half_open_calls += 1
+            self.total_calls += 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed, dependency recovered")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self, error):
+        with self._lock:
+            self._failures += 1
+            self.total_failures += 1
+            self.last_failure = f"{type(error).__name__}: {error}"
+            if self._state == self.HALF_OPEN or \
+                    self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"Circuit '{self.name}' opened after "
+                        f"{self._failures} failure(s): {self.last_failure}"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run func through the breaker and bulkhead.
+
+        Raises:
+            CircuitOpenError: breaker is open
+            BulkheadFullError: no concurrency slot available
+        """
+        self._before_call()
+        if self.bulkhead:
+            try:
+                self.bulkhead.acquire()
+            except BulkheadFullError:
+                with self._lock:
+                    self.total_rejected += 1
+                    if self._state == self.HALF_OPEN:
+                        self._half_open_calls -= 1
+                raise
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions as e:
+            self.record_failure(e)
+            raise
+        except BaseException:
+            # Not a dependency failure - just release a half-open probe slot
+            with self._lock:
+                if self._state == self.HALF_OPEN:
+                    self._half_open_calls = max(0, self._half_open_calls - 1)
+            raise
+        else:
+            self.record_success()
+            return result
+        finally:
+            if self.bulkhead:
+                self.bulkhead.release()
+
+    def reset(self):
+        """Force the breaker closed (admin / tests)"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._half_open_calls = 0
+
+    def stats(self):
+        """Breaker state snapshot for monitoring"""
+        with self._lock:
+            state = self._current_state()
+            data = {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'total_calls': self.total_calls,
+                'total_failures': self.total_failures,
+                'total_rejected': self.total_rejected,
+                'last_failure': self.last_failure
+            }
+            if state == self.OPEN:
+                data['retry_in_seconds'] = round(max(
+                    0.0,
+                    self.recovery_timeout - (time.monotonic() - self._opened_at)
+                ), 1)
+        if self.bulkhead:
+            data['bulkhead'] = self.bulkhead.stats()
+        return data
+
+
+# =====================================================
+# BREAKER REGISTRY (shared by all threads in a worker)
+# =====================================================
+
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_breaker(name, **settings):
+    """
+    Return the process-wide breaker for a dependency, creating it on first use.
+
+    Thresholds can be overridden per dependency via environment, e.g.
+    CIRCUIT_SMTP_FAILURES, CIRCUIT_SMTP_RECOVERY, BULKHEAD_SMTP_MAX.
+    """
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            key = name.upper().replace('-', '_')
+            settings.setdefault('failure_threshold', 5)
+            settings.setdefault('recovery_timeout', 30)
+            settings['failure_threshold'] = _env_int(
+                f'CIRCUIT_{key}_FAILURES', settings['failure_threshold'])
+            settings['recovery_timeout'] = _env_int(
+                f'CIRCUIT_{key}_RECOVERY', settings['recovery_timeout'])
+            if settings.get('max_concurrent'):
+                settings['max_concurrent'] = _env_int(
+                    f'BULKHEAD_{key}_MAX', settings['max_concurrent'])
+            breaker = CircuitBreaker(name, **settings)
+            _breakers[name] = breaker
+        return breaker
+
+
+def circuit_status():
+    """State of every registered breaker, keyed by dependency name"""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -3,17 +3,232 @@ S3-Compatible Storage Service
 Handles file uploads to Railway Object Storage (S3-compatible)
 """
 import os
+import io
+import time
+import hashlib
+import threading
+from collections import deque, OrderedDict
 from dotenv import load_dotenv
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, BotoCoreError
 from werkzeug.utils import secure_filename
 import secrets
 from datetime import datetime, timedelta
+from resilience import get_breaker, DependencyUnavailableError
+from security_utils import sniff_mime
 
 # Load environment variables
 load_dotenv()
 
+# Transport-level errors (endpoint unreachable, timeouts) trip the breaker;
+# ClientError responses such as 403/404 mean the bucket itself is reachable.
+s3_breaker = get_breaker(
+    's3', failure_threshold=5, recovery_timeout=30,
+    failure_exceptions=(BotoCoreError, ConnectionError),
+    max_concurrent=8
+)
+
+MB = 1024 * 1024
+
+# Transfers: objects above the threshold go up as parallel multipart parts.
+# Every request thread may run S3_MAX_CONCURRENCY part uploads at once, so
+# the HTTP pool is sized to threads x concurrency to avoid pool starvation.
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD_MB', 8)) * MB
+S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE_MB', 8)) * MB
+S3_MAX_CONCURRENCY = int(os.getenv('S3_MAX_CONCURRENCY', 8))
+S3_CLIENT_THREADS = int(os.getenv('S3_CLIENT_THREADS', os.getenv('GUNICORN_THREADS', 2)))
+S3_MAX_POOL_CONNECTIONS = int(os.getenv(
+    'S3_MAX_POOL_CONNECTIONS', max(10, S3_CLIENT_THREADS * S3_MAX_CONCURRENCY)
+))
+UPLOAD_LATENCY_WINDOW = 200  # recent uploads kept per folder for percentiles
+
+# Direct browser uploads: the presigned POST policy pins the key, content
+# type and size range, and the object is re-checked before it is used.
+PRESIGNED_UPLOAD_EXPIRATION = int(os.getenv('PRESIGNED_UPLOAD_EXPIRATION', 600))  # seconds
+UPLOAD_SNIFF_BYTES = 2048
+
+# Deletes are queued and sent as delete_objects batches (S3 caps a batch at 1000)
+S3_DELETE_BATCH_SIZE = 1000
+S3_DELETE_FLUSH_INTERVAL = int(os.getenv('S3_DELETE_FLUSH_INTERVAL', 30))  # seconds
+
+# Presigned GET URLs are reused until shortly before they expire
+PRESIGNED_URL_CACHE_SIZE = int(os.getenv('PRESIGNED_URL_CACHE_SIZE', 1024))
+PRESIGNED_URL_REFRESH_MARGIN = 0.1  # re-sign with <10% of the lifetime left
+PRESIGNED_URL_MIN_MARGIN = 30  # seconds
+
+IMAGE_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+DOCUMENT_TYPES = {'pdf': 'application/pdf', 'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg'}
+
+UPLOAD_PROFILES = {
+    'product_image': {'folder': 'products', 'types': IMAGE_TYPES, 'max_size': 5 * MB},
+    'invoice_file': {'folder': 'invoices', 'types': DOCUMENT_TYPES, 'max_size': 16 * MB},
+    'proof_of_payment': {'folder': 'proofs', 'types': DOCUMENT_TYPES, 'max_size': 10 * MB},
+}
+
+
+class ChecksumReader(io.RawIOBase):
+    """
+    Read-through wrapper that computes MD5 and SHA-256 while boto3 streams
+    the file, so the data is not read a second time for checksums.
+
+    Bytes are hashed once, in order: re-reads after a seek back (retries,
+    payload signing) are skipped. If a read ever jumps ahead of the hashed
+    prefix the digests are marked incomplete and finish() rehashes.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._md5 = hashlib.md5(usedforsecurity=False)
+        self._sha256 = hashlib.sha256()
+        self._hashed = 0
+        self._complete = True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._fileobj.seekable()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._fileobj.seek(offset, whence)
+
+    def tell(self):
+        return self._fileobj.tell()
+
+    def read(self, size=-1):
+        position = self._fileobj.tell()
+        chunk = self._fileobj.read(size)
+        end = position + len(chunk)
+        if position > self._hashed:
+            self._complete = False
+        elif end > self._hashed:
+            new = memoryview(chunk)[self._hashed - position:]
+            self._md5.update(new)
+            self._sha256.update(new)
+            self._hashed = end
+        return chunk
+
+    def readinto(self, buffer):
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def finish(self):
+        """
+        Returns:
+            dict: size, md5 and sha256 hex digests of the whole stream
+        """
+        if not self._complete:
+            self._md5 = hashlib.md5(usedforsecurity=False)
+            self._sha256 = hashlib.sha256()
+            self._hashed = 0
+            self._complete = True
+            self._fileobj.seek(0)
+            for chunk in iter(lambda: self.read(MB), b''):
+                pass
+        return {'size': self._hashed, 'md5': self._md5.hexdigest(), 'sha256': self._sha256.hexdigest()}
+
+
+class UploadMetrics:
+    """Per-folder upload latency and throughput, shared by all request threads"""
+
+    def __init__(self, window=UPLOAD_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._folders = {}
+
+    def record(self, folder, seconds, size, success=True):
+        with self._lock:
+            stats = self._folders.setdefault(folder, {
+                'uploads': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0,
+                'recent': deque(maxlen=self._window)
+            })
+            if not success:
+                stats['errors'] += 1
+                return
+            stats['uploads'] += 1
+            stats['bytes'] += size
+            stats['seconds'] += seconds
+            stats['recent'].append(seconds)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: folder -> uploads, errors, MB, avg/p50/p95/max latency (ms), MB/s
+        """
+        with self._lock:
+            folders = {folder: dict(stats, recent=sorted(stats['recent']))
+                       for folder, stats in self._folders.items()}
+        report = {}
+        for folder, stats in folders.items():
+            recent = stats['recent']
+            percentile = lambda p: round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 1) if recent else None
+            report[folder] = {
+                'uploads': stats['uploads'],
+                'errors': stats['errors'],
+                'mb': round(stats['bytes'] / MB, 2),
+                'avg_ms': round(stats['seconds'] / stats['uploads'] * 1000, 1) if stats['uploads'] else None,
+                'p50_ms': percentile(0.5),
+                'p95_ms': percentile(0.95),
+                'max_ms': round(recent[-1] * 1000, 1) if recent else None,
+                'mb_per_s': round(stats['bytes'] / MB / stats['seconds'], 2) if stats['seconds'] else None,
+            }
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._folders.clear()
+
+
+class DeleteQueue:
+    """
+    Keys waiting to be deleted, shared by all request threads.
+    Duplicates collapse; the queue is per process, so keys lost in a crash
+    are left to the orphan GC (storage_gc.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}  # insertion-ordered set
+        self._stats = {'queued': 0, 'deleted': 0, 'errors': 0, 'batches': 0}
+
+    def put(self, s3_key):
+        with self._lock:
+            if s3_key not in self._keys:
+                self._keys[s3_key] = None
+                self._stats['queued'] += 1
+            return len(self._keys)
+
+    def take(self, limit):
+        """Remove and return up to `limit` keys, oldest first"""
+        with self._lock:
+            keys = list(self._keys)[:limit]
+            for key in keys:
+                del self._keys[key]
+            return keys
+
+    def requeue(self, keys):
+        with self._lock:
+            for key in keys:
+                self._keys[key] = None
+
+    def record(self, deleted, errors):
+        with self._lock:
+            self._stats['deleted'] += deleted
+            self._stats['errors'] += errors
+            self._stats['batches'] += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._keys))
+
+
 class S3StorageService:
     """S3-compatible storage service for file uploads"""
     
@@ -25,6 +240,18 @@ class S3StorageService:
         self.secret_key = os.getenv('S3_SECRET_ACCESS_KEY')
         self.region = os.getenv('S3_REGION', 'auto')
         
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=S3_MAX_CONCURRENCY,
+            use_threads=True
+        )
+        self.metrics = UploadMetrics()
+        self._presigned_urls = OrderedDict()  # (key, expiration) -> (url, reuse_until)
+        self._presigned_lock = threading.Lock()
+        self._presigned_stats = {'hits': 0, 'misses': 0}
+        self.delete_queue = DeleteQueue()
+        
         # Initialize S3 client
         if self.endpoint_url and self.bucket_name:
             self.s3_client = boto3.client(
@@ -35,7 +262,9 @@ class S3StorageService:
                 region_name=self.region,
                 config=Config(
                     signature_version='s3v4',
-                    s3={'addressing_style': 'virtual'}
+                    s3={'addressing_style': 'virtual'},
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True
                 )
             )
             self.enabled = True
@@ -45,7 +274,8 @@ class S3StorageService:
             self.enabled = False
             print("[WARN] S3 Storage disabled - using local storage")
     
-    def upload_file(self, file, folder='uploads', allowed_extensions=None):
+    def upload_file(self, file, folder='uploads', allowed_extensions=None, data=None,
+                    checksums=None):
         """
         Upload a file to S3 storage
         
@@ -53,6 +283,10 @@ class S3StorageService:
             file: FileStorage object from Flask request
             folder: Folder path in bucket (e.g., 'products', 'proofs')
             allowed_extensions: Set of allowed file extensions
+            data: File body already read by the caller (bytes); uploaded as
+                  is instead of re-reading the stream
+            checksums: Optional dict, filled with the size/md5/sha256
+                  computed while streaming
             
         Returns:
             tuple: (file_url, error_message)
@@ -65,9 +299,7 @@ class S3StorageService:
             return None, "No file provided"
         
         # Check file size (16MB limit)
-        file.seek(0, 2)
-        size = file.tell()
-        file.seek(0)
+        size = len(data) if data is not None else self._stream_size(file)
         
         if size > 16 * 1024 * 1024:  # 16MB
             return None, "File too large (max 16MB)"
@@ -85,25 +317,16 @@ class S3StorageService:
         if allowed_extensions and ext not in allowed_extensions:
             return None, f"File type .{ext} not allowed"
         
-        # Generate unique filename
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        random_id = secrets.token_hex(8)
-        unique_filename = f"{timestamp}_{random_id}.{ext}"
-        
-        # Full S3 key (path)
-        s3_key = f"{folder}/{unique_filename}"
+        s3_key = self._unique_key(folder, ext)
         
+        content_type = file.content_type or 'application/octet-stream'
         try:
-            # Upload to S3
-            self.s3_client.upload_fileobj(
-                file,
-                self.bucket_name,
-                s3_key,
-                ExtraArgs={
-                    'ContentType': file.content_type or 'application/octet-stream',
-                    'ACL': 'public-read'  # Make publicly accessible
-                }
+            result = self.upload_stream(
+                io.BytesIO(data) if data is not None else file,
+                s3_key, content_type=content_type, folder=folder
             )
+            if checksums is not None:
+                checksums.update(size=result['size'], md5=result['md5'], sha256=result['sha256'])
             
             # Generate public URL
             file_url = f"{self.endpoint_url}/{self.bucket_name}/{s3_key}"
@@ -111,6 +334,9 @@ class S3StorageService:
             print(f"[OK] File uploaded: {s3_key}")
             return file_url, None
             
+        except DependencyUnavailableError as e:
+            print(f"[WARN] S3 upload skipped: {str(e)}")
+            return None, "File storage is temporarily unavailable, please try again shortly"
         except ClientError as e:
             error_msg = f"S3 upload failed: {str(e)}"
             print(f"[ERROR] {error_msg}")
@@ -120,40 +346,331 @@ class S3StorageService:
             print(f"[ERROR] {error_msg}")
             return None, error_msg
     
+    def upload_stream(self, fileobj, s3_key, content_type='application/octet-stream',
+                      folder=None, acl='public-read'):
+        """
+        Stream a file-like object to S3 with the tuned TransferConfig
+        (parallel multipart above the threshold), hashing it on the way.
+        
+        Args:
+            fileobj: Readable binary stream, positioned at the start
+            s3_key: Destination key
+            content_type: Content-Type header for the object
+            folder: Metrics bucket (defaults to the key's first path segment)
+            acl: Canned ACL
+            
+        Returns:
+            dict: key, size, md5, sha256, seconds
+            
+        Raises:
+            ClientError, BotoCoreError, DependencyUnavailableError
+        """
+        folder = folder or s3_key.split('/', 1)[0]
+        reader = ChecksumReader(fileobj)
+        started = time.perf_counter()
+        try:
+            s3_breaker.call(
+                self.s3_client.upload_fileobj,
+                reader,
+                self.bucket_name,
+                s3_key,
+                ExtraArgs={
+                    'ContentType': content_type,
+                    'ACL': acl  # Make publicly accessible
+                },
+                Config=self.transfer_config
+            )
+        except Exception:
+            self.metrics.record(folder, time.perf_counter() - started, 0, success=False)
+            raise
+        
+        seconds = time.perf_counter() - started
+        checksums = reader.finish()
+        self.metrics.record(folder, seconds, checksums['size'])
+        return dict(checksums, key=s3_key, seconds=seconds)
+    
+    @staticmethod
+    def _unique_key(folder, ext):
+        """Timestamped random key under folder"""
+        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        random_id = secrets.token_hex(8)
+        return f"{folder}/{timestamp}_{random_id}.{ext}"
+    
+    def create_presigned_upload(self, kind, filename, expiration=PRESIGNED_UPLOAD_EXPIRATION):
+        """
+        Presigned POST policy for a browser upload straight to the bucket
+        
+        The Content-Type comes from the file extension, not the browser, and
+        the policy rejects any other type, a different key or a body outside
+        1 byte..max_size.
+        
+        Args:
+            kind: Key of UPLOAD_PROFILES ('product_image', 'invoice_file', 'proof_of_payment')
+            filename: Original filename (only its extension is used)
+            expiration: Policy lifetime in seconds
+            
+        Returns:
+            tuple: (upload, error_message); upload has url, fields, key,
+                   content_type and max_size
+        """
+        if not self.enabled:
+            return None, "S3 storage not configured"
+        
+        profile = UPLOAD_PROFILES.get(kind)
+        if not profile:
+            return None, "Unknown upload type"
+        
+        filename = secure_filename(filename or '')
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        content_type = profile['types'].get(ext)
+        if not content_type:
+            return None, f"File type .{ext} not allowed"
+        
+        s3_key = self._unique_key(profile['folder'], ext)
+        try:
+            post = self.s3_client.generate_presigned_post(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Fields={'Content-Type': content_type, 'acl': 'public-read'},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    {'acl': 'public-read'},
+                    ['content-length-range', 1, profile['max_size']]
+                ],
+                ExpiresIn=expiration
+            )
+        except Exception as e:
+            print(f"[ERROR] Presigned upload generation failed: {str(e)}")
+            return None, "Could not prepare upload"
+        
+        return {
+            'url': post['url'],
+            'fields': post['fields'],
+            'key': s3_key,
+            'content_type': content_type,
+            'max_size': profile['max_size']
+        }, None
+    
+    def verify_uploaded_object(self, kind, s3_key):
+        """
+        Check a direct upload before it is referenced anywhere: HEAD for size
+        and Content-Type, then a ranged GET of the first bytes to sniff the
+        real file type. Rejected objects are deleted.
+        
+        Args:
+            kind: Key of UPLOAD_PROFILES the upload was presigned for
+            s3_key: Key returned by create_presigned_upload
+            
+        Returns:
+            tuple: (info, error_message); info has key, url, size, content_type
+        """
+        if not self.enabled:
+            return None, "S3 storage not configured"
+        
+        profile = UPLOAD_PROFILES.get(kind)
+        if not profile or not s3_key or not s3_key.startswith(f"{profile['folder']}/"):
+            return None, "Invalid upload"
+        expected_type = profile['types'].get(s3_key.rsplit('.', 1)[-1].lower())
+        
+        try:
+            head = s3_breaker.call(self.s3_client.head_object, Bucket=self.bucket_name, Key=s3_key)
+            size = head['ContentLength']
+            content_type = head.get('ContentType')
+            
+            error = None
+            if size == 0 or size > profile['max_size']:
+                error = f"File must be under {profile['max_size'] // MB}MB"
+            elif content_type != expected_type:
+                error = "File type not allowed"
+            else:
+                response = s3_breaker.call(
+                    self.s3_client.get_object,
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Range=f'bytes=0-{UPLOAD_SNIFF_BYTES - 1}'
+                )
+                if sniff_mime(response['Body'].read()) != expected_type:
+                    error = "File content does not match its type"
+        except DependencyUnavailableError as e:
+            print(f"[WARN] Upload verification skipped: {str(e)}")
+            return None, "File storage is temporarily unavailable, please try again shortly"
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None, "Upload not found"
+            print(f"[ERROR] Upload verification failed: {str(e)}")
+            return None, "Could not verify upload"
+        
+        if error:
+            print(f"[WARN] Rejected direct upload {s3_key}: {error}")
+            # Rejected content must not stay public until the next flush
+            try:
+                self.delete_keys([s3_key])
+            except (BotoCoreError, ClientError, DependencyUnavailableError):
+                self.delete_queue.put(s3_key)
+            return None, error
+        
+        print(f"[OK] Direct upload verified: {s3_key}")
+        return {
+            'key': s3_key,
+            'url': self.get_file_url(s3_key),
+            'size': size,
+            'content_type': content_type
+        }, None
+    
+    @staticmethod
+    def _stream_size(file):
+        """Size of an upload without reading it"""
+        stream = getattr(file, 'stream', file)
+        if isinstance(stream, io.BytesIO):
+            with stream.getbuffer() as view:
+                return view.nbytes
+        position = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(position)
+        return size
+    
+    def upload_stats(self):
+        """Per-folder upload latency metrics"""
+        return self.metrics.snapshot()
+    
     def delete_file(self, file_url):
         """
-        Delete a file from S3 storage
+        Queue a file for deletion from S3 storage
+        
+        Keys are deleted in delete_objects batches by flush_deletes(), run
+        by the scheduler, at exit, and whenever a full batch is waiting.
         
         Args:
             file_url: Full URL of the file to delete
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if queued, False otherwise
         """
         if not self.enabled:
             return False
         
-        try:
-            # Extract S3 key from URL
-            # URL format: https://t3.storageapi.dev/bucket-name/folder/file.ext
-            s3_key = file_url.split(f"{self.bucket_name}/")[1]
+        s3_key = self.key_from_url(file_url)
+        if not s3_key:
+            return False
+        
+        if self.delete_queue.put(s3_key) >= S3_DELETE_BATCH_SIZE:
+            self.flush_deletes()
+        return True
+    
+    def delete_keys(self, keys):
+        """
+        Delete keys now, S3_DELETE_BATCH_SIZE per delete_objects call
+        
+        Args:
+            keys: Iterable of S3 keys
             
-            self.s3_client.delete_object(
+        Returns:
+            tuple: (deleted_count, errors) where errors is a list of
+                   {'Key', 'Code', 'Message'} from S3
+            
+        Raises:
+            BotoCoreError, DependencyUnavailableError
+        """
+        keys = list(keys)
+        deleted, errors = 0, []
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+            response = s3_breaker.call(
+                self.s3_client.delete_objects,
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            batch_errors = response.get('Errors', [])
+            for error in batch_errors:
+                print(f"[ERROR] Delete failed: {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+            deleted += len(batch) - len(batch_errors)
+            errors.extend(batch_errors)
+            self.delete_queue.record(len(batch) - len(batch_errors), len(batch_errors))
+        return deleted, errors
+    
+    def flush_deletes(self):
+        """
+        Send every queued delete. Batches that cannot reach the bucket are
+        requeued for the next flush; per-key errors are logged and dropped.
+        
+        Returns:
+            int: Number of objects deleted
+        """
+        if not self.enabled:
+            return 0
+        
+        total = 0
+        while True:
+            batch = self.delete_queue.take(S3_DELETE_BATCH_SIZE)
+            if not batch:
+                break
+            try:
+                deleted, _ = self.delete_keys(batch)
+            except (BotoCoreError, ClientError, DependencyUnavailableError) as e:
+                self.delete_queue.requeue(batch)
+                print(f"[WARN] Delete batch of {len(batch)} requeued: {str(e)}")
+                break
+            total += deleted
+        
+        if total:
+            print(f"[OK] Deleted {total} file(s)")
+        return total
+    
+    def delete_stats(self):
+        """Queued / deleted / failed counts for batched deletes"""
+        return self.delete_queue.stats()
+    
+    def key_from_url(self, file_url):
+        """
+        Extract the S3 key from a stored file URL
+
+        Args:
+            file_url: Full URL as returned by upload_file
+
+        Returns:
+            str: S3 key or None if the URL is not in this bucket
+        """
+        marker = f"{self.bucket_name}/"
+        if not file_url or marker not in file_url:
+            return None
+        return file_url.split(marker, 1)[1]
+
+    def get_file_bytes(self, file_url):
+        """
+        Download a stored file into memory
+
+        Args:
+            file_url: Full URL of the file
+
+        Returns:
+            bytes: File contents or None if unavailable
+        """
+        if not self.enabled:
+            return None
+
+        s3_key = self.key_from_url(file_url)
+        if not s3_key:
+            return None
+
+        try:
+            response = s3_breaker.call(
+                self.s3_client.get_object,
                 Bucket=self.bucket_name,
                 Key=s3_key
             )
-            
-            print(f"[OK] File deleted: {s3_key}")
-            return True
-            
+            return response['Body'].read()
         except Exception as e:
-            print(f"[ERROR] Delete failed: {str(e)}")
-            return False
-    
+            print(f"[ERROR] Download failed: {str(e)}")
+            return None
+
     def generate_presigned_url(self, s3_key, expiration=3600):
         """
         Generate a presigned URL for temporary access to a private file
         
+        URLs are cached per key and expiration and reused until less than
+        PRESIGNED_URL_REFRESH_MARGIN of their lifetime remains.
+        
         Args:
             s3_key: S3 object key (path in bucket)
             expiration: URL expiration time in seconds (default 1 hour)
@@ -164,6 +681,16 @@ class S3StorageService:
         if not self.enabled:
             return None
         
+        cache_key = (s3_key, expiration)
+        now = time.monotonic()
+        with self._presigned_lock:
+            cached = self._presigned_urls.get(cache_key)
+            if cached and cached[1] > now:
+                self._presigned_urls.move_to_end(cache_key)
+                self._presigned_stats['hits'] += 1
+                return cached[0]
+            self._presigned_stats['misses'] += 1
+        
         try:
             url = self.s3_client.generate_presigned_url(
                 'get_object',
@@ -173,10 +700,25 @@ class S3StorageService:
                 },
                 ExpiresIn=expiration
             )
-            return url
         except Exception as e:
             print(f"[ERROR] Presigned URL generation failed: {str(e)}")
             return None
+        
+        margin = max(PRESIGNED_URL_MIN_MARGIN, expiration * PRESIGNED_URL_REFRESH_MARGIN)
+        with self._presigned_lock:
+            self._presigned_urls[cache_key] = (url, now + expiration - margin)
+            self._presigned_urls.move_to_end(cache_key)
+            while len(self._presigned_urls) > PRESIGNED_URL_CACHE_SIZE:
+                self._presigned_urls.popitem(last=False)
+        return url
+    
+    def presigned_url_stats(self):
+        """Presigned URL cache hits, misses and size"""
+        with self._presigned_lock:
+            stats = dict(self._presigned_stats, entries=len(self._presigned_urls))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
     
     def list_files(self, folder=''):
         """
@@ -227,15 +769,24 @@ storage_service = S3StorageService()
 
 # Helper functions for easy use
 def upload_product_image(file):
-    """Upload a product image"""
-    allowed = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    return storage_service.upload_file(file, folder='products', allowed_extensions=allowed)
+    """Upload a product image and queue its responsive variants"""
+    from image_pipeline import queue_image_variants
+    allowed = set(IMAGE_TYPES)  # same types as direct uploads
+    data = file.read()
+    file_url, error = storage_service.upload_file(
+        file, folder='products', allowed_extensions=allowed, data=data
+    )
+    if file_url:
+        queue_image_variants(file_url, data)
+    return file_url, error
 
 
-def upload_proof_of_payment(file):
+def upload_proof_of_payment(file, data=None, checksums=None):
     """Upload a proof of payment document"""
     allowed = {'png', 'jpg', 'jpeg', 'pdf'}
-    return storage_service.upload_file(file, folder='proofs', allowed_extensions=allowed)
+    return storage_service.upload_file(
+        file, folder='proofs', allowed_extensions=allowed, data=data, checksums=checksums
+    )
 
 
 def upload_invoice_file(file):
@@ -67,13 +67,35 @@ ALLOWED_MIME_TYPES = frozenset([
 ])
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB (reduced for security)
 
+# Leading bytes of accepted file types, used when libmagic is unavailable
+FILE_SIGNATURES = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+def _direct_upload_origin():
+    """Bucket origin browsers POST direct uploads to (virtual-hosted style)"""
+    endpoint = os.getenv('S3_ENDPOINT_URL', '')
+    bucket = os.getenv('S3_BUCKET_NAME', '')
+    if '://' not in endpoint or not bucket:
+        return ''
+    scheme, host = endpoint.rstrip('/').split('://', 1)
+    return f"{scheme}://{bucket}.{host}"
+
+
+DIRECT_UPLOAD_ORIGIN = _direct_upload_origin()
+
 # SECURITY HEADERS
 SECURITY_HEADERS = {
     'X-Content-Type-Options': 'nosniff',
     'X-Frame-Options': 'DENY',
     'X-XSS-Protection': '1; mode=block',
     'Strict-Transport-Security': 'max-age=31536000; includeSubDomains; preload',
-    'Content-Security-Policy': "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval' cdn.jsdelivr.net code.jquery.com js.stripe.com; script-src-elem 'self' 'unsafe-inline' cdn.jsdelivr.net code.jquery.com js.stripe.com; style-src 'self' 'unsafe-inline' cdn.jsdelivr.net cdnjs.cloudflare.com; style-src-elem 'self' 'unsafe-inline' cdn.jsdelivr.net cdnjs.cloudflare.com; style-src-attr 'unsafe-inline'; img-src 'self' data: https:; font-src 'self' cdnjs.cloudflare.com; connect-src 'self' https://api.stripe.com https://api.exchangerate-api.com cdn.jsdelivr.net",
+    'Content-Security-Policy': "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval' cdn.jsdelivr.net code.jquery.com js.stripe.com; script-src-elem 'self' 'unsafe-inline' cdn.jsdelivr.net code.jquery.com js.stripe.com; style-src 'self' 'unsafe-inline' cdn.jsdelivr.net cdnjs.cloudflare.com; style-src-elem 'self' 'unsafe-inline' cdn.jsdelivr.net cdnjs.cloudflare.com; style-src-attr 'unsafe-inline'; img-src 'self' data: https:; font-src 'self' cdnjs.cloudflare.com; connect-src 'self' https://api.stripe.com https://api.exchangerate-api.com cdn.jsdelivr.net" + (f" {DIRECT_UPLOAD_ORIGIN}" if DIRECT_UPLOAD_ORIGIN else ''),
     'Referrer-Policy': 'strict-origin-when-cross-origin',
     'Permissions-Policy': 'geolocation=(), microphone=(), camera=()'
 }
@@ -264,6 +286,65 @@ def secure_file_upload(file, allowed_extensions=None, max_size=MAX_FILE_SIZE):
     return True, "", secure_name
 
 
+def sniff_mime(header):
+    """
+    MIME type from a file's first bytes (libmagic when installed, otherwise
+    the FILE_SIGNATURES table). Returns None for unrecognised content.
+    """
+    header = bytes(header)
+    if MAGIC_AVAILABLE:
+        try:
+            return magic.from_buffer(header, mime=True)
+        except Exception:
+            pass
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime in FILE_SIGNATURES:
+        if header.startswith(signature):
+            return mime
+    return None
+
+
+def read_upload(file, max_size=MAX_FILE_SIZE):
+    """
+    Read an uploaded file's body exactly once, never more than max_size + 1
+    bytes. In-memory request streams hand over their buffer without a copy,
+    so the returned bytes can be shared by hashing, storage and OCR.
+    
+    Returns:
+        tuple: (data, error_message)
+    """
+    stream = file.stream
+    stream.seek(0)
+    if isinstance(stream, io.BytesIO):
+        data = stream.getvalue()
+    else:
+        data = stream.read(max_size + 1)
+    
+    if not data:
+        return None, "Empty file"
+    if len(data) > max_size:
+        return None, f"Max {max_size // (1024*1024)}MB"
+    return data, ""
+
+
+def file_sha256(file, chunk_size=64 * 1024):
+    """
+    SHA-256 of an uploaded file, read in chunks so large uploads are never
+    held in memory twice. Leaves the stream rewound.
+    Already-read bodies (bytes or memoryview) are hashed in place.
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(file).hexdigest()
+    
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
 def log_security_event(event_type, user_id=None, username=None, details=None, ip_address=None):
     """Fast security logging"""
     try:
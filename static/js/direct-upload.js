@@ -0,0 +1,114 @@
+/**
+ * Direct-to-Bucket Uploads
+ * File inputs marked data-direct-upload="<kind>" are uploaded straight to
+ * object storage with a presigned POST, then finalized by the server.
+ * Falls back to a regular form upload when storage is not configured.
+ */
+
+(function() {
+    'use strict';
+
+    function csrfToken() {
+        const meta = document.querySelector('meta[name="csrf-token"]');
+        return meta ? meta.getAttribute('content') : '';
+    }
+
+    function postJson(url, payload) {
+        return fetch(url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken()
+            },
+            body: JSON.stringify(payload)
+        }).then(response => response.json().then(data => ({ status: response.status, data: data })));
+    }
+
+    /**
+     * Presign, upload to the bucket, finalize.
+     * Resolves with the finalize response, or null if direct uploads are unavailable.
+     */
+    function directUpload(input, file) {
+        const payload = Object.assign({}, input.dataset, {
+            kind: input.dataset.directUpload,
+            filename: file.name
+        });
+
+        return postJson('/api/uploads/presign', payload).then(presign => {
+            if (presign.status === 503) {
+                return null;
+            }
+            if (!presign.data.success) {
+                throw new Error(presign.data.message || 'Upload could not be started');
+            }
+
+            const form = new FormData();
+            Object.entries(presign.data.fields).forEach(([name, value]) => form.append(name, value));
+            form.append('file', file);  // must be the last field
+
+            return fetch(presign.data.url, { method: 'POST', body: form }).then(response => {
+                if (!response.ok) {
+                    throw new Error('Upload was rejected by storage (check the file type and size)');
+                }
+                return postJson('/api/uploads/finalize', { key: presign.data.key });
+            }).then(finalize => {
+                if (!finalize.data.success) {
+                    throw new Error(finalize.data.message || 'Upload could not be verified');
+                }
+                return finalize.data;
+            });
+        });
+    }
+
+    function resetSubmit(form) {
+        const submitBtn = form.querySelector('button[type="submit"]');
+        if (submitBtn && submitBtn.dataset.label) {
+            submitBtn.disabled = false;
+            submitBtn.innerHTML = submitBtn.dataset.label;
+        }
+    }
+
+    function attach(input) {
+        const form = input.form;
+        if (!form) {
+            return;
+        }
+        const submitBtn = form.querySelector('button[type="submit"]');
+        if (submitBtn) {
+            submitBtn.dataset.label = submitBtn.innerHTML;
+        }
+
+        form.addEventListener('submit', function(e) {
+            const file = input.files && input.files[0];
+            // Skip when validation already cancelled the submit or the input is hidden
+            if (e.defaultPrevented || !file || input.offsetParent === null) {
+                return;
+            }
+            e.preventDefault();
+
+            directUpload(input, file).then(result => {
+                if (result === null) {
+                    form.submit();  // storage not configured: upload through the form
+                } else if (result.redirect) {
+                    window.location.href = result.redirect;
+                } else {
+                    const hidden = form.querySelector('input[name="image_url"]') || document.createElement('input');
+                    hidden.type = 'hidden';
+                    hidden.name = 'image_url';
+                    hidden.value = result.url;
+                    form.appendChild(hidden);
+                    input.value = '';
+                    form.submit();
+                }
+            }).catch(error => {
+                alert(error.message);
+                resetSubmit(form);
+            });
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('input[type="file"][data-direct-upload]').forEach(attach);
+    });
+})();
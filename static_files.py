@@ -0,0 +1,257 @@
+"""
+Static File Fast Path
+WSGI wrapper mounted in front of Flask that answers /static/... itself
+
+Static requests never enter the Flask pipeline (security_middleware rate
+limiting and pattern scans, request logging, session and header hooks).
+At startup every file under the static folder is indexed once:
+path -> stat, response headers, the bytes (small files) and the
+precompressed variants built by performance.precompress_static().
+
+- If-None-Match / If-Modified-Since -> 304
+- Range: bytes=a-b -> 206 (single range; unsatisfiable -> 416)
+- Accept-Encoding -> precompressed .br / .gz variant with its own ETag
+- content-hashed names from static_manifest resolve to the logical file
+  with its immutable (or grace period) Cache-Control
+
+Anything not in the index (runtime uploads under static/uploads, files added
+after startup) falls through to Flask unchanged.
+
+Outside /static, pages prerendered by prerender.py are answered the same way
+for visitors they apply to (see Prerenderer.static_page).
+"""
+import os
+import mimetypes
+import threading
+from collections import namedtuple
+
+from werkzeug.http import http_date, parse_date, parse_etags, parse_range_header
+
+from performance import negotiate_encoding, precompressed_variant
+from security_utils import SECURITY_HEADERS
+
+STATIC_MEMORY_LIMIT = int(os.getenv('STATIC_MEMORY_LIMIT', 256 * 1024))  # per file
+STATIC_MEMORY_BUDGET = int(os.getenv('STATIC_MEMORY_BUDGET', 32 * 1024 * 1024))  # all files
+STATIC_EXCLUDE = ('uploads/',)  # written at runtime: served by Flask
+STATIC_CHUNK_SIZE = 64 * 1024
+TEXT_TYPES = ('application/javascript', 'application/json', 'image/svg+xml')
+
+StaticEntry = namedtuple('StaticEntry', 'path size mtime etag content_type data variants')
+
+
+class StaticFastPath:
+    """WSGI middleware: serve indexed static files, pass everything else on"""
+
+    def __init__(self, app, static_folder, url_path='/static', max_age=31536000, headers=None,
+                 memory_limit=STATIC_MEMORY_LIMIT, memory_budget=STATIC_MEMORY_BUDGET, manifest=None,
+                 pages=None):
+        """
+        Args:
+            app: The WSGI app to wrap (flask_app.wsgi_app)
+            static_folder: Directory to index
+            url_path: URL prefix static files are served under
+            max_age: Cache-Control max-age in seconds
+            headers: Extra headers sent with every file (e.g. SECURITY_HEADERS)
+            memory_limit: Files up to this size are held in memory
+            memory_budget: Total bytes held in memory; larger files are read from disk
+            manifest: StaticManifest resolving content-hashed names
+            pages: Prerenderer serving prerendered HTML pages
+        """
+        self.app = app
+        self.static_folder = static_folder
+        self.prefix = url_path.rstrip('/') + '/'
+        self.max_age = max_age
+        self.extra_headers = list((headers if headers is not None else SECURITY_HEADERS).items())
+        self.memory_limit = memory_limit
+        self.memory_budget = memory_budget
+        self.manifest = manifest
+        self.pages = pages
+        self.index = {}
+        self._lock = threading.Lock()
+        self._stats = {'served': 0, 'not_modified': 0, 'partial': 0, 'precompressed': 0,
+                       'fallthrough': 0, 'prerendered': 0, 'bytes_sent': 0}
+        self.build_index()
+
+    # =====================================================
+    # INDEX
+    # =====================================================
+
+    def build_index(self):
+        """(Re)build the path -> StaticEntry index; returns the number of files"""
+        index = {}
+        in_memory = 0
+        for root, dirs, files in os.walk(self.static_folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                if filename.startswith(STATIC_EXCLUDE) or name.endswith(('.gz', '.br', '.tmp')):
+                    continue
+                st = os.stat(path)
+                data = None
+                if st.st_size <= self.memory_limit and in_memory + st.st_size <= self.memory_budget:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    in_memory += len(data)
+                etag = f"{int(st.st_mtime):x}-{st.st_size:x}"
+                variants = {}
+                for encoding in ('br', 'gzip'):
+                    body = precompressed_variant(filename, encoding)
+                    if body is not None:
+                        variants[encoding] = (body, f"{etag}-{encoding}")
+                index[filename] = StaticEntry(
+                    path, st.st_size, int(st.st_mtime), etag, self._content_type(name), data, variants
+                )
+        self.index = index
+        return len(index)
+
+    @staticmethod
+    def _content_type(name):
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if mimetype.startswith('text/') or mimetype in TEXT_TYPES:
+            return f'{mimetype}; charset=utf-8'
+        return mimetype
+
+    # =====================================================
+    # WSGI
+    # =====================================================
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        method = environ.get('REQUEST_METHOD')
+        if method not in ('GET', 'HEAD'):
+            return self.app(environ, start_response)
+        if not path.startswith(self.prefix):
+            page = self.pages.static_page(path, environ) if self.pages is not None else None
+            if page is None:
+                return self.app(environ, start_response)
+            self._count('prerendered')
+            return self.serve(page.entry, environ, start_response, head=method == 'HEAD',
+                              cache_control=page.cache_control, headers=page.headers)
+
+        # WSGI hands PATH_INFO over as latin-1 decoded bytes
+        filename = path[len(self.prefix):].encode('latin-1').decode('utf-8', 'replace')
+        entry = self.index.get(filename)
+        cache_control = None
+        if entry is None and self.manifest is not None:
+            resolved = self.manifest.resolve(filename)
+            if resolved:
+                entry = self.index.get(resolved[0])
+                cache_control = resolved[1]
+        if entry is None:
+            self._count('fallthrough')
+            return self.app(environ, start_response)
+        return self.serve(entry, environ, start_response, head=method == 'HEAD', cache_control=cache_control)
+
+    def serve(self, entry, environ, start_response, head=False, cache_control=None, headers=None):
+        """headers replace the default extra headers (e.g. a page's own CSP)"""
+        encoding = None
+        if entry.variants and 'HTTP_RANGE' not in environ:
+            encoding = negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+            if encoding not in entry.variants:
+                encoding = None
+        etag = entry.variants[encoding][1] if encoding else entry.etag
+
+        headers = [
+            ('Cache-Control', cache_control or f'public, max-age={self.max_age}'),
+            ('ETag', f'"{etag}"'),
+            ('Last-Modified', http_date(entry.mtime)),
+            ('Accept-Ranges', 'bytes'),
+        ] + (list(headers) if headers is not None else self.extra_headers)
+        if entry.variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        if self._not_modified(environ, etag, entry.mtime):
+            self._count('not_modified')
+            start_response('304 Not Modified', headers)
+            return [b'']
+
+        headers.append(('Content-Type', entry.content_type))
+        if encoding:
+            body = entry.variants[encoding][0]
+            headers += [('Content-Encoding', encoding), ('Content-Length', str(len(body)))]
+            self._count('precompressed')
+            return self._send(start_response, '200 OK', headers, [body], len(body), head)
+
+        start, stop = 0, entry.size
+        status = '200 OK'
+        byte_range = self._range(environ, entry)
+        if byte_range == 'unsatisfiable':
+            headers.append(('Content-Range', f'bytes */{entry.size}'))
+            start_response('416 Range Not Satisfiable', headers + [('Content-Length', '0')])
+            return [b'']
+        if byte_range:
+            start, stop = byte_range
+            status = '206 Partial Content'
+            headers.append(('Content-Range', f'bytes {start}-{stop - 1}/{entry.size}'))
+            self._count('partial')
+        headers.append(('Content-Length', str(stop - start)))
+
+        if entry.data is not None:
+            body = [entry.data if (start, stop) == (0, entry.size) else entry.data[start:stop]]
+        else:
+            body = self._read_file(entry.path, start, stop)
+        return self._send(start_response, status, headers, body, stop - start, head)
+
+    def _send(self, start_response, status, headers, body, length, head):
+        start_response(status, headers)
+        self._count('served', bytes_sent=0 if head else length)
+        if head:
+            if hasattr(body, 'close'):
+                body.close()
+            return [b'']
+        return body
+
+    @staticmethod
+    def _not_modified(environ, etag, mtime):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return parse_etags(if_none_match).contains_weak(etag)
+        since = parse_date(environ.get('HTTP_IF_MODIFIED_SINCE'))
+        return since is not None and mtime <= since.timestamp()
+
+    @staticmethod
+    def _range(environ, entry):
+        """(start, stop), None for the whole file, or 'unsatisfiable'"""
+        header = environ.get('HTTP_RANGE')
+        if not header:
+            return None
+        # If-Range with a stale validator: send the whole (new) file
+        if_range = environ.get('HTTP_IF_RANGE')
+        if if_range and if_range.strip() != f'"{entry.etag}"':
+            return None
+        byte_range = parse_range_header(header)
+        if byte_range is None or len(byte_range.ranges) != 1:
+            return None  # malformed or multipart: ignore, like most servers
+        bounds = byte_range.range_for_length(entry.size)
+        if bounds is None:
+            return 'unsatisfiable'
+        return bounds
+
+    @staticmethod
+    def _read_file(path, start, stop):
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(STATIC_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def _count(self, name, bytes_sent=0):
+        with self._lock:
+            self._stats[name] += 1
+            self._stats['bytes_sent'] += bytes_sent
+
+    def stats(self):
+        """
+        Returns:
+            dict: served, not_modified, partial, precompressed, fallthrough,
+                  prerendered, bytes_sent, files, in_memory_bytes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['files'] = len(self.index)
+        stats['in_memory_bytes'] = sum(len(e.data) for e in self.index.values() if e.data is not None)
+        return stats
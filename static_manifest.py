@@ -0,0 +1,172 @@
+"""
+Static Asset Manifest - content-hashed URLs for CSS and JS
+
+At startup each asset matching HASHED_PATTERNS is hashed and the manifest
+maps its logical path to a versioned name:
+
+    mobile-enhanced.css -> mobile-enhanced.3f9c2a71b0.css
+
+Templates call static_url('mobile-enhanced.css') and get the versioned URL,
+served with `Cache-Control: immutable` for a year: a deploy that changes the
+file changes the URL, so no CDN purge is needed. No renamed copies are
+written; the versioned name resolves to the logical file.
+
+Pages cached before a deploy still reference the previous hash. Each build
+records the hashes it replaces, with the time they were retired, in
+STATIC_MANIFEST_HISTORY (default instance/static_manifest.json; keep it on a
+volume that outlives deploys). For STATIC_HASH_GRACE seconds after a hash is
+retired it resolves to the current file with a short max-age (the bytes are
+not the ones that hash named, so they must not be cached as immutable);
+after that, and for hashes that were never deployed, it is a 404. Worker
+restarts rebuild the same hashes, so they do not extend the grace period.
+"""
+import os
+import re
+import glob
+import json
+import time
+import hashlib
+import logging
+
+from flask import request, url_for
+
+HASHED_PATTERNS = ('*.css', 'js/*.js')
+HASH_LENGTH = 10
+STATIC_HASH_GRACE = int(os.getenv('STATIC_HASH_GRACE', 7 * 86400))  # seconds
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+GRACE_CACHE_CONTROL = 'public, max-age=300'
+
+logger = logging.getLogger(__name__)
+
+_HASHED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$' % HASH_LENGTH)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(filename, digest):
+    """js/app.js + 3f9c2a71b0 -> js/app.3f9c2a71b0.js"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+class StaticManifest:
+    """Logical path <-> content-hashed name for static assets"""
+
+    def __init__(self, patterns=HASHED_PATTERNS, grace=STATIC_HASH_GRACE):
+        self.patterns = patterns
+        self.grace = grace
+        self.static_folder = None
+        self.history_path = None
+        self.assets = {}  # logical -> hashed name
+        self.retired = {}  # previously deployed hashed name -> (logical, retired_at)
+        self.built_at = None
+
+    def init_app(self, app):
+        """Build the manifest, add static_url() to templates and teach the static route hashed names"""
+        self.history_path = (app.config.get('STATIC_MANIFEST_HISTORY') or os.getenv('STATIC_MANIFEST_HISTORY')
+                             or os.path.join(app.instance_path, 'static_manifest.json'))
+        self.build(app.static_folder)
+        app.jinja_env.globals['static_url'] = static_url
+
+        send_static = app.view_functions['static']
+
+        def static(filename):
+            resolved = self.resolve(filename)
+            if resolved is None:
+                return send_static(filename=filename)
+            logical, cache_control = resolved
+            # performance._serve_precompressed looks the file up by its logical name
+            request.view_args['filename'] = logical
+            response = send_static(filename=logical)
+            response.headers['Cache-Control'] = cache_control
+            return response
+
+        app.view_functions['static'] = static
+
+    def build(self, static_folder):
+        """Hash every matching asset; returns the number of entries"""
+        assets = {}
+        for pattern in self.patterns:
+            for path in sorted(glob.glob(os.path.join(static_folder, pattern))):
+                logical = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                if _HASHED_NAME.match(os.path.basename(logical)):
+                    continue  # already versioned by hand
+                assets[logical] = hashed_name(logical, file_hash(path))
+        self.static_folder = static_folder
+        self.assets = assets
+        self._by_hashed = {name: logical for logical, name in assets.items()}
+        self.built_at = time.time()
+        self.retired = self._retire(assets)
+        return len(assets)
+
+    def _retire(self, assets):
+        """Record the hashes this build replaces; returns those still in their grace period"""
+        history = {}
+        if self.history_path and os.path.exists(self.history_path):
+            try:
+                with open(self.history_path) as f:
+                    history = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable static manifest history {self.history_path}: {e}")
+
+        now = time.time()
+        current = set(assets.values())
+        retired = {name: (logical, retired_at) for name, (logical, retired_at) in history.get('retired', {}).items()
+                   if now <= retired_at + self.grace and name not in current}
+        for logical, name in history.get('current', {}).items():
+            if name not in current and name not in retired:
+                retired[name] = (logical, now)
+
+        updated = {'current': assets, 'retired': {name: list(entry) for name, entry in retired.items()}}
+        if self.history_path and updated != history:
+            try:
+                os.makedirs(os.path.dirname(self.history_path) or '.', exist_ok=True)
+                tmp = f"{self.history_path}.{os.getpid()}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump(updated, f, indent=2, sort_keys=True)
+                os.replace(tmp, self.history_path)
+            except OSError as e:
+                logger.warning(f"Could not save static manifest history {self.history_path}: {e}")
+        return retired
+
+    def url_path(self, filename):
+        """Hashed name for a logical path, or the path unchanged if it is not in the manifest"""
+        return self.assets.get(filename, filename)
+
+    def resolve(self, filename):
+        """
+        Map a requested static filename to the file to send.
+
+        Returns:
+            tuple: (logical filename, Cache-Control) or None if the name is not
+            a current or recently retired hashed asset URL
+        """
+        logical = self._by_hashed.get(filename)
+        if logical:
+            return logical, IMMUTABLE_CACHE_CONTROL
+
+        retired = self.retired.get(filename)
+        if retired is None:
+            return None
+        logical, retired_at = retired
+        if logical not in self.assets or time.time() > retired_at + self.grace:
+            return None
+        return logical, GRACE_CACHE_CONTROL
+
+    def manifest(self):
+        """{logical: hashed} for deploy tooling and debugging"""
+        return dict(self.assets)
+
+
+static_manifest = StaticManifest()
+
+
+def static_url(filename, **kwargs):
+    """url_for('static', ...) with the content-hashed name when the asset has one"""
+    return url_for('static', filename=static_manifest.url_path(filename), **kwargs)
@@ -0,0 +1,172 @@
+"""
+Orphaned Object Garbage Collection for S3 Storage
+
+Removes bucket objects that no database row references any more: images
+of deleted products, replaced hero/logo images, abandoned direct uploads
+and variants whose source is gone.
+
+- every URL stored on a model is collected into one set of keys
+- list_objects_v2 pages are streamed, so the bucket is never held in memory
+- unreferenced objects older than the grace period are deleted in
+  delete_objects batches of up to 1000 keys; newer ones may belong to an
+  upload that has not been finalized yet
+- --dry-run reports what would be deleted and the bytes it would reclaim
+
+Usage:
+    python storage_gc.py --dry-run
+    python storage_gc.py --grace-hours 72
+    python storage_gc.py --prefix products/
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from models import (
+    db, Product, Service, HeroSection, ContentSection, Testimonial, CompanyInfo,
+    HomePageSettings, ProofOfPayment, Invoice, ImageVariantSet
+)
+from s3_storage import S3_DELETE_BATCH_SIZE
+
+STORAGE_GC_GRACE_HOURS = float(os.getenv('STORAGE_GC_GRACE_HOURS', 48))
+
+
+def reference_columns():
+    """Model columns that hold stored file URLs"""
+    return (
+        Product.image_url, Service.image_url, HeroSection.background_image,
+        ContentSection.image_url, Testimonial.avatar_url, CompanyInfo.logo_url,
+        HomePageSettings.hero_image, ProofOfPayment.file_path, Invoice.pdf_path,
+    )
+
+
+def referenced_urls():
+    """Every file URL stored in the database, excluding image variants"""
+    urls = set()
+    for column in reference_columns():
+        query = db.session.query(column).filter(column.isnot(None)).distinct()
+        urls.update(value for (value,) in query.yield_per(1000))
+    return urls
+
+
+def referenced_keys(service):
+    """
+    Bucket keys referenced by the database. Variants count only while their
+    source image is still referenced.
+
+    Returns:
+        tuple: (set of keys, list of ImageVariantSet rows with no live source)
+    """
+    urls = referenced_urls()
+    stale_sets = []
+    for variant_set in ImageVariantSet.query.yield_per(500):
+        if variant_set.source_url not in urls:
+            stale_sets.append(variant_set)
+            continue
+        for variants in json.loads(variant_set.variants).values():
+            urls.update(variants.values())
+
+    keys = {service.key_from_url(url) for url in urls}
+    keys.discard(None)
+    return keys, stale_sets
+
+
+def iter_objects(service, prefix=''):
+    """Stream bucket listings one list_objects_v2 page at a time"""
+    paginator = service.s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(
+        Bucket=service.bucket_name, Prefix=prefix,
+        PaginationConfig={'PageSize': S3_DELETE_BATCH_SIZE}
+    ):
+        yield from page.get('Contents', [])
+
+
+def collect_garbage(service=None, grace_hours=STORAGE_GC_GRACE_HOURS, prefix='', dry_run=False):
+    """
+    Delete unreferenced objects older than the grace period.
+
+    Returns:
+        dict: scanned, referenced, recent, orphans, deleted, errors,
+              reclaimed_bytes, variant_sets_pruned
+    """
+    if service is None:
+        from s3_storage import storage_service as service
+    if not service.enabled:
+        print("S3 storage not configured")
+        return None
+
+    keys, stale_sets = referenced_keys(service)
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    report = dict.fromkeys(
+        ('scanned', 'referenced', 'recent', 'orphans', 'deleted', 'errors', 'reclaimed_bytes'), 0
+    )
+    mode = 'DRY RUN - ' if dry_run else ''
+    print(f"{mode}{len(keys)} referenced key(s); grace period {grace_hours:g}h")
+    started = time.perf_counter()
+
+    def flush(batch):
+        sizes = {obj['Key']: obj['Size'] for obj in batch}
+        if dry_run:
+            report['deleted'] += len(sizes)
+            report['reclaimed_bytes'] += sum(sizes.values())
+            return
+        deleted, errors = service.delete_keys(sizes)
+        failed = {error.get('Key') for error in errors}
+        report['deleted'] += deleted
+        report['errors'] += len(errors)
+        report['reclaimed_bytes'] += sum(size for key, size in sizes.items() if key not in failed)
+
+    batch = []
+    for obj in iter_objects(service, prefix):
+        report['scanned'] += 1
+        if obj['Key'] in keys:
+            report['referenced'] += 1
+        elif obj['LastModified'] > cutoff:
+            report['recent'] += 1
+        else:
+            report['orphans'] += 1
+            batch.append(obj)
+            if len(batch) == S3_DELETE_BATCH_SIZE:
+                flush(batch)
+                batch = []
+                print(f"  {report['scanned']} scanned, {report['deleted']} deleted "
+                      f"({report['reclaimed_bytes'] / 1024 / 1024:.1f} MB)")
+    if batch:
+        flush(batch)
+
+    # Variant sets whose source is gone; their objects were collected above
+    # (a prefix-limited run may have skipped some, so keep the rows then)
+    report['variant_sets_pruned'] = 0
+    if stale_sets and not prefix:
+        report['variant_sets_pruned'] = len(stale_sets)
+        if not dry_run:
+            for variant_set in stale_sets:
+                db.session.delete(variant_set)
+            db.session.commit()
+
+    print(f"{mode}Done in {time.perf_counter() - started:.1f}s: "
+          f"{report['scanned']} scanned, {report['referenced']} referenced, "
+          f"{report['recent']} within grace period, {report['orphans']} orphaned, "
+          f"{report['deleted']} deleted, {report['errors']} error(s), "
+          f"{report['reclaimed_bytes'] / 1024 / 1024:.2f} MB reclaimed")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Delete bucket objects no database row references')
+    parser.add_argument('--dry-run', action='store_true', help='Report orphans without deleting them')
+    parser.add_argument('--grace-hours', type=float, default=STORAGE_GC_GRACE_HOURS,
+                        help='Keep unreferenced objects younger than this')
+    parser.add_argument('--prefix', default='', help='Only scan keys under this prefix')
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        try:
+            collect_garbage(grace_hours=args.grace_hours, prefix=args.prefix, dry_run=args.dry_run)
+        except KeyboardInterrupt:
+            print("\nInterrupted - objects deleted so far stay deleted; rerun to continue")
+            sys.exit(1)
@@ -22,10 +22,23 @@ import stripe
 from flask import current_app
 
 from models import db, Transaction, Order
+from resilience import get_breaker, DependencyUnavailableError
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Only outages (network, 5xx, rate limiting) trip the breaker - declined
+# cards and invalid requests are normal business errors.
+stripe_breaker = get_breaker(
+    'stripe', failure_threshold=5, recovery_timeout=30,
+    failure_exceptions=(
+        stripe.error.APIConnectionError,
+        stripe.error.APIError,
+        stripe.error.RateLimitError
+    ),
+    max_concurrent=8
+)
+
 
 class StripePaymentError(Exception):
     """Custom exception for Stripe payment errors"""
@@ -109,7 +122,8 @@ class StripePayment:
                 intent_metadata.update(metadata)
             
             # Create payment intent
-            intent = stripe.PaymentIntent.create(
+            intent = stripe_breaker.call(
+                stripe.PaymentIntent.create,
                 amount=amount_cents,
                 currency=currency.lower(),
                 description=description,
@@ -157,7 +171,7 @@ class StripePayment:
             StripePaymentError: If confirmation fails
         """
         try:
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = stripe_breaker.call(stripe.PaymentIntent.retrieve, payment_intent_id)
             
             if intent.status not in ['succeeded', 'processing']:
                 raise StripePaymentError(
@@ -180,18 +194,26 @@ class StripePayment:
                 if intent.charges.data else None
             }
             
+        except DependencyUnavailableError as e:
+            logger.warning(f"Stripe unavailable: {str(e)}")
+            raise StripePaymentError(
+                "Payment provider temporarily unavailable, please try again"
+            )
         except stripe.error.StripeError as e:
             error_msg = f"Payment confirmation error: {str(e)}"
             logger.error(error_msg)
             raise StripePaymentError(error_msg)
 
-    def handle_webhook(self, event_json, signature):
+    def handle_webhook(self, event_json, signature, before_commit=None):
         """
         Handle Stripe webhook events (payment_intent.succeeded, etc.)
         
         Args:
             event_json (str): Raw webhook JSON payload
             signature (str): X-Stripe-Signature header value
+            before_commit (callable): Called with the result dict before the
+                payment update commits, e.g. to queue emails in the same
+                transaction; if it raises, the update is rolled back
             
         Returns:
             dict: Webhook processing result {
@@ -218,15 +240,15 @@ class StripePayment:
             
             # Handle payment_intent.succeeded event
             if event_type == 'payment_intent.succeeded':
-                return self._handle_payment_succeeded(event)
+                return self._handle_payment_succeeded(event, before_commit)
             
             # Handle payment_intent.payment_failed event
             elif event_type == 'payment_intent.payment_failed':
-                return self._handle_payment_failed(event)
+                return self._handle_payment_failed(event, before_commit)
             
             # Handle charge.refunded event
             elif event_type == 'charge.refunded':
-                return self._handle_charge_refunded(event)
+                return self._handle_charge_refunded(event, before_commit)
             
             else:
                 logger.warning(
@@ -249,7 +271,7 @@ class StripePayment:
             logger.error(error_msg)
             raise StripePaymentError(error_msg)
 
-    def _handle_payment_succeeded(self, event):
+    def _handle_payment_succeeded(self, event, before_commit=None):
         """Process payment_intent.succeeded webhook event"""
         try:
             intent = event['data']['object']
@@ -292,6 +314,16 @@ class StripePayment:
                 order.payment_confirmed_at = datetime.now(timezone.utc)
                 order.payment_status = 'confirmed'
             
+            db.session.flush()
+            result = {
+                'success': True,
+                'event_id': event['id'],
+                'event_type': 'payment_intent.succeeded',
+                'order_id': order_id,
+                'transaction_id': transaction.id
+            }
+            if before_commit:
+                before_commit(result)
             db.session.commit()
             
             logger.info(
@@ -299,20 +331,14 @@ class StripePayment:
                 f"Transaction: {transaction.id}"
             )
             
-            return {
-                'success': True,
-                'event_id': event['id'],
-                'event_type': 'payment_intent.succeeded',
-                'order_id': order_id,
-                'transaction_id': transaction.id
-            }
+            return result
             
         except Exception as e:
             db.session.rollback()
             logger.error(f"Error handling payment succeeded: {str(e)}")
             raise StripePaymentError(str(e))
 
-    def _handle_payment_failed(self, event):
+    def _handle_payment_failed(self, event, before_commit=None):
         """Process payment_intent.payment_failed webhook event"""
         try:
             intent = event['data']['object']
@@ -351,6 +377,16 @@ class StripePayment:
             if order:
                 order.payment_status = 'failed'
             
+            db.session.flush()
+            result = {
+                'success': True,
+                'event_id': event['id'],
+                'event_type': 'payment_intent.payment_failed',
+                'order_id': order_id,
+                'transaction_id': transaction.id
+            }
+            if before_commit:
+                before_commit(result)
             db.session.commit()
             
             logger.warning(
@@ -358,20 +394,14 @@ class StripePayment:
                 f"Reason: {intent.get('last_payment_error')}"
             )
             
-            return {
-                'success': True,
-                'event_id': event['id'],
-                'event_type': 'payment_intent.payment_failed',
-                'order_id': order_id,
-                'transaction_id': transaction.id
-            }
+            return result
             
         except Exception as e:
             db.session.rollback()
             logger.error(f"Error handling payment failed: {str(e)}")
             raise StripePaymentError(str(e))
 
-    def _handle_charge_refunded(self, event):
+    def _handle_charge_refunded(self, event, before_commit=None):
         """Process charge.refunded webhook event"""
         try:
             charge = event['data']['object']
@@ -392,21 +422,25 @@ class StripePayment:
                     'refund_amount': str(refund_amount),
                     'refund_reason': charge.get('refund_reason', 'N/A')
                 })
-                
-                db.session.commit()
-                
-                logger.info(
-                    f"Refund processed for transaction {transaction.id}. "
-                    f"Amount: ${refund_amount}"
-                )
             
-            return {
+            result = {
                 'success': True,
                 'event_id': event['id'],
                 'event_type': 'charge.refunded',
                 'transaction_id': transaction.id if transaction else None,
                 'refund_amount': str(refund_amount)
             }
+            if before_commit:
+                before_commit(result)
+            db.session.commit()
+            
+            if transaction:
+                logger.info(
+                    f"Refund processed for transaction {transaction.id}. "
+                    f"Amount: ${refund_amount}"
+                )
+            
+            return result
             
         except Exception as e:
             db.session.rollback()
@@ -417,7 +451,8 @@ class StripePayment:
         self,
         payment_intent_id,
         amount=None,
-        reason='requested_by_customer'
+        reason='requested_by_customer',
+        before_commit=None
     ):
         """
         Refund a Stripe payment (full or partial)
@@ -426,6 +461,8 @@ class StripePayment:
             payment_intent_id (str): Stripe PaymentIntent ID
             amount (int/None): Amount in cents. None for full refund.
             reason (str): Refund reason for Stripe
+            before_commit (callable): Called with the result dict before the
+                transaction update commits (see handle_webhook)
             
         Returns:
             dict: Refund confirmation {
@@ -441,7 +478,7 @@ class StripePayment:
         """
         try:
             # Get the payment intent
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = stripe_breaker.call(stripe.PaymentIntent.retrieve, payment_intent_id)
             
             if not intent.charges.data:
                 raise StripePaymentError(
@@ -452,7 +489,8 @@ class StripePayment:
             charge_id = intent.charges.data[0].id
             
             # Create refund
-            refund = stripe.Refund.create(
+            refund = stripe_breaker.call(
+                stripe.Refund.create,
                 charge=charge_id,
                 amount=amount,
                 reason=reason,
@@ -470,20 +508,24 @@ class StripePayment:
                     str(refund.amount / 100)
                 )
                 transaction.refund_reason = reason
-                db.session.commit()
             
-            logger.info(
-                f"Refund {refund.id} processed for payment "
-                f"{payment_intent_id}. Amount: ${refund.amount/100:.2f}"
-            )
-            
-            return {
+            result = {
                 'success': True,
                 'refund_id': refund.id,
                 'amount': refund.amount / 100,
                 'status': refund.status,
                 'reason': reason
             }
+            if before_commit:
+                before_commit(result)
+            db.session.commit()
+            
+            logger.info(
+                f"Refund {refund.id} processed for payment "
+                f"{payment_intent_id}. Amount: ${refund.amount/100:.2f}"
+            )
+            
+            return result
             
         except stripe.error.StripeError as e:
             error_msg = f"Refund error: {str(e)}"
@@ -491,6 +533,7 @@ class StripePayment:
             raise StripePaymentError(error_msg)
         
         except Exception as e:
+            db.session.rollback()
             error_msg = f"Error processing refund: {str(e)}"
             logger.error(error_msg)
             raise StripePaymentError(error_msg)
@@ -512,7 +555,7 @@ class StripePayment:
             }
         """
         try:
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = stripe_breaker.call(stripe.PaymentIntent.retrieve, payment_intent_id)
             
             return {
                 'id': intent.id,
@@ -523,6 +566,11 @@ class StripePayment:
                 'charges': len(intent.charges.data) if intent.charges else 0
             }
             
+        except DependencyUnavailableError as e:
+            logger.warning(f"Stripe unavailable: {str(e)}")
+            raise StripePaymentError(
+                "Payment provider temporarily unavailable, please try again"
+            )
         except stripe.error.StripeError as e:
             logger.error(f"Error getting payment status: {str(e)}")
             raise StripePaymentError(str(e))
@@ -0,0 +1,156 @@
+"""
+Cloudflare Purge Test Suite - test_cloudflare_cache.py
+Runs against a local stub of the purge_cache API
+
+Usage:
+    pytest test_cloudflare_cache.py -v
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from flask import Flask
+
+from cloudflare_cache import CloudflareCache, PurgeQueue, watch_content
+import models
+from models import db
+
+ZONE = 'zone123'
+
+
+class StubCloudflare:
+    """Records purge_cache calls; `failures` is a list of status codes answered first"""
+
+    def __init__(self):
+        self.calls = []
+        self.failures = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.calls.append((self.path, self.headers['Authorization'], body))
+                    status = stub.failures.pop(0) if stub.failures else 200
+                payload = json.dumps({'success': status == 200, 'errors': []}).encode()
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}/client/v4'
+
+    def purged(self):
+        return [url for _, _, body in self.calls for url in body.get('files', [])]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    stub = StubCloudflare()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def cloudflare(stub):
+    return CloudflareCache(zone_id=ZONE, api_token='token', api_base=stub.base, backoff=0)
+
+
+class TestPurgeUrls:
+
+    def test_chunks_of_30_sent_to_zone(self, stub, cloudflare):
+        urls = [f'https://example.com/p/{i}' for i in range(65)]
+        assert cloudflare.purge_urls(urls + urls[:5]) is True
+        assert sorted(len(body['files']) for _, _, body in stub.calls) == [5, 30, 30]
+        assert sorted(stub.purged()) == sorted(urls)
+        path, auth, _ = stub.calls[0]
+        assert path == f'/client/v4/zones/{ZONE}/purge_cache'
+        assert auth == 'Bearer token'
+
+    def test_retries_server_errors_and_rate_limits(self, stub, cloudflare):
+        stub.failures = [500, 429]
+        assert cloudflare.purge_urls(['https://example.com/']) is True
+        assert len(stub.calls) == 3
+
+    def test_gives_up_after_retries(self, stub, cloudflare):
+        stub.failures = [503] * 10
+        assert cloudflare.purge_urls(['https://example.com/']) is False
+        assert len(stub.calls) == cloudflare.retries + 1
+
+    def test_client_errors_are_not_retried(self, stub, cloudflare):
+        stub.failures = [400]
+        assert cloudflare.purge_urls(['https://example.com/']) is False
+        assert len(stub.calls) == 1
+
+    def test_unconfigured_does_not_call_api(self, stub):
+        cloudflare = CloudflareCache(zone_id='', api_token='', api_base=stub.base, quiet=True)
+        assert cloudflare.purge_all() is False
+        assert stub.calls == []
+
+
+class TestPurgeQueue:
+
+    def test_coalesces_into_one_batch(self, stub, cloudflare):
+        queue = PurgeQueue(cloudflare, origins=['https://a.example', 'https://b.example/'], window=60)
+        queue.enqueue(['/', '/products'])
+        queue.enqueue(['/'])
+        assert stub.calls == []
+        assert queue.flush() is True
+        assert len(stub.calls) == 1
+        assert sorted(stub.purged()) == ['https://a.example/', 'https://a.example/products',
+                                         'https://b.example/', 'https://b.example/products']
+        stats = queue.stats()
+        assert (stats['enqueued'], stats['coalesced'], stats['batches'], stats['pending']) == (6, 2, 1, 0)
+
+    def test_window_timer_flushes(self, stub, cloudflare):
+        queue = PurgeQueue(cloudflare, origins=['https://a.example'], window=0.05)
+        queue.enqueue(['/services'])
+        queue._timer.join(5)
+        assert stub.purged() == ['https://a.example/services']
+
+
+class TestContentCommits:
+    """Committed content changes enqueue the pages that show them"""
+
+    @pytest.fixture
+    def app(self, cloudflare):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        app.queue = PurgeQueue(cloudflare, origins=['https://a.example'], window=60)
+        unwatch = watch_content(app.queue)
+        with app.app_context():
+            db.create_all()
+            yield app
+        unwatch()
+
+    def test_commit_enqueues_affected_pages(self, app, stub):
+        db.session.add(models.Testimonial(client_name='Thandi', content='Great service'))
+        db.session.add(models.Product(name='Pallet wrap'))
+        db.session.commit()
+        app.queue.flush()
+        assert sorted(stub.purged()) == ['https://a.example/', 'https://a.example/products']
+
+    def test_rollback_enqueues_nothing(self, app, stub):
+        db.session.add(models.Testimonial(client_name='Thandi', content='Great service'))
+        db.session.flush()
+        db.session.rollback()
+        assert app.queue.stats()['pending'] == 0
+        assert app.queue.flush() is True
+        assert stub.calls == []
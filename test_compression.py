@@ -0,0 +1,127 @@
+"""
+Response Compression Test Suite - test_compression.py
+
+Usage:
+    pytest test_compression.py -v
+"""
+
+import gzip
+
+import pytest
+from flask import Flask, jsonify, send_file
+
+import performance
+from performance import (
+    negotiate_encoding, enable_compression, precompress_static, compression_metrics
+)
+
+CSS = b'body { margin: 0; padding: 0; }\n' * 200
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Minimal app with a static folder holding one CSS file and an image"""
+    static = tmp_path / 'static'
+    (static / 'js').mkdir(parents=True)
+    (static / 'style.css').write_bytes(CSS)
+    (static / 'js' / 'menu.js').write_bytes(b'var x = 1;\n' * 300)
+    (static / 'logo.png').write_bytes(b'\x89PNG' + b'\x00' * 4000)
+
+    app = Flask(__name__, static_folder=str(static))
+    enable_compression(app)
+    precompress_static(app.static_folder)
+    compression_metrics.reset()
+
+    @app.route('/page')
+    def page():
+        return '<p>hello</p>' * 500
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/image')
+    def image():
+        return send_file(str(static / 'logo.png'))
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class TestNegotiation:
+
+    @pytest.mark.parametrize('header, expected', [
+        ('gzip, deflate', 'gzip'),
+        ('gzip;q=0, deflate', None),
+        ('*', 'gzip'),
+        ('', None),
+        (None, None),
+    ])
+    def test_gzip(self, header, expected, monkeypatch):
+        monkeypatch.setattr(performance, 'BROTLI_AVAILABLE', False)
+        assert negotiate_encoding(header) == expected
+
+    def test_brotli_preferred_when_installed(self, monkeypatch):
+        monkeypatch.setattr(performance, 'BROTLI_AVAILABLE', True)
+        assert negotiate_encoding('gzip, deflate, br') == 'br'
+        assert negotiate_encoding('gzip, br;q=0') == 'gzip'
+
+
+class TestDynamicCompression:
+
+    def test_html_above_threshold_is_gzipped(self, client):
+        response = client.get('/page', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == b'<p>hello</p>' * 500
+
+        stats = compression_metrics.snapshot()
+        assert stats['compressed'] == 1
+        assert stats['bytes_in'] == 6000
+        assert stats['bytes_saved'] == 6000 - len(response.data)
+        assert stats['cpu_ms'] >= 0
+
+    def test_identity_small_and_compressed_types_left_alone(self, client):
+        assert 'Content-Encoding' not in client.get('/page').headers
+        assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+        image = client.get('/image', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in image.headers
+        assert compression_metrics.snapshot()['compressed'] == 0
+
+
+class TestPrecompressedStatic:
+    """Static CSS/JS is compressed once, at startup"""
+
+    def test_siblings_written_and_served_without_compressing(self, app, client, tmp_path):
+        assert (tmp_path / 'static' / 'style.css.gz').exists()
+        assert (tmp_path / 'static' / 'js' / 'menu.js.gz').exists()
+
+        response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == CSS
+        assert response.headers['ETag'].endswith('-gzip"')
+        stats = compression_metrics.snapshot()
+        assert stats['compressed'] == 0
+        assert stats['precompressed_served'] == 1
+        assert stats['bytes_saved'] == len(CSS) - len(response.data)
+
+    def test_encoded_etag_revalidates(self, client):
+        etag = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_identity_and_range_get_the_plain_file(self, client):
+        assert client.get('/static/style.css').data == CSS
+        partial = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-3'})
+        assert partial.status_code == 206
+        assert partial.data == b'body'
+
+    def test_fresh_siblings_are_reused(self, app, tmp_path):
+        sibling = tmp_path / 'static' / 'style.css.gz'
+        sibling.write_bytes(b'prebuilt')
+        assert precompress_static(app.static_folder)['style.css']['gzip'] == b'prebuilt'
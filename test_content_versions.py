@@ -0,0 +1,184 @@
+"""
+Conditional GET Test Suite - test_content_versions.py
+
+Usage:
+    pytest test_content_versions.py -v
+"""
+
+import pytest
+from flask import Flask, jsonify, session
+from flask_caching import Cache
+
+from models import db, Cart, CartItem, Customer, Order, OrderItem
+from content_versions import ContentVersions, viewer_key, customer_scope
+
+versions = ContentVersions()
+calls = []
+
+
+@pytest.fixture
+def app():
+    """Minimal app: one cached page and one per-customer JSON endpoint"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True, SECRET_KEY='test', CACHE_TYPE='simple',
+        SQLALCHEMY_DATABASE_URI='sqlite:///:memory:'
+    )
+    db.init_app(app)
+    cache = Cache(app)
+    versions.init_app(app, view_cache=cache)
+    versions.store.shared = True  # as with RedisStamps
+    calls.clear()
+
+    @app.route('/page')
+    @versions.conditional('catalog', 'chrome', vary=(viewer_key,))
+    @cache.cached(timeout=300)
+    def page():
+        calls.append('page')
+        return f'page {len(calls)}'
+
+    @app.route('/count')
+    @versions.conditional(customer_scope('cart'), shared_only=True)
+    def count():
+        calls.append('count')
+        return jsonify({'cart_count': 0})
+
+    @app.route('/orders/<int:customer_id>')
+    @versions.conditional(lambda customer_id: f'orders:{customer_id}', shared_only=True)
+    def orders(customer_id):
+        calls.append('orders')
+        return jsonify({'orders': []})
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['_user_id'] = str(user_id)
+        return 'ok'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class TestConditionalGet:
+    """Validators come from stamps; 304 skips the view entirely"""
+
+    def test_matching_etag_is_answered_without_the_view(self, client):
+        first = client.get('/page')
+        assert first.status_code == 200
+        assert first.headers['ETag'].startswith('W/"')
+        assert first.headers['Cache-Control'] == 'private, no-cache'
+        assert 'Last-Modified' in first.headers
+
+        again = client.get('/page', headers={'If-None-Match': first.headers['ETag']})
+        assert again.status_code == 304
+        assert again.data == b''
+        assert again.headers['ETag'] == first.headers['ETag']
+        assert calls == ['page']
+
+    def test_invalidate_clears_view_cache_and_changes_etag(self, client):
+        etag = client.get('/page').headers['ETag']
+        versions.invalidate('catalog')
+
+        response = client.get('/page', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.data == b'page 2'  # rendered again, not the cached body
+        assert response.headers['ETag'] != etag
+
+    def test_unrelated_scope_keeps_etag(self, client):
+        etag = client.get('/page').headers['ETag']
+        versions.bump('cart:99')
+        assert client.get('/page', headers={'If-None-Match': etag}).status_code == 304
+
+    def test_etag_varies_by_viewer(self, client):
+        etag = client.get('/page').headers['ETag']
+        client.get('/login/5')
+        response = client.get('/page', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_if_modified_since_only_without_vary(self, client):
+        client.get('/login/5')
+        first = client.get('/count')
+        since = {'If-Modified-Since': first.headers['Last-Modified']}
+        assert client.get('/count', headers=since).status_code == 304
+
+        page = client.get('/page')
+        assert client.get('/page', headers={'If-Modified-Since': page.headers['Last-Modified']}).status_code == 200
+
+    def test_bump_within_the_same_second_moves_last_modified(self, client):
+        client.get('/login/5')
+        first = client.get('/count')
+        versions.bump('cart:5')
+        response = client.get('/count', headers={'If-Modified-Since': first.headers['Last-Modified']})
+        assert response.status_code == 200
+        assert response.headers['Last-Modified'] != first.headers['Last-Modified']
+
+    def test_shared_only_views_skip_per_process_stamps(self, client):
+        client.get('/login/5')
+        versions.store.shared = False
+        response = client.get('/count')
+        assert 'ETag' not in response.headers
+        assert client.get('/count', headers={'If-None-Match': '*'}).status_code == 200
+        assert calls == ['count', 'count']
+
+    def test_scope_without_customer_skips_validators(self, client):
+        response = client.get('/count')
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+
+
+class TestCommitEvents:
+    """Cart and order rows bump the owner's stamp when (and only when) they commit"""
+
+    def test_cart_changes_bump_after_commit(self, app, client):
+        client.get('/login/7')
+        etag = client.get('/count').headers['ETag']
+
+        cart = Cart(customer_id=7)
+        db.session.add(cart)
+        db.session.flush()
+        db.session.add(CartItem(cart_id=cart.id, product_id=1, quantity=2))
+        db.session.rollback()
+        assert client.get('/count', headers={'If-None-Match': etag}).status_code == 304
+
+        cart = Cart(customer_id=7)
+        db.session.add(cart)
+        db.session.commit()
+        etag = client.get('/count').headers['ETag']
+
+        db.session.add(CartItem(cart_id=cart.id, product_id=1, quantity=2))
+        db.session.commit()
+        assert client.get('/count', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_other_customers_cart_leaves_etag(self, app, client):
+        client.get('/login/7')
+        etag = client.get('/count').headers['ETag']
+        db.session.add(Cart(customer_id=8))
+        db.session.commit()
+        assert client.get('/count', headers={'If-None-Match': etag}).status_code == 304
+
+    def test_customer_and_order_item_edits_bump_orders(self, app, client):
+        customer = Customer(email='buyer@example.com', password_hash='x', company='Old Co')
+        db.session.add(customer)
+        db.session.flush()
+        order = Order(customer_id=customer.id, order_number='ORD-1', subtotal=10, total_amount=10)
+        db.session.add(order)
+        db.session.commit()
+        etag = client.get(f'/orders/{customer.id}').headers['ETag']
+
+        customer.company = 'New Co'
+        db.session.commit()
+        response = client.get(f'/orders/{customer.id}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+
+        db.session.add(OrderItem(order_id=order.id, product_id=1, quantity=1, price_at_purchase=10))
+        db.session.commit()
+        assert client.get(f'/orders/{customer.id}', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,270 @@
+"""
+Email Outbox Test Suite - test_email_outbox.py
+
+Usage:
+    pytest test_email_outbox.py -v
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from models import db, EmailOutbox
+import email_outbox
+from email_outbox import (
+    queue_email, claim_messages, dispatch, requeue_stale_messages,
+    retry_dead, outbox_stats
+)
+from email_service import smtp_breaker
+
+
+@pytest.fixture
+def app():
+    """Minimal app with an in-memory database"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['ADMIN_EMAIL'] = 'admin@example.com'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    smtp_breaker.reset()
+
+
+class FakeEmailService:
+    """Records calls; fails while `failing` is set"""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+
+    def send_refund_email(self, **kwargs):
+        self.calls.append(('send_refund_email', kwargs))
+        return not self.failing
+
+    def send_contact_confirmation(self, **kwargs):
+        self.calls.append(('send_contact_confirmation', kwargs))
+        return not self.failing
+
+
+def _refund(recipient='buyer@example.com', **extra):
+    return queue_email(
+        'send_refund_email', recipient, recipient_name='Buyer',
+        order_number='ORD-1', transaction_id=7, refund_amount=99.5,
+        currency='ZAR', refund_reason='Damaged', company_name='360',
+        company_email='info@example.com', company_phone='123', **extra
+    )
+
+
+class TestQueueEmail:
+    """The request path only adds a row to the caller's transaction"""
+
+    def test_row_commits_with_caller(self, app):
+        _refund()
+        assert EmailOutbox.query.count() == 1  # autoflush, not yet committed
+        db.session.rollback()
+        assert EmailOutbox.query.count() == 0
+
+        _refund()
+        db.session.commit()
+        message = EmailOutbox.query.one()
+        assert message.status == 'pending'
+        assert message.recipient == 'buyer@example.com'
+        assert json.loads(message.payload)['recipient_email'] == 'buyer@example.com'
+
+    def test_recipient_bound_to_method_argument(self, app):
+        message = queue_email(
+            'send_contact_notification', 'admin@example.com', sender_name='A',
+            sender_email='a@example.com', sender_phone='1', subject='Hi',
+            message_content='Hello', company_name='360'
+        )
+        assert json.loads(message.payload)['admin_email'] == 'admin@example.com'
+
+    def test_unknown_template_rejected(self, app):
+        with pytest.raises(ValueError):
+            queue_email('_deliver', 'a@example.com')
+        with pytest.raises(ValueError):
+            queue_email('send_newsletter', 'a@example.com')
+
+
+class TestDispatch:
+    """Sending, retries with backoff, dead letters and rate limits"""
+
+    @pytest.fixture
+    def service(self):
+        return FakeEmailService()
+
+    def test_sends_due_messages(self, app, service):
+        _refund()
+        db.session.commit()
+
+        assert dispatch(service) == 1
+        assert service.calls[0][1]['order_number'] == 'ORD-1'
+        message = EmailOutbox.query.one()
+        assert message.status == 'sent'
+        assert message.sent_at is not None
+        assert message.attempts == 1
+
+    def test_failure_backs_off_then_dead_letters(self, app, service, monkeypatch):
+        monkeypatch.setattr(email_outbox, 'OUTBOX_MAX_ATTEMPTS', 3)
+        service.failing = True
+        message = _refund()
+        db.session.commit()
+
+        delays = []
+        for _ in range(3):
+            message.run_after = datetime.utcnow()
+            db.session.commit()
+            before = datetime.utcnow()
+            assert dispatch(service) == 0
+            delays.append((message.run_after - before).total_seconds())
+
+        assert message.status == 'dead'
+        assert message.last_error == 'SMTP send failed'
+        assert 27 <= delays[0] <= 33 and 54 <= delays[1] <= 66
+
+        assert retry_dead() == 1
+        service.failing = False
+        assert dispatch(service) == 1
+
+    def test_bad_payload_dead_letters_immediately(self, app, service):
+        message = _refund()
+        message.payload = json.dumps({'unexpected': True})
+        db.session.commit()
+
+        service.send_refund_email = lambda recipient_email: True
+        dispatch(service)
+        assert message.status == 'dead'
+        assert message.attempts == 1
+
+    def test_unexpected_errors_do_not_stop_the_batch(self, app, service):
+        from jinja2 import TemplateError
+        broken, transient, good = _refund(), _refund(), _refund()
+        db.session.commit()
+
+        errors = {broken.id: TemplateError('undefined variable'), transient.id: OSError('disk full')}
+        send = service.send_refund_email
+        pending = iter([broken.id, transient.id, good.id])
+
+        def flaky(**kwargs):
+            error = errors.get(next(pending))
+            if error:
+                raise error
+            return send(**kwargs)
+
+        service.send_refund_email = flaky
+        assert dispatch(service) == 1
+        assert broken.status == 'dead'
+        assert transient.status == 'pending' and transient.last_error == 'disk full'
+        assert good.status == 'sent'
+
+    def test_per_recipient_rate_limit(self, app, service, monkeypatch):
+        monkeypatch.setattr(email_outbox, 'OUTBOX_RECIPIENT_LIMIT', 2)
+        for _ in range(3):
+            _refund()
+        _refund('admin@example.com')
+        _refund('admin@example.com')
+        _refund('admin@example.com')
+        db.session.commit()
+
+        assert dispatch(service) == 5
+        deferred = EmailOutbox.query.filter_by(status='pending').one()
+        assert deferred.recipient == 'buyer@example.com'
+        assert deferred.attempts == 0
+        assert deferred.run_after > datetime.utcnow() + timedelta(minutes=59)
+
+    def test_open_breaker_holds_batch_back(self, app, service):
+        _refund()
+        db.session.commit()
+        for _ in range(smtp_breaker.failure_threshold):
+            smtp_breaker.record_failure(ConnectionError('down'))
+
+        assert dispatch(service) == 0
+        message = EmailOutbox.query.one()
+        assert message.status == 'pending'
+        assert message.attempts == 0
+        assert service.calls == []
+
+    def test_dispatcher_sleeps_when_nothing_is_claimed(self, app, service, monkeypatch):
+        message = _refund()
+        db.session.commit()
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 3:  # the dispatcher holding the row sends it
+                message.status = 'sent'
+                db.session.commit()
+        monkeypatch.setattr(email_outbox, 'claim_messages', lambda limit: [])
+        monkeypatch.setattr(email_outbox.time, 'sleep', sleep)
+
+        email_outbox.run_dispatcher(service, once=True)
+        assert sleeps == [email_outbox.OUTBOX_POLL_INTERVAL] * 3
+        assert service.calls == []
+
+    def test_stale_claims_are_requeued(self, app):
+        _refund()
+        db.session.commit()
+        message = claim_messages(10)[0]
+        message.started_at = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+
+        assert requeue_stale_messages() == 1
+        db.session.refresh(message)
+        assert message.status == 'pending'
+
+
+class TestCommitsWithPayment:
+    """Webhook emails are queued inside the gateway's own transaction"""
+
+    def _callback(self, app, monkeypatch, before_commit):
+        from payfast_service import PayFastPayment
+        app.config.update(PAYFAST_MERCHANT_ID='1', PAYFAST_MERCHANT_KEY='k')
+        payfast = PayFastPayment()
+        monkeypatch.setattr(payfast, 'verify_signature', lambda post_data: True)
+        return payfast.handle_callback({'custom_str1': '1', 'pf_payment_id': 'pf-1', 'amount_gross': '10.00',
+                                        'payment_status': 'COMPLETE'}, before_commit=before_commit)
+
+    def test_email_and_payment_commit_together(self, app, monkeypatch):
+        from models import Transaction
+        result = self._callback(app, monkeypatch, lambda result: _refund())
+        db.session.rollback()
+        assert db.session.get(Transaction, result['transaction_id']).status == 'completed'
+        assert EmailOutbox.query.count() == 1
+
+    def test_failed_queueing_rolls_the_payment_back(self, app, monkeypatch):
+        from models import Transaction
+        from payfast_service import PayFastPaymentError
+
+        def broken(result):
+            _refund()
+            raise ValueError('template missing')
+        with pytest.raises(PayFastPaymentError):
+            self._callback(app, monkeypatch, broken)
+        assert Transaction.query.count() == 0
+        assert EmailOutbox.query.count() == 0
+
+
+class TestOutboxStats:
+
+    def test_depth_and_age(self, app):
+        assert outbox_stats()['oldest_pending_age_s'] is None
+        old = _refund()
+        old.created_at = datetime.utcnow() - timedelta(minutes=10)
+        later = _refund()
+        later.run_after = datetime.utcnow() + timedelta(hours=1)
+        dead = _refund()
+        dead.status = 'dead'
+        db.session.commit()
+
+        stats = outbox_stats()
+        assert stats['pending'] == 2
+        assert stats['due'] == 1
+        assert stats['dead'] == 1
+        assert stats['oldest_pending_age_s'] >= 600
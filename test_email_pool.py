@@ -0,0 +1,229 @@
+"""
+SMTP Connection Pool Test Suite - test_email_pool.py
+Uses an in-memory stand-in for smtplib sessions
+
+Usage:
+    pytest test_email_pool.py -v
+"""
+
+import smtplib
+import threading
+
+import pytest
+
+import email_service
+from email_service import EmailService, SMTPConnectionPool, SMTPMetrics
+
+
+class FakeSMTP:
+    """Records logins and messages; can be told to drop or refuse"""
+
+    opened = []
+
+    def __init__(self):
+        self.logins = 0
+        self.sent = []
+        self.closed = False
+        self.alive = True
+        self.refuse = set()
+        FakeSMTP.opened.append(self)
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def noop(self):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected('gone')
+        return (250, b'OK')
+
+    def sendmail(self, sender, recipients, message):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        recipients = [recipients] if isinstance(recipients, str) else recipients
+        refused = {r: (550, b'No such user') for r in recipients if r in self.refuse}
+        if len(refused) == len(recipients):
+            raise smtplib.SMTPRecipientsRefused(refused)
+        self.sent.append((sender, recipients, message))
+        return refused
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def service(monkeypatch):
+    FakeSMTP.opened = []
+    metrics = SMTPMetrics()
+    monkeypatch.setattr(email_service, 'smtp_metrics', metrics)
+    service = EmailService('smtp.test', 587, 'shop@example.com', 'secret')
+    service.pool = SMTPConnectionPool(service._login, metrics=metrics)
+    monkeypatch.setattr(service, '_open_connection', FakeSMTP)
+    return service
+
+
+class TestPooledSends:
+    """Sessions are authenticated once and reused"""
+
+    def test_sessions_are_reused(self, service):
+        for index in range(5):
+            assert service.send_email(f'c{index}@example.com', 'Hi', '<p>Hi</p>')
+
+        assert len(FakeSMTP.opened) == 1
+        assert FakeSMTP.opened[0].logins == 1
+        assert len(FakeSMTP.opened[0].sent) == 5
+        stats = email_service.smtp_metrics.snapshot()
+        assert stats['sent'] == 5
+        assert stats['connections_opened'] == 1
+        assert stats['connections_reused'] == 4
+        assert stats['p95_ms'] is not None
+
+    def test_multi_recipient_send_is_one_transaction(self, service):
+        assert service.send_email(['a@example.com', 'b@example.com'], 'Hi', '<p>Hi</p>')
+        sender, recipients, message = FakeSMTP.opened[0].sent[0]
+        assert recipients == ['a@example.com', 'b@example.com']
+        assert 'To: a@example.com, b@example.com' in message
+
+    def test_bulk_send_keeps_going_after_a_rejection(self, service):
+        service.send_email('first@example.com', 'Hi', '<p>Hi</p>')
+        FakeSMTP.opened[0].refuse.add('bad@example.com')
+
+        results = service.send_bulk([
+            {'recipient_email': 'a@example.com', 'subject': 'A', 'html_content': '<p>A</p>'},
+            {'recipient_email': 'bad@example.com', 'subject': 'B', 'html_content': '<p>B</p>'},
+            {'recipient_email': 'c@example.com', 'subject': 'C', 'html_content': '<p>C</p>', 'plain_text': 'C'},
+        ])
+
+        assert results == [True, False, True]
+        assert len(FakeSMTP.opened) == 1
+        assert email_service.smtp_metrics.snapshot()['failed'] == 1
+
+    def test_dropped_session_is_replaced_once(self, service):
+        service.send_email('a@example.com', 'Hi', '<p>Hi</p>')
+        FakeSMTP.opened[0].alive = False
+
+        assert service.send_email('b@example.com', 'Hi', '<p>Hi</p>')
+        assert len(FakeSMTP.opened) == 2
+        assert FakeSMTP.opened[0].closed
+        assert email_service.smtp_metrics.snapshot()['retries'] == 1
+
+    def test_no_credentials_skips_smtp(self, service):
+        service.sender_password = ''
+        assert service.send_email('a@example.com', 'Hi', '<p>Hi</p>') is False
+        assert FakeSMTP.opened == []
+
+
+class TestBulkhead:
+    """A full SMTP bulkhead waits briefly, then counts what it drops"""
+
+    @pytest.fixture
+    def breaker(self, monkeypatch):
+        from resilience import CircuitBreaker
+        breaker = CircuitBreaker('smtp-test', max_concurrent=1, acquire_timeout=0.2)
+        monkeypatch.setattr(email_service, 'smtp_breaker', breaker)
+        return breaker
+
+    def test_sender_waits_for_a_free_slot(self, service, breaker):
+        breaker.bulkhead.acquire()
+        threading.Timer(0.05, breaker.bulkhead.release).start()
+
+        assert service.send_email('c@example.com', 'Hi', '<p>Hi</p>')
+        assert email_service.smtp_metrics.snapshot()['rejected'] == 0
+
+    def test_rejected_sends_are_counted(self, service, breaker):
+        breaker.bulkhead.acquire()
+        try:
+            assert not service.send_email('c@example.com', 'Hi', '<p>Hi</p>')
+            assert service.send_bulk([
+                {'recipient_email': f'c{index}@example.com', 'subject': 'Hi', 'html_content': '<p>Hi</p>'}
+                for index in range(2)
+            ]) == [False, False]
+        finally:
+            breaker.bulkhead.release()
+
+        assert email_service.smtp_metrics.snapshot()['rejected'] == 3
+        assert breaker.bulkhead.stats()['rejected'] == 2
+
+
+class TestPoolExpiry:
+    """Health checks, max age and idle expiry"""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(email_service.time, 'monotonic', lambda: now[0])
+        return now
+
+    def make_pool(self, **kwargs):
+        FakeSMTP.opened = []
+        kwargs.setdefault('metrics', SMTPMetrics())
+        return SMTPConnectionPool(FakeSMTP, **kwargs)
+
+    def test_noop_checks_sessions_idle_past_threshold(self, clock):
+        pool = self.make_pool(noop_after=5, idle_timeout=60)
+        conn, _ = pool.acquire()
+        pool.release(conn)
+        conn.server.alive = False
+
+        clock[0] += 1
+        assert pool.acquire() == (conn, True)  # recently used: no NOOP
+        pool.release(conn)
+
+        clock[0] += 10
+        fresh, reused = pool.acquire()
+        assert fresh is not conn and not reused
+        assert pool.metrics.snapshot()['noop_failures'] == 1
+
+    def test_idle_sessions_expire(self, clock):
+        pool = self.make_pool(idle_timeout=30)
+        conn, _ = pool.acquire()
+        pool.release(conn)
+
+        clock[0] += 31
+        assert pool.prune() == 1
+        assert conn.server.closed
+        assert len(pool) == 0
+
+    def test_old_sessions_are_retired(self, clock):
+        pool = self.make_pool(max_age=100, idle_timeout=1000, noop_after=1000)
+        conn, _ = pool.acquire()
+        for _ in range(3):
+            clock[0] += 40
+            pool.release(conn)
+            conn, _ = pool.acquire()
+
+        assert len(FakeSMTP.opened) == 2
+        assert FakeSMTP.opened[0].closed
+
+    def test_pool_keeps_at_most_size_sessions(self):
+        pool = self.make_pool(size=2)
+        conns = [pool.acquire()[0] for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+
+        assert len(pool) == 2
+        assert conns[2].server.closed
+        pool.close_all()
+        assert all(conn.server.closed for conn in conns)
+
+    def test_concurrent_senders_share_the_pool(self):
+        pool = self.make_pool(size=4)
+        barrier = threading.Barrier(4)
+
+        def send():
+            barrier.wait()
+            for _ in range(10):
+                conn, _ = pool.acquire()
+                conn.server.sendmail('shop@example.com', 'a@example.com', 'x')
+                pool.release(conn)
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(FakeSMTP.opened) <= 4
+        assert sum(len(server.sent) for server in FakeSMTP.opened) == 40
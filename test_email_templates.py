@@ -0,0 +1,125 @@
+"""
+Email Template Test Suite - test_email_templates.py
+
+Usage:
+    pytest test_email_templates.py -v
+"""
+
+import pytest
+
+from email_templates import (
+    parse_stylesheet, inline_css, html_to_text, render_email, email_env
+)
+from email_service import EmailService
+
+
+class TestInlineCss:
+    """Stylesheet rules are copied into style attributes"""
+
+    RULES = parse_stylesheet("""
+        /* comment */
+        p { margin: 0; }
+        .note { color: #777; font-size: 12px; }
+        a.button { color: white; }
+        div .nested { color: red; }
+    """)
+
+    def test_parses_simple_selectors_only(self):
+        assert self.RULES == {
+            'p': 'margin: 0',
+            '.note': 'color: #777; font-size: 12px',
+            'a.button': 'color: white',
+        }
+
+    def test_tag_then_class_then_own_style(self):
+        html = inline_css('<p class="note" style="color: red">x</p>', self.RULES)
+        assert html == '<p class="note" style="margin: 0; font-size: 12px; color: red">x</p>'
+
+    def test_tag_qualified_class(self):
+        assert 'style="color: white"' in inline_css('<a class="button" href="#">Go</a>', self.RULES)
+        assert inline_css('<span class="button">Go</span>', self.RULES) == '<span class="button">Go</span>'
+
+    def test_templated_class_and_jinja_left_alone(self):
+        source = '{% if x %}<p class="{{ cls }}">{{ x }}</p>{% endif %}'
+        assert inline_css(source, self.RULES) == source
+
+
+class TestHtmlToText:
+
+    def test_blocks_lists_and_links(self):
+        text = html_to_text(
+            '<html><head><title>T</title></head><body><h2>Hello</h2>'
+            '<p>Line one\n   continues</p><ul><li>a</li><li>b</li></ul>'
+            '<p><a href="https://x.test/pay">Pay now</a> or <a href="mailto:a@b.c">a@b.c</a></p>'
+            '<table><tr><td>Name:</td><td>Ann &amp; Co</td></tr></table></body></html>'
+        )
+        assert text == (
+            'Hello\n\nLine one continues\n\n- a\n- b\n\n'
+            'Pay now (https://x.test/pay) or a@b.c\n\nName: Ann & Co\n'
+        )
+
+
+class TestRenderEmail:
+    """Templates share the layout, are inlined once and autoescape"""
+
+    CONTEXT = dict(
+        recipient_name='Ann <script>', order_number='ORD-1', transaction_id='tx-1',
+        refund_amount='10.00', currency='ZAR', refund_reason='Damaged',
+        company_name='360Degree Supply', company_email='info@example.com',
+        company_phone='123', processed_date='2026-10-19 10:00'
+    )
+
+    def test_layout_inline_styles_and_escaping(self):
+        html, text = render_email('refund.html', **self.CONTEXT)
+        assert '© 2026 360Degree Supply' in html
+        assert '<div class="header" style="background-color: #1a472a' in html
+        assert 'Ann &lt;script&gt;' in html
+        assert 'Dear Ann <script>,' in text
+        assert 'Refund Amount: ZAR 10.00' in text
+
+    def test_inlined_and_compiled_once(self):
+        render_email('refund.html', **self.CONTEXT)
+        loads = email_env.loader.inlined
+        for _ in range(5):
+            render_email('refund.html', **self.CONTEXT)
+        assert email_env.loader.inlined == loads
+
+
+class TestEmailServiceTemplates:
+    """Every send_* method renders its template and a text part"""
+
+    @pytest.fixture
+    def sent(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            EmailService, 'send_email',
+            lambda self, to, subject, html, text=None: calls.append((to, subject, html, text)) or True
+        )
+        return calls
+
+    @pytest.fixture
+    def service(self):
+        return EmailService('smtp.test', 587, 'shop@example.com', 'secret')
+
+    COMPANY = dict(company_name='360', company_email='info@example.com', company_phone='123')
+
+    @pytest.mark.parametrize('method, kwargs, subject', [
+        ('send_contact_confirmation', dict(recipient_name='A', subject='Quote', message_content='Hi'), 'Thank You - Quote'),
+        ('send_payment_confirmation', dict(recipient_name='A', transaction_id='tx', amount=5, currency='ZAR', payment_method='EFT'), 'Payment Confirmation - tx'),
+        ('send_order_confirmation', dict(order_number='O1', total_amount=5), 'Order Confirmation - O1'),
+        ('send_payment_failed_email', dict(recipient_name='A', order_number='O1', error_message='Declined', retry_url='https://x/retry'), 'Payment Failed - Order O1'),
+        ('send_refund_email', dict(recipient_name='A', order_number='O1', transaction_id='tx', refund_amount=5, currency='ZAR', refund_reason='R'), 'Refund Processed - Order O1'),
+    ])
+    def test_customer_emails(self, service, sent, method, kwargs, subject):
+        assert getattr(service, method)(recipient_email='c@example.com', **kwargs, **self.COMPANY)
+        to, actual_subject, html, text = sent[0]
+        assert (to, actual_subject) == ('c@example.com', subject)
+        assert 'style="' in html and '{{' not in html
+        assert '© 2026 360. All rights reserved.' in text
+
+    def test_admin_notifications(self, service, sent):
+        service.send_contact_notification('admin@example.com', 'A', 'a@example.com', '1', 'Quote', 'Hi', '360')
+        service.send_payment_notification('admin@example.com', 'A', 'a@example.com', 'tx', 5, 'ZAR', 'EFT', '360')
+        assert [call[1] for call in sent] == ['New Contact Form: Quote', 'Payment Received - ZAR 5.00']
+        assert 'Name: A' in sent[0][3]
+        assert 'Amount: ZAR 5.00' in sent[1][3]
@@ -0,0 +1,158 @@
+"""
+Email Validation Test Suite - test_email_validator.py
+MX lookups go to a stub DNS server on 127.0.0.1
+
+Usage:
+    pytest test_email_validator.py -v
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+import dns.asyncresolver
+import pytest
+
+import email_validator
+from email_validator import (
+    make_resolver, verify_email_exists, verify_email_exists_async, mx_cache
+)
+
+
+class StubDNSServer:
+    """
+    Minimal UDP DNS server. `zones` maps a domain to its MX TTL, None for
+    NXDOMAIN, 'nomx' for a domain without MX records, or 'slow' to never
+    answer.
+    """
+
+    def __init__(self, zones):
+        self.zones = zones
+        self.queries = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            try:
+                wire, addr = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            query = dns.message.from_wire(wire)
+            name = query.question[0].name.to_text().rstrip('.')
+            self.queries.append(name)
+            zone = self.zones.get(name)
+            if zone == 'slow':
+                continue
+            response = dns.message.make_response(query)
+            if name not in self.zones:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            elif zone != 'nomx':
+                response.answer.append(dns.rrset.from_text(
+                    f'{name}.', zone, 'IN', 'MX', f'10 mail.{name}.'
+                ))
+            self.sock.sendto(response.to_wire(), addr)
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def dns_server(monkeypatch):
+    server = StubDNSServer({
+        'example.co.za': 3600,
+        'shortttl.com': 5,
+        'nomail.com': 'nomx',
+        'slow.com': 'slow',
+    })
+    monkeypatch.setattr(email_validator, 'mx_resolver', make_resolver(['127.0.0.1'], server.port, timeout=0.5))
+    monkeypatch.setattr(email_validator, 'mx_async_resolver', make_resolver(
+        ['127.0.0.1'], server.port, timeout=0.5, resolver_class=dns.asyncresolver.Resolver
+    ))
+    mx_cache.clear()
+    yield server
+    server.stop()
+    mx_cache.clear()
+
+
+class TestDomainCache:
+    """One lookup per domain, for as long as its TTL"""
+
+    def test_addresses_share_the_domain_lookup(self, dns_server):
+        assert verify_email_exists('a@example.co.za') == (True, None)
+        assert verify_email_exists('b@Example.co.za ') == (True, None)
+        assert dns_server.queries == ['example.co.za']
+
+    def test_ttl_is_respected_with_a_floor(self, dns_server, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(email_validator.time, 'monotonic', lambda: now[0])
+        verify_email_exists('a@shortttl.com')
+
+        now[0] += email_validator.MX_CACHE_MIN_TTL - 1  # TTL 5 raised to the floor
+        verify_email_exists('b@shortttl.com')
+        assert len(dns_server.queries) == 1
+
+        now[0] += 2
+        verify_email_exists('c@shortttl.com')
+        assert len(dns_server.queries) == 2
+
+    def test_nxdomain_and_no_mx_cached_negatively(self, dns_server):
+        for _ in range(2):
+            assert verify_email_exists('a@nowhere.invalid') == (False, "Email domain 'nowhere.invalid' does not exist")
+            assert verify_email_exists('a@nomail.com') == (False, "Email domain 'nomail.com' has no mail server")
+        assert sorted(dns_server.queries) == ['nomail.com', 'nowhere.invalid']
+        assert mx_cache.stats()['negative'] == 2
+
+    def test_known_providers_skip_dns(self, dns_server):
+        assert verify_email_exists('someone@gmail.com') == (True, None)
+        assert dns_server.queries == []
+        assert mx_cache.stats()['allowlisted'] == 1
+
+    def test_format_and_disposable_checks_come_first(self, dns_server):
+        assert verify_email_exists('not-an-email') == (False, "Invalid email format")
+        assert verify_email_exists('x@mailinator.com') == (False, "Disposable email addresses are not allowed")
+        assert verify_email_exists(None) == (False, "Email is required")
+        assert dns_server.queries == []
+
+
+class TestTimeoutBudget:
+
+    def test_slow_server_times_out_within_budget_and_is_not_cached(self, dns_server):
+        started = time.monotonic()
+        assert verify_email_exists('a@slow.com') == (False, "Email verification timeout - please try again")
+        assert time.monotonic() - started < 1.0
+        assert mx_cache.stats()['timeouts'] == 1
+        assert mx_cache.stats()['entries'] == 0
+
+    def test_resolver_errors_fail_open(self, dns_server, monkeypatch):
+        monkeypatch.setattr(email_validator, 'mx_resolver', make_resolver([], timeout=0.5))
+        assert verify_email_exists('a@unreachable.com') == (True, None)
+        assert mx_cache.stats()['errors'] == 1
+
+
+class TestAsync:
+
+    def test_async_lookups_share_the_cache(self, dns_server):
+        async def check():
+            return await asyncio.gather(
+                verify_email_exists_async('a@example.co.za'),
+                verify_email_exists_async('a@nowhere.invalid'),
+            )
+
+        assert asyncio.run(check()) == [
+            (True, None), (False, "Email domain 'nowhere.invalid' does not exist")
+        ]
+        assert verify_email_exists('b@example.co.za') == (True, None)
+        assert sorted(dns_server.queries) == ['example.co.za', 'nowhere.invalid']
@@ -0,0 +1,157 @@
+"""
+Image Pipeline Test Suite - test_image_pipeline.py
+
+Usage:
+    pytest test_image_pipeline.py -v
+"""
+
+import io
+import os
+import json
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+import image_pipeline
+from image_pipeline import render_variants, create_image_variants, picture, image_set
+from models import db, ImageVariantSet
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Minimal app with an in-memory database and a scratch static folder"""
+    monkeypatch.setattr(image_pipeline, 'STATIC_ROOT', str(tmp_path / 'static'))
+    monkeypatch.setattr(image_pipeline, '_variant_lookup', {})
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def photo(size=(2000, 1000), mode='RGB', orientation=None):
+    """JPEG/PNG with EXIF metadata, optionally rotated via the orientation tag"""
+    image = Image.new(mode, size, (200, 120, 40, 128) if mode == 'RGBA' else (200, 120, 40))
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'  # Make
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, format='PNG' if mode == 'RGBA' else 'JPEG', exif=exif.tobytes())
+    return out.getvalue()
+
+
+class TestRender:
+    """Widths, formats and metadata stripping"""
+
+    def test_widths_formats_and_no_upscale(self):
+        width, height, rendered = render_variants(photo(), widths=(320, 640, 4000))
+
+        assert (width, height) == (2000, 1000)
+        widths = sorted({variant_width for _, _, variant_width, _ in rendered})
+        assert widths == [320, 640, 2000]
+        mimes = {mime for mime, _, _, _ in rendered}
+        assert {'image/webp', 'image/jpeg'} <= mimes
+        assert ('image/avif' in mimes) == image_pipeline.AVIF_AVAILABLE
+
+    def test_metadata_stripped_and_orientation_applied(self):
+        _, _, rendered = render_variants(photo(orientation=6), widths=(320,))
+        for mime, _, _, data in rendered:
+            variant = Image.open(io.BytesIO(data))
+            assert variant.size == (320, 640), mime  # rotated to portrait
+            assert not variant.getexif(), mime
+
+    def test_alpha_flattened_for_jpeg_only(self):
+        _, _, rendered = render_variants(photo(size=(400, 200), mode='RGBA'), widths=(400,))
+        modes = {mime: Image.open(io.BytesIO(data)).mode for mime, _, _, data in rendered}
+        assert modes['image/jpeg'] == 'RGB'
+        assert modes['image/webp'] == 'RGBA'
+
+
+class TestStorageAndTemplates:
+    """Variant files, the variant set row and srcset markup"""
+
+    def test_local_image_variants_and_picture(self, app):
+        variants = create_image_variants('/static/uploads/plant.jpg', photo())
+        db.session.commit()
+
+        assert variants['image/webp']['640'] == '/static/uploads/variants/plant-640w.webp'
+        row = ImageVariantSet.query.filter_by(source_url='/static/uploads/plant.jpg').one()
+        assert json.loads(row.variants) == variants
+        assert os.path.exists(os.path.join(image_pipeline.STATIC_ROOT, 'uploads', 'variants', 'plant-1600w.jpg'))
+
+        image_pipeline._variant_lookup.clear()
+        html = str(picture('/static/uploads/plant.jpg', 'Plant & Co', sizes='50vw', loading='lazy'))
+        assert '<source type="image/webp" srcset="/static/uploads/variants/plant-320w.webp 320w, ' in html
+        assert 'srcset="/static/uploads/variants/plant-320w.jpg 320w' in html
+        assert 'alt="Plant &amp; Co" loading="lazy"' in html
+        assert "image-set(" in str(image_set('/static/uploads/plant.jpg', max_width=1024))
+        assert "plant-1024w.webp') type('image/webp')" in str(image_set('/static/uploads/plant.jpg', max_width=1024))
+
+    def test_without_variants_falls_back_to_img(self, app):
+        assert str(picture('/static/uploads/none.jpg', 'x')) == '<img src="/static/uploads/none.jpg" alt="x">'
+        assert str(image_set('/static/uploads/none.jpg')) == "url('/static/uploads/none.jpg')"
+
+    def test_broken_upload_does_not_raise(self, app):
+        assert create_image_variants('/static/uploads/bad.jpg', b'not an image') is None
+
+    def test_queued_variants_read_the_stored_file(self, app):
+        uploads = os.path.join(image_pipeline.STATIC_ROOT, 'uploads')
+        os.makedirs(uploads)
+        with open(os.path.join(uploads, 'hero.jpg'), 'wb') as f:
+            f.write(photo(size=(800, 600)))
+
+        image_pipeline.queue_image_variants('/static/uploads/hero.jpg')
+        image_pipeline.queue_image_variants('/static/uploads/missing.jpg')
+        assert image_pipeline.wait_for_queued_variants(timeout=30)
+        db.session.expire_all()
+        assert ImageVariantSet.query.filter_by(source_url='/static/uploads/hero.jpg').count() == 1
+        assert ImageVariantSet.query.count() == 1
+        assert os.path.exists(os.path.join(uploads, 'variants', 'hero-640w.webp'))
+
+    def test_backfill_static_in_parallel(self, app):
+        uploads = os.path.join(image_pipeline.STATIC_ROOT, 'uploads')
+        os.makedirs(uploads)
+        for name in ('a.jpg', 'b.jpg'):
+            with open(os.path.join(uploads, name), 'wb') as f:
+                f.write(photo(size=(800, 600)))
+
+        report = image_pipeline.backfill(workers=2, include_db=False)
+        assert report == {'created': 2, 'skipped': 0, 'failed': 0}
+        assert os.path.exists(os.path.join(uploads, 'variants', 'b-640w.webp'))
+
+        assert image_pipeline.backfill(workers=2, include_db=False)['skipped'] == 2
+
+
+class TestBucketVariants:
+    """Uploaded images get variants in the bucket"""
+
+    def test_variants_uploaded_next_to_source(self, app, monkeypatch):
+        moto = pytest.importorskip('moto')
+        import s3_storage
+        for name, value in {'S3_ENDPOINT_URL': 'https://s3.amazonaws.com', 'S3_BUCKET_NAME': 'test-bucket',
+                            'S3_ACCESS_KEY_ID': 'testing', 'S3_SECRET_ACCESS_KEY': 'testing',
+                            'S3_REGION': 'us-east-1'}.items():
+            monkeypatch.setenv(name, value)
+        with moto.mock_aws():
+            service = s3_storage.S3StorageService()
+            service.s3_client.create_bucket(Bucket='test-bucket')
+            monkeypatch.setattr(s3_storage, 'storage_service', service)
+
+            class Upload(io.BytesIO):
+                filename = 'pump.jpg'
+                content_type = 'image/jpeg'
+
+            url, error = s3_storage.upload_product_image(Upload(photo()))
+            assert error is None
+            assert image_pipeline.wait_for_queued_variants(timeout=30)
+            variants = json.loads(ImageVariantSet.query.filter_by(source_url=url).one().variants)
+            key = service.key_from_url(variants['image/webp']['640'])
+            assert key.startswith('products/variants/') and key.endswith('-640w.webp')
+            head = service.s3_client.head_object(Bucket='test-bucket', Key=key)
+            assert head['ContentType'] == 'image/webp'
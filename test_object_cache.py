@@ -0,0 +1,157 @@
+"""
+Object Cache Test Suite - test_object_cache.py
+
+Usage:
+    pytest test_object_cache.py -v
+"""
+
+import io
+import hashlib
+import threading
+
+import pytest
+
+from object_cache import ObjectCache
+
+
+class FakeBucket:
+    """get_object stand-in that counts downloads"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.fetches = []
+
+    def __call__(self, s3_key):
+        self.fetches.append(s3_key)
+        if s3_key not in self.objects:
+            raise KeyError(s3_key)
+        data = self.objects[s3_key]
+        return {
+            'Body': io.BytesIO(data),
+            'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+            'ContentType': 'application/pdf',
+            'ContentLength': len(data)
+        }
+
+
+@pytest.fixture
+def bucket():
+    return FakeBucket({
+        'proofs/a.pdf': b'a' * 400,
+        'proofs/b.pdf': b'b' * 400,
+        'proofs/c.pdf': b'c' * 400,
+        'proofs/big.pdf': b'x' * 5000,
+    })
+
+
+@pytest.fixture
+def cache(tmp_path, bucket):
+    return ObjectCache(str(tmp_path), max_bytes=1000, max_object_bytes=2000, fetch=bucket)
+
+
+class TestObjectCache:
+    """Read-through, LRU eviction and metrics"""
+
+    def test_read_through_then_hit(self, cache, bucket):
+        first = cache.get('proofs/a.pdf')
+        second = cache.get('proofs/a.pdf')
+
+        assert bucket.fetches == ['proofs/a.pdf']
+        assert second.path == first.path
+        assert open(second.path, 'rb').read() == b'a' * 400
+        assert second.etag == hashlib.md5(b'a' * 400).hexdigest()
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+    def test_lru_eviction_within_size_limit(self, cache, bucket):
+        cache.get('proofs/a.pdf')
+        cache.get('proofs/b.pdf')
+        cache.get('proofs/a.pdf')  # b is now least recently used
+        cache.get('proofs/c.pdf')
+
+        stats = cache.stats()
+        assert stats['evictions'] == 1
+        assert stats['entries'] == 2
+        cache.get('proofs/a.pdf')
+        cache.get('proofs/b.pdf')
+        assert bucket.fetches.count('proofs/a.pdf') == 1
+        assert bucket.fetches.count('proofs/b.pdf') == 2
+
+    def test_large_objects_bypass_cache(self, cache, bucket):
+        entry = cache.get('proofs/big.pdf')
+        assert entry.path is None and entry.data == b'x' * 5000
+        cache.get('proofs/big.pdf')
+        assert bucket.fetches.count('proofs/big.pdf') == 2
+        assert cache.stats()['bypassed'] == 2
+
+    def test_missing_object(self, cache):
+        assert cache.get('proofs/none.pdf') is None
+        assert cache.stats()['errors'] == 1
+
+    def test_index_survives_restart(self, cache, bucket, tmp_path):
+        cache.get('proofs/a.pdf')
+        restarted = ObjectCache(str(tmp_path), max_bytes=1000, max_object_bytes=2000, fetch=bucket)
+        entry = restarted.get('proofs/a.pdf')
+
+        assert bucket.fetches == ['proofs/a.pdf']
+        assert entry.etag == hashlib.md5(b'a' * 400).hexdigest()
+
+    def test_file_removed_by_other_worker_is_a_miss(self, cache, bucket):
+        import os
+        os.remove(cache.get('proofs/a.pdf').path)
+        assert open(cache.get('proofs/a.pdf').path, 'rb').read() == b'a' * 400
+        assert bucket.fetches == ['proofs/a.pdf', 'proofs/a.pdf']
+
+    def test_concurrent_misses_share_one_download(self, cache, bucket):
+        threads = [threading.Thread(target=cache.get, args=('proofs/a.pdf',)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert bucket.fetches == ['proofs/a.pdf']
+
+
+class TestServing:
+    """ETag and Range handling for cached documents"""
+
+    @pytest.fixture
+    def client(self, cache, monkeypatch):
+        from flask import Flask
+        import app as app_module
+        monkeypatch.setattr(app_module, 'object_cache', cache)
+        monkeypatch.setattr(app_module.storage_service, 'key_from_url', lambda url: url)
+
+        server = Flask(__name__)
+        server.add_url_rule('/doc/<path:key>', 'doc', lambda key: app_module.serve_stored_file(key, 'pop.pdf'))
+        return server.test_client()
+
+    def test_etag_and_conditional_get(self, client):
+        response = client.get('/doc/proofs/a.pdf')
+        assert response.status_code == 200
+        assert response.data == b'a' * 400
+        etag = response.headers['ETag']
+        assert 'private' in response.headers['Cache-Control']
+
+        assert client.get('/doc/proofs/a.pdf', headers={'If-None-Match': etag}).status_code == 304
+
+    def test_range_request(self, client):
+        response = client.get('/doc/proofs/b.pdf', headers={'Range': 'bytes=10-19'})
+        assert response.status_code == 206
+        assert response.data == b'b' * 10
+        assert response.headers['Content-Range'] == 'bytes 10-19/400'
+
+    def test_evicted_between_lookup_and_send(self, client, cache, bucket, monkeypatch):
+        import os
+        lookup = cache.get
+
+        def get_then_evict(s3_key):
+            entry = lookup(s3_key)
+            if len(bucket.fetches) == 1:
+                os.remove(entry.path)  # another worker evicts it before send_file opens it
+            return entry
+
+        monkeypatch.setattr(cache, 'get', get_then_evict)
+        response = client.get('/doc/proofs/c.pdf')
+        assert response.status_code == 200
+        assert response.data == b'c' * 400
+        assert bucket.fetches == ['proofs/c.pdf', 'proofs/c.pdf']
@@ -0,0 +1,358 @@
+"""
+OCR Job Queue Test Suite - test_ocr_jobs.py
+
+Usage:
+    pytest test_ocr_jobs.py -v
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from models import (
+    db, Customer, Invoice, InvoicePayment, ProofOfPayment, OCRJob
+)
+import ocr_jobs
+from ocr_jobs import (
+    enqueue_ocr_job, claim_jobs, apply_ocr_result, get_pop_status,
+    requeue_stale_jobs, submit_proof_of_payment
+)
+from security_utils import file_sha256, read_upload
+
+
+@pytest.fixture
+def app():
+    """Minimal app with an in-memory database"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['OCR_CONFIDENCE_THRESHOLD'] = 0.75
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def pop(app):
+    """Invoice with a pending EFT payment and an uploaded POP"""
+    customer = Customer(email='buyer@example.com', password_hash='x')
+    db.session.add(customer)
+    db.session.flush()
+
+    invoice = Invoice(
+        invoice_number='INV-1001', customer_id=customer.id,
+        due_date=datetime.utcnow() + timedelta(days=30),
+        total_amount=1500.00, paid_amount=0, status='sent'
+    )
+    db.session.add(invoice)
+    db.session.flush()
+
+    payment = InvoicePayment(invoice_id=invoice.id, amount=1500.00, payment_method='eft')
+    db.session.add(payment)
+    db.session.flush()
+
+    pop = ProofOfPayment(
+        invoice_payment_id=payment.id, invoice_id=invoice.id,
+        customer_id=customer.id, file_path='https://s3/bucket/proofs/a.pdf',
+        file_name='pop.pdf', file_type='pdf', file_size=1024,
+        content_hash='a' * 64
+    )
+    db.session.add(pop)
+    db.session.commit()
+    return pop
+
+
+def _resubmit(pop, invoice_id=None):
+    """Upload the same document again, optionally against another invoice"""
+    again = ProofOfPayment(
+        invoice_payment_id=pop.invoice_payment_id,
+        invoice_id=invoice_id or pop.invoice_id, customer_id=pop.customer_id,
+        file_path='https://s3/bucket/proofs/b.pdf', file_name='pop.pdf',
+        file_type='pdf', file_size=1024, content_hash=pop.content_hash
+    )
+    db.session.add(again)
+    db.session.flush()
+    return again
+
+
+class TestEnqueue:
+    """Upload path only writes a queued job"""
+
+    def test_enqueue_marks_pop_queued(self, pop):
+        enqueue_ocr_job(pop)
+        db.session.commit()
+
+        assert pop.verification_status == 'queued'
+        job = OCRJob.query.one()
+        assert job.status == 'queued'
+        assert get_pop_status(pop)['job_status'] == 'queued'
+
+    def test_claim_marks_processing(self, pop):
+        enqueue_ocr_job(pop)
+        db.session.commit()
+
+        jobs = claim_jobs(5)
+        assert len(jobs) == 1
+        assert jobs[0].status == 'processing'
+        assert jobs[0].attempts == 1
+        assert claim_jobs(5) == []
+
+    def test_stale_jobs_requeued(self, pop):
+        job = enqueue_ocr_job(pop)
+        db.session.commit()
+        claim_jobs(1)
+        job.started_at = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+
+        assert requeue_stale_jobs() == 1
+        assert db.session.get(OCRJob, job.id).status == 'queued'
+        assert job.attempts == 1
+        assert job.run_after > datetime.utcnow()
+
+    def test_job_that_keeps_going_stale_goes_to_manual_review(self, pop):
+        job = enqueue_ocr_job(pop)
+        db.session.commit()
+        for _ in range(ocr_jobs.OCR_JOB_MAX_ATTEMPTS):
+            job.run_after = datetime.utcnow()
+            db.session.commit()
+            assert claim_jobs(1) == [job]
+            job.started_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+            assert requeue_stale_jobs() == 1
+
+        assert (job.status, job.attempts) == ('failed', ocr_jobs.OCR_JOB_MAX_ATTEMPTS)
+        assert pop.verification_status == 'manual_review'
+
+
+class TestApplyResult:
+    """Worker-side verification logic"""
+
+    def test_matching_amount_auto_verifies(self, pop):
+        status = apply_ocr_result(pop, {
+            'success': True, 'amount': 1500.00, 'reference': 'INV-1001',
+            'confidence': 0.85, 'raw_text': 'Amount R1,500.00'
+        })
+        assert status == 'verified'
+        assert pop.invoice.status == 'paid'
+        assert float(pop.invoice.paid_amount) == 1500.00
+
+    def test_low_confidence_needs_review(self, pop):
+        status = apply_ocr_result(pop, {
+            'success': True, 'amount': 1500.00, 'confidence': 0.5
+        })
+        assert status == 'manual_review'
+        assert pop.invoice.status == 'pending_verification'
+
+    def test_ocr_error_needs_review(self, pop):
+        status = apply_ocr_result(pop, {'success': False, 'error': 'blank page'})
+        assert status == 'manual_review'
+        assert 'blank page' in pop.verification_notes
+
+
+class TestRetries:
+    """Failed jobs back off, then give up"""
+
+    def test_retry_then_fail(self, pop, monkeypatch):
+        monkeypatch.setattr(ocr_jobs, 'OCR_JOB_MAX_ATTEMPTS', 2)
+        job = enqueue_ocr_job(pop)
+        db.session.commit()
+
+        claim_jobs(1)
+        ocr_jobs._fail_job(job, IOError('download failed'))
+        db.session.commit()
+        assert job.status == 'queued'
+        assert job.run_after > datetime.utcnow()
+
+        job.run_after = datetime.utcnow()
+        db.session.commit()
+        claim_jobs(1)
+        ocr_jobs._fail_job(job, IOError('download failed'))
+        db.session.commit()
+        assert job.status == 'failed'
+        assert pop.verification_status == 'manual_review'
+
+
+class TestPoolCrash:
+    """A dead OCR process replaces the pool instead of failing every later job"""
+
+    RESULT = {'success': True, 'amount': 1500.00, 'confidence': 0.9, 'raw_text': 'R1500'}
+
+    def _run(self, monkeypatch, crashing_pools):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+        import s3_storage
+        pools = []
+
+        class Pool:
+            def __init__(self, max_workers):
+                self.broken = len(pools) < crashing_pools
+                pools.append(self)
+
+            def submit(self, fn, *args):
+                future = Future()
+                if self.broken:
+                    future.set_exception(BrokenProcessPool('child died'))
+                else:
+                    future.set_result(TestPoolCrash.RESULT)
+                return future
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                pass
+
+        monkeypatch.setattr(ocr_jobs, 'ProcessPoolExecutor', Pool)
+        monkeypatch.setattr(s3_storage, 'storage_service', TestDirectUploadHashing._Storage(b'%PDF'))
+        ocr_jobs.run_worker(concurrency=2, once=True)
+        return pools
+
+    def test_jobs_requeued_without_spending_an_attempt(self, pop, monkeypatch):
+        job = enqueue_ocr_job(pop)
+        db.session.commit()
+        pools = self._run(monkeypatch, crashing_pools=1)
+        assert len(pools) == 2
+        assert (job.status, job.attempts) == ('done', 1)
+        assert pop.verification_status == 'verified'
+
+    def test_job_that_keeps_crashing_spends_attempts(self, pop, monkeypatch):
+        job = enqueue_ocr_job(pop)
+        db.session.commit()
+        self._run(monkeypatch, crashing_pools=100)
+        assert (job.status, job.attempts) == ('queued', 1)
+        assert job.run_after > datetime.utcnow()
+        assert job.last_error == 'OCR process crashed'
+
+
+class TestContentHashCache:
+    """Identical uploads reuse OCR output and are flagged as duplicates"""
+
+    def test_file_sha256_streams_and_rewinds(self):
+        import hashlib
+        import io
+        data = b'%PDF-1.4 ' + b'x' * 200000
+        stream = io.BytesIO(data)
+        assert file_sha256(stream, chunk_size=4096) == hashlib.sha256(data).hexdigest()
+        assert stream.tell() == 0
+
+    def test_read_upload_once_within_cap(self):
+        import io
+        from werkzeug.datastructures import FileStorage
+        body = b'%PDF-1.4 ' + b'x' * 1000
+        upload = FileStorage(stream=io.BytesIO(body), filename='pop.pdf')
+
+        data, error = read_upload(upload, max_size=2048)
+        assert data == body and error == ''
+        assert file_sha256(memoryview(data)) == file_sha256(io.BytesIO(body))
+
+        data, error = read_upload(upload, max_size=512)
+        assert data is None and error
+
+    def test_only_pop_uploads_are_buffered_in_memory(self):
+        import io
+        from flask import Flask, request
+        from app import InMemoryUploadRequest
+        server = Flask(__name__)
+        server.request_class = InMemoryUploadRequest
+        streams = {}
+
+        def upload():
+            streams[request.endpoint] = request.files['file'].stream
+            return ''
+        server.add_url_rule('/pay', 'customer_pay_invoice', upload, methods=['POST'])
+        server.add_url_rule('/logo', 'upload_logo', upload, methods=['POST'])
+
+        client = server.test_client()
+        for path in ('/pay', '/logo'):
+            # above werkzeug's 500KB in-memory default
+            client.post(path, data={'file': (io.BytesIO(b'x' * 600 * 1024), 'doc.pdf')})
+        assert isinstance(streams['customer_pay_invoice'], io.BytesIO)
+        assert not isinstance(streams['upload_logo'], io.BytesIO)
+
+    def test_first_upload_is_queued(self, pop):
+        assert submit_proof_of_payment(pop) == 'queued'
+        assert pop.duplicate_of is None
+        assert OCRJob.query.count() == 1
+
+    def test_duplicate_reuses_result_without_ocr(self, pop):
+        apply_ocr_result(pop, {
+            'success': True, 'amount': 1500.00, 'reference': 'INV-1001',
+            'confidence': 0.9, 'raw_text': 'Amount R1,500.00'
+        })
+        db.session.commit()
+
+        again = _resubmit(pop)
+        status = submit_proof_of_payment(again)
+        db.session.commit()
+
+        assert OCRJob.query.count() == 0
+        assert again.duplicate_of_id == pop.id
+        assert float(again.extracted_amount) == 1500.00
+        # Never settles the invoice twice
+        assert status == 'manual_review'
+        assert 'Duplicate submission' in again.verification_notes
+        assert float(pop.invoice.paid_amount) == 1500.00
+
+    def test_duplicate_of_unprocessed_pop_is_queued(self, pop):
+        enqueue_ocr_job(pop)
+        db.session.commit()
+
+        again = _resubmit(pop)
+        assert submit_proof_of_payment(again) == 'queued'
+        assert again.duplicate_of is pop
+
+
+class TestDirectUploadHashing:
+    """Direct-to-bucket uploads are hashed by the worker"""
+
+    class _Storage:
+        def __init__(self, document):
+            self.document = document
+
+        def get_file_bytes(self, file_path):
+            return self.document
+
+    class _Pool:
+        def __init__(self):
+            self.submitted = []
+
+        def submit(self, fn, *args):
+            self.submitted.append(args)
+            return None
+
+    def test_unhashed_upload_is_hashed_and_ocrd(self, pop, monkeypatch):
+        import hashlib
+        import s3_storage
+        monkeypatch.setattr(s3_storage, 'storage_service', self._Storage(b'%PDF-new'))
+        fresh = _resubmit(pop)
+        fresh.content_hash = None
+        job = enqueue_ocr_job(fresh)
+        db.session.commit()
+
+        pool = self._Pool()
+        ocr_jobs._submit(pool, job)
+        assert fresh.content_hash == hashlib.sha256(b'%PDF-new').hexdigest()
+        assert fresh.duplicate_of is None
+        assert pool.submitted == [(b'%PDF-new', 'pdf')]
+
+    def test_unhashed_duplicate_reuses_result(self, pop, monkeypatch):
+        import hashlib
+        import s3_storage
+        document = b'%PDF-same'
+        pop.content_hash = hashlib.sha256(document).hexdigest()
+        apply_ocr_result(pop, {'success': True, 'amount': 1500.00, 'confidence': 0.9, 'raw_text': 'R1500'})
+        db.session.commit()
+        monkeypatch.setattr(s3_storage, 'storage_service', self._Storage(document))
+
+        again = _resubmit(pop)
+        again.content_hash = None
+        job = enqueue_ocr_job(again)
+        db.session.commit()
+
+        pool = self._Pool()
+        future = ocr_jobs._submit(pool, job)
+        assert pool.submitted == []
+        assert again.duplicate_of is pop
+        assert future.result()['amount'] == 1500.00
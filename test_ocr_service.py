@@ -0,0 +1,243 @@
+"""
+OCR Service Test Suite - test_ocr_service.py
+
+Usage:
+    pytest test_ocr_service.py -v
+"""
+
+import io
+import random
+
+import pytest
+
+import ocr_service
+from ocr_service import OCRService
+from benchmark_ocr import build_pdf, _text_page_pdf, _scanned_page_pdf, filler_lines
+
+RECEIPT_LINES = [
+    "FNB Payment Confirmation",
+    "Date: 14/03/2026",
+    "Reference: INV-1042",
+    "Amount: R12,450.00",
+    "From: Thabo Mokoena",
+]
+
+
+def _merge_pdf(pages):
+    import PyPDF2
+    writer = PyPDF2.PdfWriter()
+    for page_pdf in pages:
+        writer.add_page(PyPDF2.PdfReader(io.BytesIO(page_pdf)).pages[0])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def fake_page_ocr(monkeypatch):
+    """Record which pages get rasterised instead of running Tesseract"""
+    calls = []
+
+    def _ocr(pdf_bytes, page_number, dpi=ocr_service.PDF_OCR_DPI):
+        calls.append(page_number)
+        return "\n".join(RECEIPT_LINES)
+
+    monkeypatch.setattr(ocr_service, '_ocr_pdf_page', _ocr)
+    monkeypatch.setattr(ocr_service, 'PDF_OCR_WORKERS', 1)
+    monkeypatch.setattr(ocr_service, 'TESSERACT_AVAILABLE', True)
+    return calls
+
+
+class TestPdfExtraction:
+    """Text-layer-first, per-page PDF handling"""
+
+    def test_text_layer_skips_ocr(self, fake_page_ocr):
+        document = _merge_pdf([_text_page_pdf(RECEIPT_LINES)])
+        service = OCRService()
+        text = service._extract_from_pdf(document)
+
+        assert 'INV-1042' in text
+        assert fake_page_ocr == []
+        assert service.last_pdf_stats['text_pages'] == 1
+
+    def test_early_stop_after_key_fields(self, fake_page_ocr):
+        rng = random.Random(1)
+        document = _merge_pdf([_text_page_pdf(RECEIPT_LINES)] +
+                              [_scanned_page_pdf(filler_lines(rng)) for _ in range(3)])
+        service = OCRService()
+        service._extract_from_pdf(memoryview(document))
+
+        assert fake_page_ocr == []
+        assert service.last_pdf_stats['early_stop'] is True
+
+    def test_only_textless_pages_are_ocrd(self, fake_page_ocr):
+        rng = random.Random(2)
+        document = _merge_pdf([
+            _text_page_pdf(filler_lines(rng)),
+            _scanned_page_pdf(RECEIPT_LINES),
+            _scanned_page_pdf(filler_lines(rng)),
+        ])
+        service = OCRService()
+        result = service.process_document(document, 'pdf')
+
+        # Page 2 yields all key fields, so page 3 is never rasterised
+        assert fake_page_ocr == [2]
+        assert result['success'] is True
+        assert result['amount'] == 12450.00
+        assert result['reference'] == 'INV-1042'
+
+    def test_pool_workers_do_not_start_a_page_pool(self, fake_page_ocr, monkeypatch):
+        def no_pool(*args, **kwargs):
+            raise AssertionError('nested process pool')
+        monkeypatch.setattr(ocr_service, 'PDF_OCR_WORKERS', 2)
+        monkeypatch.setattr(ocr_service, 'ProcessPoolExecutor', no_pool)
+        monkeypatch.setattr(ocr_service.multiprocessing, 'parent_process', lambda: object())
+        rng = random.Random(4)
+        document = _merge_pdf([_scanned_page_pdf(filler_lines(rng)) for _ in range(2)])
+
+        OCRService()._extract_from_pdf(document)
+        assert fake_page_ocr == [1]
+
+    def test_synthetic_corpus_fields_found(self, tmp_path):
+        rng = random.Random(3)
+        service = OCRService()
+        for index in range(5):
+            path = tmp_path / f'doc_{index}.pdf'
+            path.write_bytes(build_pdf(rng, index, pages=3, scanned_ratio=0.0))
+            result = service.process_document(str(path), 'pdf')
+            assert result['reference'] == f'INV-{1000 + index}'
+
+    def test_path_and_buffer_inputs_agree(self, tmp_path):
+        document = _merge_pdf([_text_page_pdf(RECEIPT_LINES)])
+        path = tmp_path / 'pop.pdf'
+        path.write_bytes(document)
+        service = OCRService()
+
+        from_path = service.process_document(str(path), 'pdf')
+        from_view = service.process_document(memoryview(document), 'pdf')
+        assert from_path['raw_text'] == from_view['raw_text']
+        assert from_view['amount'] == 12450.00
+
+
+class TestImagePreprocessing:
+    """Phone-photo cleanup before Tesseract"""
+
+    @pytest.fixture
+    def photo(self):
+        from benchmark_ocr import build_receipt_photo
+        from PIL import Image
+        data, _ = build_receipt_photo(random.Random(5), 0)  # index 0 is EXIF-rotated
+        return Image.open(io.BytesIO(data))
+
+    def test_exif_orientation_and_downscale(self, photo):
+        service = OCRService()
+        assert photo.size == (3024, 4032)  # stored sideways
+        prepared = service._preprocess_image(photo, crop_document=False)
+
+        assert prepared.width > prepared.height
+        assert max(prepared.size) <= int(ocr_service.IMAGE_TARGET_DPI * ocr_service.DOCUMENT_LONG_EDGE_INCHES) + 200
+
+    def test_crop_and_threshold(self, photo):
+        service = OCRService()
+        full = service._preprocess_image(photo, crop_document=False)
+        prepared = service._preprocess_image(photo)
+
+        assert prepared.width * prepared.height < 0.8 * full.width * full.height
+        assert set(prepared.tobytes()) <= {0, 255}
+
+    def test_scanned_pdf_pages_use_the_same_pipeline(self, photo, monkeypatch):
+        png = io.BytesIO()
+        photo.convert('L').save(png, format='PNG')
+        seen = {}
+
+        def image_to_string(image, config=''):
+            seen.update(values=set(image.tobytes()), config=config)
+            return 'text'
+        monkeypatch.setattr(ocr_service, '_poppler', lambda command, pdf_bytes: png.getvalue())
+        monkeypatch.setattr(ocr_service.pytesseract, 'image_to_string', image_to_string)
+
+        assert ocr_service._ocr_pdf_page(b'%PDF', 1) == 'text'
+        assert seen['config'] == ocr_service.TESSERACT_CONFIG
+        assert seen['values'] <= {0, 255}  # thresholded
+
+    def test_deskew_levels_text(self):
+        from PIL import Image, ImageDraw
+        service = OCRService()
+        page = Image.new('L', (1200, 1600), 255)
+        draw = ImageDraw.Draw(page)
+        for row in range(25):
+            draw.rectangle((100, 100 + row * 55, 1100, 115 + row * 55), fill=0)
+        skewed = page.rotate(3, expand=True, fillcolor=255)
+
+        straightened = service._deskew(skewed)
+        assert straightened.size != skewed.size
+        assert service._projection_score(straightened.resize((400, 533)), 0) > \
+            service._projection_score(skewed.resize((400, 533)), 0)
+
+    def test_buffer_reader_does_not_copy(self):
+        from PIL import Image
+        out = io.BytesIO()
+        Image.new('L', (40, 30), 255).save(out, format='PNG')
+        view = memoryview(bytearray(out.getvalue()))
+
+        image = Image.open(ocr_service._open_buffer(view))
+        assert image.size == (40, 30)
+        stream = ocr_service._open_buffer(view[:8])
+        assert stream.read() == b'\x89PNG\r\n\x1a\n'
+
+    def test_tesseract_config(self):
+        assert '--psm 4' in ocr_service.TESSERACT_CONFIG
+        assert '--oem 1' in ocr_service.TESSERACT_CONFIG
+        assert 'R' in ocr_service.TESSERACT_WHITELIST and ',' in ocr_service.TESSERACT_WHITELIST
+
+
+class TestTemplateExtraction:
+    """Bank detection, per-bank templates and the accuracy suite"""
+
+    def test_detects_bank_in_one_pass(self):
+        from ocr_templates import extraction_engine
+        assert extraction_engine.detect_bank("First National Bank\nPaid to ABSA account") == 'fnb'
+        assert extraction_engine.detect_bank("standard  bank\nproof of payment") == 'standard_bank'
+        assert extraction_engine.detect_bank("Payment Confirmation") is None
+
+    def test_recipient_reference_beats_own_reference(self):
+        service = OCRService()
+        data = service._parse_payment_info(
+            "FNB\nDate Actioned : 2026/03/14\nAmount : R1,500.00\n"
+            "Own Reference : Rent\nRecipient Reference : INV-1001\n"
+        )
+        assert data['template'] == 'fnb'
+        assert data['reference'] == 'INV-1001'
+        # YYYY/MM/DD must not be read as DD/MM/YY
+        assert data['date'].strftime('%Y-%m-%d') == '2026-03-14'
+        assert data['field_confidence']['reference'] == pytest.approx(0.95)
+
+    def test_space_thousands_separator(self):
+        service = OCRService()
+        data = service._parse_payment_info("Nedbank\nAmount paid: R12 450.00\n")
+        assert data['amount'] == 12450.00
+
+    def test_unknown_bank_uses_generic_with_lower_confidence(self):
+        service = OCRService()
+        data = service._parse_payment_info("\n".join(RECEIPT_LINES[1:]))
+        assert data['template'] == 'generic'
+        assert data['bank_name'] is None
+        assert data['amount'] == 12450.00
+        assert data['reference'] == 'INV-1042'
+        assert data['field_confidence']['amount'] < 0.95
+        assert 0 < data['confidence'] < 0.95
+
+    def test_synthetic_corpus_accuracy(self):
+        from collections import Counter
+        from benchmark_ocr import parse_corpus, field_hits
+        service = OCRService()
+        hits, per_bank = Counter(), Counter()
+        corpus = parse_corpus(300)
+        for bank, text, expected in corpus:
+            result = field_hits(service._parse_payment_info(text), expected)
+            hits.update(field for field, hit in result.items() if hit)
+            per_bank[bank] += all(result.values())
+
+        for field in ('amount', 'reference', 'date', 'bank'):
+            assert hits[field] / len(corpus) >= 0.98, field
+        assert all(count >= 45 for count in per_bank.values())
@@ -0,0 +1,213 @@
+"""
+Page Cache Test Suite - test_page_cache.py
+
+Usage:
+    pytest test_page_cache.py -v
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+import pytest
+import redis
+from flask import Flask
+from flask_caching import Cache
+
+from content_versions import ContentVersions
+from geolocation import geolocation_service
+import page_cache
+from page_cache import PageCache, RedisLocks, jittered
+from pricing import pricing_service
+
+renders = []
+gate = threading.Event()  # cleared: renders of /about block until it is set
+database_down = threading.Event()
+
+
+@pytest.fixture
+def app():
+    """Minimal app: one page per currency and one shared page that can be held or broken"""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY='test', CACHE_TYPE='simple', CACHE_WARMUP=True)
+    cache = Cache(app)
+    versions = ContentVersions()
+    versions.init_app(app, view_cache=cache)
+    pages = PageCache()
+    pages.init_app(app, cache, versions=versions)
+    app.page_cache, app.versions, app.view_cache = pages, versions, cache
+    renders.clear()
+    gate.set()
+    database_down.clear()
+
+    @app.route('/prices')
+    @pages.cached(vary_currency=True)
+    def prices():
+        currency = pricing_service.get_customer_pricing_context()['currency_code']
+        renders.append(('prices', currency))
+        return f'prices in {currency}'
+
+    @app.route('/about')
+    @pages.cached()
+    def about():
+        gate.wait(5)
+        if database_down.is_set():
+            raise RuntimeError('database unavailable')
+        renders.append(('about', None))
+        return f'about us {len(renders)}'
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class TestVariants:
+
+    def test_one_entry_per_currency(self, client):
+        assert client.get('/prices', headers={'CF-IPCountry': 'ZA'}).get_data() == b'prices in ZAR'
+        assert client.get('/prices', headers={'CF-IPCountry': 'DE'}).get_data() == b'prices in USD'
+        assert client.get('/prices', headers={'CF-IPCountry': 'US'}).get_data() == b'prices in USD'
+        assert client.get('/prices', headers={'CF-IPCountry': 'ZA'}).get_data() == b'prices in ZAR'
+        assert renders == [('prices', 'ZAR'), ('prices', 'USD')]
+
+    def test_cloudflare_country_skips_geoip(self, app):
+        with app.test_request_context(headers={'CF-IPCountry': 'ZA'}):
+            location = geolocation_service.get_country_from_ip()
+        assert location['is_local'] is True
+        assert location['country_name'] == 'South Africa'
+
+    def test_cache_hits_skip_geoip(self, client, monkeypatch):
+        lookups = []
+
+        def lookup(ip_address=None):
+            lookups.append(ip_address)
+            return {'country_code': 'ZA', 'country_name': 'South Africa', 'success': True, 'is_local': True}
+
+        monkeypatch.setattr(page_cache, '_currency_by_ip', OrderedDict())
+        monkeypatch.setattr(geolocation_service, 'get_country_from_ip', lookup)
+        headers = {'X-Forwarded-For': '41.0.0.1'}
+        assert client.get('/prices', headers=headers).get_data() == b'prices in ZAR'
+        looked_up = len(lookups)
+
+        for _ in range(3):
+            assert client.get('/prices', headers=headers).get_data() == b'prices in ZAR'
+        assert len(lookups) == looked_up
+        assert renders == [('prices', 'ZAR')]
+
+    def test_ttls_are_jittered(self):
+        timeouts = {jittered(300, 0.1) for _ in range(200)}
+        assert min(timeouts) >= 270 and max(timeouts) <= 330
+        assert len(timeouts) > 10
+
+
+class TestWarmUp:
+
+    def test_renders_every_variant_and_reports(self, app, client):
+        report = app.page_cache.warm('startup')
+        assert (report['warmed'], report['total'], report['coverage']) == (3, 3, 1.0)
+        assert sorted((page['path'], page['currency']) for page in report['pages']) == [
+            ('/about', None), ('/prices', 'USD'), ('/prices', 'ZAR')]
+        assert report['duration_ms'] >= 0
+
+        # visitors now hit the warmed entries
+        client.get('/prices', headers={'CF-IPCountry': 'ZA'})
+        client.get('/prices', headers={'CF-IPCountry': 'FR'})
+        client.get('/about')
+        assert len(renders) == 3
+
+    def test_warm_overwrites_cached_pages(self, app, client):
+        client.get('/about')
+        app.page_cache.warm('refresh')
+        assert renders.count(('about', None)) == 2
+
+    def test_one_warm_up_per_round(self, app):
+        assert app.page_cache.warm('refresh') is not None
+        assert app.page_cache.warm('refresh') is None
+        stats = app.page_cache.stats()
+        assert (stats['runs'], stats['skipped']) == (1, 1)
+
+    def test_failures_lower_coverage(self, app, monkeypatch):
+        def broken():
+            raise RuntimeError('database down')
+        monkeypatch.setattr(pricing_service, 'get_customer_pricing_context', broken)
+        report = app.page_cache.warm('startup')
+        assert (report['warmed'], report['total']) == (1, 3)
+        assert app.page_cache.stats()['failures'] == 2
+
+    def test_invalidation_re_warms(self, app, client):
+        app.page_cache.warm('startup')
+        app.versions.invalidate('catalog')
+        timer = app.page_cache._timer
+        assert timer is not None
+        timer.join(5)
+        assert app.page_cache.stats()['last_run']['reason'] == 'invalidation'
+        assert len(renders) == 6
+
+
+def expire(app, key, seconds_ago):
+    """Make a cached page's freshness run out `seconds_ago`"""
+    fresh_until, response = app.view_cache.get(key)
+    app.view_cache.set(key, (time.time() - seconds_ago, response), timeout=3600)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestStaleWhileRevalidate:
+
+    def test_stale_page_served_while_one_request_re_renders(self, app, client):
+        client.get('/about')
+        expire(app, 'view//about', 10)
+
+        gate.clear()  # hold the background render
+        assert client.get('/about').get_data() == b'about us 1'
+        assert client.get('/about').get_data() == b'about us 1'
+        gate.set()
+        assert wait_for(lambda: app.page_cache.stats()['served']['revalidations'] == 1)
+
+        assert client.get('/about').get_data() == b'about us 2'
+        served = app.page_cache.stats()['served']
+        assert (served['stale_hits'], served['hits'], len(renders)) == (2, 1, 2)
+
+    def test_concurrent_misses_render_once(self, app):
+        gate.clear()
+        bodies = []
+        threads = [threading.Thread(target=lambda: bodies.append(app.test_client().get('/about').get_data()))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        assert wait_for(lambda: app.page_cache.stats()['served']['misses'] == 4)
+        gate.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert bodies == [b'about us 1'] * 4
+        assert len(renders) == 1
+        assert app.page_cache.stats()['served']['coalesced'] == 3
+
+    def test_stale_if_error(self, app, client):
+        client.get('/about')
+        expire(app, 'view//about', app.page_cache.grace + 10)
+        database_down.set()
+        assert client.get('/about').get_data() == b'about us 1'
+        assert app.page_cache.stats()['served']['stale_if_error'] == 1
+
+    def test_errors_propagate_without_a_stale_copy(self, client):
+        database_down.set()
+        with pytest.raises(RuntimeError):
+            client.get('/about')
+
+    def test_redis_lock_falls_back_per_process(self):
+        locks = RedisLocks(redis.from_url('redis://127.0.0.1:1/0'))
+        token = locks.acquire('view//about')
+        assert token is not None
+        assert locks.acquire('view//about') is None
+        locks.release(token)
+        assert locks.acquire('view//about') is not None
@@ -0,0 +1,220 @@
+"""
+Prerendered Pages Test Suite - test_prerender.py
+
+Usage:
+    pytest test_prerender.py -v
+"""
+
+import re
+import gzip
+
+import pytest
+from flask import Flask, render_template_string, request, session, flash
+from flask_caching import Cache
+from flask_wtf.csrf import CSRFProtect
+
+from content_versions import ContentVersions
+from page_cache import PageCache
+from prerender import Prerenderer, CSRF_PLACEHOLDER
+from pricing import pricing_service
+from static_files import StaticFastPath
+
+PAGE = '<meta name="csrf-token" content="{{ csrf_token() }}">{{ get_flashed_messages()|join }}'
+content = {}
+renders = []
+pipeline = []
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Minimal app behind the static fast path: a page, a form page and a per-currency page"""
+    app = Flask(__name__, static_folder=str(tmp_path / 'static'))
+    app.config.update(SECRET_KEY='test', PRERENDER_ENABLED=True, PRERENDER_FOLDER=str(tmp_path / 'pages'))
+    CSRFProtect(app)
+    content.update(home='Welcome')
+    renders.clear()
+    pipeline.clear()
+
+    @app.before_request
+    def seen():
+        pipeline.append(request.path)
+
+    @app.after_request
+    def csp(response):
+        response.headers['Content-Security-Policy'] = "default-src 'self'"
+        return response
+
+    @app.route('/')
+    def index():
+        renders.append('index')
+        return render_template_string(PAGE + '<h1>{{ home }}</h1>', home=content['home'])
+
+    @app.route('/contact')
+    def contact():
+        renders.append('contact')
+        return render_template_string(PAGE + '<form><input name="csrf_token" value="{{ csrf_token() }}"></form>')
+
+    @app.route('/prices')
+    def prices():
+        renders.append('prices')
+        return render_template_string(PAGE + '{{ currency }}',
+                                      currency=pricing_service.get_customer_pricing_context()['currency_code'])
+
+    @app.route('/api/contact', methods=['POST'])
+    def submit():
+        return 'sent'
+
+    @app.route('/login')
+    def login():
+        session['_user_id'] = '1'
+        return 'ok'
+
+    @app.route('/flash')
+    def flash_message():
+        flash('Logged out')
+        return 'ok'
+
+    versions = ContentVersions()
+    versions.init_app(app)
+    prerenderer = Prerenderer(pages={'index': False, 'contact': False, 'prices': True})
+    prerenderer.init_app(app, versions=versions)
+    app.prerenderer, app.versions = prerenderer, versions
+    (tmp_path / 'static').mkdir()
+    app.wsgi_app = StaticFastPath(app.wsgi_app, app.static_folder, headers={}, pages=prerenderer)
+    return app
+
+
+def token_in(html):
+    return re.search(r'content="([^"]*)"', html).group(1)
+
+
+class TestPrerender:
+
+    def test_writes_every_variant_once(self, app):
+        report = app.prerenderer.prerender('startup')
+        assert (report['total'], report['written'], report['errors']) == (4, 4, 0)
+        assert sorted((page['path'], page['currency']) for page in report['pages']) == [
+            ('/', None), ('/contact', None), ('/prices', 'USD'), ('/prices', 'ZAR')]
+
+        html, headers = app.prerenderer._stored('index')
+        assert CSRF_PLACEHOLDER.encode() in html
+        assert ['Content-Security-Policy', "default-src 'self'"] in headers
+        assert not any(name.lower() == 'set-cookie' for name, value in headers)
+
+        assert app.prerenderer.prerender('refresh')['unchanged'] == 4
+
+    def test_currency_variants(self, app):
+        app.prerenderer.prerender('startup')
+        assert app.prerenderer._stored('prices.ZAR')[0].endswith(b'ZAR')
+        assert app.prerenderer._stored('prices.USD')[0].endswith(b'USD')
+
+
+class TestServing:
+
+    @pytest.fixture(autouse=True)
+    def written(self, app):
+        app.prerenderer.prerender('startup')
+        renders.clear()
+        pipeline.clear()
+
+    def test_fast_path_serves_cookieless_visitors(self, app):
+        response = app.test_client().get('/', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        body = gzip.decompress(response.get_data())
+        assert b'<h1>Welcome</h1>' in body and CSRF_PLACEHOLDER.encode() not in body
+        assert response.headers['Content-Security-Policy'] == "default-src 'self'"
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+        assert pipeline == [] and renders == []
+
+    def test_form_page_gets_a_working_token_from_flask(self, app):
+        client = app.test_client()
+        html = client.get('/contact').get_data(as_text=True)
+        assert pipeline == ['/contact'] and renders == []
+        token = token_in(html)
+        assert token != CSRF_PLACEHOLDER
+        assert client.post('/api/contact', headers={'X-CSRFToken': token}).get_data() == b'sent'
+        assert app.prerenderer.stats()['served_flask'] == 1
+
+    def test_anonymous_session_gets_prerendered_page(self, app):
+        client = app.test_client()
+        client.get('/contact')  # sets the session cookie
+        html = client.get('/').get_data(as_text=True)
+        assert renders == [] and '<h1>Welcome</h1>' in html
+        assert token_in(html) not in ('', CSRF_PLACEHOLDER)
+
+    def test_signed_in_and_flashed_visitors_get_live_pages(self, app):
+        client = app.test_client()
+        client.get('/flash')
+        assert 'Logged out' in client.get('/').get_data(as_text=True)
+        client.get('/login')
+        client.get('/')
+        assert renders == ['index', 'index']
+
+    def test_plain_http_falls_through_when_https_required(self, app):
+        app.prerenderer.require_https = True
+        app.test_client().get('/')
+        assert pipeline == ['/']
+        app.test_client().get('/', headers={'X-Forwarded-Proto': 'https'})
+        app.test_client().get('/', headers={'CF-Visitor': '{"scheme":"https"}'})
+        assert pipeline == ['/'] and app.prerenderer.stats()['served_static'] == 2
+
+    def test_varied_page_needs_a_country(self, app):
+        client = app.test_client()
+        assert client.get('/prices', headers={'CF-IPCountry': 'ZA'}).get_data().endswith(b'ZAR')
+        assert renders == []
+        client.get('/prices')
+        assert renders == ['prices']
+
+
+class TestDrift:
+
+    def test_check_reports_then_heals(self, app):
+        app.prerenderer.prerender('startup')
+        content['home'] = 'Winter specials'  # changed without invalidate()
+
+        report = app.prerenderer.check(heal=False)
+        assert report['changed'] == 1 and report['written'] == 0
+        drifted = next(page for page in report['pages'] if page['state'] == 'changed')
+        assert drifted['path'] == '/' and drifted['first_difference'] > 0
+        assert b'Welcome' in app.test_client().get('/').get_data()
+
+        app.prerenderer.check()
+        assert b'Winter specials' in app.test_client().get('/').get_data()
+        assert app.prerenderer.stats()['drift'] == 2
+
+    def test_invalidation_re_renders(self, app):
+        app.prerenderer.prerender('startup')
+        content['home'] = 'New range'
+        app.versions.invalidate('catalog')
+        app.prerenderer._timer.join(5)
+        assert b'New range' in app.test_client().get('/').get_data()
+
+
+class TestWithPageCache:
+
+    def test_warm_up_and_revalidation_reach_the_view(self, tmp_path):
+        app = Flask(__name__, static_folder=str(tmp_path / 'static'))
+        app.config.update(SECRET_KEY='test', CACHE_TYPE='simple', CACHE_WARMUP=True,
+                          PRERENDER_ENABLED=True, PRERENDER_FOLDER=str(tmp_path / 'pages'))
+        cache = Cache(app)
+        pages = PageCache()
+        pages.init_app(app, cache)
+        rendered = []
+
+        @app.route('/')
+        @pages.cached()
+        def index():
+            rendered.append('index')
+            return 'home'
+
+        prerenderer = Prerenderer(pages={'index': False})
+        prerenderer.init_app(app)
+        app.wsgi_app = StaticFastPath(app.wsgi_app, app.static_folder, headers={}, pages=prerenderer)
+        prerenderer.prerender('startup')
+        rendered.clear()
+
+        assert pages.warm('startup')['warmed'] == 1
+        assert rendered == ['index'] and cache.get('view//') is not None
+        pages._fetch(app.test_client(), '/', None)  # as a background revalidation
+        assert rendered == ['index', 'index']
+        assert prerenderer.stats()['served_static'] == 0
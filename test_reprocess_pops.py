@@ -0,0 +1,116 @@
+"""
+Batch Re-OCR Test Suite - test_reprocess_pops.py
+
+Usage:
+    pytest test_reprocess_pops.py -v
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from models import db, User, Customer, Invoice, InvoicePayment, ProofOfPayment
+import reprocess_pops
+from reprocess_pops import backlog_query, reprocess
+
+
+@pytest.fixture
+def app():
+    """Minimal app with an in-memory database"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['OCR_CONFIDENCE_THRESHOLD'] = 0.75
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def backlog(app):
+    """Five invoices whose POP failed OCR, plus one reviewed by an admin"""
+    customer = Customer(email='buyer@example.com', password_hash='x')
+    admin = User(email='admin@example.com', password_hash='x')
+    db.session.add_all([customer, admin])
+    db.session.flush()
+
+    pops = []
+    for index in range(6):
+        invoice = Invoice(
+            invoice_number=f'INV-{2000 + index}', customer_id=customer.id,
+            due_date=datetime.utcnow() + timedelta(days=30),
+            total_amount=1500.00, paid_amount=0, status='pending_verification'
+        )
+        db.session.add(invoice)
+        db.session.flush()
+        payment = InvoicePayment(invoice_id=invoice.id, amount=1500.00, payment_method='eft')
+        db.session.add(payment)
+        db.session.flush()
+        pop = ProofOfPayment(
+            invoice_payment_id=payment.id, invoice_id=invoice.id,
+            customer_id=customer.id, file_path=f'https://s3/bucket/proofs/{index}.pdf',
+            file_name='pop.pdf', file_type='pdf', file_size=1024,
+            verification_status='manual_review', verification_notes='OCR Error: blank page',
+            verified_by=admin.id if index == 5 else None
+        )
+        db.session.add(pop)
+        pops.append(pop)
+    db.session.commit()
+    return pops
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """Inline pools, in-memory documents and an extractor that now succeeds"""
+    monkeypatch.setattr(reprocess_pops, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(reprocess_pops, 'fetch_document', lambda file_path: b'%PDF-1.4')
+    monkeypatch.setattr(reprocess_pops, '_run_ocr', lambda document, file_type: {
+        'success': True, 'amount': 1500.00, 'reference': 'INV', 'confidence': 0.9, 'raw_text': 'R1,500.00'
+    })
+
+
+def test_backlog_skips_reviewed(backlog):
+    assert backlog_query().count() == 5
+
+
+def test_dry_run_writes_nothing(backlog, fake_ocr, tmp_path):
+    checkpoint = tmp_path / 'checkpoint.json'
+    result = reprocess(chunk_size=2, workers=1, checkpoint_path=str(checkpoint), dry_run=True)
+
+    assert result['statuses'] == {'verified': 5}
+    assert not checkpoint.exists()
+    assert backlog_query().count() == 5
+
+
+def test_chunks_commit_and_checkpoint(backlog, fake_ocr, tmp_path):
+    checkpoint = tmp_path / 'checkpoint.json'
+    reprocess(chunk_size=2, workers=1, checkpoint_path=str(checkpoint), limit=3)
+
+    saved = json.loads(checkpoint.read_text())
+    assert saved['processed'] == 3
+    assert saved['last_id'] == backlog[2].id
+    assert backlog_query().count() == 2
+
+    # Resume picks up after the last committed chunk
+    result = reprocess(chunk_size=2, workers=1, checkpoint_path=str(checkpoint))
+    assert result['processed'] == 5
+    assert result['statuses'] == {'verified': 5}
+    assert backlog_query().count() == 0
+    assert db.session.get(ProofOfPayment, backlog[5].id).verification_status == 'manual_review'
+
+
+def test_download_failure_counts_as_error(backlog, fake_ocr, monkeypatch, tmp_path):
+    def missing(file_path):
+        raise IOError('gone')
+
+    monkeypatch.setattr(reprocess_pops, 'fetch_document', missing)
+    result = reprocess(chunk_size=5, workers=1, checkpoint_path=str(tmp_path / 'c.json'))
+    assert result['statuses'] == {'errors': 5}
+    assert backlog_query().count() == 5
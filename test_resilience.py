@@ -0,0 +1,134 @@
+"""
+Circuit Breaker & Bulkhead Test Suite - test_resilience.py
+
+Usage:
+    pytest test_resilience.py -v
+"""
+
+import threading
+import time
+
+import pytest
+
+from resilience import (
+    CircuitBreaker, Bulkhead, CircuitOpenError, BulkheadFullError,
+    get_breaker, circuit_status
+)
+
+
+class DependencyDown(Exception):
+    pass
+
+
+def _fail():
+    raise DependencyDown("connection refused")
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(
+        'test_dep', failure_threshold=2, recovery_timeout=0.05,
+        failure_exceptions=(DependencyDown,)
+    )
+
+
+class TestCircuitBreaker:
+    """State transitions: closed -> open -> half-open -> closed/open"""
+
+    def test_opens_after_threshold(self, breaker):
+        for _ in range(2):
+            with pytest.raises(DependencyDown):
+                breaker.call(_fail)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: 'never called')
+        assert breaker.stats()['total_rejected'] == 1
+
+    def test_success_resets_failures(self, breaker):
+        with pytest.raises(DependencyDown):
+            breaker.call(_fail)
+        assert breaker.call(lambda: 'ok') == 'ok'
+        with pytest.raises(DependencyDown):
+            breaker.call(_fail)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_probe_closes_on_success(self, breaker):
+        for _ in range(2):
+            with pytest.raises(DependencyDown):
+                breaker.call(_fail)
+        time.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.call(lambda: 'recovered') == 'recovered'
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_probe_reopens_on_failure(self, breaker):
+        for _ in range(2):
+            with pytest.raises(DependencyDown):
+                breaker.call(_fail)
+        time.sleep(0.06)
+        with pytest.raises(DependencyDown):
+            breaker.call(_fail)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_business_errors_do_not_trip(self, breaker):
+        for _ in range(5):
+            with pytest.raises(ValueError):
+                breaker.call(lambda: (_ for _ in ()).throw(ValueError('declined')))
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestBulkhead:
+    """Concurrency limits per dependency"""
+
+    def test_rejects_when_full(self):
+        bulkhead = Bulkhead('slow_dep', max_concurrent=1)
+        bulkhead.acquire()
+        with pytest.raises(BulkheadFullError):
+            bulkhead.acquire()
+        bulkhead.release()
+        bulkhead.acquire()
+        bulkhead.release()
+        assert bulkhead.stats()['rejected'] == 1
+
+    def test_breaker_bulkhead_limits_threads(self):
+        breaker = CircuitBreaker('slow_dep', max_concurrent=2,
+                                 failure_exceptions=(DependencyDown,))
+        release = threading.Event()
+        started = threading.Barrier(3)
+
+        def slow_call():
+            started.wait()
+            release.wait(1)
+            return True
+
+        threads = [threading.Thread(target=breaker.call, args=(slow_call,))
+                   for _ in range(2)]
+        for t in threads:
+            t.start()
+        started.wait()
+        with pytest.raises(BulkheadFullError):
+            breaker.call(lambda: True)
+        release.set()
+        for t in threads:
+            t.join()
+        assert breaker.bulkhead.stats()['active'] == 0
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestRegistry:
+    """Shared breakers and health reporting"""
+
+    def test_same_instance_per_name(self):
+        assert get_breaker('registry_dep') is get_breaker('registry_dep')
+
+    def test_status_reports_state(self):
+        dep = get_breaker('registry_status_dep', failure_threshold=1,
+                          failure_exceptions=(DependencyDown,))
+        with pytest.raises(DependencyDown):
+            dep.call(_fail)
+        status = circuit_status()['registry_status_dep']
+        assert status['state'] == 'open'
+        assert 'retry_in_seconds' in status
+        dep.reset()
+        assert circuit_status()['registry_status_dep']['state'] == 'closed'
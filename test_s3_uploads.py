@@ -0,0 +1,243 @@
+"""
+S3 Upload Test Suite - test_s3_uploads.py
+Runs against moto's in-process S3 stand-in
+
+Usage:
+    pytest test_s3_uploads.py -v
+"""
+
+import io
+import hashlib
+
+import pytest
+
+moto = pytest.importorskip('moto')
+
+import s3_storage
+from s3_storage import S3StorageService, ChecksumReader, MB
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setenv('S3_ENDPOINT_URL', 'https://s3.amazonaws.com')
+    monkeypatch.setenv('S3_BUCKET_NAME', 'test-bucket')
+    monkeypatch.setenv('S3_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('S3_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('S3_REGION', 'us-east-1')
+    with moto.mock_aws():
+        service = S3StorageService()
+        service.s3_client.create_bucket(Bucket='test-bucket')
+        yield service
+
+
+class Upload(io.BytesIO):
+    """FileStorage stand-in"""
+    def __init__(self, data, filename='doc.pdf', content_type='application/pdf'):
+        super().__init__(data)
+        self.filename = filename
+        self.content_type = content_type
+
+
+class TestChecksumReader:
+    """Hashes are computed once while the stream is read"""
+
+    def test_rereads_are_not_double_counted(self):
+        data = bytes(range(256)) * 1000
+        reader = ChecksumReader(io.BytesIO(data))
+        reader.read(1000)
+        reader.seek(0)  # e.g. payload signing rewinds the body
+        while reader.read(4096):
+            pass
+        result = reader.finish()
+        assert result['sha256'] == hashlib.sha256(data).hexdigest()
+        assert result['md5'] == hashlib.md5(data).hexdigest()
+        assert result['size'] == len(data)
+
+    def test_gap_falls_back_to_rehash(self):
+        data = b'x' * 5000 + b'y' * 5000
+        reader = ChecksumReader(io.BytesIO(data))
+        reader.seek(5000)
+        reader.read()
+        assert reader.finish()['sha256'] == hashlib.sha256(data).hexdigest()
+
+
+class TestUploads:
+    """Transfer settings, checksums and per-folder metrics"""
+
+    def test_pool_sized_to_threads(self, storage):
+        assert storage.s3_client.meta.config.max_pool_connections == s3_storage.S3_MAX_POOL_CONNECTIONS
+        assert storage.transfer_config.max_request_concurrency == s3_storage.S3_MAX_CONCURRENCY
+
+    def test_single_part_upload(self, storage):
+        data = b'%PDF-1.4 receipt' * 100
+        checksums = {}
+        url, error = storage.upload_file(Upload(data), folder='proofs', checksums=checksums)
+
+        assert error is None
+        assert checksums == {'size': len(data), 'md5': hashlib.md5(data).hexdigest(),
+                             'sha256': hashlib.sha256(data).hexdigest()}
+        key = storage.key_from_url(url)
+        head = storage.s3_client.head_object(Bucket='test-bucket', Key=key)
+        assert head['ETag'].strip('"') == hashlib.md5(data).hexdigest()
+        assert storage.get_file_bytes(url) == data
+
+    def test_multipart_upload_with_checksums(self, storage, monkeypatch):
+        monkeypatch.setattr(storage.transfer_config, 'multipart_threshold', 5 * MB)
+        monkeypatch.setattr(storage.transfer_config, 'multipart_chunksize', 5 * MB)
+        data = bytes(range(256)) * (12 * MB // 256)
+
+        result = storage.upload_stream(io.BytesIO(data), 'bulk/large.bin')
+
+        assert result['sha256'] == hashlib.sha256(data).hexdigest()
+        assert result['md5'] == hashlib.md5(data).hexdigest()
+        head = storage.s3_client.head_object(Bucket='test-bucket', Key='bulk/large.bin')
+        assert head['ETag'].strip('"').endswith('-3')
+        assert head['ContentLength'] == len(data)
+
+    def test_latency_metrics_per_folder(self, storage):
+        storage.upload_file(Upload(b'a' * 2048, 'a.png', 'image/png'), folder='products')
+        storage.upload_file(Upload(b'b' * 4096), folder='proofs', data=b'b' * 4096)
+
+        stats = storage.upload_stats()
+        assert stats['products']['uploads'] == 1
+        assert stats['proofs']['uploads'] == 1
+        assert stats['proofs']['p95_ms'] is not None
+        assert stats['proofs']['errors'] == 0
+
+
+class TestDirectUploads:
+    """Presigned POST policies and finalize-time verification"""
+
+    PDF = b'%PDF-1.4\n' + b'0' * 4096
+
+    def _browser_post(self, upload, data, content_type=None):
+        import requests
+        fields = dict(upload['fields'])
+        if content_type:
+            fields['Content-Type'] = content_type
+        return requests.post(upload['url'], data=fields, files={'file': ('doc', data)})
+
+    def test_policy_pins_key_type_and_size(self, storage):
+        upload, error = storage.create_presigned_upload('proof_of_payment', 'Bank Receipt.PDF')
+
+        assert error is None
+        assert upload['key'].startswith('proofs/') and upload['key'].endswith('.pdf')
+        assert upload['fields']['key'] == upload['key']
+        assert upload['fields']['Content-Type'] == 'application/pdf'
+        assert 'policy' in upload['fields']
+        assert upload['max_size'] == s3_storage.UPLOAD_PROFILES['proof_of_payment']['max_size']
+
+    def test_disallowed_type_or_kind(self, storage):
+        assert storage.create_presigned_upload('proof_of_payment', 'run.exe') == (None, 'File type .exe not allowed')
+        assert storage.create_presigned_upload('avatar', 'me.png') == (None, 'Unknown upload type')
+
+    def test_browser_post_then_verify(self, storage):
+        upload, _ = storage.create_presigned_upload('proof_of_payment', 'pop.pdf')
+        assert self._browser_post(upload, self.PDF).status_code in (200, 204)
+
+        info, error = storage.verify_uploaded_object('proof_of_payment', upload['key'])
+        assert error is None
+        assert info['size'] == len(self.PDF)
+        assert info['content_type'] == 'application/pdf'
+        assert storage.get_file_bytes(info['url']) == self.PDF
+
+    def test_wrong_content_type_is_rejected(self, storage):
+        # S3 enforces the policy's Content-Type condition; moto does not, so
+        # finalize must catch an object stored under another type too
+        upload, _ = storage.create_presigned_upload('proof_of_payment', 'pop.pdf')
+        self._browser_post(upload, self.PDF, content_type='text/html')
+
+        info, error = storage.verify_uploaded_object('proof_of_payment', upload['key'])
+        assert (info, error) == (None, 'File type not allowed')
+        assert storage.list_files('proofs/') == []
+
+    def test_mismatched_content_is_deleted(self, storage):
+        upload, _ = storage.create_presigned_upload('product_image', 'photo.png')
+        storage.s3_client.put_object(Bucket='test-bucket', Key=upload['key'],
+                                     Body=b'<html>not an image</html>', ContentType='image/png')
+
+        info, error = storage.verify_uploaded_object('product_image', upload['key'])
+        assert info is None
+        assert error == 'File content does not match its type'
+        assert storage.list_files('products/') == []
+
+    def test_key_outside_profile_folder(self, storage):
+        assert storage.verify_uploaded_object('product_image', 'proofs/x.pdf') == (None, 'Invalid upload')
+        assert storage.verify_uploaded_object('product_image', 'products/missing.png') == (None, 'Upload not found')
+
+    def test_sniff_signatures_without_libmagic(self, monkeypatch):
+        import security_utils
+        monkeypatch.setattr(security_utils, 'MAGIC_AVAILABLE', False)
+        assert security_utils.sniff_mime(self.PDF) == 'application/pdf'
+        assert security_utils.sniff_mime(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp'
+        assert security_utils.sniff_mime(memoryview(b'\xff\xd8\xff\xe0')) == 'image/jpeg'
+        assert security_utils.sniff_mime(b'MZ\x90\x00') is None
+
+
+class TestPresignedUrlCache:
+    """Presigned GET URLs are reused until close to expiry"""
+
+    def test_reused_until_refresh_margin(self, storage, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(s3_storage.time, 'monotonic', lambda: clock[0])
+
+        first = storage.generate_presigned_url('proofs/a.pdf', expiration=600)
+        clock[0] += 500
+        assert storage.generate_presigned_url('proofs/a.pdf', expiration=600) == first
+        assert storage.generate_presigned_url('proofs/a.pdf', expiration=3600) != first
+
+        clock[0] += 41  # 59s of the 600s lifetime left: inside the margin
+        storage.generate_presigned_url('proofs/a.pdf', expiration=600)
+
+        stats = storage.presigned_url_stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 3, 2)
+
+    def test_bounded(self, storage, monkeypatch):
+        monkeypatch.setattr(s3_storage, 'PRESIGNED_URL_CACHE_SIZE', 3)
+        for index in range(5):
+            storage.generate_presigned_url(f'proofs/{index}.pdf')
+        assert storage.presigned_url_stats()['entries'] == 3
+
+
+class TestBatchedDeletes:
+    """delete_file queues; flush_deletes sends delete_objects batches"""
+
+    def _put(self, storage, count, prefix='uploads'):
+        keys = [f'{prefix}/{index}.jpg' for index in range(count)]
+        for key in keys:
+            storage.s3_client.put_object(Bucket='test-bucket', Key=key, Body=b'x')
+        return keys
+
+    def test_deletes_are_queued_until_flush(self, storage):
+        keys = self._put(storage, 3)
+        for key in keys:
+            assert storage.delete_file(storage.get_file_url(key)) is True
+        storage.delete_file(storage.get_file_url(keys[0]))  # duplicate collapses
+
+        assert len(storage.list_files('uploads/')) == 3
+        assert storage.flush_deletes() == 3
+        assert storage.list_files('uploads/') == []
+        assert storage.delete_stats() == {'queued': 3, 'deleted': 3, 'errors': 0, 'batches': 1, 'pending': 0}
+
+    def test_full_batch_flushes_in_chunks(self, storage, monkeypatch):
+        monkeypatch.setattr(s3_storage, 'S3_DELETE_BATCH_SIZE', 2)
+        keys = self._put(storage, 5)
+        deleted, errors = storage.delete_keys(keys)
+
+        assert (deleted, errors) == (5, [])
+        assert storage.delete_stats()['batches'] == 3
+
+    def test_unreachable_bucket_requeues(self, storage, monkeypatch):
+        from botocore.exceptions import EndpointConnectionError
+        keys = self._put(storage, 2)
+        for key in keys:
+            storage.delete_file(storage.get_file_url(key))
+
+        def unreachable(**kwargs):
+            raise EndpointConnectionError(endpoint_url='https://s3.amazonaws.com')
+        monkeypatch.setattr(storage.s3_client, 'delete_objects', unreachable)
+        assert storage.flush_deletes() == 0
+        assert storage.delete_stats()['pending'] == 2
+
+    def test_foreign_urls_are_ignored(self, storage):
+        assert storage.delete_file('https://cdn.example.com/other/a.jpg') is False
@@ -0,0 +1,125 @@
+"""
+Static Fast Path Test Suite - test_static_files.py
+
+Usage:
+    pytest test_static_files.py -v
+"""
+
+import gzip
+
+import pytest
+from flask import Flask, request
+from werkzeug.test import Client
+
+from performance import precompress_static
+from static_files import StaticFastPath
+
+CSS = b'.card { color: #1a472a; }\n' * 100
+IMAGE = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def pipeline():
+    """Requests that reached Flask"""
+    return []
+
+
+@pytest.fixture
+def client(tmp_path, pipeline):
+    static = tmp_path / 'static'
+    (static / 'images').mkdir(parents=True)
+    (static / 'uploads').mkdir()
+    (static / 'style.css').write_bytes(CSS)
+    (static / 'images' / 'hero.jpg').write_bytes(IMAGE)
+    (static / 'uploads' / 'new.jpg').write_bytes(b'upload')
+
+    app = Flask(__name__, static_folder=str(static))
+
+    @app.before_request
+    def seen():
+        pipeline.append(request.path)
+
+    precompress_static(app.static_folder)
+    fast_path = StaticFastPath(app.wsgi_app, app.static_folder, headers={'X-Content-Type-Options': 'nosniff'},
+                               memory_limit=4096)
+    client = Client(fast_path)
+    client.fast_path = fast_path
+    return client
+
+
+class TestFastPath:
+    """Indexed files are answered without entering Flask"""
+
+    def test_serves_from_index_without_flask(self, client, pipeline):
+        response = client.get('/static/style.css')
+        assert response.status_code == 200
+        assert response.get_data() == CSS
+        assert response.headers['Content-Type'] == 'text/css; charset=utf-8'
+        assert response.headers['Cache-Control'] == 'public, max-age=31536000'
+        assert response.headers['X-Content-Type-Options'] == 'nosniff'
+        assert pipeline == []
+
+    def test_large_files_stream_from_disk(self, client):
+        entry = client.fast_path.index['images/hero.jpg']
+        assert entry.data is None
+        assert client.get('/static/images/hero.jpg').get_data() == IMAGE
+
+    def test_uploads_and_unknown_paths_fall_through(self, client, pipeline):
+        assert client.get('/static/uploads/new.jpg').get_data() == b'upload'
+        assert client.get('/static/missing.css').status_code == 404
+        assert len(pipeline) == 2
+        assert client.fast_path.stats()['fallthrough'] == 2
+
+    def test_head_has_headers_only(self, client):
+        response = client.head('/static/style.css')
+        assert response.headers['Content-Length'] == str(len(CSS))
+        assert response.get_data() == b''
+
+
+class TestConditionalAndRange:
+
+    def test_if_none_match(self, client):
+        etag = client.get('/static/style.css').headers['ETag']
+        response = client.get('/static/style.css', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.get_data() == b''
+        assert client.fast_path.stats()['not_modified'] == 1
+
+    def test_single_range_from_memory_and_disk(self, client):
+        response = client.get('/static/style.css', headers={'Range': 'bytes=0-5'})
+        assert response.status_code == 206
+        assert response.get_data() == CSS[:6]
+        assert response.headers['Content-Range'] == f'bytes 0-5/{len(CSS)}'
+
+        tail = client.get('/static/images/hero.jpg', headers={'Range': 'bytes=-100'})
+        assert tail.get_data() == IMAGE[-100:]
+
+    def test_unsatisfiable_and_stale_if_range(self, client):
+        response = client.get('/static/style.css', headers={'Range': f'bytes={len(CSS) + 10}-'})
+        assert response.status_code == 416
+        assert response.headers['Content-Range'] == f'bytes */{len(CSS)}'
+
+        stale = client.get('/static/style.css', headers={'Range': 'bytes=0-5', 'If-Range': '"old"'})
+        assert stale.status_code == 200
+        assert stale.get_data() == CSS
+
+
+class TestPrecompressedVariants:
+
+    def test_gzip_variant_with_its_own_etag(self, client):
+        response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert gzip.decompress(response.get_data()) == CSS
+        etag = response.headers['ETag']
+        assert etag.endswith('-gzip"')
+
+        again = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert again.status_code == 304
+        plain = client.get('/static/style.css', headers={'If-None-Match': etag})
+        assert plain.status_code == 200  # identity is a different representation
+
+    def test_range_gets_identity_bytes(self, client):
+        response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-3'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_data() == CSS[:4]
@@ -0,0 +1,111 @@
+"""
+Static Manifest Test Suite - test_static_manifest.py
+
+Usage:
+    pytest test_static_manifest.py -v
+"""
+
+import pytest
+from flask import Flask, render_template_string
+from werkzeug.test import Client
+
+import static_manifest as manifest_module
+from performance import enable_compression
+from static_manifest import StaticManifest, IMMUTABLE_CACHE_CONTROL, GRACE_CACHE_CONTROL
+from static_files import StaticFastPath
+
+CSS = b'.card { color: #1a472a; }\n'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    (static / 'js').mkdir(parents=True)
+    (static / 'style.css').write_bytes(CSS)
+    (static / 'js' / 'menu.js').write_bytes(b'var open = false;\n')
+    (static / 'logo.png').write_bytes(b'\x89PNG')
+
+    app = Flask(__name__, static_folder=str(static))
+    app.config['STATIC_MANIFEST_HISTORY'] = str(tmp_path / 'instance' / 'static_manifest.json')
+    enable_compression(app)
+    manifest = StaticManifest()
+    monkeypatch.setattr(manifest_module, 'static_manifest', manifest)
+    manifest.init_app(app)
+    app.manifest = manifest
+    return app
+
+
+class TestManifest:
+
+    def test_hashes_css_and_js_only(self, app):
+        assets = app.manifest.manifest()
+        assert sorted(assets) == ['js/menu.js', 'style.css']
+        assert assets['style.css'].startswith('style.') and assets['style.css'].endswith('.css')
+        assert assets['js/menu.js'].startswith('js/menu.')
+
+    def test_hash_follows_content(self, app):
+        before = app.manifest.manifest()['style.css']
+        with open(f"{app.static_folder}/style.css", 'ab') as f:
+            f.write(b'p { margin: 0; }\n')
+        app.manifest.build(app.static_folder)
+        assert app.manifest.manifest()['style.css'] != before
+
+    def test_static_url_helper(self, app):
+        with app.test_request_context():
+            html = render_template_string("{{ static_url('style.css') }} {{ static_url('logo.png') }}")
+        assert html == f"/static/{app.manifest.manifest()['style.css']} /static/logo.png"
+
+
+class TestServing:
+    """Hashed names resolve through Flask and through the fast path"""
+
+    @pytest.fixture(params=['flask', 'fast_path'])
+    def client(self, request, app):
+        if request.param == 'flask':
+            return app.test_client()
+        return Client(StaticFastPath(app.wsgi_app, app.static_folder, headers={}, manifest=app.manifest))
+
+    def test_current_hash_is_immutable(self, app, client):
+        response = client.get(f"/static/{app.manifest.manifest()['style.css']}")
+        assert response.status_code == 200
+        assert response.get_data() == CSS
+        assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+    @staticmethod
+    def deploy(app):
+        """Change menu.js and rebuild, as a deploy would; returns the retired name"""
+        old = app.manifest.manifest()['js/menu.js']
+        with open(f"{app.static_folder}/js/menu.js", 'ab') as f:
+            f.write(b'var closed = true;\n')
+        app.manifest.build(app.static_folder)
+        return old
+
+    def test_retired_hash_resolves_briefly_during_grace(self, app, client):
+        old = self.deploy(app)
+        response = client.get(f'/static/{old}')
+        assert response.status_code == 200
+        assert response.get_data().startswith(b'var open = false;\n')
+        assert response.headers['Cache-Control'] == GRACE_CACHE_CONTROL
+
+    def test_hashes_never_deployed_are_404(self, client):
+        assert client.get('/static/js/menu.0123456789.js').status_code == 404
+
+    def test_retired_hash_gone_after_grace(self, app, client, monkeypatch):
+        old = self.deploy(app)
+        retired_at = app.manifest.retired[old][1]
+        monkeypatch.setattr(manifest_module.time, 'time', lambda: retired_at + app.manifest.grace + 1)
+        assert client.get(f'/static/{old}').status_code == 404
+
+    def test_worker_restart_keeps_the_retirement_time(self, app, client, monkeypatch):
+        old = self.deploy(app)
+        retired_at = app.manifest.retired[old][1]
+        monkeypatch.setattr(manifest_module.time, 'time', lambda: retired_at + app.manifest.grace - 60)
+        app.manifest.build(app.static_folder)  # recycled worker, same files
+        assert app.manifest.retired[old][1] == retired_at
+        monkeypatch.setattr(manifest_module.time, 'time', lambda: retired_at + app.manifest.grace + 1)
+        assert client.get(f'/static/{old}').status_code == 404
+
+    def test_plain_name_still_served(self, client):
+        response = client.get('/static/style.css')
+        assert response.get_data() == CSS
+        assert 'immutable' not in response.headers['Cache-Control']